@@ -8,6 +8,8 @@ import concurrent.futures
 from pathlib import Path
 import numpy as np
 
+from volume_manifest import ManifestBuilder
+
 # Pyvips 필수 체크
 try:
     import pyvips
@@ -150,7 +152,7 @@ class UniversalLoader:
 # ========================================================================
 # [Worker] 타일 저장
 # ========================================================================
-def save_tile(loader, x, y, chunk, out_dir):
+def save_tile(loader, x, y, chunk, out_dir, builder=None):
     try:
         data = loader.get_crop(x, y, chunk, chunk)
         if data is None:
@@ -176,8 +178,11 @@ def save_tile(loader, x, y, chunk, out_dir):
 
         out_path = os.path.join(out_dir, f"{x}-{x+w}_{y}-{y+h}_0-1")
 
+        raw = chunk_arr.tobytes(order="F")
         with open(out_path, "wb") as f:
-            f.write(chunk_arr.tobytes(order="F"))
+            f.write(raw)
+        if builder is not None:
+            builder.add(out_path, raw)  # 메모리의 바이트로 해시 (다시 읽지 않음)
 
         return 1
 
@@ -274,6 +279,7 @@ def main():
         }
         with open(scale_dir.parent / "info", "w") as f: json.dump(info, f)
         with open(scale_dir.parent / "provenance", "w") as f: json.dump({"source": name}, f)
+        builder = ManifestBuilder(str(scale_dir.parent))
 
         print(f"\n🚀 작업 시작 (스레드: {optimal_workers})...")
         start_time = time.time()
@@ -282,7 +288,7 @@ def main():
 
         # 🔥 자동 감지된 최적 스레드 수 적용
         with concurrent.futures.ThreadPoolExecutor(max_workers=optimal_workers) as executor:
-            futures = [executor.submit(save_tile, loader, x, y, chunk_size, str(scale_dir))
+            futures = [executor.submit(save_tile, loader, x, y, chunk_size, str(scale_dir), builder)
                        for y in range(0, H, chunk_size) for x in range(0, W, chunk_size)]
             
             for _ in concurrent.futures.as_completed(futures):
@@ -294,6 +300,7 @@ def main():
                     print(f"\r⚡ {processed:,}/{total_chunks:,} | {speed:.0f} tiles/s | ETA: {eta:.0f}s  ", end="")
 
         loader.close()
+        builder.write()  # manifest.json (전송/검증용 체크섬)
         print(f"\n✨ 완료! ({time.time() - start_time:.1f}초)")
 
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+"""
+저장 위치별 I/O 스케줄러
+- 위치마다 별도의 제한된 스레드 풀 → 느린 F: 마운트가 Docker 볼륨 요청을 막지 않음
+  (Starlette 기본 스레드 풀도 디스크 I/O 로 고갈되지 않음)
+- 짧은 작업(목록/stat/파일 쓰기)과 긴 작업(삭제/검증/중복 제거)은 다른 풀에서 실행
+- 큰 디렉터리 삭제는 이름을 숨김 이름으로 바꾼 뒤 백그라운드에서 지우며 진행 상황 제공
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+# 위치별 짧은 작업 / 긴 작업 스레드 수
+IO_WORKERS = 4
+BACKGROUND_WORKERS = 2
+
+# 삭제 대기 중인 디렉터리 이름 접미사 (목록에서 숨김)
+DELETING_SUFFIX = ".deleting"
+
+# 보관하는 완료된 삭제 작업 수
+MAX_FINISHED_DELETIONS = 100
+
+
+class Deletion:
+    """백그라운드 삭제 작업 한 개"""
+
+    def __init__(self, location: str, item_name: str, trash_path: Path):
+        self.id = uuid.uuid4().hex[:12]
+        self.location = location
+        self.item_name = item_name
+        self.trash_path = trash_path
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed")
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "location": self.location,
+            "item_name": self.item_name,
+            "status": self.status,
+            "error": self.error,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "bytes_total": self.bytes_total,
+            "bytes_done": self.bytes_done,
+            "percent": round(self.files_done / self.files_total * 100, 1) if self.files_total else
+                       (100.0 if self.status == "completed" else 0.0),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class IOScheduler:
+    """위치별 제한된 실행기 + 백그라운드 삭제"""
+
+    def __init__(self, locations: Dict[str, Path], io_workers: int = IO_WORKERS,
+                 background_workers: int = BACKGROUND_WORKERS,
+                 on_deleted: Optional[Callable[[str, str], None]] = None, logger=None):
+        self.locations = {name: Path(p) for name, p in locations.items()}
+        self.on_deleted = on_deleted
+        self.logger = logger
+        self._io = {
+            name: ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix=f"io-{name}")
+            for name in self.locations
+        }
+        self._background = {
+            name: ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix=f"bg-{name}")
+            for name in self.locations
+        }
+        self._pending = {name: 0 for name in self.locations}
+        self._deletions: "OrderedDict[str, Deletion]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    # ==========================================
+    # 실행
+    # ==========================================
+
+    def _executor(self, pools: Dict[str, ThreadPoolExecutor], location: str) -> ThreadPoolExecutor:
+        if location not in pools:
+            raise ValueError(f"Invalid location: {location}")
+        return pools[location]
+
+    async def run(self, location: str, fn: Callable, *args, **kwargs):
+        """짧은 I/O 작업을 위치의 풀에서 실행"""
+        return await self._submit(self._executor(self._io, location), location, fn, *args, **kwargs)
+
+    async def run_background(self, location: str, fn: Callable, *args, **kwargs):
+        """오래 걸리는 작업 (검증/중복 제거 등) 을 위치의 백그라운드 풀에서 실행"""
+        return await self._submit(self._executor(self._background, location), location,
+                                  fn, *args, **kwargs)
+
+    async def _submit(self, executor: ThreadPoolExecutor, location: str, fn: Callable, *args, **kwargs):
+        with self._lock:
+            self._pending[location] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            with self._lock:
+                self._pending[location] -= 1
+
+    def pending(self, location: str) -> int:
+        """위치에서 실행 중이거나 대기 중인 작업 수"""
+        return self._pending.get(location, 0)
+
+    # ==========================================
+    # 비동기 파일 조회
+    # ==========================================
+
+    async def stat(self, location: str, path: Path) -> Optional[os.stat_result]:
+        """stat (없으면 None)"""
+        def _stat():
+            try:
+                return os.stat(path)
+            except OSError:
+                return None
+        return await self.run(location, _stat)
+
+    async def exists(self, location: str, path: Path) -> bool:
+        return await self.run(location, os.path.exists, path)
+
+    async def is_dir(self, location: str, path: Path) -> bool:
+        return await self.run(location, os.path.isdir, path)
+
+    async def listdir(self, location: str, path: Path) -> List[str]:
+        return await self.run(location, os.listdir, path)
+
+    # ==========================================
+    # 백그라운드 삭제
+    # ==========================================
+
+    def delete_tree(self, location: str, item_name: str) -> Deletion:
+        """
+        디렉터리를 숨김 이름으로 바꾼 뒤 (즉시, 같은 이름 재사용 가능)
+        백그라운드 풀에서 삭제
+        """
+        base = self.locations[location]
+        path = base / item_name
+        trash = base / f".{item_name}.{uuid.uuid4().hex[:8]}{DELETING_SUFFIX}"
+        os.rename(path, trash)
+        return self._schedule_delete(Deletion(location, item_name, trash))
+
+    def resume_deletions(self) -> int:
+        """재시작 전에 끝나지 않은 삭제 이어서 진행"""
+        count = 0
+        for location, base in self.locations.items():
+            try:
+                names = [n for n in os.listdir(base) if n.endswith(DELETING_SUFFIX)]
+            except OSError:
+                continue
+            for name in names:
+                item_name = name[1:-len(DELETING_SUFFIX)].rsplit(".", 1)[0]
+                self._schedule_delete(Deletion(location, item_name, base / name))
+                count += 1
+        return count
+
+    def _schedule_delete(self, deletion: Deletion) -> Deletion:
+        with self._lock:
+            self._deletions[deletion.id] = deletion
+            finished = [d.id for d in self._deletions.values() if d.finished]
+            for deletion_id in finished[:max(len(finished) - MAX_FINISHED_DELETIONS, 0)]:
+                del self._deletions[deletion_id]
+        self._background[deletion.location].submit(self._delete, deletion)
+        return deletion
+
+    def _delete(self, deletion: Deletion):
+        deletion.status = "scanning"
+        try:
+            dirs = []
+            files = []
+            stack = [str(deletion.trash_path)]
+            while stack:
+                current = stack.pop()
+                dirs.append(current)
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            size = entry.stat(follow_symlinks=False).st_size
+                            files.append((entry.path, size))
+                            deletion.files_total += 1
+                            deletion.bytes_total += size
+
+            deletion.status = "deleting"
+            for path, size in files:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                deletion.files_done += 1
+                deletion.bytes_done += size
+            # 하위 디렉터리부터 (스캔 순서의 역순)
+            for path in reversed(dirs):
+                os.rmdir(path)
+
+            deletion.status = "completed"
+            if self.logger:
+                self.logger.info(f"Deleted: {deletion.location}/{deletion.item_name}",
+                                 files=deletion.files_done, bytes=deletion.bytes_done)
+        except Exception as e:
+            deletion.status = "failed"
+            deletion.error = str(e)
+            if self.logger:
+                self.logger.error(f"Delete failed: {deletion.location}/{deletion.item_name}",
+                                  exc_info=True)
+        finally:
+            deletion.finished_at = time.time()
+            if self.on_deleted:
+                self.on_deleted(deletion.location, deletion.item_name)
+
+    def get_deletion(self, deletion_id: str) -> Optional[Deletion]:
+        return self._deletions.get(deletion_id)
+
+    def list_deletions(self) -> List[Deletion]:
+        """삭제 작업 목록 (최신순)"""
+        with self._lock:
+            return list(reversed(self._deletions.values()))
+
+    # ==========================================
+    # 종료
+    # ==========================================
+
+    def shutdown(self):
+        """실행기 종료 (진행 중인 삭제는 다음 시작 시 resume_deletions 로 이어서 진행)"""
+        for pool in (*self._io.values(), *self._background.values()):
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,262 @@
+"""
+저장 위치 목록 캐시
+- os.scandir 한 번으로 목록 생성 (DirEntry 의 stat 캐시 사용, 항목당 stat 1회)
+- 위치 디렉터리의 mtime 이 그대로면 캐시된 목록 반환
+- 디렉터리 크기는 백그라운드 스레드가 계산해 위치별 JSON 으로 저장 (재시작 후에도 유지)
+- 전송/업로드/삭제 시 해당 항목 무효화
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from chunk_store import CHUNK_DIR_NAME
+from io_scheduler import DELETING_SUFFIX
+
+
+# 무효화되지 않은 디렉터리 크기도 이 주기로 다시 계산 (외부에서 바뀐 경우 대비)
+SIZE_MAX_AGE_SECONDS = 3600
+
+
+def tree_size(path: str) -> Tuple[int, int]:
+    """디렉터리 전체 크기와 파일 수 (scandir 재귀)"""
+    total, files = 0, 0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            total += entry.stat(follow_symlinks=False).st_size
+                            files += 1
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total, files
+
+
+class _Listing:
+    """한 위치의 캐시된 목록"""
+
+    __slots__ = ("mtime_ns", "items")
+
+    def __init__(self, mtime_ns: int, items: List[Dict]):
+        self.mtime_ns = mtime_ns
+        self.items = items
+
+
+class ListingCache:
+    """위치별 목록 캐시 + 디렉터리 크기 집계기"""
+
+    def __init__(self, locations: Dict[str, Path], state_dir: Path, interval: float = 5.0):
+        self.locations = {name: Path(p) for name, p in locations.items()}
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.interval = interval
+
+        self._listings: Dict[str, _Listing] = {}
+        # 위치 → {디렉터리 이름: {"size_bytes", "file_count", "computed_at"}}
+        self._sizes: Dict[str, Dict[str, Dict]] = {
+            name: self._load_sizes(name) for name in self.locations
+        }
+        self._dirty: Dict[str, set] = {name: set() for name in self.locations}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+    # ==========================================
+    # 목록
+    # ==========================================
+
+    def list(self, location: str) -> List[Dict]:
+        """위치의 항목 목록 (디렉터리 mtime 이 바뀌었거나 무효화된 경우에만 다시 스캔)"""
+        base = self.locations[location]
+        try:
+            mtime_ns = base.stat().st_mtime_ns
+        except OSError:
+            return []
+
+        with self._lock:
+            cached = self._listings.get(location)
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                return self._with_sizes(location, cached.items)
+
+        items = self._scan(base)
+        with self._lock:
+            self._listings[location] = _Listing(mtime_ns, items)
+            # 크기를 모르는 디렉터리는 집계 대상, 사라진 디렉터리는 크기 제거
+            sizes = self._sizes[location]
+            dir_names = {item['name'] for item in items if item['type'] == 'directory'}
+            for name in dir_names - sizes.keys():
+                self._dirty[location].add(name)
+            for name in sizes.keys() - dir_names:
+                self._dirty[location].add(name)
+            if self._dirty[location]:
+                self._wake.set()
+            return self._with_sizes(location, items)
+
+    def count(self, location: str) -> int:
+        """항목 수 (캐시가 있으면 조회만)"""
+        with self._lock:
+            cached = self._listings.get(location)
+            if cached is not None:
+                return len(cached.items)
+        return len(self.list(location))
+
+    @staticmethod
+    def _scan(base: Path) -> List[Dict]:
+        items = []
+        with os.scandir(base) as it:
+            for entry in it:
+                # 청크 저장소 / 업로드 중인 임시 파일 / 삭제 중인 디렉터리 제외
+                if (entry.name == CHUNK_DIR_NAME or entry.name.endswith(".upload")
+                        or entry.name.endswith(DELETING_SUFFIX)):
+                    continue
+                try:
+                    is_dir = entry.is_dir()
+                    st = entry.stat()
+                except OSError:
+                    continue
+                items.append({
+                    'name': entry.name,
+                    'type': 'directory' if is_dir else 'file',
+                    'size_mb': "-" if is_dir else round(st.st_size / (1024 * 1024), 2),
+                    'extension': None if is_dir else os.path.splitext(entry.name)[1].lower(),
+                    'modified': datetime.fromtimestamp(st.st_mtime).isoformat()
+                })
+        return sorted(items, key=lambda x: (x['type'], x['name']))
+
+    def _with_sizes(self, location: str, items: List[Dict]) -> List[Dict]:
+        """캐시된 목록에 집계된 디렉터리 크기 채우기 (호출자는 _lock 보유)"""
+        sizes = self._sizes[location]
+        dirty = self._dirty[location]
+        result = []
+        for item in items:
+            if item['type'] == 'directory':
+                info = sizes.get(item['name'])
+                item = dict(item)
+                if info is not None:
+                    item['size_mb'] = round(info['size_bytes'] / (1024 * 1024), 2)
+                    item['file_count'] = info['file_count']
+                item['size_pending'] = info is None or item['name'] in dirty
+            result.append(item)
+        return result
+
+    # ==========================================
+    # 무효화
+    # ==========================================
+
+    def invalidate(self, location: str, name: Optional[str] = None):
+        """위치 목록과 (지정 시) 해당 항목의 크기 무효화"""
+        if location not in self.locations:
+            return
+        with self._lock:
+            self._listings.pop(location, None)
+            if name:
+                top = name.strip("/").split("/", 1)[0]
+                self._dirty[location].add(top)
+        self._wake.set()
+
+    # ==========================================
+    # 백그라운드 크기 집계
+    # ==========================================
+
+    def start(self):
+        """백그라운드 집계 시작"""
+        if self.running:
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._aggregate_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """백그라운드 집계 중지"""
+        self.running = False
+        self._wake.set()
+        if self.thread:
+            self.thread.join()
+
+    def _aggregate_loop(self):
+        while self.running:
+            self._wake.clear()
+            try:
+                self.aggregate()
+            except Exception as e:
+                print(f"디렉터리 크기 집계 오류: {e}")
+            self._wake.wait(self.interval)
+
+    def aggregate(self) -> int:
+        """무효화되었거나 오래된 디렉터리 크기 다시 계산"""
+        updated = 0
+        now = time.time()
+        for location, base in self.locations.items():
+            self.list(location)  # 새로 생긴 디렉터리 반영
+            with self._lock:
+                sizes = self._sizes[location]
+                todo = set(self._dirty[location])
+                todo.update(
+                    name for name, info in sizes.items()
+                    if now - info['computed_at'] > SIZE_MAX_AGE_SECONDS
+                )
+
+            changed = False
+            for name in sorted(todo):
+                if not self.running and self.thread is not None:
+                    return updated
+                path = base / name
+                with self._lock:
+                    self._dirty[location].discard(name)
+                if not path.is_dir():
+                    with self._lock:
+                        changed |= sizes.pop(name, None) is not None
+                    continue
+                size_bytes, file_count = tree_size(str(path))
+                with self._lock:
+                    sizes[name] = {
+                        'size_bytes': size_bytes,
+                        'file_count': file_count,
+                        'computed_at': time.time(),
+                    }
+                changed = True
+                updated += 1
+
+            if changed:
+                self._save_sizes(location)
+        return updated
+
+    # ==========================================
+    # 저장
+    # ==========================================
+
+    def _sizes_file(self, location: str) -> Path:
+        return self.state_dir / f"dir_sizes_{location}.json"
+
+    def _load_sizes(self, location: str) -> Dict[str, Dict]:
+        try:
+            with open(self._sizes_file(location), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_sizes(self, location: str):
+        with self._lock:
+            data = dict(self._sizes[location])
+        path = self._sizes_file(location)
+        tmp = path.with_suffix(".tmp")
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"디렉터리 크기 저장 오류: {e}")
@@ -5,21 +5,22 @@ Docker 서버 ↔ 로컬 (F:/uploads, ./converter/uploads) 양방향 전송
 import os
 import sys
 import shutil
+import stat
+import asyncio
 import json
 from pathlib import Path
-from typing import List, Optional, Dict
-import zipfile
-import io
+from typing import List, Optional, Dict, Literal
 from datetime import datetime
 import logging
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File
-from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Request
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 # 로깅 모듈 import
 sys.path.insert(0, '/app')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 try:
     from shared_logging import get_logger
     logger = get_logger("downloader", "/logs")
@@ -30,6 +31,16 @@ except ImportError as e:
     logger = logging.getLogger("downloader")
     logger.info(f"Using fallback logger: {e}")
 
+from zip_stream import StreamingZip, parse_range
+from transfer_engine import TransferEngine
+from transfer_jobs import TransferJob, TransferJobManager
+from transfer_history import TransferHistory
+from listing_cache import ListingCache
+from chunk_store import ChunkStore
+from volume_manifest import build_manifest, verify_manifest
+from multipart_upload import MultipartUploadManager, UploadError, DEFAULT_PART_SIZE
+from io_scheduler import IOScheduler
+
 app = FastAPI(title="Neuroglancer Bidirectional Transfer")
 
 app.add_middleware(
@@ -44,8 +55,15 @@ app.add_middleware(
 DOCKER_UPLOADS = "/tmp/uploads"
 F_DRIVE_UPLOADS = "/app/f_uploads"
 PROJECT_UPLOADS = "/app/project_uploads"
-TRANSFER_LOG = "/app/transfer_history.json"
+TRANSFER_LOG = "/app/transfer_history.json"   # 이전 형식 (최초 실행 시 DB 로 가져옴)
+TRANSFER_DB = os.getenv("TRANSFER_HISTORY_DB", "/app/transfer_history.db")
 LOG_DIR = "/logs"
+UPLOAD_BUFFER_SIZE = 8 * 1024 * 1024
+# 멀티파트 업로드에서 디스크에 한 번에 쓰는 크기
+PART_WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+# 위치별 I/O 스레드 수 / 목록 조회 제한 시간 (초, 느린 마운트가 응답 전체를 막지 않도록)
+IO_WORKERS_PER_LOCATION = int(os.getenv("IO_WORKERS_PER_LOCATION", "4"))
+IO_LIST_TIMEOUT = float(os.getenv("IO_LIST_TIMEOUT", "10"))
 
 # 디렉터리 생성
 for directory in [DOCKER_UPLOADS, F_DRIVE_UPLOADS, PROJECT_UPLOADS]:
@@ -68,45 +86,37 @@ class TransferRequest(BaseModel):
     target_location: str
     item_name: str
     overwrite: bool = False
+    mode: Literal["copy", "sync"] = "copy"   # sync: 변경분만 복사 + 원본에 없는 파일 삭제
+    checksum: bool = False                   # sync 시 크기가 같은 파일을 해시로 비교
+    dedup: bool = False                      # 해시로 전송 (대상 청크 저장소에 있는 블롭은 링크만)
 
 
-class TransferHistory:
-    """전송 기록 관리"""
-    
-    def __init__(self, log_file: str = TRANSFER_LOG):
-        self.log_file = log_file
-        self.history = self._load()
-        logger.info(f"TransferHistory initialized with {len(self.history)} records")
-    
-    def _load(self) -> List[Dict]:
-        if os.path.exists(self.log_file):
-            try:
-                with open(self.log_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"Failed to load transfer history: {e}", exc_info=True)
-                return []
-        return []
-    
-    def _save(self):
-        try:
-            with open(self.log_file, 'w', encoding='utf-8') as f:
-                json.dump(self.history, f, indent=2, ensure_ascii=False)
-            logger.debug(f"Transfer history saved: {len(self.history)} records")
-        except Exception as e:
-            logger.error(f"Failed to save transfer history: {e}", exc_info=True)
-    
-    def add(self, record: Dict):
-        record['timestamp'] = datetime.now().isoformat()
-        self.history.append(record)
-        self._save()
-        logger.info(f"Transfer record added", **record)
-    
-    def get_recent(self, limit: int = 20) -> List[Dict]:
-        return list(reversed(self.history[-limit:]))
+class MultipartInitRequest(BaseModel):
+    filename: str
+    size: int
+    part_size: int = DEFAULT_PART_SIZE
 
 
-transfer_history = TransferHistory()
+transfer_history = TransferHistory(TRANSFER_DB, legacy_json=TRANSFER_LOG, logger=logger)
+logger.info(f"TransferHistory initialized with {transfer_history.total} records")
+LOCATIONS = {'docker': DOCKER_UPLOADS, 'f_drive': F_DRIVE_UPLOADS, 'project': PROJECT_UPLOADS}
+listing_cache = ListingCache(
+    LOCATIONS,
+    state_dir=os.getenv("LISTING_STATE_DIR", "/app/.listing_cache")
+)
+io_scheduler = IOScheduler(
+    LOCATIONS,
+    io_workers=IO_WORKERS_PER_LOCATION,
+    on_deleted=listing_cache.invalidate,
+    logger=logger
+)
+chunk_stores = {
+    'docker': ChunkStore(DOCKER_UPLOADS),
+    'f_drive': ChunkStore(F_DRIVE_UPLOADS),
+    'project': ChunkStore(PROJECT_UPLOADS)
+}
+multipart_uploads = MultipartUploadManager(os.getenv("UPLOAD_STATE_DIR", "/app/.uploads"))
+transfer_engine = TransferEngine(workers=int(os.getenv("TRANSFER_WORKERS", "8")))
 
 
 # ============= Helper Functions =============
@@ -125,72 +135,29 @@ def get_location_path(location: str) -> Path:
     return locations[location]
 
 
-def scan_directory(location: str) -> List[Dict]:
-    """디렉터리 스캔하여 파일/폴더 목록 반환"""
-    try:
-        base_path = get_location_path(location)
-
-        logger.info(f"🔍 Scanning {location} -> {base_path}")
-
-        if not base_path.exists():
-            logger.warning(f"⚠️ Location path does not exist: {location} -> {base_path}")
-            return []
-
-        items = []
-
-        logger.info(f"📂 Reading directory: {base_path}")
-
-        for item in base_path.iterdir():
-            try:
-                is_dir = item.is_dir()
+def get_chunk_store(location: str) -> ChunkStore:
+    """위치의 청크 저장소"""
+    get_location_path(location)
+    return chunk_stores[location]
 
-                # 파일만 크기 계산, 디렉터리는 "-" 표시
-                if is_dir:
-                    size_mb = "-"  # 디렉터리는 크기 표시 안 함
-                else:
-                    size_bytes = item.stat().st_size
-                    size_mb = round(size_bytes / (1024 * 1024), 2)
 
-                items.append({
-                    'name': item.name,
-                    'type': 'directory' if is_dir else 'file',
-                    'size_mb': size_mb,
-                    'extension': item.suffix.lower() if not is_dir else None,
-                    'modified': datetime.fromtimestamp(item.stat().st_mtime).isoformat()
-                })
-
-                logger.debug(f"  ✅ {item.name} ({size_mb} MB)")
-
-            except Exception as e:
-                logger.error(f"❌ Error scanning {item.name}: {e}", location=location, exc_info=True)
-
-        logger.info(f"✅ Scanned {location}: found {len(items)} items")
-        return sorted(items, key=lambda x: (x['type'], x['name']))
+def scan_directory(location: str) -> List[Dict]:
+    """위치의 파일/폴더 목록 (캐시 사용, 디렉터리 크기는 백그라운드 집계값)"""
+    try:
+        get_location_path(location)
+        items = listing_cache.list(location)
+        logger.debug(f"Listed {location}: {len(items)} items")
+        return items
 
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"❌ Fatal error scanning {location}: {e}", exc_info=True)
         return []
 
 
-def calculate_size(path: Path) -> int:
-    """경로의 전체 크기 계산 (바이트)"""
-    if path.is_file():
-        return path.stat().st_size
-    
-    total = 0
-    for item in path.rglob('*'):
-        if item.is_file():
-            total += item.stat().st_size
-    return total
-
-
-def transfer_item(source_loc: str, target_loc: str, item_name: str, overwrite: bool = False) -> Dict:
-    """파일 또는 디렉터리 전송"""
-    logger.info(f"Transfer started: {item_name}", 
-               source=source_loc, 
-               target=target_loc, 
-               overwrite=overwrite)
-    
+def resolve_transfer_paths(source_loc: str, target_loc: str, item_name: str, overwrite: bool = False):
+    """전송 원본/대상 경로 확인"""
     source_path = get_location_path(source_loc) / item_name
     target_path = get_location_path(target_loc) / item_name
     
@@ -202,28 +169,40 @@ def transfer_item(source_loc: str, target_loc: str, item_name: str, overwrite: b
         logger.error(f"Target already exists: {target_path}")
         raise FileExistsError(f"Target already exists: {target_path}")
     
-    # 기존 파일 삭제
-    if target_path.exists():
-        logger.info(f"Removing existing target: {target_path}")
-        if target_path.is_dir():
-            shutil.rmtree(target_path)
-        else:
-            target_path.unlink()
+    return source_path, target_path
+
+
+def transfer_item(source_loc: str, target_loc: str, item_name: str, overwrite: bool = False,
+                  mode: str = "copy", checksum: bool = False, dedup: bool = False) -> Dict:
+    """파일 또는 디렉터리 전송"""
+    logger.info(f"Transfer started: {item_name}", 
+               source=source_loc, 
+               target=target_loc, 
+               overwrite=overwrite,
+               mode=mode,
+               dedup=dedup)
+    
+    source_path, target_path = resolve_transfer_paths(source_loc, target_loc, item_name,
+                                                      overwrite or mode == "sync")
     
     start_time = datetime.now()
+    stores = {}
+    if dedup:
+        stores = {'store': get_chunk_store(target_loc), 'source_store': get_chunk_store(source_loc)}
     
     try:
-        # 복사 실행
-        if source_path.is_dir():
-            shutil.copytree(source_path, target_path)
+        if mode == "sync":
+            # 증분 동기화 (크기/mtime 또는 해시 비교)
+            stats = transfer_engine.sync(source_path, target_path, checksum=checksum, **stores)
         else:
-            shutil.copy2(source_path, target_path)
+            # 병렬 복사 (크기/mtime 이 같은 파일은 건너뜀 → 중단 후 재실행 시 이어하기)
+            # 덮어쓰기는 대상 삭제 대신 변경분만 복사하고 원본에 없는 파일을 정리
+            stats = transfer_engine.copy(source_path, target_path, prune=overwrite, **stores)
         
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         
-        size_bytes = calculate_size(target_path)
-        size_mb = round(size_bytes / (1024 * 1024), 2)
+        size_mb = round(stats.bytes_total / (1024 * 1024), 2)
         
         result = {
             'success': True,
@@ -231,15 +210,22 @@ def transfer_item(source_loc: str, target_loc: str, item_name: str, overwrite: b
             'source_location': source_loc,
             'target_location': target_loc,
             'type': 'directory' if source_path.is_dir() else 'file',
+            'mode': mode,
             'size_mb': size_mb,
             'duration_seconds': round(duration, 2),
             'source_path': str(source_path),
-            'target_path': str(target_path)
+            'target_path': str(target_path),
+            **stats.to_dict()
         }
         
         logger.info(f"Transfer completed: {item_name}", 
                    size_mb=size_mb, 
-                   duration=duration)
+                   duration=duration,
+                   files_copied=stats.files_copied,
+                   files_skipped=stats.files_skipped,
+                   files_deleted=stats.files_deleted,
+                   files_deduped=stats.files_deduped,
+                   throughput_mb_s=round(stats.throughput_mb_s, 2))
         
         return result
         
@@ -249,6 +235,43 @@ def transfer_item(source_loc: str, target_loc: str, item_name: str, overwrite: b
                     target=target_loc,
                     exc_info=True)
         raise
+    finally:
+        listing_cache.invalidate(target_loc, item_name)
+
+
+def record_finished_job(job: TransferJob):
+    """백그라운드 작업 종료 시 전송 기록 저장 (측정된 처리량 포함)"""
+    snapshot = job.to_dict()
+    result = job.result or {}
+    record = {
+        'success': job.status == 'completed',
+        'job_id': job.id,
+        'status': job.status,
+        'item_name': job.item_name,
+        'source_location': job.source_location,
+        'target_location': job.target_location,
+        'type': 'directory' if job.source_path.is_dir() else 'file',
+        'mode': job.mode,
+        'size_mb': round(job.bytes_total / (1024 * 1024), 2),
+        'duration_seconds': snapshot['elapsed_seconds'],
+        'source_path': str(job.source_path),
+        'target_path': str(job.target_path),
+        **result
+    }
+    if job.error:
+        record['error'] = job.error
+    transfer_history.add(record)
+    listing_cache.invalidate(job.target_location, job.item_name)
+    logger.info(f"Transfer job {job.status}: {job.item_name}", job_id=job.id,
+                throughput_mb_s=result.get('throughput_mb_s'))
+
+
+transfer_jobs = TransferJobManager(
+    transfer_engine,
+    on_finished=record_finished_job,
+    max_jobs=int(os.getenv("TRANSFER_MAX_JOBS", "4")),
+    per_location_limit=int(os.getenv("TRANSFER_JOBS_PER_LOCATION", "1"))
+)
 
 
 # ============= Frontend 설정 =============
@@ -260,6 +283,21 @@ if os.path.exists(frontend_dir):
 
 # ============= API Endpoints =============
 
+@app.on_event("startup")
+def start_background_tasks():
+    """디렉터리 크기 집계 시작 / 재시작 전에 끝나지 않은 삭제 이어서 진행"""
+    listing_cache.start()
+    resumed = io_scheduler.resume_deletions()
+    if resumed:
+        logger.info(f"Resumed {resumed} pending deletions")
+
+
+@app.on_event("shutdown")
+def stop_background_tasks():
+    listing_cache.stop()
+    io_scheduler.shutdown()
+
+
 @app.get("/")
 def index():
     """메인 페이지"""
@@ -274,6 +312,7 @@ def index():
         "endpoints": {
             "list_files": "/api/files/{location}",
             "transfer": "/api/transfer",
+            "transfer_jobs": "/api/transfer/jobs",
             "download": "/api/download/{location}/{item_name}",
             "upload": "/api/upload/{location}",
             "history": "/api/history"
@@ -282,38 +321,35 @@ def index():
 
 
 @app.get("/api/health")
-def health_check():
-    """헬스 체크"""
+async def health_check():
+    """헬스 체크 (캐시된 항목 수만 조회, 위치별 I/O 풀에서 실행)"""
+    async def location_info(location: str, path: str):
+        info = {"path": path, "pending_io": io_scheduler.pending(location)}
+        try:
+            info["accessible"] = await asyncio.wait_for(
+                io_scheduler.exists(location, Path(path)), IO_LIST_TIMEOUT)
+            info["items"] = await asyncio.wait_for(
+                io_scheduler.run(location, listing_cache.count, location), IO_LIST_TIMEOUT)
+        except asyncio.TimeoutError:
+            info.update(accessible=False, items=None, timeout=True)
+        return info
+    
+    infos = await asyncio.gather(*(location_info(loc, path) for loc, path in LOCATIONS.items()))
     health_info = {
         "status": "healthy",
-        "locations": {
-            "docker": {
-                "path": DOCKER_UPLOADS,
-                "accessible": os.path.exists(DOCKER_UPLOADS),
-                "items": len(scan_directory('docker'))
-            },
-            "f_drive": {
-                "path": F_DRIVE_UPLOADS,
-                "accessible": os.path.exists(F_DRIVE_UPLOADS),
-                "items": len(scan_directory('f_drive'))
-            },
-            "project": {
-                "path": PROJECT_UPLOADS,
-                "accessible": os.path.exists(PROJECT_UPLOADS),
-                "items": len(scan_directory('project'))
-            }
-        }
+        "locations": dict(zip(LOCATIONS, infos))
     }
     logger.debug("Health check performed", **health_info)
     return health_info
 
 
 @app.get("/api/files/{location}")
-def list_files(location: str):
+async def list_files(location: str):
     """특정 위치의 파일 목록"""
     logger.info(f"Listing files for location: {location}")
     try:
-        items = scan_directory(location)
+        items = await asyncio.wait_for(
+            io_scheduler.run(location, scan_directory, location), IO_LIST_TIMEOUT)
         return {
             "location": location,
             "path": str(get_location_path(location)),
@@ -323,39 +359,55 @@ def list_files(location: str):
     except ValueError as e:
         logger.error(f"Invalid location: {location}", exc_info=True)
         raise HTTPException(status_code=400, detail=str(e))
+    except asyncio.TimeoutError:
+        logger.warning(f"Listing timed out: {location}", timeout=IO_LIST_TIMEOUT)
+        raise HTTPException(status_code=504, detail=f"Listing timed out: {location}")
 
 
 @app.get("/api/files")
-def list_all_files():
-    """모든 위치의 파일 목록"""
+async def list_all_files():
+    """모든 위치의 파일 목록 (위치별로 동시에 조회, 느린 위치는 빈 목록)"""
     logger.info("Listing all files")
 
-    result = {}
-
-    for location in ['docker', 'f_drive', 'project']:
+    async def scan(location: str):
         try:
-            items = scan_directory(location)
-            result[location] = items
+            items = await asyncio.wait_for(
+                io_scheduler.run(location, scan_directory, location), IO_LIST_TIMEOUT)
             logger.info(f"Scanned {location}: found {len(items)} items")
+            return items
+        except asyncio.TimeoutError:
+            logger.warning(f"Listing timed out: {location}", timeout=IO_LIST_TIMEOUT)
         except Exception as e:
             logger.error(f"Failed to scan {location}: {e}", exc_info=True)
-            result[location] = []
+        return []
 
-    return result
+    results = await asyncio.gather(*(scan(location) for location in LOCATIONS))
+    return dict(zip(LOCATIONS, results))
 
 
 @app.post("/api/transfer")
-def transfer(request: TransferRequest):
-    """파일/디렉터리 전송 실행"""
+async def transfer(request: TransferRequest):
+    """파일/디렉터리 전송 실행 (대상 위치의 백그라운드 풀에서 실행)"""
     logger.info(f"Transfer requested: {request.item_name}",
                source=request.source_location,
                target=request.target_location)
     try:
-        result = transfer_item(
+        get_location_path(request.source_location)
+        get_location_path(request.target_location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        result = await io_scheduler.run_background(
+            request.target_location,
+            transfer_item,
             source_loc=request.source_location,
             target_loc=request.target_location,
             item_name=request.item_name,
-            overwrite=request.overwrite
+            overwrite=request.overwrite,
+            mode=request.mode,
+            checksum=request.checksum,
+            dedup=request.dedup
         )
         
         transfer_history.add(result)
@@ -371,9 +423,137 @@ def transfer(request: TransferRequest):
         raise HTTPException(status_code=500, detail=f"Transfer failed: {str(e)}")
 
 
+@app.post("/api/transfer/plan")
+async def plan_transfer(request: TransferRequest):
+    """sync 미리보기 - 복사/삭제될 파일 목록만 계산 (실제 변경 없음)"""
+    try:
+        source_path = get_location_path(request.source_location) / request.item_name
+        target_path = get_location_path(request.target_location) / request.item_name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await io_scheduler.is_dir(request.source_location, source_path):
+        raise HTTPException(status_code=404, detail=f"Source directory not found: {source_path}")
+    
+    plan = await io_scheduler.run_background(
+        request.source_location,
+        transfer_engine.plan_sync, source_path, target_path, checksum=request.checksum
+    )
+    return {
+        'item_name': request.item_name,
+        'source_location': request.source_location,
+        'target_location': request.target_location,
+        'checksum': request.checksum,
+        **plan.to_dict()
+    }
+
+
+@app.post("/api/transfer/jobs", status_code=202)
+def create_transfer_job(request: TransferRequest):
+    """백그라운드 전송 작업 등록 (즉시 반환)"""
+    logger.info(f"Transfer job requested: {request.item_name}",
+               source=request.source_location,
+               target=request.target_location)
+    try:
+        source_path, target_path = resolve_transfer_paths(
+            request.source_location,
+            request.target_location,
+            request.item_name,
+            request.overwrite or request.mode == "sync"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except FileExistsError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    job = transfer_jobs.submit(TransferJob(
+        request.source_location,
+        request.target_location,
+        request.item_name,
+        source_path,
+        target_path,
+        overwrite=request.overwrite,
+        mode=request.mode,
+        checksum=request.checksum,
+        store=get_chunk_store(request.target_location) if request.dedup else None,
+        source_store=get_chunk_store(request.source_location) if request.dedup else None
+    ))
+    return job.to_dict()
+
+
+@app.get("/api/transfer/jobs")
+def list_transfer_jobs():
+    """전송 작업 목록 (최신순)"""
+    return {"jobs": [job.to_dict() for job in transfer_jobs.list()]}
+
+
+def _get_job_or_404(job_id: str) -> TransferJob:
+    job = transfer_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/transfer/jobs/{job_id}")
+def get_transfer_job(job_id: str):
+    """전송 작업 진행 상황"""
+    return _get_job_or_404(job_id).to_dict()
+
+
+@app.get("/api/transfer/jobs/{job_id}/events")
+async def stream_transfer_job(job_id: str, interval: float = Query(1.0, ge=0.2, le=10)):
+    """전송 작업 진행 상황 (Server-Sent Events, 종료 시 스트림 닫힘)"""
+    job = _get_job_or_404(job_id)
+    
+    async def event_stream():
+        while True:
+            snapshot = job.to_dict()
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+            if snapshot["status"] in ("completed", "failed", "cancelled"):
+                break
+            await asyncio.sleep(interval)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.post("/api/transfer/jobs/{job_id}/cancel")
+def cancel_transfer_job(job_id: str):
+    """전송 작업 취소"""
+    _get_job_or_404(job_id)
+    logger.info(f"Transfer job cancel requested: {job_id}")
+    return transfer_jobs.cancel(job_id).to_dict()
+
+
+@app.post("/api/transfer/jobs/{job_id}/pause")
+def pause_transfer_job(job_id: str):
+    """전송 작업 일시정지"""
+    _get_job_or_404(job_id)
+    return transfer_jobs.pause(job_id).to_dict()
+
+
+@app.post("/api/transfer/jobs/{job_id}/resume")
+def resume_transfer_job(job_id: str):
+    """전송 작업 재개"""
+    _get_job_or_404(job_id)
+    return transfer_jobs.resume(job_id).to_dict()
+
+
 @app.get("/api/download/{location}/{item_name}")
-async def download_item(location: str, item_name: str):
-    """파일 또는 디렉터리를 ZIP으로 다운로드"""
+def download_item(
+    location: str,
+    item_name: str,
+    request: Request,
+    compression: str = Query("stored", pattern="^(stored|deflated)$")
+):
+    """
+    파일 또는 디렉터리를 ZIP으로 다운로드
+    디렉터리는 메모리 버퍼 없이 스트리밍 (stored 는 Range 이어받기 지원)
+    """
     logger.info(f"Download requested: {location}/{item_name}")
     try:
         source_path = get_location_path(location) / item_name
@@ -386,23 +566,42 @@ async def download_item(location: str, item_name: str):
             logger.info(f"Downloading file: {item_name}")
             return FileResponse(source_path, filename=item_name, media_type='application/octet-stream')
         
-        # 디렉터리인 경우 ZIP으로 압축
-        logger.info(f"Creating ZIP for directory: {item_name}")
-        zip_buffer = io.BytesIO()
+        # 디렉터리인 경우 ZIP 스트림 생성 (파일 목록만 먼저 수집)
+        archive = StreamingZip(source_path, compression=compression)
+        headers = {"Content-Disposition": f"attachment; filename={item_name}.zip"}
+        
+        if not archive.supports_range:
+            logger.info(f"Streaming ZIP for directory: {item_name}",
+                        files=len(archive.entries), compression=compression)
+            return StreamingResponse(archive.iter_bytes(), media_type="application/zip", headers=headers)
         
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for file_path in source_path.rglob('*'):
-                if file_path.is_file():
-                    arcname = file_path.relative_to(source_path)
-                    zip_file.write(file_path, arcname)
+        etag = f'"{archive.etag()}"'
+        headers.update({"Accept-Ranges": "bytes", "ETag": etag})
+        
+        # If-Range 가 현재 레이아웃과 다르면 전체 전송
+        byte_range = None
+        if_range = request.headers.get("if-range")
+        if not if_range or if_range == etag:
+            try:
+                byte_range = parse_range(request.headers.get("range"), archive.total_size)
+            except ValueError:
+                return Response(status_code=416, headers={"Content-Range": f"bytes */{archive.total_size}"})
         
-        zip_buffer.seek(0)
+        if byte_range is None:
+            logger.info(f"Streaming ZIP for directory: {item_name}",
+                        files=len(archive.entries), size_bytes=archive.total_size)
+            headers["Content-Length"] = str(archive.total_size)
+            return StreamingResponse(archive.iter_bytes(), media_type="application/zip", headers=headers)
         
-        logger.info(f"ZIP created successfully: {item_name}")
+        start, end = byte_range
+        logger.info(f"Resuming ZIP for directory: {item_name}", start=start, end=end)
+        headers["Content-Length"] = str(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{archive.total_size}"
         return StreamingResponse(
-            zip_buffer,
+            archive.iter_bytes(start, end),
+            status_code=206,
             media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename={item_name}.zip"}
+            headers=headers
         )
         
     except ValueError as e:
@@ -417,10 +616,12 @@ async def upload_file(location: str, file: UploadFile = File(...)):
     try:
         target_path = get_location_path(location) / file.filename
         
-        with open(target_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        def save() -> int:
+            with open(target_path, "wb") as buffer:
+                shutil.copyfileobj(file.file, buffer, UPLOAD_BUFFER_SIZE)
+            return target_path.stat().st_size
         
-        size_mb = round(target_path.stat().st_size / (1024 * 1024), 2)
+        size_mb = round(await io_scheduler.run(location, save) / (1024 * 1024), 2)
         
         result = {
             'success': True,
@@ -430,6 +631,7 @@ async def upload_file(location: str, file: UploadFile = File(...)):
             'path': str(target_path)
         }
         
+        listing_cache.invalidate(location, file.filename)
         transfer_history.add({
             **result,
             'source_location': 'upload',
@@ -449,21 +651,135 @@ async def upload_file(location: str, file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+# ============= 멀티파트 업로드 =============
+
+def _get_upload_or_404(upload_id: str):
+    session = multipart_uploads.get(upload_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+
+@app.post("/api/upload/{location}/multipart", status_code=201)
+def initiate_multipart_upload(location: str, request: MultipartInitRequest):
+    """멀티파트 업로드 시작 - 대상 크기만큼 임시 파일을 미리 할당"""
+    try:
+        base_path = get_location_path(location)
+        session = multipart_uploads.initiate(location, base_path, request.filename,
+                                             request.size, request.part_size)
+    except (ValueError, UploadError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    logger.info(f"Multipart upload initiated: {session.filename}", location=location,
+                upload_id=session.id, size=session.size, part_count=session.part_count)
+    return session.to_dict()
+
+
+@app.get("/api/uploads/{upload_id}")
+def get_multipart_upload(upload_id: str):
+    """업로드 상태 (완료된 파트 / 남은 파트)"""
+    return _get_upload_or_404(upload_id).to_dict()
+
+
+@app.put("/api/uploads/{upload_id}/parts/{part_number}")
+async def upload_part(upload_id: str, part_number: int, request: Request):
+    """
+    파트 업로드 (요청 본문 = 파트 데이터)
+    X-Part-SHA256 헤더가 있으면 검증, 실패 시 해당 파트만 다시 보내면 됨
+    """
+    session = _get_upload_or_404(upload_id)
+    try:
+        writer = await io_scheduler.run(session.location, multipart_uploads.open_part, session, part_number)
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        buf = bytearray()
+        async for chunk in request.stream():
+            buf += chunk
+            if len(buf) >= PART_WRITE_BUFFER_SIZE:
+                await io_scheduler.run(session.location, writer.write, bytes(buf))
+                buf.clear()
+        if buf:
+            await io_scheduler.run(session.location, writer.write, bytes(buf))
+        return await io_scheduler.run(session.location, writer.finish,
+                                      request.headers.get("x-part-sha256"))
+    except UploadError as e:
+        logger.warning(f"Part rejected: {session.filename}", upload_id=upload_id,
+                       part_number=part_number, error=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        writer.close()
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+def complete_multipart_upload(upload_id: str):
+    """모든 파트 확인 후 최종 파일로 완성"""
+    session = _get_upload_or_404(upload_id)
+    try:
+        target_path = Path(multipart_uploads.complete(session))
+    except UploadError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    size_mb = round(session.size / (1024 * 1024), 2)
+    result = {
+        'success': True,
+        'filename': session.filename,
+        'location': session.location,
+        'size_mb': size_mb,
+        'path': str(target_path),
+        'part_count': session.part_count
+    }
+    
+    listing_cache.invalidate(session.location, session.filename)
+    transfer_history.add({
+        **result,
+        'source_location': 'upload',
+        'target_location': session.location,
+        'item_name': session.filename,
+        'type': 'file'
+    })
+    logger.info(f"Multipart upload completed: {session.filename}", size_mb=size_mb)
+    return result
+
+
+@app.delete("/api/uploads/{upload_id}")
+def abort_multipart_upload(upload_id: str):
+    """업로드 취소 (임시 파일 삭제)"""
+    session = _get_upload_or_404(upload_id)
+    multipart_uploads.abort(session)
+    logger.info(f"Multipart upload aborted: {session.filename}", upload_id=upload_id)
+    return {"success": True, "upload_id": upload_id}
+
+
 @app.delete("/api/files/{location}/{item_name}")
-def delete_item(location: str, item_name: str):
-    """파일 또는 디렉터리 삭제"""
+async def delete_item(location: str, item_name: str):
+    """
+    파일 또는 디렉터리 삭제
+    디렉터리는 숨김 이름으로 바꾼 뒤 백그라운드에서 삭제 (진행 상황: /api/deletions/{id})
+    """
     logger.info(f"Delete requested: {location}/{item_name}")
     try:
         item_path = get_location_path(location) / item_name
+        st = await io_scheduler.stat(location, item_path)
         
-        if not item_path.exists():
+        if st is None:
             logger.warning(f"Item not found for deletion: {item_path}")
             raise HTTPException(status_code=404, detail="Item not found")
         
-        if item_path.is_dir():
-            shutil.rmtree(item_path)
-        else:
-            item_path.unlink()
+        if stat.S_ISDIR(st.st_mode):
+            deletion = await io_scheduler.run(location, io_scheduler.delete_tree, location, item_name)
+            listing_cache.invalidate(location, item_name)
+            logger.info(f"Deleting in background: {location}/{item_name}", deletion_id=deletion.id)
+            return {
+                "success": True,
+                "message": f"Deleting: {item_name}",
+                "location": location,
+                "deletion": deletion.to_dict()
+            }
+        
+        await io_scheduler.run(location, item_path.unlink)
+        listing_cache.invalidate(location, item_name)
         
         logger.info(f"Deleted: {location}/{item_name}")
         return {
@@ -477,22 +793,125 @@ def delete_item(location: str, item_name: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.get("/api/deletions")
+def list_deletions():
+    """백그라운드 삭제 작업 목록 (최신순)"""
+    return {"deletions": [d.to_dict() for d in io_scheduler.list_deletions()]}
+
+
+@app.get("/api/deletions/{deletion_id}")
+def get_deletion(deletion_id: str):
+    """삭제 진행 상황 (files_done / files_total)"""
+    deletion = io_scheduler.get_deletion(deletion_id)
+    if deletion is None:
+        raise HTTPException(status_code=404, detail="Deletion not found")
+    return deletion.to_dict()
+
+
+async def _volume_path_or_404(location: str, item_name: str) -> Path:
+    try:
+        item_path = get_location_path(location) / item_name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not await io_scheduler.is_dir(location, item_path):
+        raise HTTPException(status_code=404, detail="Item not found")
+    return item_path
+
+
+@app.get("/api/chunks/{location}")
+async def chunk_store_stats(location: str):
+    """청크 저장소 통계 (블롭 수, 저장된 바이트, 링크로 절약된 바이트)"""
+    try:
+        store = get_chunk_store(location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stats = await io_scheduler.run_background(location, store.stats)
+    return {"location": location, "path": str(store.blob_dir), **stats}
+
+
+@app.post("/api/chunks/{location}/dedupe/{item_name}")
+async def dedupe_item(location: str, item_name: str):
+    """기존 볼륨을 청크 저장소로 옮겨 중복 제거 (같은 내용의 파일은 하나의 블롭을 공유)"""
+    item_path = await _volume_path_or_404(location, item_name)
+    store = get_chunk_store(location)
+    
+    logger.info(f"Dedupe started: {location}/{item_name}")
+    result = await io_scheduler.run_background(location, store.dedupe_tree, str(item_path))
+    logger.info(f"Dedupe completed: {location}/{item_name}", **result)
+    return {"location": location, "item_name": item_name, **result}
+
+
+@app.post("/api/chunks/{location}/gc")
+async def collect_chunks(location: str):
+    """어느 볼륨에서도 쓰지 않는 블롭 삭제 (볼륨 삭제 후 공간 회수)"""
+    try:
+        store = get_chunk_store(location)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    result = await io_scheduler.run_background(location, store.gc)
+    logger.info(f"Chunk GC completed: {location}", **result)
+    return {"location": location, **result}
+
+
+@app.post("/api/manifest/{location}/{item_name}")
+async def create_manifest(location: str, item_name: str):
+    """기존 볼륨의 체크섬 매니페스트(manifest.json) 생성"""
+    item_path = await _volume_path_or_404(location, item_name)
+    result = await io_scheduler.run_background(location, build_manifest, str(item_path))
+    listing_cache.invalidate(location, item_name)
+    logger.info(f"Manifest created: {location}/{item_name}", **result)
+    return {"location": location, "item_name": item_name, **result}
+
+
+@app.post("/api/verify/{location}/{item_name}")
+async def verify_item(location: str, item_name: str):
+    """볼륨을 매니페스트와 비교 (병렬 해시)"""
+    item_path = await _volume_path_or_404(location, item_name)
+    try:
+        result = await io_scheduler.run_background(location, verify_manifest, str(item_path))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    log = logger.info if result["ok"] else logger.warning
+    log(f"Verify {'passed' if result['ok'] else 'FAILED'}: {location}/{item_name}",
+        files_checked=result["files_checked"],
+        missing=result["missing_count"],
+        mismatched=result["mismatched_count"])
+    return {"location": location, "item_name": item_name, **result}
+
+
 @app.get("/api/history")
-def get_history(limit: int = Query(20, ge=1, le=100)):
+def get_history(
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    location: Optional[str] = Query(None, description="원본 또는 대상 위치"),
+    start_date: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, description="YYYY-MM-DD")
+):
     """전송 기록 조회"""
     logger.debug(f"History requested: limit={limit}")
-    return {
-        "history": transfer_history.get_recent(limit),
-        "total": len(transfer_history.history)
-    }
+    if not (skip or location or start_date or end_date):
+        return {
+            "history": transfer_history.get_recent(limit),
+            "total": transfer_history.total
+        }
+    
+    try:
+        start = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format (YYYY-MM-DD)")
+    
+    history, total = transfer_history.query(location, start, end, skip=skip, limit=limit)
+    return {"history": history, "total": total}
 
 
 @app.delete("/api/history")
 def clear_history():
     """전송 기록 초기화"""
     logger.warning("Transfer history cleared")
-    transfer_history.history = []
-    transfer_history._save()
+    transfer_history.clear()
     return {"success": True, "message": "History cleared"}
 
 
@@ -0,0 +1,307 @@
+"""
+멀티파트 업로드
+- initiate: 대상 크기만큼 임시 파일을 미리 할당 (조각 모음/추가 할당 없음)
+- part: 각 파트를 자기 오프셋에 pwrite → 여러 파트를 병렬로 받을 수 있음
+- 파트별 SHA-256 검증, 실패한 파트만 다시 보내면 됨
+- complete: 모든 파트가 들어오면 rename 으로 완성 (중간 상태 파일이 보이지 않음)
+- 세션 상태는 JSON 으로 저장되어 서버 재시작 후에도 이어서 업로드 가능
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+DEFAULT_PART_SIZE = 64 * 1024 * 1024
+MIN_PART_SIZE = 1024 * 1024
+MAX_PART_SIZE = 1024 * 1024 * 1024
+
+# 완료되지 않은 세션 보관 시간 (초)
+SESSION_TTL_SECONDS = 24 * 3600
+
+
+class UploadError(Exception):
+    """잘못된 업로드 요청 (파트 번호/크기/체크섬 오류 등)"""
+
+
+def preallocate(fd: int, size: int):
+    """파일 공간 미리 할당 (지원하지 않으면 크기만 설정)"""
+    if size <= 0:
+        return
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+
+class UploadSession:
+    """업로드 세션 한 개"""
+
+    def __init__(self, upload_id: str, location: str, filename: str, size: int, part_size: int,
+                 target_path: str, parts: Optional[Dict[int, Dict]] = None,
+                 created_at: Optional[float] = None):
+        self.id = upload_id
+        self.location = location
+        self.filename = filename
+        self.size = size
+        self.part_size = part_size
+        self.target_path = target_path
+        self.parts: Dict[int, Dict] = parts or {}
+        self.created_at = created_at or time.time()
+        self.lock = threading.Lock()
+        # 지금 쓰고 있는 파트 번호 (저장하지 않음)
+        self.writing: Set[int] = set()
+        self.completing = False
+
+    @property
+    def tmp_path(self) -> str:
+        directory, name = os.path.split(self.target_path)
+        return os.path.join(directory, f".{name}.{self.id}.upload")
+
+    @property
+    def part_count(self) -> int:
+        return max((self.size + self.part_size - 1) // self.part_size, 1)
+
+    def part_range(self, part_number: int):
+        """파트 번호(1부터) → (오프셋, 길이)"""
+        if not 1 <= part_number <= self.part_count:
+            raise UploadError(f"Invalid part number: {part_number} (1-{self.part_count})")
+        offset = (part_number - 1) * self.part_size
+        return offset, min(self.part_size, self.size - offset)
+
+    def missing_parts(self) -> List[int]:
+        return [n for n in range(1, self.part_count + 1) if n not in self.parts]
+
+    def to_dict(self) -> Dict:
+        done = sum(p["size"] for p in self.parts.values())
+        return {
+            "upload_id": self.id,
+            "location": self.location,
+            "filename": self.filename,
+            "size": self.size,
+            "part_size": self.part_size,
+            "part_count": self.part_count,
+            "parts_done": sorted(self.parts),
+            "missing_parts": self.missing_parts(),
+            "bytes_done": done,
+            "percent": round(done / self.size * 100, 1) if self.size else 100.0,
+        }
+
+    def to_state(self) -> Dict:
+        return {
+            "id": self.id,
+            "location": self.location,
+            "filename": self.filename,
+            "size": self.size,
+            "part_size": self.part_size,
+            "target_path": self.target_path,
+            "parts": {str(n): p for n, p in self.parts.items()},
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict) -> "UploadSession":
+        return cls(
+            state["id"], state["location"], state["filename"], state["size"], state["part_size"],
+            state["target_path"], {int(n): p for n, p in state.get("parts", {}).items()},
+            state.get("created_at"),
+        )
+
+
+class MultipartUploadManager:
+    """멀티파트 업로드 세션 관리"""
+
+    def __init__(self, state_dir: Path):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self._sessions: Dict[str, UploadSession] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _state_file(self, upload_id: str) -> Path:
+        return self.state_dir / f"{upload_id}.json"
+
+    def _load(self):
+        for path in self.state_dir.glob("*.json"):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    session = UploadSession.from_state(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            if os.path.exists(session.tmp_path):
+                self._sessions[session.id] = session
+            else:
+                path.unlink(missing_ok=True)
+
+    def _save(self, session: UploadSession):
+        path = self._state_file(session.id)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with session.lock:
+            state = session.to_state()
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    # ==========================================
+    # 세션
+    # ==========================================
+
+    def initiate(self, location: str, base_path: Path, filename: str, size: int,
+                 part_size: int = DEFAULT_PART_SIZE) -> UploadSession:
+        """세션 생성 및 임시 파일 미리 할당"""
+        self.expire()
+
+        name = Path(filename).name
+        if not name or name in (".", ".."):
+            raise UploadError(f"Invalid filename: {filename}")
+        if size < 0:
+            raise UploadError("size must be >= 0")
+        part_size = min(max(int(part_size), MIN_PART_SIZE), MAX_PART_SIZE)
+
+        session = UploadSession(uuid.uuid4().hex, location, name, size, part_size,
+                                str(Path(base_path) / name))
+        fd = os.open(session.tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            preallocate(fd, size)
+        finally:
+            os.close(fd)
+
+        with self._lock:
+            self._sessions[session.id] = session
+        self._save(session)
+        return session
+
+    def get(self, upload_id: str) -> Optional[UploadSession]:
+        return self._sessions.get(upload_id)
+
+    def open_part(self, session: UploadSession, part_number: int) -> "PartWriter":
+        """
+        파트 쓰기 시작 - write() 로 본문을 순서대로 넣고 finish() 로 검증/기록
+        이미 완료된 파트를 다시 보내면 덮어쓰기 전에 완료 표시를 지움
+        (재전송이 실패하면 그 파트는 다시 빠진 파트가 됨)
+        """
+        offset, length = session.part_range(part_number)
+        with session.lock:
+            if session.completing:
+                raise UploadError("Upload is being completed")
+            if part_number in session.writing:
+                raise UploadError(f"Part {part_number} is already being uploaded")
+            session.writing.add(part_number)
+            replaced = session.parts.pop(part_number, None) is not None
+        try:
+            if replaced:
+                self._save(session)
+            return PartWriter(self, session, part_number, offset, length)
+        except BaseException:
+            self._part_closed(session, part_number)
+            raise
+
+    def _part_closed(self, session: UploadSession, part_number: int):
+        with session.lock:
+            session.writing.discard(part_number)
+
+    def _part_done(self, session: UploadSession, part_number: int, info: Dict):
+        with session.lock:
+            session.parts[part_number] = info
+        self._save(session)
+
+    def complete(self, session: UploadSession) -> str:
+        """모든 파트 확인 후 최종 파일로 rename (쓰고 있는 파트가 있으면 거부)"""
+        with session.lock:
+            if session.writing:
+                raise UploadError(f"Parts still uploading: {sorted(session.writing)[:20]}")
+            missing = session.missing_parts()
+            if missing and session.size > 0:
+                raise UploadError(f"Missing parts: {missing[:20]}")
+            session.completing = True
+
+        try:
+            fd = os.open(session.tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(session.tmp_path, session.target_path)
+        except BaseException:
+            with session.lock:
+                session.completing = False
+            raise
+        self._forget(session)
+        return session.target_path
+
+    def abort(self, session: UploadSession):
+        """세션 취소 및 임시 파일 삭제"""
+        try:
+            os.unlink(session.tmp_path)
+        except FileNotFoundError:
+            pass
+        self._forget(session)
+
+    def expire(self) -> int:
+        """오래된 미완료 세션 정리"""
+        now = time.time()
+        with self._lock:
+            stale = [s for s in self._sessions.values() if now - s.created_at > SESSION_TTL_SECONDS]
+        for session in stale:
+            self.abort(session)
+        return len(stale)
+
+    def _forget(self, session: UploadSession):
+        with self._lock:
+            self._sessions.pop(session.id, None)
+        self._state_file(session.id).unlink(missing_ok=True)
+
+
+class PartWriter:
+    """파트 한 개를 자기 오프셋에 pwrite 하며 SHA-256 계산"""
+
+    def __init__(self, manager: MultipartUploadManager, session: UploadSession,
+                 part_number: int, offset: int, length: int):
+        self.manager = manager
+        self.session = session
+        self.part_number = part_number
+        self.offset = offset
+        self.length = length
+        self.written = 0
+        self._hash = hashlib.sha256()
+        self._fd = os.open(session.tmp_path, os.O_WRONLY)
+
+    def write(self, data: bytes):
+        if self.written + len(data) > self.length:
+            raise UploadError(f"Part {self.part_number} too large (expected {self.length} bytes)")
+        view = memoryview(data)
+        while view:
+            n = os.pwrite(self._fd, view, self.offset + self.written)
+            view = view[n:]
+            self.written += n
+        self._hash.update(data)
+
+    def finish(self, checksum: Optional[str] = None) -> Dict:
+        """
+        길이/체크섬 확인 후 파트 완료 기록
+        맞지 않으면 UploadError (해당 파트만 다시 보내면 됨)
+        """
+        if self.written != self.length:
+            raise UploadError(
+                f"Part {self.part_number} size mismatch: got {self.written}, expected {self.length}"
+            )
+        digest = self._hash.hexdigest()
+        if checksum and checksum.lower() != digest:
+            raise UploadError(f"Part {self.part_number} checksum mismatch")
+
+        info = {"size": self.written, "sha256": digest}
+        self.manager._part_done(self.session, self.part_number, info)
+        return {"part_number": self.part_number, **info}
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self.manager._part_closed(self.session, self.part_number)
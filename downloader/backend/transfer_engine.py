@@ -0,0 +1,551 @@
+"""
+병렬 디렉터리 전송 엔진
+- 파일 단위 병렬 복사 (스레드 풀)
+- copy_file_range / sendfile / 대용량 버퍼 복사 (가능한 것부터 시도)
+- 이어하기: 대상에 크기와 mtime 이 같은 파일이 있으면 건너뜀
+  (복사 시 mtime 을 원본과 맞춰 두므로 중단 후 다시 실행하면 남은 파일만 복사)
+- 복사 중 바이트 수 누적 (전송 후 대상 디렉터리를 다시 순회하지 않음)
+- 동기화(sync): 원본/대상 목록(크기, mtime, 선택적으로 해시)을 비교해
+  새로 생기거나 바뀐 파일만 복사하고 원본에서 사라진 파일은 삭제
+- 중복 제거(store): 대상 위치의 청크 저장소에 같은 해시의 블롭이 있으면 데이터 복사 없이 링크
+"""
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from volume_manifest import MANIFEST_NAME, DEFAULT_ALGORITHM, hash_file, load_manifest
+
+
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+DEFAULT_WORKERS = 8
+
+# FAT/exFAT 등 마운트는 mtime 해상도가 2초
+MTIME_TOLERANCE_NS = 2_000_000_000
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class TransferCancelled(Exception):
+    """전송이 취소됨"""
+
+
+@dataclass
+class FileEntry:
+    """원본 파일 한 개"""
+    rel_path: str
+    size: int
+    mtime_ns: int
+
+
+@dataclass
+class TransferStats:
+    """전송 결과 통계"""
+    files_total: int = 0
+    files_copied: int = 0
+    files_skipped: int = 0
+    files_deleted: int = 0
+    bytes_total: int = 0
+    bytes_copied: int = 0
+    bytes_skipped: int = 0
+    files_deduped: int = 0
+    bytes_deduped: int = 0
+    duration_seconds: float = 0.0
+
+    @property
+    def throughput_mb_s(self) -> float:
+        if self.duration_seconds <= 0:
+            return 0.0
+        return self.bytes_copied / (1024 * 1024) / self.duration_seconds
+
+    def to_dict(self) -> Dict:
+        return {
+            "files_total": self.files_total,
+            "files_copied": self.files_copied,
+            "files_skipped": self.files_skipped,
+            "files_deleted": self.files_deleted,
+            "bytes_total": self.bytes_total,
+            "bytes_copied": self.bytes_copied,
+            "bytes_skipped": self.bytes_skipped,
+            "files_deduped": self.files_deduped,
+            "bytes_deduped": self.bytes_deduped,
+            "duration_seconds": round(self.duration_seconds, 2),
+            "throughput_mb_s": round(self.throughput_mb_s, 2),
+        }
+
+
+def scan_tree(root: Path) -> List[FileEntry]:
+    """os.scandir 기반 재귀 스캔 (DirEntry 의 stat 캐시 사용)"""
+    entries: List[FileEntry] = []
+    stack = [("", str(root))]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((rel, entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    entries.append(FileEntry(rel, st.st_size, st.st_mtime_ns))
+    return entries
+
+
+@dataclass
+class SyncPlan:
+    """동기화 계획 (원본/대상 비교 결과)"""
+    copy: List[FileEntry] = field(default_factory=list)
+    delete: List[str] = field(default_factory=list)
+    unchanged: List[FileEntry] = field(default_factory=list)
+
+    def to_dict(self, max_items: int = 100) -> Dict:
+        return {
+            "files_to_copy": len(self.copy),
+            "bytes_to_copy": sum(e.size for e in self.copy),
+            "files_to_delete": len(self.delete),
+            "files_unchanged": len(self.unchanged),
+            "bytes_unchanged": sum(e.size for e in self.unchanged),
+            "copy": [e.rel_path for e in self.copy[:max_items]],
+            "delete": self.delete[:max_items],
+        }
+
+
+class _ManifestHashes:
+    """매니페스트에 기록된 해시 (매니페스트 이후 수정된 파일은 사용하지 않음)"""
+
+    def __init__(self, manifest: Dict, manifest_mtime_ns: int):
+        self.algorithm = manifest.get("algorithm", DEFAULT_ALGORITHM)
+        self.files = manifest["files"]
+        self.mtime_ns = manifest_mtime_ns
+
+    def get(self, rel_path: str, mtime_ns: int, size: int) -> Optional[str]:
+        entry = self.files.get(rel_path)
+        if entry is None or entry[0] != size or mtime_ns > self.mtime_ns:
+            return None
+        return entry[1]
+
+
+def _manifest_hashes(root: Path) -> Optional[_ManifestHashes]:
+    if not root.is_dir():
+        return None
+    manifest = load_manifest(str(root))
+    if manifest is None:
+        return None
+    return _ManifestHashes(manifest, (root / MANIFEST_NAME).stat().st_mtime_ns)
+
+
+def checkpoint(cancel: Optional[threading.Event], resume: Optional[threading.Event] = None):
+    """
+    취소/일시정지 확인 지점
+    resume 이 해제(clear)되어 있으면 다시 설정되거나 취소될 때까지 대기
+    """
+    if resume is not None:
+        while not resume.is_set():
+            if cancel is not None and cancel.is_set():
+                break
+            resume.wait(0.5)
+    if cancel is not None and cancel.is_set():
+        raise TransferCancelled()
+
+
+def same_file(size: int, mtime_ns: int, target: str) -> bool:
+    """대상 파일이 원본과 같은 크기/mtime 인지"""
+    try:
+        st = os.stat(target)
+    except OSError:
+        return False
+    return st.st_size == size and abs(st.st_mtime_ns - mtime_ns) <= MTIME_TOLERANCE_NS
+
+
+def _copy_data(src_fd: int, dst_fd: int, size: int, on_bytes: Callable[[int], None],
+               cancel: Optional[threading.Event], resume: Optional[threading.Event]):
+    """
+    파일 내용 복사 - copy_file_range → sendfile → 버퍼 복사 순으로 시도
+    처음부터 0 바이트를 돌려주는 방식은 지원하지 않는 것으로 보고 다음 방식으로,
+    복사 도중 0 바이트면 원본이 줄어든 것이므로 오류
+    """
+    copied = 0
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                checkpoint(cancel, resume)
+                n = os.copy_file_range(src_fd, dst_fd, min(COPY_BUFFER_SIZE, size - copied))
+                if n == 0:
+                    break
+                copied += n
+                on_bytes(n)
+        except OSError:
+            # 파일시스템이 지원하지 않음 (예: 서로 다른 마운트 간 일부 커널) → 다음 방식
+            if copied:
+                raise
+        if copied:
+            _check_copied(copied, size)
+            return
+
+    if hasattr(os, "sendfile"):
+        try:
+            while copied < size:
+                checkpoint(cancel, resume)
+                n = os.sendfile(dst_fd, src_fd, copied, min(COPY_BUFFER_SIZE, size - copied))
+                if n == 0:
+                    break
+                copied += n
+                on_bytes(n)
+        except OSError:
+            if copied:
+                raise
+        if copied:
+            _check_copied(copied, size)
+            return
+
+    buf = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buf)
+    with open(src_fd, "rb", buffering=0, closefd=False) as fsrc, \
+            open(dst_fd, "wb", buffering=0, closefd=False) as fdst:
+        while True:
+            checkpoint(cancel, resume)
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            fdst.write(view[:n])
+            copied += n
+            on_bytes(n)
+    _check_copied(copied, size)
+
+
+def _check_copied(copied: int, size: int):
+    if copied != size:
+        raise OSError(f"Source size changed during copy: copied {copied} of {size} bytes")
+
+
+def copy_file(src: str, dst: str, on_bytes: Callable[[int], None] = lambda n: None,
+              cancel: Optional[threading.Event] = None,
+              resume: Optional[threading.Event] = None) -> int:
+    """
+    파일 한 개 복사 - 임시 파일에 쓴 뒤 rename
+    (중단되어도 완성된 것처럼 보이는 파일이 남지 않음)
+    """
+    st = os.stat(src)
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.part")
+    try:
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                _copy_data(src_fd, dst_fd, st.st_size, on_bytes, cancel, resume)
+                _check_copied(os.fstat(dst_fd).st_size, st.st_size)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        shutil.copymode(src, tmp)
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return st.st_size
+
+
+def copy_file_dedup(src: str, dst: str, store, source_store=None,
+                    on_bytes: Callable[[int], None] = lambda n: None,
+                    cancel: Optional[threading.Event] = None,
+                    resume: Optional[threading.Event] = None) -> bool:
+    """
+    해시로 파일 전송 - 대상 저장소에 블롭이 있으면 링크만 (True)
+    없으면 블롭으로 복사한 뒤 링크 (False)
+    원본이 원본 저장소의 블롭에 연결되어 있으면 해시를 위해 파일을 읽지 않음
+    """
+    digest = (source_store.digest_of(src) if source_store is not None else None) or store.digest_file(src)
+    created = store.ingest(digest, lambda blob: copy_file(src, blob, on_bytes, cancel, resume))
+    store.link(digest, dst)
+    return not created
+
+
+class TransferEngine:
+    """병렬 파일 복사 엔진"""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+
+    def copy(
+        self,
+        source: Path,
+        target: Path,
+        prune: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[threading.Event] = None,
+        resume: Optional[threading.Event] = None,
+        on_scan: Optional[Callable[[int, int], None]] = None,
+        store=None,
+        source_store=None,
+    ) -> TransferStats:
+        """
+        source → target 복사 (파일 또는 디렉터리)
+        prune=True 이면 원본에 없는 대상 파일 삭제 (덮어쓰기 시 기존 동작과 동일한 결과)
+        progress(bytes, files) 는 복사 중 수시로 호출됨
+        on_scan(files, bytes) 은 스캔 직후 한 번 호출됨 - 대상에 이미 같은 파일(이어하기)을 뺀
+        남은 양이 전달되므로 progress 합계가 이 값에 도달함 (sync 와 동일)
+        cancel 이 설정되면 TransferCancelled, resume 이 해제되면 일시정지
+        store(대상 위치의 ChunkStore) 가 있으면 해시로 전송 (이미 있는 블롭은 링크만)
+        """
+        start = time.monotonic()
+        stats = TransferStats()
+        lock = threading.Lock()
+
+        def on_bytes(n: int):
+            with lock:
+                stats.bytes_copied += n
+            if progress:
+                progress(n, 0)
+
+        if source.is_file():
+            st = source.stat()
+            stats.files_total, stats.bytes_total = 1, st.st_size
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if same_file(st.st_size, st.st_mtime_ns, str(target)):
+                stats.files_skipped, stats.bytes_skipped = 1, st.st_size
+                if on_scan:
+                    on_scan(0, 0)
+            else:
+                if on_scan:
+                    on_scan(1, st.st_size)
+                self._copy_entry(str(source), str(target), st.st_size, stats, lock, on_bytes,
+                                 cancel, resume, store, source_store)
+                if progress:
+                    progress(0, 1)
+            stats.duration_seconds = time.monotonic() - start
+            return stats
+
+        entries = scan_tree(source)
+        stats.files_total = len(entries)
+        stats.bytes_total = sum(e.size for e in entries)
+        pending = self._without_unchanged(target, entries, stats, lock, cancel)
+        if on_scan:
+            on_scan(len(pending), sum(e.size for e in pending))
+
+        def copy_one(entry: FileEntry):
+            checkpoint(cancel, resume)
+            self._copy_entry(os.path.join(source, entry.rel_path), os.path.join(target, entry.rel_path),
+                             entry.size, stats, lock, on_bytes, cancel, resume, store, source_store)
+            if progress:
+                progress(0, 1)
+
+        self._make_dirs(target, entries)
+        # 큰 파일부터 시작해 꼬리 지연을 줄임
+        self._run_parallel(copy_one, sorted(pending, key=lambda e: e.size, reverse=True))
+
+        if prune:
+            stats.files_deleted = self._prune(target, {e.rel_path for e in entries})
+
+        stats.duration_seconds = time.monotonic() - start
+        return stats
+
+    def plan_sync(self, source: Path, target: Path, checksum: bool = False,
+                  cancel: Optional[threading.Event] = None) -> SyncPlan:
+        """
+        원본/대상 목록 비교
+        - 대상에 없거나 크기가 다르면 복사
+        - checksum=False: mtime 이 다르면 복사
+        - checksum=True: 크기가 같으면 해시로 비교 (mtime 은 무시)
+          양쪽에 매니페스트가 있으면 그 해시를 사용해 파일을 읽지 않음
+        - 원본에 없는 대상 파일은 삭제
+        """
+        src_entries = scan_tree(source)
+        dst_entries = {e.rel_path: e for e in scan_tree(target)} if target.is_dir() else {}
+
+        plan = SyncPlan()
+        to_hash: List[FileEntry] = []
+        for e in src_entries:
+            d = dst_entries.get(e.rel_path)
+            if d is None or d.size != e.size:
+                plan.copy.append(e)
+            elif checksum:
+                to_hash.append(e)
+            elif abs(d.mtime_ns - e.mtime_ns) <= MTIME_TOLERANCE_NS:
+                plan.unchanged.append(e)
+            else:
+                plan.copy.append(e)
+
+        if to_hash:
+            lock = threading.Lock()
+            src_hashes = _manifest_hashes(source)
+            dst_hashes = _manifest_hashes(target)
+            dst_mtimes = {rel: e.mtime_ns for rel, e in dst_entries.items()}
+
+            ref = src_hashes or dst_hashes
+            algorithm = ref.algorithm if ref else DEFAULT_ALGORITHM
+
+            def digest(root: Path, rel: str, size: int, mtime_ns: int, hashes) -> str:
+                if hashes is not None and hashes.algorithm == algorithm:
+                    known = hashes.get(rel, mtime_ns, size)
+                    if known:
+                        return known
+                return hash_file(os.path.join(root, rel), algorithm)
+
+            def compare(entry: FileEntry):
+                checkpoint(cancel)
+                rel = entry.rel_path
+                same = digest(source, rel, entry.size, entry.mtime_ns, src_hashes) == \
+                    digest(target, rel, entry.size, dst_mtimes[rel], dst_hashes)
+                with lock:
+                    (plan.unchanged if same else plan.copy).append(entry)
+
+            self._run_parallel(compare, to_hash)
+
+        src_names = {e.rel_path for e in src_entries}
+        plan.delete = sorted(rel for rel in dst_entries if rel not in src_names)
+        plan.copy.sort(key=lambda e: e.rel_path)
+        return plan
+
+    def sync(
+        self,
+        source: Path,
+        target: Path,
+        checksum: bool = False,
+        progress: Optional[ProgressCallback] = None,
+        cancel: Optional[threading.Event] = None,
+        resume: Optional[threading.Event] = None,
+        on_scan: Optional[Callable[[int, int], None]] = None,
+        store=None,
+        source_store=None,
+    ) -> TransferStats:
+        """
+        증분 동기화 - 변경분만 복사하고 원본에서 사라진 파일 삭제
+        on_scan 에는 전체가 아닌 복사할 양(delta)이 전달됨
+        """
+        if source.is_file():
+            return self.copy(source, target, progress=progress, cancel=cancel,
+                             resume=resume, on_scan=on_scan, store=store, source_store=source_store)
+
+        start = time.monotonic()
+        plan = self.plan_sync(source, target, checksum=checksum, cancel=cancel)
+
+        stats = TransferStats()
+        stats.files_total = len(plan.copy) + len(plan.unchanged)
+        stats.bytes_total = sum(e.size for e in plan.copy) + sum(e.size for e in plan.unchanged)
+        stats.files_skipped = len(plan.unchanged)
+        stats.bytes_skipped = sum(e.size for e in plan.unchanged)
+        if on_scan:
+            on_scan(len(plan.copy), sum(e.size for e in plan.copy))
+
+        lock = threading.Lock()
+
+        def on_bytes(n: int):
+            with lock:
+                stats.bytes_copied += n
+            if progress:
+                progress(n, 0)
+
+        def copy_one(entry: FileEntry):
+            checkpoint(cancel, resume)
+            self._copy_entry(os.path.join(source, entry.rel_path), os.path.join(target, entry.rel_path),
+                             entry.size, stats, lock, on_bytes, cancel, resume, store, source_store)
+            if progress:
+                progress(0, 1)
+
+        self._make_dirs(target, plan.copy)
+        self._run_parallel(copy_one, sorted(plan.copy, key=lambda e: e.size, reverse=True))
+
+        if checksum:
+            # 내용이 같은 파일은 mtime 을 맞춰 다음 (mtime 기반) 비교에서 바로 건너뛰도록
+            # 청크 저장소 블롭에 링크된 파일(st_nlink > 1)은 블롭과 다른 볼륨의 mtime 까지
+            # 바뀌므로 건드리지 않음
+            for e in plan.unchanged:
+                path = os.path.join(target, e.rel_path)
+                if os.stat(path).st_nlink == 1:
+                    os.utime(path, ns=(e.mtime_ns, e.mtime_ns))
+
+        for rel in plan.delete:
+            checkpoint(cancel, resume)
+            os.unlink(os.path.join(target, rel))
+        stats.files_deleted = len(plan.delete)
+        self._remove_empty_dirs(target)
+
+        stats.duration_seconds = time.monotonic() - start
+        return stats
+
+    @staticmethod
+    def _copy_entry(src: str, dst: str, size: int, stats: TransferStats, lock: threading.Lock,
+                    on_bytes: Callable[[int], None], cancel, resume, store, source_store):
+        """파일 한 개 전송 후 통계 반영 (store 가 있으면 해시로 전송)"""
+        if store is None:
+            copy_file(src, dst, on_bytes, cancel, resume)
+            deduped = False
+        else:
+            deduped = copy_file_dedup(src, dst, store, source_store, on_bytes, cancel, resume)
+        with lock:
+            if deduped:
+                stats.files_deduped += 1
+                stats.bytes_deduped += size
+            else:
+                stats.files_copied += 1
+
+    def _without_unchanged(self, target: Path, entries: List[FileEntry], stats: TransferStats,
+                           lock: threading.Lock,
+                           cancel: Optional[threading.Event]) -> List[FileEntry]:
+        """이어하기 - 대상에 크기/mtime 이 같은 파일이 있는 항목을 빼고 건너뜀으로 집계"""
+        if not target.is_dir():
+            return list(entries)
+        pending: List[FileEntry] = []
+
+        def check(entry: FileEntry):
+            checkpoint(cancel)
+            unchanged = same_file(entry.size, entry.mtime_ns, os.path.join(target, entry.rel_path))
+            with lock:
+                if unchanged:
+                    stats.files_skipped += 1
+                    stats.bytes_skipped += entry.size
+                else:
+                    pending.append(entry)
+
+        self._run_parallel(check, entries)
+        return pending
+
+    @staticmethod
+    def _make_dirs(target: Path, entries: Iterable[FileEntry]):
+        """디렉터리 구조 먼저 생성 (워커 간 mkdir 경쟁 방지)"""
+        target.mkdir(parents=True, exist_ok=True)
+        for rel_dir in sorted({os.path.dirname(e.rel_path) for e in entries}):
+            if rel_dir:
+                (target / rel_dir).mkdir(parents=True, exist_ok=True)
+
+    def _run_parallel(self, fn: Callable, items: List):
+        """items 를 스레드 풀에서 처리 - 첫 예외 발생 시 나머지 취소 후 예외 전달"""
+        if not items:
+            return
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transfer") as pool:
+            futures = [pool.submit(fn, item) for item in items]
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+            for f in pending:
+                f.cancel()
+            for f in done:
+                exc = f.exception()
+                if exc is not None:
+                    raise exc
+
+    @staticmethod
+    def _prune(target: Path, keep: set) -> int:
+        """원본에 없는 대상 파일 삭제"""
+        deleted = 0
+        for entry in scan_tree(target):
+            if entry.rel_path not in keep:
+                os.unlink(os.path.join(target, entry.rel_path))
+                deleted += 1
+        TransferEngine._remove_empty_dirs(target)
+        return deleted
+
+    @staticmethod
+    def _remove_empty_dirs(target: Path):
+        """비게 된 디렉터리 정리 (깊은 것부터)"""
+        for dirpath, _, _ in os.walk(target, topdown=False):
+            if dirpath != str(target) and not os.listdir(dirpath):
+                os.rmdir(dirpath)
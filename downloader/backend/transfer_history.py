@@ -0,0 +1,188 @@
+"""
+전송 기록 저장소 (SQLite)
+- 기록 1건 = INSERT 1회 (전체 파일 재작성 없음)
+- 최근 기록은 메모리 링 버퍼에서 바로 반환
+- 위치/날짜 조건 조회는 인덱스 사용
+- 기존 transfer_history.json 은 최초 실행 시 한 번만 가져옴
+"""
+import json
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS TransferHistory (
+    RecordId       INTEGER PRIMARY KEY AUTOINCREMENT,
+    Timestamp      TEXT NOT NULL,
+    SourceLocation TEXT,
+    TargetLocation TEXT,
+    ItemName       TEXT,
+    Success        INTEGER NOT NULL DEFAULT 1,
+    Record         TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_TransferHistory_Timestamp ON TransferHistory (Timestamp);
+CREATE INDEX IF NOT EXISTS IX_TransferHistory_Source ON TransferHistory (SourceLocation, Timestamp);
+CREATE INDEX IF NOT EXISTS IX_TransferHistory_Target ON TransferHistory (TargetLocation, Timestamp);
+"""
+
+# 메모리에 유지하는 최근 기록 수 (/api/history 의 limit 상한 이상)
+RECENT_BUFFER_SIZE = 100
+
+
+class TransferHistory:
+    """전송 기록 관리 (스레드별 커넥션)"""
+
+    def __init__(self, db_path: Path, legacy_json: Optional[Path] = None,
+                 buffer_size: int = RECENT_BUFFER_SIZE, logger=None):
+        self.logger = logger
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if legacy_json is not None:
+            self.import_json(Path(legacy_json))
+
+        self._total = conn.execute("SELECT COUNT(*) FROM TransferHistory").fetchone()[0]
+        self._recent: deque = deque(
+            reversed(self._select("ORDER BY RecordId DESC LIMIT ?", [buffer_size])),
+            maxlen=buffer_size
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """현재 스레드의 커넥션 (없으면 생성)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    def _select(self, clause: str, params: list) -> List[Dict]:
+        rows = self._conn().execute(f"SELECT Record FROM TransferHistory {clause}", params)
+        return [json.loads(row[0]) for row in rows]
+
+    # ==========================================
+    # 기록
+    # ==========================================
+
+    def add(self, record: Dict):
+        """기록 1건 추가"""
+        record['timestamp'] = datetime.now().isoformat()
+        self._conn().execute(
+            "INSERT INTO TransferHistory "
+            "(Timestamp, SourceLocation, TargetLocation, ItemName, Success, Record) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            _row(record)
+        )
+        with self._lock:
+            self._recent.append(record)
+            self._total += 1
+        if self.logger:
+            self.logger.info("Transfer record added", **record)
+
+    def clear(self):
+        """전체 기록 삭제"""
+        self._conn().execute("DELETE FROM TransferHistory")
+        with self._lock:
+            self._recent.clear()
+            self._total = 0
+
+    def import_json(self, json_file: Path) -> int:
+        """
+        기존 JSON 기록 가져오기
+        테이블이 비어 있을 때만 가져오므로 여러 번 호출해도 안전합니다.
+        """
+        if not json_file.exists():
+            return 0
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(records, list):
+            return 0
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM TransferHistory LIMIT 1").fetchone():
+                conn.execute("ROLLBACK")
+                return 0
+            conn.executemany(
+                "INSERT INTO TransferHistory "
+                "(Timestamp, SourceLocation, TargetLocation, ItemName, Success, Record) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [_row(r) for r in records if isinstance(r, dict)]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(records)
+
+    # ==========================================
+    # 조회
+    # ==========================================
+
+    @property
+    def total(self) -> int:
+        return self._total
+
+    def get_recent(self, limit: int = 20) -> List[Dict]:
+        """최근 기록 (최신순)"""
+        with self._lock:
+            if limit <= len(self._recent) or len(self._recent) == self._total:
+                return list(reversed(self._recent))[:limit]
+        return self._select("ORDER BY RecordId DESC LIMIT ?", [limit])
+
+    def query(
+        self,
+        location: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 20,
+    ) -> Tuple[List[Dict], int]:
+        """위치(원본 또는 대상)/날짜 조건 조회 (최신순)"""
+        where, params = [], []
+        if location:
+            where.append("(SourceLocation = ? OR TargetLocation = ?)")
+            params += [location, location]
+        if start_date:
+            where.append("Timestamp >= ?")
+            params.append(start_date.isoformat())
+        if end_date:
+            where.append("Timestamp < ?")
+            params.append((end_date + timedelta(days=1)).strftime("%Y-%m-%d"))
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        total = self._conn().execute(
+            f"SELECT COUNT(*) FROM TransferHistory {where_sql}", params
+        ).fetchone()[0]
+        records = self._select(
+            f"{where_sql} ORDER BY Timestamp DESC, RecordId DESC LIMIT ? OFFSET ?",
+            [*params, limit, skip]
+        )
+        return records, total
+
+
+def _row(record: Dict) -> tuple:
+    """기록 → INSERT 파라미터"""
+    return (
+        record.get('timestamp') or datetime.now().isoformat(),
+        record.get('source_location') or record.get('location'),
+        record.get('target_location'),
+        record.get('item_name') or record.get('filename'),
+        1 if record.get('success', True) else 0,
+        json.dumps(record, ensure_ascii=False, default=str),
+    )
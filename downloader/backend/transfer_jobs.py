@@ -0,0 +1,287 @@
+"""
+백그라운드 전송 작업 관리
+- 요청은 작업만 등록하고 즉시 반환, 복사는 백그라운드 스레드에서 실행
+- 저장 위치별 동시 실행 수 제한 (느린 F: 마운트가 다른 위치 전송을 막지 않도록)
+- 진행률(바이트/파일), 순간 MB/s, ETA 조회
+- 취소 / 일시정지 / 재개
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from transfer_engine import TransferEngine, TransferCancelled
+
+
+# 순간 속도 계산 구간 (초)
+RATE_WINDOW_SECONDS = 5.0
+RATE_SAMPLE_INTERVAL = 0.25
+
+# 완료된 작업 보관 개수
+MAX_FINISHED_JOBS = 200
+
+TERMINAL_STATES = ("completed", "failed", "cancelled")
+
+
+class TransferJob:
+    """전송 작업 한 건"""
+
+    def __init__(self, source_location: str, target_location: str, item_name: str,
+                 source_path: Path, target_path: Path, overwrite: bool = False,
+                 mode: str = "copy", checksum: bool = False, store=None, source_store=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.source_location = source_location
+        self.target_location = target_location
+        self.item_name = item_name
+        self.source_path = source_path
+        self.target_path = target_path
+        self.overwrite = overwrite
+        self.mode = mode
+        self.checksum = checksum
+        # 해시 전송 시 대상/원본 위치의 청크 저장소
+        self.store = store
+        self.source_store = source_store
+
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.result: Optional[Dict] = None
+
+        self.cancel_event = threading.Event()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+
+        self._lock = threading.Lock()
+        self._samples: deque = deque()
+        self._last_sample = 0.0
+
+    # ============= 진행률 =============
+
+    def on_scan(self, files_total: int, bytes_total: int):
+        with self._lock:
+            self.files_total = files_total
+            self.bytes_total = bytes_total
+
+    def on_progress(self, n_bytes: int, n_files: int):
+        now = time.monotonic()
+        with self._lock:
+            self.bytes_done += n_bytes
+            self.files_done += n_files
+            if now - self._last_sample >= RATE_SAMPLE_INTERVAL:
+                self._last_sample = now
+                self._samples.append((now, self.bytes_done))
+                while self._samples and now - self._samples[0][0] > RATE_WINDOW_SECONDS:
+                    self._samples.popleft()
+
+    def rate_mb_s(self) -> float:
+        """최근 RATE_WINDOW_SECONDS 동안의 평균 속도"""
+        with self._lock:
+            if self.status != "running" or len(self._samples) < 2:
+                return 0.0
+            (t0, b0), (t1, b1) = self._samples[0], self._samples[-1]
+            # 마지막 샘플 이후 멈춰 있었다면 그만큼 속도가 떨어진 것으로 계산
+            t1 = max(t1, time.monotonic())
+        if t1 <= t0:
+            return 0.0
+        return (b1 - b0) / (1024 * 1024) / (t1 - t0)
+
+    def percent(self) -> float:
+        # 이어하기로 남은 양이 없으면 bytes_total 이 0 일 수 있음
+        if self.status == "completed":
+            return 100.0
+        return round(self.bytes_done / self.bytes_total * 100, 1) if self.bytes_total else 0.0
+
+    def to_dict(self) -> Dict:
+        rate = self.rate_mb_s()
+        remaining = max(self.bytes_total - self.bytes_done, 0)
+        eta = round(remaining / (rate * 1024 * 1024), 1) if rate > 0 else None
+        elapsed = None
+        if self.started_at:
+            elapsed = round(((self.finished_at or datetime.now()) - self.started_at).total_seconds(), 2)
+        return {
+            "id": self.id,
+            "status": self.status,
+            "source_location": self.source_location,
+            "target_location": self.target_location,
+            "item_name": self.item_name,
+            "overwrite": self.overwrite,
+            "mode": self.mode,
+            "checksum": self.checksum,
+            "dedup": self.store is not None,
+            "files_total": self.files_total,
+            "files_done": self.files_done,
+            "bytes_total": self.bytes_total,
+            "bytes_done": self.bytes_done,
+            "percent": self.percent(),
+            "rate_mb_s": round(rate, 2),
+            "eta_seconds": eta,
+            "elapsed_seconds": elapsed,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error,
+            "result": self.result,
+        }
+
+
+class TransferJobManager:
+    """전송 작업 큐 및 실행기"""
+
+    def __init__(
+        self,
+        engine: TransferEngine,
+        on_finished: Callable[[TransferJob], None],
+        max_jobs: int = 4,
+        per_location_limit: int = 1,
+    ):
+        self.engine = engine
+        self.on_finished = on_finished
+        self.max_jobs = max_jobs
+        self.per_location_limit = per_location_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs, thread_name_prefix="transfer-job")
+        # 위치별 실행 중인 작업 수 - 슬롯은 실행기에 넘기기 전에 확보하므로 워커가 기다리지 않음
+        self._active: Dict[str, int] = {}
+        self._num_started = 0
+        self._pending: List[TransferJob] = []
+        self._jobs: "OrderedDict[str, TransferJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, job: TransferJob) -> TransferJob:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+            self._pending.append(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        """
+        위치 슬롯이 비어 있는 대기 작업을 실행기에 넘김
+        - 바쁜 위치의 작업이 다른 위치 작업의 시작을 막지 않음 (앞 작업만 건너뛰고 계속)
+        - 같은 위치에서는 먼저 들어온 작업이 우선 (막힌 작업의 위치는 이번 순회에서 예약)
+        - 일시정지된 대기 작업은 재개될 때까지 슬롯을 잡지 않음
+        """
+        with self._lock:
+            blocked = set()
+            for job in list(self._pending):
+                if self._num_started >= self.max_jobs:
+                    break
+                if not job.resume_event.is_set():
+                    continue
+                locations = {job.source_location, job.target_location}
+                if (locations & blocked or
+                        any(self._active.get(loc, 0) >= self.per_location_limit for loc in locations)):
+                    blocked |= locations
+                    continue
+                for loc in locations:
+                    self._active[loc] = self._active.get(loc, 0) + 1
+                self._num_started += 1
+                self._pending.remove(job)
+                self._executor.submit(self._run, job, locations)
+
+    def get(self, job_id: str) -> Optional[TransferJob]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[TransferJob]:
+        return list(reversed(self._jobs.values()))
+
+    def cancel(self, job_id: str) -> Optional[TransferJob]:
+        job = self.get(job_id)
+        if job and job.status not in TERMINAL_STATES:
+            job.cancel_event.set()
+            job.resume_event.set()
+            with self._lock:
+                unstarted = job in self._pending
+                if unstarted:
+                    self._pending.remove(job)
+            if unstarted:
+                job.status = "cancelled"
+                self._finish(job)
+        return job
+
+    def pause(self, job_id: str) -> Optional[TransferJob]:
+        job = self.get(job_id)
+        if job and job.status in ("queued", "running"):
+            job.resume_event.clear()
+            job.status = "paused"
+        return job
+
+    def resume(self, job_id: str) -> Optional[TransferJob]:
+        job = self.get(job_id)
+        if job and job.status == "paused":
+            job.status = "running" if job.started_at else "queued"
+            job.resume_event.set()
+            self._dispatch()
+        return job
+
+    def _trim(self):
+        """오래된 완료 작업 정리"""
+        finished = [j for j in self._jobs.values() if j.status in TERMINAL_STATES]
+        for job in finished[:max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+            del self._jobs[job.id]
+
+    def _run(self, job: TransferJob, locations: set):
+        try:
+            if job.cancel_event.is_set():
+                raise TransferCancelled()
+
+            job.started_at = datetime.now()
+            if job.status == "queued":
+                job.status = "running"
+
+            if job.mode == "sync":
+                stats = self.engine.sync(
+                    job.source_path,
+                    job.target_path,
+                    checksum=job.checksum,
+                    progress=job.on_progress,
+                    cancel=job.cancel_event,
+                    resume=job.resume_event,
+                    on_scan=job.on_scan,
+                    store=job.store,
+                    source_store=job.source_store,
+                )
+            else:
+                stats = self.engine.copy(
+                    job.source_path,
+                    job.target_path,
+                    prune=job.overwrite,
+                    progress=job.on_progress,
+                    cancel=job.cancel_event,
+                    resume=job.resume_event,
+                    on_scan=job.on_scan,
+                    store=job.store,
+                    source_store=job.source_store,
+                )
+            job.result = stats.to_dict()
+            job.status = "completed"
+        except TransferCancelled:
+            job.status = "cancelled"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            with self._lock:
+                for loc in locations:
+                    self._active[loc] -= 1
+                self._num_started -= 1
+            self._finish(job)
+            self._dispatch()
+
+    def _finish(self, job: TransferJob):
+        job.finished_at = datetime.now()
+        try:
+            self.on_finished(job)
+        except Exception as e:
+            print(f"전송 작업 완료 처리 오류: {e}")
@@ -0,0 +1,364 @@
+"""
+Streaming ZIP 생성기
+디렉터리를 메모리 버퍼 없이 ZIP 바이트 스트림으로 변환
+- 로컬 헤더는 파일을 읽는 시점에 생성 (data descriptor 사용)
+- 4GB 이상 파일/오프셋은 zip64
+- 기본 STORED: 파일 크기만으로 아카이브 레이아웃이 결정되므로
+  Content-Length 와 HTTP Range(이어받기)를 지원
+- DEFLATED: 크기를 미리 알 수 없으므로 Range 미지원
+"""
+import os
+import time
+import struct
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP16_LIMIT = 0xFFFF
+
+LOCAL_HEADER_SIG = 0x04034b50
+DATA_DESCRIPTOR_SIG = 0x08074b50
+CENTRAL_DIR_SIG = 0x02014b50
+END_OF_CD_SIG = 0x06054b50
+ZIP64_END_OF_CD_SIG = 0x06064b50
+ZIP64_LOCATOR_SIG = 0x07064b50
+
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+
+METHOD_STORED = 0
+METHOD_DEFLATED = 8
+
+
+# ============= CRC 캐시 (이어받기 시 앞쪽 파일 재계산 방지) =============
+
+_CRC_CACHE_MAX = 200_000
+_crc_cache: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+_crc_lock = threading.Lock()
+
+
+def _crc_cache_get(key: Tuple[str, int, int]) -> Optional[int]:
+    with _crc_lock:
+        crc = _crc_cache.get(key)
+        if crc is not None:
+            _crc_cache.move_to_end(key)
+        return crc
+
+
+def _crc_cache_put(key: Tuple[str, int, int], crc: int):
+    with _crc_lock:
+        _crc_cache[key] = crc
+        _crc_cache.move_to_end(key)
+        while len(_crc_cache) > _CRC_CACHE_MAX:
+            _crc_cache.popitem(last=False)
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    """ZIP 헤더용 DOS 날짜/시간 (1980년 이전은 1980-01-01)"""
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return 0, (0 << 9) | (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+@dataclass
+class ZipEntry:
+    """아카이브 내 파일 한 개"""
+    path: str
+    arcname: bytes
+    size: int
+    mtime_ns: int
+    offset: int = 0
+    crc: Optional[int] = None
+    compressed_size: Optional[int] = None
+
+    @property
+    def cache_key(self) -> Tuple[str, int, int]:
+        return (self.path, self.size, self.mtime_ns)
+
+    @property
+    def zip64(self) -> bool:
+        """로컬 헤더/descriptor 를 zip64 형식으로 쓸지 (크기 기준으로만 결정)"""
+        return self.size >= ZIP32_LIMIT
+
+
+class StreamingZip:
+    """디렉터리 → ZIP 스트림"""
+
+    def __init__(self, root: Path, compression: str = "stored"):
+        if compression not in ("stored", "deflated"):
+            raise ValueError(f"Invalid compression: {compression}")
+        self.root = Path(root)
+        self.method = METHOD_STORED if compression == "stored" else METHOD_DEFLATED
+        self.entries = self._collect()
+
+        self.total_size: Optional[int] = None
+        if self.method == METHOD_STORED:
+            self._layout()
+
+    @property
+    def supports_range(self) -> bool:
+        return self.total_size is not None
+
+    def _collect(self) -> List[ZipEntry]:
+        """파일 목록 (상대 경로 정렬 → 결정적 레이아웃)"""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames.sort()
+            for name in sorted(filenames):
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                arcname = os.path.relpath(full, self.root).replace(os.sep, "/")
+                entries.append(ZipEntry(
+                    path=full,
+                    arcname=arcname.encode("utf-8"),
+                    size=st.st_size,
+                    mtime_ns=st.st_mtime_ns,
+                ))
+        return entries
+
+    def etag(self) -> str:
+        """레이아웃 식별자 (이름/크기/mtime 이 같으면 같은 아카이브)"""
+        h = hashlib.sha1(str(self.method).encode())
+        for e in self.entries:
+            h.update(e.arcname)
+            h.update(struct.pack("<QQ", e.size, e.mtime_ns))
+        return h.hexdigest()
+
+    # ============= 헤더 =============
+
+    def _local_header(self, e: ZipEntry) -> bytes:
+        dos_time, dos_date = _dos_datetime(e.mtime_ns / 1e9)
+        # DEFLATED 는 압축 후 크기를 미리 모르므로 항상 zip64 descriptor
+        zip64 = e.zip64 or self.method == METHOD_DEFLATED
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        size_field = ZIP32_LIMIT if zip64 else 0
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            LOCAL_HEADER_SIG,
+            45 if zip64 else 20,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method,
+            dos_time, dos_date,
+            0, size_field, size_field,
+            len(e.arcname), len(extra),
+        ) + e.arcname + extra
+
+    def _data_descriptor(self, e: ZipEntry) -> bytes:
+        if e.zip64 or self.method == METHOD_DEFLATED:
+            return struct.pack("<IIQQ", DATA_DESCRIPTOR_SIG, e.crc, e.compressed_size, e.size)
+        return struct.pack("<IIII", DATA_DESCRIPTOR_SIG, e.crc, e.compressed_size, e.size)
+
+    def _descriptor_size(self, e: ZipEntry) -> int:
+        return 24 if (e.zip64 or self.method == METHOD_DEFLATED) else 16
+
+    def _central_header(self, e: ZipEntry) -> bytes:
+        dos_time, dos_date = _dos_datetime(e.mtime_ns / 1e9)
+        extra_fields = []
+        usize, csize, offset = e.size, e.compressed_size, e.offset
+        if usize >= ZIP32_LIMIT:
+            extra_fields.append(usize)
+            usize = ZIP32_LIMIT
+        if csize >= ZIP32_LIMIT:
+            extra_fields.append(csize)
+            csize = ZIP32_LIMIT
+        if offset >= ZIP32_LIMIT:
+            extra_fields.append(offset)
+            offset = ZIP32_LIMIT
+        extra = b""
+        if extra_fields:
+            extra = struct.pack("<HH", 0x0001, 8 * len(extra_fields)) + \
+                struct.pack(f"<{len(extra_fields)}Q", *extra_fields)
+        version = 45 if (extra or e.zip64 or self.method == METHOD_DEFLATED) else 20
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            CENTRAL_DIR_SIG,
+            (3 << 8) | version, version,
+            FLAG_DATA_DESCRIPTOR | FLAG_UTF8,
+            self.method,
+            dos_time, dos_date,
+            e.crc, csize, usize,
+            len(e.arcname), len(extra), 0,
+            0, 0,
+            0o100644 << 16,
+            offset,
+        ) + e.arcname + extra
+
+    def _central_header_size(self, e: ZipEntry, compressed_size: int, offset: int) -> int:
+        n_extra = sum(1 for v in (e.size, compressed_size, offset) if v >= ZIP32_LIMIT)
+        return 46 + len(e.arcname) + (4 + 8 * n_extra if n_extra else 0)
+
+    def _end_records(self, cd_offset: int, cd_size: int) -> bytes:
+        count = len(self.entries)
+        out = b""
+        need_zip64 = count >= ZIP16_LIMIT or cd_offset >= ZIP32_LIMIT or cd_size >= ZIP32_LIMIT
+        if need_zip64:
+            zip64_eocd_offset = cd_offset + cd_size
+            out += struct.pack(
+                "<IQHHIIQQQQ",
+                ZIP64_END_OF_CD_SIG, 44, 45, 45, 0, 0,
+                count, count, cd_size, cd_offset,
+            )
+            out += struct.pack("<IIQI", ZIP64_LOCATOR_SIG, 0, zip64_eocd_offset, 1)
+        out += struct.pack(
+            "<IHHHHIIH",
+            END_OF_CD_SIG, 0, 0,
+            min(count, ZIP16_LIMIT), min(count, ZIP16_LIMIT),
+            min(cd_size, ZIP32_LIMIT), min(cd_offset, ZIP32_LIMIT),
+            0,
+        )
+        return out
+
+    def _layout(self):
+        """STORED: 오프셋과 전체 크기 계산 (파일 내용은 읽지 않음)"""
+        offset = 0
+        for e in self.entries:
+            e.offset = offset
+            e.compressed_size = e.size
+            offset += len(self._local_header(e)) + e.size + self._descriptor_size(e)
+        self.cd_offset = offset
+        self.cd_size = sum(self._central_header_size(e, e.size, e.offset) for e in self.entries)
+        self.total_size = offset + self.cd_size + len(self._end_records(self.cd_offset, self.cd_size))
+
+    # ============= 스트림 =============
+
+    def _read_crc(self, e: ZipEntry) -> int:
+        """건너뛴 파일의 CRC (캐시 우선)"""
+        crc = _crc_cache_get(e.cache_key)
+        if crc is None:
+            crc = 0
+            for chunk in self._read_file(e):
+                crc = zlib.crc32(chunk, crc)
+            _crc_cache_put(e.cache_key, crc)
+        return crc
+
+    def _read_file(self, e: ZipEntry) -> Iterator[bytes]:
+        """정확히 e.size 바이트 읽기 (도중에 파일이 바뀌면 오류)"""
+        remaining = e.size
+        with open(e.path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"File changed during download: {e.path}")
+                remaining -= len(chunk)
+                yield chunk
+
+    def iter_bytes(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        [start, end] 구간 (end 포함) 의 바이트 생성
+        Range 는 STORED 에서만 지원
+        """
+        if self.method == METHOD_DEFLATED:
+            if start or end is not None:
+                raise ValueError("Range requests require stored compression")
+            yield from self._iter_deflated()
+            return
+
+        stop = self.total_size if end is None else end + 1
+        for piece_start, piece in self._iter_stored(start):
+            if piece_start >= stop:
+                return
+            lo = max(start - piece_start, 0)
+            hi = min(stop - piece_start, len(piece))
+            if lo < hi:
+                yield piece[lo:hi] if (lo or hi < len(piece)) else piece
+
+    def _iter_stored(self, start: int) -> Iterator[Tuple[int, bytes]]:
+        """(절대 오프셋, 바이트) 조각 생성 - start 이전 조각은 읽지 않음"""
+        for e in self.entries:
+            header = self._local_header(e)
+            data_start = e.offset + len(header)
+            entry_end = data_start + e.size + self._descriptor_size(e)
+            if entry_end <= start:
+                # 이 엔트리는 건너뜀 (central directory 에 필요한 CRC 는 나중에 계산)
+                continue
+
+            yield e.offset, header
+            crc = 0
+            pos = data_start
+            for chunk in self._read_file(e):
+                crc = zlib.crc32(chunk, crc)
+                if pos + len(chunk) > start:
+                    yield pos, chunk
+                pos += len(chunk)
+            e.crc = crc
+            _crc_cache_put(e.cache_key, crc)
+            yield pos, self._data_descriptor(e)
+
+        central = []
+        for e in self.entries:
+            if e.crc is None:
+                e.crc = self._read_crc(e)
+            central.append(self._central_header(e))
+        cd = b"".join(central)
+        yield self.cd_offset, cd + self._end_records(self.cd_offset, len(cd))
+
+    def _iter_deflated(self) -> Iterator[bytes]:
+        """DEFLATED 스트림 (오프셋은 쓰면서 계산)"""
+        offset = 0
+        for e in self.entries:
+            e.offset = offset
+            header = self._local_header(e)
+            yield header
+            offset += len(header)
+
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+            crc = 0
+            csize = 0
+            for chunk in self._read_file(e):
+                crc = zlib.crc32(chunk, crc)
+                out = compressor.compress(chunk)
+                if out:
+                    csize += len(out)
+                    yield out
+            out = compressor.flush()
+            csize += len(out)
+            if out:
+                yield out
+            e.crc = crc
+            e.compressed_size = csize
+            offset += csize
+
+            descriptor = self._data_descriptor(e)
+            yield descriptor
+            offset += len(descriptor)
+
+        cd = b"".join(self._central_header(e) for e in self.entries)
+        yield cd + self._end_records(offset, len(cd))
+
+
+def parse_range(range_header: Optional[str], total_size: int) -> Optional[Tuple[int, int]]:
+    """
+    'bytes=a-b' / 'bytes=a-' / 'bytes=-n' 파싱 → (start, end) (end 포함)
+    단일 구간만 지원, 잘못된 값이면 ValueError
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError(f"Unsupported range: {range_header}")
+    first, _, last = spec.strip().partition("-")
+    if first:
+        start = int(first)
+        end = int(last) if last else total_size - 1
+    else:
+        suffix = int(last)
+        start = max(total_size - suffix, 0)
+        end = total_size - 1
+    end = min(end, total_size - 1)
+    if start > end or start >= total_size:
+        raise ValueError(f"Unsatisfiable range: {range_header}")
+    return start, end
@@ -0,0 +1,271 @@
+"""
+내용 주소 기반 청크 저장소 (중복 제거)
+- 청크 내용의 해시를 이름으로 하는 블롭을 {root}/.chunks/ab/abcdef... 에 한 번만 저장
+- 볼륨의 청크 파일은 블롭에 대한 하드링크 → 볼륨 디렉터리는 그대로 Precomputed 형식
+  (뷰어/Neuroglancer 는 변경 없이 읽음)
+- 하드링크를 만들 수 없는 파일시스템에서는 복사로 대체 (중복 제거만 안 됨)
+- 블롭에 연결된 파일은 제자리에서 수정하면 안 됨 (항상 새 파일로 교체)
+"""
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+
+CHUNK_DIR_NAME = ".chunks"
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+
+# 블롭 생성 잠금 (같은 해시를 동시에 쓰지 않도록, 해시 앞자리로 분할)
+_LOCK_STRIPES = 64
+
+# 원본 저장소의 inode 색인을 다시 읽는 최소 간격 (초)
+INDEX_REFRESH_SECONDS = 30.0
+
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def digest_file(path: str) -> str:
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_blob(entry: os.DirEntry) -> bool:
+    """쓰는 중인 임시 파일(.part / .tmp) 제외"""
+    return (not entry.name.startswith(".") and not entry.name.endswith(".tmp")
+            and entry.is_file(follow_symlinks=False))
+
+
+class ChunkStore:
+    """위치(root) 하나의 청크 저장소"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blob_dir = self.root / CHUNK_DIR_NAME
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        self._index_lock = threading.Lock()
+        self._inodes: Optional[Dict[Tuple[int, int], str]] = None
+        self._index_loaded_at = 0.0
+
+    def exists(self) -> bool:
+        return self.blob_dir.is_dir()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def has(self, digest: str) -> bool:
+        return self.blob_path(digest).exists()
+
+    @staticmethod
+    def digest_file(path: str) -> str:
+        return digest_file(path)
+
+    # ==========================================
+    # 쓰기
+    # ==========================================
+
+    def ingest(self, digest: str, write_fn: Callable[[str], None]) -> bool:
+        """
+        블롭이 없으면 write_fn(블롭 경로) 로 생성
+        새로 만들었으면 True, 이미 있었으면 False
+        (write_fn 은 임시 파일에 쓰고 rename 하는 방식이어야 함)
+        """
+        blob = self.blob_path(digest)
+        with self._locks[int(digest[:2], 16) % _LOCK_STRIPES]:
+            if blob.exists():
+                return False
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            write_fn(str(blob))
+        self._remember(blob, digest)
+        return True
+
+    def put_bytes(self, data: bytes, dest: str) -> str:
+        """청크 내용을 저장소에 넣고 dest 를 블롭에 연결"""
+        digest = digest_bytes(data)
+
+        def write(blob: str):
+            tmp = f"{blob}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, blob)
+
+        self.ingest(digest, write)
+        self.link(digest, dest)
+        return digest
+
+    def put_file(self, path: str) -> Tuple[str, bool]:
+        """
+        기존 파일을 저장소로 옮김 (내용은 그대로, 같은 블롭이 있으면 하드링크로 교체)
+        반환: (해시, 디스크 공간을 회수했는지)
+        """
+        digest = digest_file(path)
+
+        def adopt(blob: str):
+            try:
+                os.link(path, blob)
+            except OSError:
+                self._copy_replace(path, blob)
+
+        created = self.ingest(digest, adopt)
+        if created:
+            return digest, False
+        return digest, self.link(digest, path)
+
+    def link(self, digest: str, dest: str) -> bool:
+        """
+        dest 를 블롭에 연결 (기존 파일은 교체)
+        블롭이 없으면 False, 하드링크 불가 시 복사
+        """
+        blob = str(self.blob_path(digest))
+        tmp = os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}.lnk")
+        try:
+            os.link(blob, tmp)
+        except FileNotFoundError:
+            if not os.path.exists(blob):
+                return False
+            raise
+        except FileExistsError:
+            os.unlink(tmp)
+            os.link(blob, tmp)
+        except OSError:
+            # 다른 파일시스템 / 하드링크 미지원 → 복사
+            self._copy_replace(blob, dest)
+            return True
+        os.replace(tmp, dest)
+        return True
+
+    @staticmethod
+    def _copy_replace(src: str, dst: str):
+        tmp = f"{dst}.{threading.get_ident()}.tmp"
+        with open(src, "rb") as fs, open(tmp, "wb") as fd:
+            while True:
+                block = fs.read(HASH_BLOCK_SIZE)
+                if not block:
+                    break
+                fd.write(block)
+        os.replace(tmp, dst)
+
+    # ==========================================
+    # 조회
+    # ==========================================
+
+    def digest_of(self, path: str) -> Optional[str]:
+        """
+        파일이 블롭에 연결되어 있으면 그 해시 (inode 로 찾으므로 파일을 읽지 않음)
+        연결되어 있지 않으면 None
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_nlink < 2 or not self.exists():
+            return None
+
+        key = (st.st_dev, st.st_ino)
+        with self._index_lock:
+            if self._inodes is None or (
+                key not in self._inodes and
+                time.monotonic() - self._index_loaded_at > INDEX_REFRESH_SECONDS
+            ):
+                self._inodes = self._scan_inodes()
+                self._index_loaded_at = time.monotonic()
+            return self._inodes.get(key)
+
+    def _remember(self, blob: Path, digest: str):
+        with self._index_lock:
+            if self._inodes is not None:
+                try:
+                    st = blob.stat()
+                except OSError:
+                    return
+                self._inodes[(st.st_dev, st.st_ino)] = digest
+
+    def _scan_inodes(self) -> Dict[Tuple[int, int], str]:
+        inodes = {}
+        for sub in self._iter_subdirs():
+            with os.scandir(sub) as it:
+                for entry in it:
+                    if not _is_blob(entry):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    inodes[(st.st_dev, st.st_ino)] = entry.name
+        return inodes
+
+    def _iter_subdirs(self):
+        if not self.exists():
+            return
+        with os.scandir(self.blob_dir) as it:
+            subs = [e.path for e in it if e.is_dir(follow_symlinks=False)]
+        yield from subs
+
+    # ==========================================
+    # 관리
+    # ==========================================
+
+    def dedupe_tree(self, directory: str, cancel: Optional[threading.Event] = None) -> Dict:
+        """기존 볼륨의 모든 파일을 저장소로 옮겨 중복 제거"""
+        stats = {"files": 0, "files_deduped": 0, "bytes_reclaimed": 0}
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            with os.scandir(current) as it:
+                entries = list(it)
+            for entry in entries:
+                if cancel is not None and cancel.is_set():
+                    return stats
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != CHUNK_DIR_NAME:
+                        stack.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+                stats["files"] += 1
+                if st.st_nlink > 1 and self.digest_of(entry.path):
+                    continue
+                _, reclaimed = self.put_file(entry.path)
+                if reclaimed:
+                    stats["files_deduped"] += 1
+                    stats["bytes_reclaimed"] += st.st_size
+        return stats
+
+    def gc(self) -> Dict:
+        """어느 볼륨에서도 참조하지 않는 블롭(링크 수 1) 삭제"""
+        removed, freed = 0, 0
+        for sub in self._iter_subdirs():
+            with os.scandir(sub) as it:
+                for entry in it:
+                    if not _is_blob(entry):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_nlink == 1:
+                        os.unlink(entry.path)
+                        removed += 1
+                        freed += st.st_size
+        with self._index_lock:
+            self._inodes = None
+        return {"blobs_removed": removed, "bytes_freed": freed}
+
+    def stats(self) -> Dict:
+        """블롭 수 / 저장된 바이트 / 참조 수 합계 (링크로 절약된 바이트 포함)"""
+        blobs, stored, saved = 0, 0, 0
+        for sub in self._iter_subdirs():
+            with os.scandir(sub) as it:
+                for entry in it:
+                    if not _is_blob(entry):
+                        continue
+                    st = entry.stat(follow_symlinks=False)
+                    blobs += 1
+                    stored += st.st_size
+                    # 저장소 자신 + 첫 번째 참조를 제외한 나머지 참조가 절약분
+                    saved += st.st_size * max(st.st_nlink - 2, 0)
+        return {"blobs": blobs, "bytes_stored": stored, "bytes_saved": saved}
@@ -24,6 +24,7 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 from precomputed_writer import convert_image_file_to_precomputed, convert_raw_to_precomputed
 from memory_management import MemoryManager, MemoryConfig
 from output_path_manager import OutputPathManager
+from chunk_store import ChunkStore
 
 # FastAPI 앱 초기화
 app = FastAPI(title="Neuroglancer Server - Custom Output Path")
@@ -35,6 +36,19 @@ DATA_ROOT = os.environ.get("DATA_DIR", "/app/data/precomputed")
 UPLOAD_DIR = os.path.join(DATA_ROOT, "temp")
 CHUNK_SIZE = 512
 
+# 청크 중복 제거 (저장 경로별 .chunks 블롭 저장소에 하드링크)
+CHUNK_DEDUP = os.environ.get("CHUNK_DEDUP", "0") == "1"
+_chunk_stores = {}
+
+
+def get_chunk_store(base_output_path):
+    """저장 경로의 청크 저장소 (CHUNK_DEDUP=1 일 때만)"""
+    if not CHUNK_DEDUP:
+        return None
+    if base_output_path not in _chunk_stores:
+        _chunk_stores[base_output_path] = ChunkStore(base_output_path)
+    return _chunk_stores[base_output_path]
+
 # [⭐️ 추가] yml에서 정의한 서버/로컬 저장 경로
 SERVER_SAVE_PATH = os.environ.get("SERVER_SAVE_PATH", DATA_ROOT)
 LOCAL_SAVE_PATH = os.environ.get("LOCAL_SAVE_PATH", os.path.join(DATA_ROOT, "local_storage"))
@@ -267,7 +281,8 @@ async def upload_and_convert(
             upload_path,
             final_output_path,
             chunk_size=CHUNK_SIZE,
-            encoding="raw"
+            encoding="raw",
+            store=get_chunk_store(base_output_path)
         )
         print(f"✅ 변환 완료: {chunk_count}개 청크 생성")
 
@@ -372,7 +387,8 @@ async def upload_raw(
 
         print(f"🔄 Precomputed 형식으로 변환 시작...")
         chunk_count = convert_raw_to_precomputed(
-            upload_path, final_output_path, width, height, channels, dtype, CHUNK_SIZE, "raw"
+            upload_path, final_output_path, width, height, channels, dtype, CHUNK_SIZE, "raw",
+            store=get_chunk_store(base_output_path)
         )
         print(f"✅ 변환 완료: {chunk_count}개 청크 생성")
 
@@ -5,6 +5,7 @@ CloudVolume 없이 직접 Precomputed 형식으로 저장하는 유틸리티
 - encoding: 'raw' 또는 'png' 선택 지원
 - 파일명 규칙: {xStart}-{yStart}-{z}  (z=0 고정)
 """
+import io
 import os
 import json
 import warnings
@@ -15,6 +16,8 @@ from PIL import Image, ImageFile
 import tifffile as tiff
 import zarr
 
+from volume_manifest import ManifestBuilder
+
 # Pillow 폭탄가드 완전 해제 (PNG/JPG용)
 Image.MAX_IMAGE_PIXELS = None
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -53,7 +56,7 @@ def np_dtype_to_str(dtype_like):
 
 
 # ---------- 저장 함수 ----------
-def save_chunk_raw(tile_hwc_or_hw: np.ndarray, out_path: str):
+def save_chunk_raw(tile_hwc_or_hw: np.ndarray, out_path: str, store=None, builder=None):
     """
     tile: (H, W, C) 또는 (H, W) [uint8/uint16/float32 등]
     RAW 파일을 Neuroglancer가 기대하는 레이아웃으로 기록.
@@ -65,12 +68,35 @@ def save_chunk_raw(tile_hwc_or_hw: np.ndarray, out_path: str):
 
     # (H, W, C) -> (C, Y, X)
     tile_cyx = np.transpose(tile, (2, 0, 1)).copy(order="C")
+    data = tile_cyx.tobytes(order="C")
+    if builder is not None:
+        builder.add(out_path, data)
+    if store is not None:
+        # 청크 저장소: 같은 내용의 청크는 블롭 하나를 공유 (하드링크)
+        store.put_bytes(data, out_path)
+        return
     with open(out_path, "wb") as f:
-        f.write(tile_cyx.tobytes(order="C"))
+        f.write(data)
 
 
 
-def save_chunk_png(tile_whc, out_path):
+def _save_png(img, out_path, store=None, builder=None):
+    if store is None and builder is None:
+        img.save(out_path, format='PNG', compress_level=0)
+        return
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=0)
+    data = buf.getvalue()
+    if builder is not None:
+        builder.add(out_path, data)
+    if store is not None:
+        store.put_bytes(data, out_path)
+        return
+    with open(out_path, "wb") as f:
+        f.write(data)
+
+
+def save_chunk_png(tile_whc, out_path, store=None, builder=None):
     """
     tile_whc: (H, W, C) 또는 (H, W) -> PNG로 저장
     - 단일 채널 uint16은 'I;16'로 저장 가능
@@ -83,7 +109,7 @@ def save_chunk_png(tile_whc, out_path):
             img = Image.fromarray(arr)
         else:
             img = Image.fromarray(arr.astype(np.uint8), mode='L')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     # (H,W,C)
@@ -94,7 +120,7 @@ def save_chunk_png(tile_whc, out_path):
             img = Image.fromarray(ch)  # 'I;16'
         else:
             img = Image.fromarray(ch.astype(np.uint8), mode='L')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     if C == 3:
@@ -104,17 +130,20 @@ def save_chunk_png(tile_whc, out_path):
             img = Image.fromarray(down, mode='RGB')
         else:
             img = Image.fromarray(tile_whc.astype(np.uint8), mode='RGB')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     raise ValueError(f"지원하지 않는 채널 수: {C}")
 
 
 # ---------- 공통 타일 루프 ----------
-def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding="raw"):
+def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding="raw", store=None,
+                                 manifest=True):
     """
     arr_hwc: (H, W[, C])  (C가 없으면 1채널로 처리)
     encoding: "raw" 또는 "png"
+    store: ChunkStore 를 주면 청크를 내용 해시 블롭으로 저장 (중복 청크는 하드링크)
+    manifest: True 면 청크 해시를 모아 manifest.json 기록 (전송/검증용)
     """
     # 차원/채널 정리
     if arr_hwc.ndim == 2:
@@ -142,6 +171,7 @@ def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding=
         json.dump(info, f, indent=2)
     with open(os.path.join(volume_path, "provenance"), "w") as f:
         json.dump({"sources": []}, f, indent=2)
+    builder = ManifestBuilder(volume_path) if manifest else None
 
     # 타일 저장
     total = 0
@@ -158,23 +188,28 @@ def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding=
             out_path = os.path.join(scale_dir, fname)
 
             if encoding == "raw":
-                save_chunk_raw(tile, out_path)
+                save_chunk_raw(tile, out_path, store, builder)
             elif encoding == "png":
-                save_chunk_png(tile, out_path)  # 확장자 없어도 NG는 문제 없음
+                save_chunk_png(tile, out_path, store, builder)  # 확장자 없어도 NG는 문제 없음
             else:
                 raise ValueError("encoding은 'raw' 또는 'png'만 지원")
 
             total += 1
+    if builder is not None:
+        builder.write()
     return total
 
 
 # ---------- 파일 단위 변환 ----------
-def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, encoding="raw"):
+def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, encoding="raw", store=None,
+                                      manifest=True):
     """
     이미지 파일을 Precomputed 형식으로 변환.
     - TIFF: tifffile + zarr 스트리밍 (메모리 폭주 방지)
     - PNG/JPG: Pillow (폭탄가드 해제됨)
     - encoding: "raw" 또는 "png"
+    - store: ChunkStore (선택, 중복 청크 제거)
+    - manifest: True 면 manifest.json 기록
     """
     ext = Path(input_path).suffix.lower()
 
@@ -205,6 +240,7 @@ def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, e
                 json.dump(info, f, indent=2)
             with open(os.path.join(output_path, "provenance"), "w") as f:
                 json.dump({"sources": [Path(input_path).name]}, f, indent=2)
+            builder = ManifestBuilder(output_path) if manifest else None
 
             total = 0
             # 타일 루프: 필요 영역만 디코드
@@ -226,11 +262,13 @@ def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, e
                     out_path = os.path.join(scale_dir, fname)
 
                     if encoding == "raw":
-                        save_chunk_raw(tile_np, out_path)
+                        save_chunk_raw(tile_np, out_path, store, builder)
                     else:
-                        save_chunk_png(tile_np, out_path)
+                        save_chunk_png(tile_np, out_path, store, builder)
 
                     total += 1
+            if builder is not None:
+                builder.write()
             return total
 
     # ---------- PNG/JPG 등: Pillow ----------
@@ -248,7 +286,8 @@ def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, e
         raise ValueError(f"지원하지 않는 이미지 차원: {arr.shape}")
 
     # dtype은 있는 그대로 사용(예: uint8/uint16/float32)
-    return write_precomputed_from_array(arr, output_path, chunk_size=chunk_size, encoding=encoding)
+    return write_precomputed_from_array(arr, output_path, chunk_size=chunk_size, encoding=encoding,
+                                        store=store, manifest=manifest)
 
 
 # ---------- RAW 파일 지원 ----------
@@ -260,7 +299,9 @@ def convert_raw_to_precomputed(
         channels: int = 3,
         dtype_str: str = "uint8",
         chunk_size: int = 512,
-        encoding: str = "raw"
+        encoding: str = "raw",
+        store=None,
+        manifest: bool = True
 ):
     """
     RAW 이미지 파일(헤더 없는 순수 바이너리)을 Precomputed 형식으로 변환
@@ -274,6 +315,8 @@ def convert_raw_to_precomputed(
         dtype_str: 데이터 타입 ("uint8", "uint16", "int16", "uint32", "float32")
         chunk_size: 청크 크기 (기본: 512)
         encoding: 출력 인코딩 ("raw" or "png")
+        store: ChunkStore (선택, 지정 시 중복 청크를 하드링크로 공유)
+        manifest: True 면 manifest.json (청크별 크기/해시) 기록
     """
     # dtype 매핑
     dtype_map = {
@@ -337,5 +380,7 @@ def convert_raw_to_precomputed(
         arr,
         output_path,
         chunk_size=chunk_size,
-        encoding=encoding
+        encoding=encoding,
+        store=store,
+        manifest=manifest
     )
\ No newline at end of file
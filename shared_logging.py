@@ -1,15 +1,44 @@
 """
 통합 로깅 시스템
 날짜별로 JSON 형식의 로그 파일 생성
+비동기 모드: 요청 경로에서는 큐에 넣기만 하고, 전용 스레드가 배치로 기록
 """
 import os
 import json
+import time
+import queue
+import atexit
 import logging
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import traceback
 
+try:
+    import orjson
+except ImportError:  # orjson 미설치 시 표준 json 사용
+    orjson = None
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    """JSON 직렬화 (orjson 우선)"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _next_midnight(ts: float) -> float:
+    """ts 다음 자정(로컬 시간)의 epoch 초"""
+    next_day = datetime.fromtimestamp(ts).date() + timedelta(days=1)
+    return datetime.combine(next_day, datetime.min.time()).timestamp()
+
+
+def _log_file_for(ts: float, log_base_dir: Path) -> Path:
+    """ts 가 속한 날짜의 로그 파일 경로 (YYYY/MM/DD.txt)"""
+    day = datetime.fromtimestamp(ts)
+    return log_base_dir / str(day.year) / f"{day.month:02d}" / f"{day.day:02d}.txt"
+
 
 class JSONFormatter(logging.Formatter):
     """JSON 형식의 로그 포맷터"""
@@ -43,13 +72,170 @@ class JSONFormatter(logging.Formatter):
                 'traceback': traceback.format_exception(*record.exc_info)
             }
         
-        return json.dumps(log_data, ensure_ascii=False)
+        return _dumps(log_data)
+
+
+# 큐 종료 신호
+_STOP = object()
+
+
+class AsyncJSONLogWriter:
+    """
+    큐 기반 비동기 로그 기록기
+    - 요청 경로: 레코드를 큐에 넣기만 함 (디스크 I/O 없음)
+    - 기록 스레드: 배치로 직렬화 후 한 번에 write/flush
+    - 날짜 변경: 미리 계산한 자정 시각과 record.created 비교
+    - 부하 시: low_value 레코드(타일 접근 등)는 샘플링, 큐가 가득 차면 버림
+    """
+
+    def __init__(
+        self,
+        log_base_dir: Path,
+        console_handler: Optional[logging.Handler] = None,
+        max_queue_size: int = 10000,
+        batch_size: int = 512,
+        flush_interval: float = 0.5,
+        sample_threshold: float = 0.5,
+        sample_rate: int = 10,
+    ):
+        self.log_base_dir = Path(log_base_dir)
+        self.console_handler = console_handler
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # 큐가 이 개수 이상 차면 low_value 레코드는 sample_rate 개 중 1개만 기록
+        self.sample_watermark = int(max_queue_size * sample_threshold)
+        self.sample_rate = max(1, sample_rate)
+        self.formatter = JSONFormatter()
+
+        self.stats = {"written": 0, "dropped": 0, "sampled_out": 0}
+        self._sample_counter = 0
+        self._reported_dropped = 0
+
+        self._file = None
+        self._next_rollover = 0.0
+
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, record: logging.LogRecord):
+        """요청 경로에서 호출 - 블로킹 없음"""
+        if getattr(record, 'low_value', False) and self.queue.qsize() >= self.sample_watermark:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.stats["sampled_out"] += 1
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def close(self, timeout: float = 5.0):
+        """남은 레코드 기록 후 종료"""
+        if not self.thread.is_alive():
+            return
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self.thread.join(timeout)
+
+    def _run(self):
+        """기록 스레드 루프"""
+        stopping = False
+        while not stopping:
+            try:
+                record = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if record is _STOP:
+                break
+
+            batch = [record]
+            while len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"로그 기록 오류: {e}")
+
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch: List[logging.LogRecord]):
+        """배치 직렬화 및 기록 (날짜가 바뀌면 파일 교체)"""
+        lines: List[str] = []
+        for record in batch:
+            if record.created >= self._next_rollover:
+                self._flush_lines(lines)
+                lines = []
+                self._rollover(record.created)
+
+            try:
+                lines.append(self.formatter.format(record))
+            except Exception:
+                continue
+
+            if self.console_handler and record.levelno >= self.console_handler.level:
+                self.console_handler.handle(record)
+
+        dropped = self.stats["dropped"]
+        if dropped > self._reported_dropped:
+            lines.append(_dumps({
+                "timestamp": datetime.now().isoformat(),
+                "level": "WARNING",
+                "logger": "shared_logging",
+                "message": "Log records dropped under load",
+                "dropped": dropped - self._reported_dropped,
+            }))
+            self._reported_dropped = dropped
+
+        self._flush_lines(lines)
+
+    def _flush_lines(self, lines: List[str]):
+        if not lines or self._file is None:
+            return
+        self._file.write("\n".join(lines) + "\n")
+        self._file.flush()
+        self.stats["written"] += len(lines)
+
+    def _rollover(self, ts: float):
+        """ts 날짜의 로그 파일로 교체"""
+        if self._file:
+            self._file.close()
+        log_file = _log_file_for(ts, self.log_base_dir)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(log_file, 'a', encoding='utf-8')
+        self._next_rollover = _next_midnight(ts)
+        print(f"📝 Log file: {log_file}")
+
+
+class AsyncQueueHandler(logging.Handler):
+    """레코드를 AsyncJSONLogWriter 큐로 전달하는 핸들러"""
+
+    def __init__(self, writer: AsyncJSONLogWriter):
+        super().__init__()
+        self.writer = writer
+
+    def emit(self, record: logging.LogRecord):
+        self.writer.enqueue(record)
 
 
 class DailyRotatingJSONLogger:
     """일별 로테이션 JSON 로거"""
     
-    def __init__(self, service_name: str, log_base_dir: str = "/logs"):
+    def __init__(self, service_name: str, log_base_dir: str = "/logs",
+                 async_mode: Optional[bool] = None):
         self.service_name = service_name
         self.log_base_dir = Path(log_base_dir)
         self.logger = logging.getLogger(service_name)
@@ -58,21 +244,33 @@ class DailyRotatingJSONLogger:
         # 기존 핸들러 제거
         self.logger.handlers.clear()
         
+        # 비동기 모드 (기본값: 환경변수 LOG_ASYNC, 미설정 시 사용)
+        if async_mode is None:
+            async_mode = os.getenv("LOG_ASYNC", "1").lower() not in ("0", "false", "no")
+        self.async_mode = async_mode
+        
         # 현재 날짜
         self.current_date = None
         self.file_handler = None
+        self.writer = None
+        self._next_rollover = 0.0
         
-        # 초기 설정
-        self._setup_handler()
-        
-        # 콘솔 핸들러 추가 (일반 텍스트)
+        # 콘솔 핸들러 (일반 텍스트)
         console_handler = logging.StreamHandler()
         console_handler.setLevel(logging.INFO)
         console_formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
         )
         console_handler.setFormatter(console_formatter)
-        self.logger.addHandler(console_handler)
+        
+        if self.async_mode:
+            # 파일/콘솔 기록 모두 기록 스레드에서 처리
+            self.writer = AsyncJSONLogWriter(self.log_base_dir, console_handler=console_handler)
+            self.logger.addHandler(AsyncQueueHandler(self.writer))
+        else:
+            # 초기 설정
+            self._setup_handler()
+            self.logger.addHandler(console_handler)
     
     def _setup_handler(self):
         """날짜별 핸들러 설정"""
@@ -103,12 +301,13 @@ class DailyRotatingJSONLogger:
             
             self.logger.addHandler(self.file_handler)
             self.current_date = today
+            self._next_rollover = _next_midnight(now.timestamp())
             
             print(f"📝 Log file: {log_file}")
     
     def _check_date_change(self):
-        """날짜 변경 확인 및 핸들러 재설정"""
-        if datetime.now().date() != self.current_date:
+        """날짜 변경 확인 및 핸들러 재설정 (비동기 모드는 기록 스레드가 처리)"""
+        if self.file_handler is not None and time.time() >= self._next_rollover:
             self._setup_handler()
     
     def debug(self, message: str, **kwargs):
@@ -141,6 +340,17 @@ class DailyRotatingJSONLogger:
         extra = self._make_extra(**kwargs)
         self.logger.critical(message, exc_info=exc_info, extra=extra)
     
+    def access(self, message: str, **kwargs):
+        """INFO 레벨 접근 로그 (부하 시 샘플링 대상)"""
+        self._check_date_change()
+        extra = self._make_extra(**kwargs)
+        extra['low_value'] = True
+        self.logger.info(message, extra=extra)
+    
+    def get_stats(self) -> Dict[str, int]:
+        """비동기 기록 통계 (written / dropped / sampled_out)"""
+        return dict(self.writer.stats) if self.writer else {}
+    
     def _make_extra(self, **kwargs) -> Dict[str, Any]:
         """추가 필드 생성"""
         extra = {'service': self.service_name}
@@ -155,10 +365,11 @@ class DailyRotatingJSONLogger:
 _loggers = {}
 
 
-def get_logger(service_name: str, log_base_dir: str = "/logs") -> DailyRotatingJSONLogger:
+def get_logger(service_name: str, log_base_dir: str = "/logs",
+               async_mode: Optional[bool] = None) -> DailyRotatingJSONLogger:
     """로거 인스턴스 가져오기 (싱글톤)"""
     if service_name not in _loggers:
-        _loggers[service_name] = DailyRotatingJSONLogger(service_name, log_base_dir)
+        _loggers[service_name] = DailyRotatingJSONLogger(service_name, log_base_dir, async_mode)
     return _loggers[service_name]
 
 
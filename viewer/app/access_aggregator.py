@@ -0,0 +1,142 @@
+"""
+타일 접근 집계기
+Neuroglancer 타일 요청(GET /precomp/..., /precomputed/...)을 요청마다 로그로 남기지 않고
+(사용자, 볼륨, 분) 단위 카운터와 지연시간 히스토그램으로 모아 주기적으로 기록
+/viewer/app/access_aggregator.py
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+
+# 지연시간 히스토그램 경계 (ms), 마지막 버킷은 그 이상
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000)
+
+TILE_PATH_PREFIXES = ("/precomp/", "/precomputed/")
+
+
+def volume_from_path(path: str) -> Optional[str]:
+    """
+    타일 경로에서 볼륨 이름 추출
+    /precomp/{volume}/...            -> volume
+    /precomputed/{location}/{volume}/... -> location/volume
+    """
+    parts = path.strip("/").split("/")
+    if parts[0] == "precomp" and len(parts) >= 2:
+        return parts[1]
+    if parts[0] == "precomputed" and len(parts) >= 3:
+        return f"{parts[1]}/{parts[2]}"
+    return None
+
+
+class _Bucket:
+    """한 (사용자, 볼륨, 분) 구간의 집계"""
+
+    __slots__ = ("count", "total_ms", "max_ms", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, duration_ms: float):
+        self.count += 1
+        self.total_ms += duration_ms
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if duration_ms < bound:
+                self.histogram[i] += 1
+                return
+        self.histogram[-1] += 1
+
+
+class AccessAggregator:
+    """타일 접근 집계 및 주기적 기록"""
+
+    def __init__(self, logger, flush_interval: float = 60.0):
+        self.logger = logger
+        self.flush_interval = flush_interval
+        self._buckets: Dict[Tuple[str, str, int], _Bucket] = {}
+        self._lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def is_tile_path(path: str) -> bool:
+        return path.startswith(TILE_PATH_PREFIXES)
+
+    def record(self, user: Optional[str], path: str, duration_s: float, now: Optional[float] = None):
+        """성공한 타일 요청 1건 집계 (요청 경로에서 호출)"""
+        volume = volume_from_path(path) or "-"
+        minute = int((now if now is not None else time.time()) // 60) * 60
+        key = (user or "-", volume, minute)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket()
+            bucket.add(duration_s * 1000.0)
+
+    def start(self):
+        """주기적 기록 시작"""
+        if self.running:
+            return
+
+        self.running = True
+        self._stop_event.clear()
+        self.thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """중지 및 남은 집계 모두 기록"""
+        self.running = False
+        self._stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=5)
+            self.thread = None
+        self.flush(force=True)
+
+    def _flush_loop(self):
+        # stop() 이 이벤트를 설정하면 대기 중이라도 바로 종료
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"접근 집계 기록 오류: {e}")
+
+    def flush(self, force: bool = False) -> int:
+        """
+        완료된 분(minute) 구간을 로그로 기록
+        force=True 이면 진행 중인 구간까지 모두 기록
+        """
+        current_minute = int(time.time() // 60) * 60
+        with self._lock:
+            if force:
+                ready, self._buckets = self._buckets, {}
+            else:
+                ready = {k: v for k, v in self._buckets.items() if k[2] < current_minute}
+                for k in ready:
+                    del self._buckets[k]
+
+        for (user, volume, minute), bucket in sorted(ready.items(), key=lambda kv: kv[0][2]):
+            payload = {
+                "action": "view_image_summary",
+                "volume": volume,
+                "minute": datetime.fromtimestamp(minute).isoformat(),
+                "count": bucket.count,
+                "avg_ms": round(bucket.total_ms / bucket.count, 2),
+                "max_ms": round(bucket.max_ms, 2),
+                "latency_buckets_ms": list(LATENCY_BUCKETS_MS),
+                "latency_histogram": bucket.histogram,
+            }
+            if user != "-":
+                # 로그 조회 API 의 사용자 필터링 필드
+                payload["user"] = user
+                payload["LoginId"] = user
+            self.logger.info(payload)
+
+        return len(ready)
@@ -0,0 +1,288 @@
+"""
+로그 인덱스 (SQLite)
+/logs/YYYY/MM/DD.txt JSON 라인 로그를 증분 인덱싱하여
+사용자/레벨/시간 범위 조회를 전체 로그 스캔 없이 처리
+/viewer/app/log_index.py
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS LogFiles (
+    FileId INTEGER PRIMARY KEY AUTOINCREMENT,
+    Path   TEXT NOT NULL UNIQUE,
+    Offset INTEGER NOT NULL DEFAULT 0,
+    Size   INTEGER NOT NULL DEFAULT 0,
+    Mtime  REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS LogEntries (
+    EntryId INTEGER PRIMARY KEY AUTOINCREMENT,
+    FileId  INTEGER NOT NULL,
+    Offset  INTEGER NOT NULL,
+    Length  INTEGER NOT NULL,
+    Ts      TEXT NOT NULL,
+    User    TEXT,
+    Level   TEXT
+);
+
+CREATE INDEX IF NOT EXISTS IX_LogEntries_User_Ts ON LogEntries (User, Ts);
+CREATE INDEX IF NOT EXISTS IX_LogEntries_User_Level_Ts ON LogEntries (User, Level, Ts);
+CREATE INDEX IF NOT EXISTS IX_LogEntries_FileId ON LogEntries (FileId);
+"""
+
+# 한 번에 읽는 최대 바이트 (초기 백필 시 메모리 상한)
+READ_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def _entry_user(entry: Dict) -> Optional[str]:
+    """로그 라인의 사용자 필드 (기존 필터링과 동일한 우선순위)"""
+    return (
+        entry.get("user") or
+        entry.get("user_id") or
+        entry.get("LoginId") or
+        entry.get("login_id")
+    )
+
+
+class LogIndex:
+    """일별 JSON 로그 파일의 증분 인덱스"""
+
+    def __init__(self, log_dir: str, db_path: Path, refresh_interval: float = 5.0):
+        self.log_dir = Path(log_dir)
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.refresh_interval = refresh_interval
+
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """현재 스레드의 커넥션 (없으면 생성)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+        return conn
+
+    # ==========================================
+    # 백그라운드 인덱싱
+    # ==========================================
+
+    def start(self):
+        """백그라운드 인덱싱 시작"""
+        if self.running:
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """백그라운드 인덱싱 중지"""
+        self.running = False
+        if self.thread:
+            self.thread.join()
+
+    def _refresh_loop(self):
+        """주기적으로 새 로그 라인 인덱싱"""
+        while self.running:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"로그 인덱싱 오류: {e}")
+            time.sleep(self.refresh_interval)
+
+    # ==========================================
+    # 인덱싱
+    # ==========================================
+
+    def refresh(self) -> int:
+        """
+        마지막 인덱싱 이후 추가된 라인만 인덱싱
+        변경되지 않은 파일은 stat 한 번으로 건너뜀
+        """
+        if not self.log_dir.exists():
+            return 0
+
+        with self._refresh_lock:
+            conn = self._conn()
+            tracked = {
+                row[1]: row
+                for row in conn.execute("SELECT FileId, Path, Offset, Size, Mtime FROM LogFiles")
+            }
+
+            added = 0
+            for log_file in self.log_dir.glob("*/*/*.txt"):
+                try:
+                    st = log_file.stat()
+                except OSError:
+                    continue
+
+                key = str(log_file)
+                rec = tracked.get(key)
+                if rec and rec[3] == st.st_size and rec[4] == st.st_mtime:
+                    continue
+
+                added += self._index_file(conn, log_file, rec, st)
+
+            return added
+
+    def _index_file(self, conn: sqlite3.Connection, log_file: Path, rec, st) -> int:
+        """한 파일의 새 라인 인덱싱 (완결된 라인까지만)"""
+        if rec is None:
+            cur = conn.execute(
+                "INSERT INTO LogFiles (Path, Offset, Size, Mtime) VALUES (?, 0, 0, 0)",
+                (str(log_file),)
+            )
+            file_id, offset = cur.lastrowid, 0
+        else:
+            file_id, offset = rec[0], rec[2]
+            if st.st_size < offset:
+                # 파일이 잘리거나 새로 만들어짐 → 처음부터 다시 인덱싱
+                conn.execute("DELETE FROM LogEntries WHERE FileId = ?", (file_id,))
+                offset = 0
+
+        added = 0
+        with open(log_file, 'rb') as f:
+            f.seek(offset)
+            while True:
+                block = f.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+
+                end = block.rfind(b"\n")
+                if end < 0:
+                    # 아직 쓰는 중인 라인
+                    if len(block) < READ_BLOCK_SIZE:
+                        break
+                    # 블록보다 긴 라인은 건너뜀
+                    offset += len(block)
+                    continue
+
+                rows = []
+                pos = 0
+                for raw in block[:end + 1].split(b"\n")[:-1]:
+                    line_offset = offset + pos
+                    pos += len(raw) + 1
+                    line = raw.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(entry, dict):
+                        continue
+                    rows.append((
+                        file_id, line_offset, len(raw),
+                        str(entry.get("timestamp", "")),
+                        _entry_user(entry),
+                        entry.get("level"),
+                    ))
+
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO LogEntries (FileId, Offset, Length, Ts, User, Level) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                offset += end + 1
+                conn.execute(
+                    "UPDATE LogFiles SET Offset = ? WHERE FileId = ?",
+                    (offset, file_id)
+                )
+                conn.execute("COMMIT")
+                added += len(rows)
+
+                f.seek(offset)
+
+        # 완결되지 않은 마지막 라인이 있으면 Size 를 맞추지 않아 다음에 다시 확인
+        size = st.st_size if offset == st.st_size else -1
+        conn.execute(
+            "UPDATE LogFiles SET Offset = ?, Size = ?, Mtime = ? WHERE FileId = ?",
+            (offset, size, st.st_mtime, file_id)
+        )
+        return added
+
+    # ==========================================
+    # 조회
+    # ==========================================
+
+    def query(
+        self,
+        user: str,
+        skip: int = 0,
+        limit: int = 100,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        level: Optional[str] = None,
+    ) -> Tuple[List[Dict], int]:
+        """
+        사용자 로그 조회 (최신순)
+        인덱스로 해당 페이지의 위치만 찾고, 로그 파일에서는 그 라인만 읽음
+        """
+        where = ["User = ?"]
+        params: list = [user]
+        if level:
+            where.append("Level = ?")
+            params.append(level)
+        if start_date:
+            where.append("Ts >= ?")
+            params.append(start_date.isoformat())
+        if end_date:
+            where.append("Ts < ?")
+            params.append((end_date + timedelta(days=1)).strftime("%Y-%m-%d"))
+        where_sql = " AND ".join(where)
+
+        conn = self._conn()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM LogEntries WHERE {where_sql}", params
+        ).fetchone()[0]
+
+        rows = conn.execute(
+            f"SELECT f.Path, e.Offset, e.Length FROM LogEntries e "
+            f"JOIN LogFiles f ON f.FileId = e.FileId "
+            f"WHERE {where_sql} ORDER BY e.Ts DESC, e.EntryId DESC LIMIT ? OFFSET ?",
+            [*params, limit, skip]
+        ).fetchall()
+
+        return self._read_entries(rows), total
+
+    @staticmethod
+    def _read_entries(rows) -> List[Dict]:
+        """(경로, 오프셋, 길이) 목록의 라인만 읽어서 파싱"""
+        entries = []
+        handles = {}
+        try:
+            for path, offset, length in rows:
+                f = handles.get(path)
+                if f is None:
+                    try:
+                        f = handles[path] = open(path, 'rb')
+                    except OSError:
+                        continue
+                f.seek(offset)
+                try:
+                    entries.append(json.loads(f.read(length)))
+                except ValueError:
+                    continue
+        finally:
+            for f in handles.values():
+                f.close()
+        return entries
@@ -1,6 +1,6 @@
 """
 ATI Lab 2025 - Neuroglancer Unified Viewer
-JSON-based Authentication (MySQL 제거, 기존 API 형식 유지)
+SQLite(WAL) 기반 사용자/북마크 저장소 (MySQL 제거, 기존 API 형식 유지)
 /viewer/app/main.py
 """
 
@@ -31,12 +31,19 @@ from pydantic import BaseModel
 # 로깅 설정
 from shared_logging import (
     get_logger,
+    log_access,
     set_current_user,
     clear_current_user
 )
+from sqlite_store import SQLiteStore
+from log_index import LogIndex
+from access_aggregator import AccessAggregator
 
 logger = get_logger("viewer", "/logs")
 
+# 타일 요청은 (사용자, 볼륨, 분) 단위로 집계하여 기록
+access_aggregator = AccessAggregator(logger, flush_interval=60)
+
 print("🔥🔥🔥 JSON-based Authentication - 기존 API 형식 유지 🔥🔥🔥")
 
 # ==========================================
@@ -71,6 +78,8 @@ DATA_DIR = "/viewer/data"
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
 USERS_FILE = Path(DATA_DIR) / "users.json"
 BOOKMARKS_FILE = Path(DATA_DIR) / "bookmarks.json"
+DB_FILE = Path(os.getenv("VIEWER_DB_FILE", str(Path(DATA_DIR) / "viewer.db")))
+LOG_INDEX_FILE = Path(DATA_DIR) / "log_index.db"
 
 # JWT 설정
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-this-in-production")
@@ -106,38 +115,18 @@ logger.info(f"✅ Available locations: {list(RAW_UPLOAD_DIRS.keys())}")
 logger.info("=" * 80)
 
 # ==========================================
-# 3. JSON 파일 관리 함수
+# 3. 사용자/북마크 저장소 (SQLite WAL)
 # ==========================================
 
-def load_users() -> Dict:
-    """사용자 데이터 로드"""
-    if not USERS_FILE.exists():
-        return {}
-    try:
-        with open(USERS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {}
-
-def save_users(users: Dict):
-    """사용자 데이터 저장"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, indent=2, ensure_ascii=False)
-
-def load_bookmarks() -> Dict:
-    """북마크 데이터 로드"""
-    if not BOOKMARKS_FILE.exists():
-        return {}
-    try:
-        with open(BOOKMARKS_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except:
-        return {}
+store = SQLiteStore(DB_FILE)
+
+# 기존 JSON 데이터는 테이블이 비어 있을 때 한 번만 가져옴
+_imported = store.import_json(USERS_FILE, BOOKMARKS_FILE)
+if _imported["users"] or _imported["bookmarks"]:
+    logger.info(f"📥 Imported from JSON: {_imported['users']} users, {_imported['bookmarks']} bookmarks")
 
-def save_bookmarks(bookmarks: Dict):
-    """북마크 데이터 저장"""
-    with open(BOOKMARKS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(bookmarks, f, indent=2, ensure_ascii=False)
+# 로그 조회용 인덱스 (백그라운드에서 새 라인만 증분 인덱싱)
+log_index = LogIndex(LOG_DIR, LOG_INDEX_FILE)
 
 # ==========================================
 # 4. 인증 관련 함수
@@ -168,11 +157,11 @@ def get_current_user_from_token(credentials: HTTPAuthorizationCredentials = Depe
         if login_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
         
-        users = load_users()
-        if login_id not in users:
+        user = store.get_user(login_id)
+        if user is None:
             raise HTTPException(status_code=401, detail="User not found")
         
-        return users[login_id]
+        return user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.JWTError:
@@ -215,7 +204,11 @@ class AuthAndLoggingMiddleware(BaseHTTPMiddleware):
         response = await call_next(request)
         process_time = time.time() - start_time
 
-        if request.method == "GET" and not path.startswith(("/api/health", "/favicon.ico", "/manifest.json", "/static")):
+        if (request.method == "GET" and response.status_code < 400
+                and access_aggregator.is_tile_path(path)):
+            # 성공한 타일 요청은 집계만 (에러는 아래에서 개별 기록)
+            access_aggregator.record(login_id_str, path, process_time)
+        elif request.method == "GET" and not path.startswith(("/api/health", "/favicon.ico", "/manifest.json", "/static")):
             log_payload = {
                 "action": "view_image", "path": path, "method": request.method,
                 "status": response.status_code, "duration": round(process_time, 4)
@@ -225,7 +218,8 @@ class AuthAndLoggingMiddleware(BaseHTTPMiddleware):
             elif response.status_code >= 400:
                 logger.warning(log_payload)
             else:
-                logger.info(log_payload)
+                # 성공한 조회는 부하 시 샘플링
+                log_access(logger, log_payload)
 
         # ✅ 사용자 컨텍스트 클리어
         clear_current_user()
@@ -365,13 +359,11 @@ def login(
     password: str = Form(...)
 ):
     """로그인 - Form 데이터로 받기"""
-    users = load_users()
+    user = store.get_user(username)
     
-    if username not in users:
+    if user is None:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user = users[username]
-    
     if not verify_password(password, user["PasswordHash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
@@ -389,12 +381,6 @@ def login(
 @app.post("/api/v1/auth/signup")
 def signup(request: SignupRequest):
     """회원가입"""
-    users = load_users()
-    
-    # 중복 확인
-    if request.LoginId in users:
-        raise HTTPException(status_code=400, detail="User already exists")
-    
     # 새 사용자 생성
     new_user = {
         "LoginId": request.LoginId,
@@ -405,8 +391,9 @@ def signup(request: SignupRequest):
         "UpdatedAt": datetime.now().isoformat()
     }
     
-    users[request.LoginId] = new_user
-    save_users(users)
+    # 중복 확인 (INSERT OR IGNORE 로 원자적으로 처리)
+    if not store.create_user(new_user):
+        raise HTTPException(status_code=400, detail="User already exists")
     
     logger.info(f"✅ New user registered: {request.LoginId}")
     
@@ -538,8 +525,7 @@ def list_raw_uploads(
 @app.get("/api/v1/bookmarks")
 def list_bookmarks(current_user: Dict = Depends(get_current_user_from_token)):
     """북마크 목록"""
-    bookmarks = load_bookmarks()
-    user_bookmarks = bookmarks.get(current_user["LoginId"], [])
+    user_bookmarks = store.list_bookmarks(current_user["LoginId"])
     return {"bookmarks": user_bookmarks}
 
 @app.post("/api/v1/bookmarks")
@@ -548,21 +534,12 @@ def create_bookmark(
     current_user: Dict = Depends(get_current_user_from_token)
 ):
     """북마크 생성"""
-    bookmarks = load_bookmarks()
-    
-    if current_user["LoginId"] not in bookmarks:
-        bookmarks[current_user["LoginId"]] = []
-    
-    new_bookmark = {
-        "id": len(bookmarks[current_user["LoginId"]]) + 1,
-        "volume_name": bookmark.volume_name,
-        "location": bookmark.location,
-        "note": bookmark.note,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    bookmarks[current_user["LoginId"]].append(new_bookmark)
-    save_bookmarks(bookmarks)
+    new_bookmark = store.create_bookmark(
+        current_user["LoginId"],
+        volume_name=bookmark.volume_name,
+        location=bookmark.location,
+        note=bookmark.note
+    )
     
     logger.info(f"📌 User {current_user['LoginId']} created bookmark: {bookmark.volume_name}")
     return new_bookmark
@@ -573,14 +550,8 @@ def delete_bookmark(
     current_user: Dict = Depends(get_current_user_from_token)
 ):
     """북마크 삭제"""
-    bookmarks = load_bookmarks()
-    
-    if current_user["LoginId"] not in bookmarks:
-        raise HTTPException(status_code=404, detail="No bookmarks found")
-    
-    user_bookmarks = bookmarks[current_user["LoginId"]]
-    bookmarks[current_user["LoginId"]] = [b for b in user_bookmarks if b["id"] != bookmark_id]
-    save_bookmarks(bookmarks)
+    if not store.delete_bookmark(current_user["LoginId"], bookmark_id):
+        raise HTTPException(status_code=404, detail="Bookmark not found")
     
     logger.info(f"🗑️ User {current_user['LoginId']} deleted bookmark: {bookmark_id}")
     return {"message": "Bookmark deleted"}
@@ -645,6 +616,11 @@ def clean_memory(current_user: Dict = Depends(get_current_user_from_token)):
 from fastapi import File, UploadFile
 import aiofiles
 from precomputed_writer import convert_image_file_to_precomputed
+from chunk_store import ChunkStore
+
+# 청크 중복 제거 (TMP_UPLOADS/.chunks 블롭 저장소에 하드링크)
+CHUNK_DEDUP = os.getenv("CHUNK_DEDUP", "0") == "1"
+upload_chunk_store = ChunkStore(TMP_UPLOADS) if CHUNK_DEDUP else None
 
 @app.post("/api/v1/upload")
 async def upload_file(
@@ -698,7 +674,8 @@ async def upload_file(
             input_path=str(temp_file_path),
             output_path=str(volume_path),
             chunk_size=512,
-            encoding="raw"
+            encoding="raw",
+            store=upload_chunk_store
         )
         
         logger.info(f"✅ Conversion completed: {volume_name} ({chunk_count} chunks created)")
@@ -766,14 +743,13 @@ def get_my_image_logs(
 ):
     """
     현재 사용자의 이미지 처리 로그 조회
-    로그 파일에서 해당 사용자의 로그만 필터링하여 반환
+    로그 인덱스에서 해당 페이지의 라인 위치만 찾아 읽음
     """
     log_base = Path(LOG_DIR)
     if not log_base.exists():
         return {"logs": [], "total": 0}
     
     login_id = current_user["LoginId"]
-    logs = []
     
     try:
         # 날짜 범위 파싱
@@ -789,69 +765,17 @@ def get_my_image_logs(
         if end_date:
             try:
                 end_dt = datetime.strptime(end_date, "%Y-%m-%d")
-                end_dt = end_dt.replace(hour=23, minute=59, second=59)
             except:
                 pass
         
-        # 로그 파일 읽기
-        for year_dir in sorted(log_base.iterdir(), reverse=True):
-            if not year_dir.is_dir():
-                continue
-            
-            for month_dir in sorted(year_dir.iterdir(), reverse=True):
-                if not month_dir.is_dir():
-                    continue
-                
-                for log_file in sorted(month_dir.glob("*.txt"), reverse=True):
-                    try:
-                        with open(log_file, 'r', encoding='utf-8') as f:
-                            for line in f:
-                                line = line.strip()
-                                if not line:
-                                    continue
-                                
-                                try:
-                                    log_entry = json.loads(line)
-                                    
-                                    # 사용자 필터링 - 여러 필드 확인
-                                    log_user = (
-                                        log_entry.get("user") or 
-                                        log_entry.get("user_id") or 
-                                        log_entry.get("LoginId") or 
-                                        log_entry.get("login_id")
-                                    )
-                                    
-                                    if log_user != login_id:
-                                        continue
-                                    
-                                    # 날짜 필터링
-                                    if start_dt or end_dt:
-                                        timestamp_str = log_entry.get("timestamp")
-                                        if timestamp_str:
-                                            try:
-                                                log_dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                                                if start_dt and log_dt < start_dt:
-                                                    continue
-                                                if end_dt and log_dt > end_dt:
-                                                    continue
-                                            except:
-                                                pass
-                                    
-                                    # 레벨 필터링
-                                    if level and log_entry.get("level") != level:
-                                        continue
-                                    
-                                    logs.append(log_entry)
-                                    
-                                except json.JSONDecodeError:
-                                    continue
-                    except Exception as e:
-                        logger.error(f"Error reading log file {log_file}: {e}")
-                        continue
-        
-        # 페이지네이션
-        total = len(logs)
-        logs = logs[skip:skip + limit]
+        logs, total = log_index.query(
+            login_id,
+            skip=skip,
+            limit=limit,
+            start_date=start_dt,
+            end_date=end_dt,
+            level=level
+        )
         
         return {
             "logs": logs,
@@ -997,24 +921,28 @@ for location, path in RAW_UPLOAD_DIRS.items():
 async def startup_event():
     logger.info("🚀 Application Starting...")
     
+    # 로그 인덱스 백그라운드 갱신 시작
+    log_index.start()
+    
+    # 타일 접근 집계 주기적 기록 시작
+    access_aggregator.start()
+    
     # 기본 관리자 계정 생성
-    users = load_users()
-    if "admin" not in users:
-        users["admin"] = {
+    if store.get_user("admin") is None:
+        store.create_user({
             "LoginId": "admin",
             "UserName": "Administrator",
             "PasswordHash": get_password_hash("admin1234"),
             "Role": "admin",
             "CreatedAt": datetime.now().isoformat(),
             "UpdatedAt": datetime.now().isoformat()
-        }
-        save_users(users)
+        })
         logger.info("✅ Default admin account created: admin / admin1234")
-    
-    # 북마크 파일 초기화
-    if not BOOKMARKS_FILE.exists():
-        save_bookmarks({})
-        logger.info("✅ Bookmarks file initialized")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # 남은 타일 접근 집계 기록
+    access_aggregator.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,6 +1,7 @@
 """
 CloudVolume 없이 직접 Precomputed 형식으로 저장하는 유틸리티
 """
+import io
 import os
 import json
 import warnings
@@ -11,6 +12,8 @@ from PIL import Image, ImageFile
 import tifffile as tiff
 import zarr
 
+from volume_manifest import ManifestBuilder
+
 # Pillow 폭탄가드 완전 해제
 Image.MAX_IMAGE_PIXELS = None
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -45,24 +48,47 @@ def np_dtype_to_str(dtype_like):
 
 
 # ---------- 저장 함수 ----------
-def save_chunk_raw(tile_hwc_or_hw: np.ndarray, out_path: str):
+def save_chunk_raw(tile_hwc_or_hw: np.ndarray, out_path: str, store=None, builder=None):
     tile = tile_hwc_or_hw
     if tile.ndim == 2:
         tile = tile[:, :, None]
 
     tile_cyx = np.transpose(tile, (2, 0, 1)).copy(order="C")
+    data = tile_cyx.tobytes(order="C")
+    if builder is not None:
+        builder.add(out_path, data)
+    if store is not None:
+        # 청크 저장소: 같은 내용의 청크는 블롭 하나를 공유 (하드링크)
+        store.put_bytes(data, out_path)
+        return
     with open(out_path, "wb") as f:
-        f.write(tile_cyx.tobytes(order="C"))
+        f.write(data)
 
 
-def save_chunk_png(tile_whc, out_path):
+def _save_png(img, out_path, store=None, builder=None):
+    if store is None and builder is None:
+        img.save(out_path, format='PNG', compress_level=0)
+        return
+    buf = io.BytesIO()
+    img.save(buf, format='PNG', compress_level=0)
+    data = buf.getvalue()
+    if builder is not None:
+        builder.add(out_path, data)
+    if store is not None:
+        store.put_bytes(data, out_path)
+        return
+    with open(out_path, "wb") as f:
+        f.write(data)
+
+
+def save_chunk_png(tile_whc, out_path, store=None, builder=None):
     if tile_whc.ndim == 2:
         arr = tile_whc
         if arr.dtype == np.uint16:
             img = Image.fromarray(arr)
         else:
             img = Image.fromarray(arr.astype(np.uint8), mode='L')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     H, W, C = tile_whc.shape
@@ -72,7 +98,7 @@ def save_chunk_png(tile_whc, out_path):
             img = Image.fromarray(ch)
         else:
             img = Image.fromarray(ch.astype(np.uint8), mode='L')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     if C == 3:
@@ -81,14 +107,15 @@ def save_chunk_png(tile_whc, out_path):
             img = Image.fromarray(down, mode='RGB')
         else:
             img = Image.fromarray(tile_whc.astype(np.uint8), mode='RGB')
-        img.save(out_path, format='PNG', compress_level=0)
+        _save_png(img, out_path, store, builder)
         return
 
     raise ValueError(f"지원하지 않는 채널 수: {C}")
 
 
 # ---------- 공통 타일 루프 ----------
-def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding="raw"):
+def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding="raw", store=None,
+                                 manifest=True):
     if arr_hwc.ndim == 2:
         H, W = arr_hwc.shape
         C = 1
@@ -113,6 +140,7 @@ def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding=
         json.dump(info, f, indent=2)
     with open(os.path.join(volume_path, "provenance"), "w") as f:
         json.dump({"sources": []}, f, indent=2)
+    builder = ManifestBuilder(volume_path) if manifest else None
 
     for y0 in range(0, H, chunk_size):
         y1 = min(H, y0 + chunk_size)
@@ -124,16 +152,19 @@ def write_precomputed_from_array(arr_hwc, volume_path, chunk_size=512, encoding=
             out_path = os.path.join(scale_dir, fname)
 
             if encoding == "raw":
-                save_chunk_raw(tile, out_path)
+                save_chunk_raw(tile, out_path, store, builder)
             elif encoding == "png":
-                save_chunk_png(tile, out_path)
+                save_chunk_png(tile, out_path, store, builder)
             else:
                 raise ValueError("encoding은 'raw' 또는 'png'만 지원")
+    if builder is not None:
+        builder.write()
     return 0
 
 
 # ---------- 파일 단위 변환 ----------
-def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, encoding="raw", chunk_z=1):
+def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, encoding="raw", chunk_z=1,
+                                      store=None, manifest=True):
     ext = Path(input_path).suffix.lower()
 
     # TIFF 처리
@@ -160,6 +191,7 @@ def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, e
                 json.dump(info, f, indent=2)
             with open(os.path.join(output_path, "provenance"), "w") as f:
                 json.dump({"sources": [Path(input_path).name]}, f, indent=2)
+            builder = ManifestBuilder(output_path) if manifest else None
 
             total = 0
             for y0 in range(0, H, chunk_size):
@@ -177,14 +209,17 @@ def convert_image_file_to_precomputed(input_path, output_path, chunk_size=512, e
                     out_path = os.path.join(scale_dir, fname)
 
                     if encoding == "raw":
-                        save_chunk_raw(tile_np, out_path)
+                        save_chunk_raw(tile_np, out_path, store, builder)
                     else:
-                        save_chunk_png(tile_np, out_path)
+                        save_chunk_png(tile_np, out_path, store, builder)
                     total += 1
+            if builder is not None:
+                builder.write()
             return total
 
     # 일반 이미지 (PNG, JPG) 처리
     with Image.open(input_path) as img:
         arr = np.array(img)
 
-    return write_precomputed_from_array(arr, output_path, chunk_size=chunk_size, encoding=encoding)
\ No newline at end of file
+    return write_precomputed_from_array(arr, output_path, chunk_size=chunk_size, encoding=encoding,
+                                        store=store, manifest=manifest)
\ No newline at end of file
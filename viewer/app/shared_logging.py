@@ -1,11 +1,20 @@
 import logging
 import json
 import os
-from datetime import datetime
+import queue
+import time
+import atexit
+from datetime import datetime, timedelta
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
 from typing import Optional, List, Dict, Union
 from contextvars import ContextVar
 
+try:
+    import orjson
+except ImportError:  # orjson 미설치 시 표준 json 사용
+    orjson = None
+
 # ✅ 현재 사용자 LoginId를 저장하는 context variable
 current_user_context: ContextVar[Optional[str]] = ContextVar('current_user', default=None)
 
@@ -49,24 +58,179 @@ class JsonFormatter(logging.Formatter):
             log_record["message"] = record.getMessage()
 
         # ✅ [수정] 저장 시 호환성을 위해 user_id와 LoginId 모두 저장
-        login_id = get_current_user()
+        # 비동기 모드에서는 큐에 넣을 때 캡처한 값을 사용
+        login_id = getattr(record, "login_id", None) or get_current_user()
         if login_id:
             log_record["user"] = login_id  # API 필터링용 표준 필드
             log_record["user_id"] = login_id  # 프론트엔드/필터링 표준
             log_record["LoginId"] = login_id  # 레거시 호환
             log_record["login_id"] = login_id  # 추가 안전장치
 
-        return json.dumps(log_record, ensure_ascii=False)
+        if orjson is not None:
+            return orjson.dumps(log_record, default=str).decode('utf-8')
+        return json.dumps(log_record, ensure_ascii=False, default=str)
 
 
-def get_logger(service_name: str = "viewer", log_dir: str = "/logs"):
-    log_dir_path = Path(log_dir)
-    log_dir_path.mkdir(parents=True, exist_ok=True)
+def _daily_log_file(log_dir_path: Path, ts: float) -> Path:
+    day = datetime.fromtimestamp(ts)
+    return log_dir_path / str(day.year) / f"{day.month:02d}" / f"{day.day:02d}.txt"
+
+
+class DailyFileHandler(logging.FileHandler):
+    """
+    YYYY/MM/DD.txt 파일 핸들러
+    다음 자정 시각을 미리 계산해 두고 record.created 와 비교하여 교체
+    """
+
+    def __init__(self, log_dir_path: Path):
+        self.log_dir_path = log_dir_path
+        now = datetime.now().timestamp()
+        log_file = _daily_log_file(log_dir_path, now)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        super().__init__(log_file, encoding='utf-8')
+        self.next_rollover = self._next_midnight(now)
+
+    @staticmethod
+    def _next_midnight(ts: float) -> float:
+        next_day = datetime.fromtimestamp(ts).date() + timedelta(days=1)
+        return datetime.combine(next_day, datetime.min.time()).timestamp()
+
+    def _rollover(self, ts: float):
+        log_file = _daily_log_file(self.log_dir_path, ts)
+        log_file.parent.mkdir(parents=True, exist_ok=True)
+        self.close()
+        self.baseFilename = os.fspath(log_file.absolute())
+        self.stream = None  # 다음 기록 시 새 파일 열기
+        self.next_rollover = self._next_midnight(ts)
+
+    def emit(self, record):
+        if record.created >= self.next_rollover:
+            self._rollover(record.created)
+        super().emit(record)
+
+    def emit_batch(self, records: List[logging.LogRecord]):
+        """레코드 묶음을 포맷한 뒤 한 번의 write/flush 로 기록 (날짜가 바뀌면 파일 교체)"""
+        lines: List[str] = []
+        for record in records:
+            if record.created >= self.next_rollover:
+                self._write_lines(lines)
+                lines = []
+                self._rollover(record.created)
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        self._write_lines(lines)
+
+    def _write_lines(self, lines: List[str]):
+        if not lines:
+            return
+        self.acquire()
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.terminator.join(lines) + self.terminator)
+            self.stream.flush()
+        finally:
+            self.release()
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    요청 경로에서는 큐에 넣기만 하는 핸들러
+    - 사용자 컨텍스트는 요청 중에만 유효하므로 넣기 전에 캡처
+    - 포맷팅은 리스너 스레드에서 수행
+    - 큐가 가득 차면 레코드를 버림 (요청을 막지 않음)
+    - 큐가 sample_threshold 이상 차면 접근 로그(low_value)는 sample_rate 개 중 1개만 기록
+    """
+
+    def __init__(self, log_queue: queue.Queue, sample_threshold: float = 0.5, sample_rate: int = 10):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.sampled_out = 0
+        self.sample_watermark = int(log_queue.maxsize * sample_threshold) if log_queue.maxsize > 0 else None
+        self.sample_rate = max(1, sample_rate)
+        self._sample_counter = 0
+
+    def prepare(self, record):
+        record.login_id = get_current_user()
+        return record
+
+    def enqueue(self, record):
+        if (getattr(record, "low_value", False) and self.sample_watermark is not None
+                and self.queue.qsize() >= self.sample_watermark):
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.sampled_out += 1
+                return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
 
-    now = datetime.now()
-    log_file = log_dir_path / str(now.year) / f"{now.month:02d}" / f"{now.day:02d}.txt"
 
-    log_file.parent.mkdir(parents=True, exist_ok=True)
+class BatchQueueListener(QueueListener):
+    """
+    큐를 배치 단위로 비우는 리스너
+    - 파일: 배치마다 한 번 write/flush (DailyFileHandler.emit_batch)
+    - 콘솔: 레코드별로 기존 핸들러 처리
+    - 버려진 레코드가 있으면 배치 뒤에 요약 한 줄 기록
+    """
+
+    def __init__(self, log_queue: queue.Queue, file_handler: DailyFileHandler,
+                 console_handler: logging.Handler, queue_handler: ContextQueueHandler,
+                 batch_size: int = 512):
+        super().__init__(log_queue, console_handler, respect_handler_level=True)
+        self.file_handler = file_handler
+        self.queue_handler = queue_handler
+        self.batch_size = batch_size
+        self._reported_dropped = 0
+
+    def _monitor(self):
+        q = self.queue
+        has_task_done = hasattr(q, "task_done")
+        stopping = False
+        while not stopping:
+            batch = []
+            record = self.dequeue(True)
+            while True:
+                if has_task_done:
+                    q.task_done()
+                if record is self._sentinel:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.dequeue(False)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    print(f"로그 기록 오류: {e}")
+
+    def _write_batch(self, batch: List[logging.LogRecord]):
+        dropped = self.queue_handler.dropped
+        if dropped > self._reported_dropped:
+            batch.append(logging.makeLogRecord({
+                "msg": {"message": "Log records dropped under load",
+                        "dropped": dropped - self._reported_dropped},
+                "levelname": "WARNING",
+                "levelno": logging.WARNING,
+                "created": time.time(),
+            }))
+            self._reported_dropped = dropped
+        self.file_handler.emit_batch(batch)
+        for record in batch:
+            self.handle(record)
+
+
+def get_logger(service_name: str = "viewer", log_dir: str = "/logs", async_mode: Optional[bool] = None):
+    log_dir_path = Path(log_dir)
+    log_dir_path.mkdir(parents=True, exist_ok=True)
 
     logger = logging.getLogger(service_name)
     logger.setLevel(logging.INFO)
@@ -74,17 +238,35 @@ def get_logger(service_name: str = "viewer", log_dir: str = "/logs"):
     if logger.handlers:
         return logger
 
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler = DailyFileHandler(log_dir_path)
     file_handler.setFormatter(JsonFormatter())
-    logger.addHandler(file_handler)
 
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(logging.Formatter('%(levelname)s: %(message)s'))
-    logger.addHandler(console_handler)
+
+    if async_mode is None:
+        async_mode = os.getenv("LOG_ASYNC", "1").lower() not in ("0", "false", "no")
+
+    if async_mode:
+        # 파일/콘솔 기록은 리스너 스레드에서 배치로 처리
+        log_queue = queue.Queue(maxsize=10000)
+        queue_handler = ContextQueueHandler(log_queue)
+        logger.addHandler(queue_handler)
+        listener = BatchQueueListener(log_queue, file_handler, console_handler, queue_handler)
+        listener.start()
+        atexit.register(listener.stop)
+    else:
+        logger.addHandler(file_handler)
+        logger.addHandler(console_handler)
 
     return logger
 
 
+def log_access(logger: logging.Logger, message):
+    """INFO 레벨 접근 로그 (비동기 모드에서 부하 시 샘플링 대상)"""
+    logger.info(message, extra={"low_value": True})
+
+
 def parse_log_file(log_file_path: Path) -> List[Dict]:
     logs = []
     if not log_file_path.exists():
@@ -0,0 +1,219 @@
+"""
+SQLite 기반 사용자/북마크 저장소
+- WAL 모드로 읽기와 쓰기가 서로 막지 않음
+- 트랜잭션 단위 INSERT/DELETE (전체 파일 재작성 없음)
+- 기존 users.json / bookmarks.json 은 최초 실행 시 한 번만 가져옴
+/viewer/app/sqlite_store.py
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Users (
+    LoginId      TEXT PRIMARY KEY,
+    UserName     TEXT NOT NULL,
+    PasswordHash TEXT NOT NULL,
+    Role         TEXT NOT NULL DEFAULT 'user',
+    CreatedAt    TEXT NOT NULL,
+    UpdatedAt    TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS Bookmarks (
+    BookmarkId INTEGER PRIMARY KEY AUTOINCREMENT,
+    LoginId    TEXT NOT NULL,
+    VolumeName TEXT NOT NULL,
+    Location   TEXT NOT NULL,
+    Note       TEXT,
+    CreatedAt  TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS IX_Bookmarks_LoginId ON Bookmarks (LoginId, BookmarkId);
+"""
+
+
+class SQLiteStore:
+    """사용자/북마크 저장소 (스레드별 커넥션)"""
+
+    def __init__(self, db_path: Path, busy_timeout_ms: int = 5000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        """현재 스레드의 커넥션 (없으면 생성)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: 트랜잭션은 BEGIN IMMEDIATE 로 직접 관리
+            conn = sqlite3.connect(str(self.db_path), isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """현재 스레드의 커넥션 닫기"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ==========================================
+    # 사용자
+    # ==========================================
+
+    def get_user(self, login_id: str) -> Optional[Dict]:
+        """LoginId 로 사용자 조회"""
+        row = self._conn().execute(
+            "SELECT LoginId, UserName, PasswordHash, Role, CreatedAt, UpdatedAt "
+            "FROM Users WHERE LoginId = ?",
+            (login_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def create_user(self, user: Dict) -> bool:
+        """사용자 생성 - 이미 존재하면 False"""
+        cur = self._conn().execute(
+            "INSERT OR IGNORE INTO Users (LoginId, UserName, PasswordHash, Role, CreatedAt, UpdatedAt) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                user["LoginId"],
+                user["UserName"],
+                user["PasswordHash"],
+                user.get("Role", "user"),
+                user.get("CreatedAt") or datetime.now().isoformat(),
+                user.get("UpdatedAt") or datetime.now().isoformat(),
+            )
+        )
+        return cur.rowcount == 1
+
+    def count_users(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM Users").fetchone()[0]
+
+    # ==========================================
+    # 북마크
+    # ==========================================
+
+    @staticmethod
+    def _bookmark_to_dict(row: sqlite3.Row) -> Dict:
+        """기존 JSON API 형식으로 변환"""
+        return {
+            "id": row["BookmarkId"],
+            "volume_name": row["VolumeName"],
+            "location": row["Location"],
+            "note": row["Note"],
+            "created_at": row["CreatedAt"],
+        }
+
+    def list_bookmarks(self, login_id: str) -> List[Dict]:
+        """사용자의 북마크 목록 (생성 순)"""
+        rows = self._conn().execute(
+            "SELECT BookmarkId, VolumeName, Location, Note, CreatedAt "
+            "FROM Bookmarks WHERE LoginId = ? ORDER BY BookmarkId",
+            (login_id,)
+        ).fetchall()
+        return [self._bookmark_to_dict(r) for r in rows]
+
+    def create_bookmark(self, login_id: str, volume_name: str, location: str,
+                        note: Optional[str] = None) -> Dict:
+        """북마크 생성 - id 는 AUTOINCREMENT 로 삭제 후에도 재사용되지 않음"""
+        created_at = datetime.now().isoformat()
+        cur = self._conn().execute(
+            "INSERT INTO Bookmarks (LoginId, VolumeName, Location, Note, CreatedAt) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (login_id, volume_name, location, note, created_at)
+        )
+        return {
+            "id": cur.lastrowid,
+            "volume_name": volume_name,
+            "location": location,
+            "note": note,
+            "created_at": created_at,
+        }
+
+    def delete_bookmark(self, login_id: str, bookmark_id: int) -> bool:
+        """북마크 삭제 - 본인 소유가 아니거나 없으면 False"""
+        cur = self._conn().execute(
+            "DELETE FROM Bookmarks WHERE BookmarkId = ? AND LoginId = ?",
+            (bookmark_id, login_id)
+        )
+        return cur.rowcount > 0
+
+    # ==========================================
+    # JSON 마이그레이션
+    # ==========================================
+
+    def import_json(self, users_file: Path, bookmarks_file: Path) -> Dict[str, int]:
+        """
+        기존 JSON 파일 가져오기
+        테이블이 비어 있을 때만 가져오므로 여러 번 호출해도 안전합니다.
+        """
+        imported = {"users": 0, "bookmarks": 0}
+        conn = self._conn()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            has_users = conn.execute("SELECT 1 FROM Users LIMIT 1").fetchone()
+            if not has_users:
+                for user in _read_json(users_file).values():
+                    conn.execute(
+                        "INSERT OR IGNORE INTO Users "
+                        "(LoginId, UserName, PasswordHash, Role, CreatedAt, UpdatedAt) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (
+                            user["LoginId"],
+                            user.get("UserName", user["LoginId"]),
+                            user["PasswordHash"],
+                            user.get("Role", "user"),
+                            user.get("CreatedAt") or datetime.now().isoformat(),
+                            user.get("UpdatedAt") or datetime.now().isoformat(),
+                        )
+                    )
+                    imported["users"] += 1
+
+            has_bookmarks = conn.execute("SELECT 1 FROM Bookmarks LIMIT 1").fetchone()
+            if not has_bookmarks:
+                for login_id, items in _read_json(bookmarks_file).items():
+                    for b in items:
+                        conn.execute(
+                            "INSERT INTO Bookmarks (LoginId, VolumeName, Location, Note, CreatedAt) "
+                            "VALUES (?, ?, ?, ?, ?)",
+                            (
+                                login_id,
+                                b.get("volume_name", ""),
+                                b.get("location", ""),
+                                b.get("note"),
+                                b.get("created_at") or datetime.now().isoformat(),
+                            )
+                        )
+                        imported["bookmarks"] += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        return imported
+
+
+def _read_json(path: Path) -> Dict:
+    """JSON 파일 읽기 (없거나 깨져 있으면 빈 dict)"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            return json.load(f) or {}
+    except Exception:
+        return {}
@@ -0,0 +1,221 @@
+"""
+볼륨 체크섬 매니페스트
+- {volume}/manifest.json: 파일별 (크기, 해시) 목록
+- 변환 시 청크를 쓰면서 같이 계산 (메모리에 있는 바이트를 해시하므로 추가 읽기 없음)
+- 검증은 스레드 풀로 병렬 해시 후 매니페스트와 비교
+- 해시: xxh3-128 (xxhash 설치 시), 없으면 blake2b-128
+
+CLI:
+    python volume_manifest.py build  <volume_dir>
+    python volume_manifest.py verify <volume_dir>
+"""
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+try:
+    import xxhash
+except ImportError:  # xxhash 미설치 시 blake2b 사용
+    xxhash = None
+
+
+MANIFEST_NAME = "manifest.json"
+HASH_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_ALGORITHM = "xxh3_128" if xxhash is not None else "blake2b_128"
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 4) * 2)
+
+
+def new_hasher(algorithm: str = DEFAULT_ALGORITHM):
+    if algorithm == "xxh3_128":
+        if xxhash is None:
+            raise RuntimeError("xxhash 모듈이 필요합니다 (pip install xxhash)")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b_128":
+        return hashlib.blake2b(digest_size=16)
+    raise ValueError(f"지원하지 않는 해시: {algorithm}")
+
+
+def hash_bytes(data: bytes, algorithm: str = DEFAULT_ALGORITHM) -> str:
+    h = new_hasher(algorithm)
+    h.update(data)
+    return h.hexdigest()
+
+
+def hash_file(path: str, algorithm: str = DEFAULT_ALGORITHM) -> str:
+    h = new_hasher(algorithm)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(HASH_BLOCK_SIZE)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+class ManifestBuilder:
+    """변환 중 청크 해시 수집 (여러 스레드에서 add 가능)"""
+
+    def __init__(self, volume_path: str, algorithm: str = DEFAULT_ALGORITHM):
+        self.volume_path = os.path.abspath(volume_path)
+        self.algorithm = algorithm
+        self.files: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def _rel(self, path: str) -> str:
+        return os.path.relpath(os.path.abspath(path), self.volume_path).replace(os.sep, "/")
+
+    def add(self, path: str, data: bytes):
+        """쓴 바이트로 해시 기록"""
+        entry = [len(data), hash_bytes(data, self.algorithm)]
+        with self._lock:
+            self.files[self._rel(path)] = entry
+
+    def add_file(self, path: str):
+        """이미 쓴 파일 해시 기록 (info / provenance 등)"""
+        entry = [os.path.getsize(path), hash_file(path, self.algorithm)]
+        with self._lock:
+            self.files[self._rel(path)] = entry
+
+    def write(self) -> str:
+        for name in ("info", "provenance"):
+            path = os.path.join(self.volume_path, name)
+            if name not in self.files and os.path.isfile(path):
+                self.add_file(path)
+        return write_manifest(self.volume_path, self.algorithm, self.files)
+
+
+def write_manifest(volume_path: str, algorithm: str, files: Dict[str, list]) -> str:
+    path = os.path.join(volume_path, MANIFEST_NAME)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({
+            "version": 1,
+            "algorithm": algorithm,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "files": dict(sorted(files.items())),
+        }, f)
+    os.replace(tmp, path)
+    return path
+
+
+def load_manifest(volume_path: str) -> Optional[Dict]:
+    """매니페스트 읽기 (없거나 깨졌으면 None)"""
+    try:
+        with open(os.path.join(volume_path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), dict):
+        return None
+    return manifest
+
+
+def _list_files(volume_path: str) -> Dict[str, int]:
+    """볼륨 내 파일 (상대 경로 → 크기), 매니페스트와 임시 파일 제외"""
+    files = {}
+    stack = [("", volume_path)]
+    while stack:
+        rel_dir, abs_dir = stack.pop()
+        with os.scandir(abs_dir) as it:
+            for entry in it:
+                rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((rel, entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    if rel == MANIFEST_NAME or entry.name.startswith("."):
+                        continue
+                    files[rel] = entry.stat(follow_symlinks=False).st_size
+    return files
+
+
+def build_manifest(volume_path: str, algorithm: str = DEFAULT_ALGORITHM,
+                   workers: int = DEFAULT_WORKERS) -> Dict:
+    """기존 볼륨의 매니페스트 생성 (병렬 해시)"""
+    start = time.monotonic()
+    sizes = _list_files(volume_path)
+
+    def work(rel: str):
+        return rel, [sizes[rel], hash_file(os.path.join(volume_path, rel), algorithm)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        files = dict(pool.map(work, sizes))
+
+    write_manifest(volume_path, algorithm, files)
+    return {
+        "files": len(files),
+        "bytes": sum(sizes.values()),
+        "algorithm": algorithm,
+        "duration_seconds": round(time.monotonic() - start, 2),
+    }
+
+
+def verify_manifest(volume_path: str, workers: int = DEFAULT_WORKERS,
+                    max_items: int = 100) -> Dict:
+    """
+    디렉터리를 매니페스트와 비교
+    크기가 다르면 해시 없이 바로 불일치, 크기가 같은 파일만 병렬 해시
+    """
+    start = time.monotonic()
+    manifest = load_manifest(volume_path)
+    if manifest is None:
+        raise FileNotFoundError(f"Manifest not found: {os.path.join(volume_path, MANIFEST_NAME)}")
+
+    algorithm = manifest.get("algorithm", DEFAULT_ALGORITHM)
+    expected: Dict[str, list] = manifest["files"]
+    actual = _list_files(volume_path)
+
+    missing = sorted(rel for rel in expected if rel not in actual)
+    extra = sorted(rel for rel in actual if rel not in expected)
+    mismatched = sorted(
+        rel for rel, (size, _) in expected.items() if rel in actual and actual[rel] != size
+    )
+    to_hash = [rel for rel in expected if rel in actual and actual[rel] == expected[rel][0]]
+
+    def check(rel: str):
+        return rel, hash_file(os.path.join(volume_path, rel), algorithm) == expected[rel][1]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for rel, ok in pool.map(check, to_hash):
+            if not ok:
+                mismatched.append(rel)
+    mismatched.sort()
+
+    return {
+        "ok": not (missing or mismatched),
+        "algorithm": algorithm,
+        "files_checked": len(to_hash),
+        "bytes_checked": sum(actual[rel] for rel in to_hash),
+        "missing_count": len(missing),
+        "mismatched_count": len(mismatched),
+        "extra_count": len(extra),
+        "missing": missing[:max_items],
+        "mismatched": mismatched[:max_items],
+        "extra": extra[:max_items],
+        "duration_seconds": round(time.monotonic() - start, 2),
+    }
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="볼륨 체크섬 매니페스트 생성/검증")
+    parser.add_argument("command", choices=["build", "verify"])
+    parser.add_argument("volume_dir")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        result = build_manifest(args.volume_dir, workers=args.workers)
+    else:
+        result = verify_manifest(args.volume_dir, workers=args.workers)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0 if result.get("ok", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,7 +19,10 @@ from . import (  # noqa: I001
     skeleton,  # noqa: F401
 )
 from .default_credentials_manager import set_boss_token  # noqa: F401
-from .equivalence_map import EquivalenceMap  # noqa: F401
+from .equivalence_map import (
+    ArrayEquivalenceMap,  # noqa: F401
+    EquivalenceMap,  # noqa: F401
+)
 from .local_volume import LocalVolume  # noqa: F401
 from .screenshot import ScreenshotSaver  # noqa: F401
 from .server import (
@@ -27,6 +30,7 @@ from .server import (
     set_server_bind_address,  # noqa: F401
     set_static_content_source,  # noqa: F401
     set_dev_server_content_source,  # noqa: F401
+    set_subvolume_process_pool,  # noqa: F401
     stop,  # noqa: F401
 )
 from .url_state import parse_url, to_json_dump, to_url  # noqa: F401
@@ -0,0 +1,98 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Size-bounded LRU cache of LocalVolume and AnnotationReader chunks."""
+
+import collections
+import concurrent.futures
+import threading
+from collections.abc import Callable, Hashable
+from typing import Any
+
+
+class ChunkCache:
+    """Thread-safe LRU cache bounded by the total size of its values.
+
+    `get_or_compute` additionally coalesces concurrent requests for the same
+    key, so that a chunk requested by several viewers at once is only
+    computed once.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._entries: collections.OrderedDict[Hashable, tuple[Any, int]] = (
+            collections.OrderedDict()
+        )
+        self._pending: dict[Hashable, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            pending = self._pending.get(key)
+            if pending is None:
+                self.misses += 1
+                future: concurrent.futures.Future = concurrent.futures.Future()
+                self._pending[key] = future
+        if pending is not None:
+            return pending.result()
+        try:
+            value = compute()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            self.put(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._pending[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
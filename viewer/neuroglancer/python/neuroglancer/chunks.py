@@ -12,12 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Encoders for the chunk formats served by LocalVolume.
+
+All formats store chunks with the first dimension varying fastest, which is
+the order in which the Neuroglancer frontend lays out chunk data.
+"""
+
+import gzip
 import io
 import zlib
 
 import numpy as np
 from PIL import Image
 
+# zlib level used for npz and gzip encoding.  Chunks are usually served to a
+# browser on the same machine or network, where encoding time dominates
+# transfer time, so the fastest level is preferred over the zlib default.
+DEFAULT_COMPRESSION_LEVEL = 1
+
+# Formats that may additionally be sent with gzip Content-Encoding, which the
+# browser decodes natively.
+GZIP_FORMATS = ("raw", "compressed_segmentation")
+
+_COMPRESSED_SEGMENTATION_BITS = (0, 1, 2, 4, 8, 16, 32)
+
 
 def encode_jpeg(subvol):
     shape = subvol.shape
@@ -28,12 +46,148 @@ def encode_jpeg(subvol):
     return f.getvalue()
 
 
-def encode_npz(subvol):
+def encode_npz(subvol, compression_level=DEFAULT_COMPRESSION_LEVEL):
     fileobj = io.BytesIO()
     np.save(fileobj, np.asfortranarray(subvol))
-    cdz = zlib.compress(fileobj.getvalue())
+    cdz = zlib.compress(fileobj.getbuffer(), compression_level)
     return cdz
 
 
+def _little_endian(subvol):
+    if subvol.dtype.byteorder == ">":
+        return subvol.astype(subvol.dtype.newbyteorder("<"))
+    return subvol
+
+
 def encode_raw(subvol):
-    return subvol.tostring("C")
+    """Encodes subvol as little-endian values with the first dimension fastest.
+
+    @return: A memoryview of subvol's own buffer if it is already laid out
+        that way, and a bytes copy otherwise.
+    """
+    subvol = _little_endian(subvol)
+    if subvol.flags.f_contiguous:
+        return memoryview(subvol.T.reshape(-1).view(np.uint8))
+    return subvol.tobytes("F")
+
+
+def encode_gzip(data, compression_level=DEFAULT_COMPRESSION_LEVEL):
+    """Compresses already-encoded chunk data for gzip Content-Encoding."""
+    return gzip.compress(data, compresslevel=max(compression_level, 0), mtime=0)
+
+
+def _blocks_of(subvol, block_size):
+    """Splits a 3-d array into blocks.
+
+    @return: Array of shape (num_blocks, block_voxels), with blocks ordered by
+        grid position and voxels within each block ordered with x fastest.
+    """
+    grid = tuple(-(-s // b) for s, b in zip(subvol.shape, block_size))
+    padding = [(0, g * b - s) for s, g, b in zip(subvol.shape, grid, block_size)]
+    if any(p for _, p in padding):
+        # Any value present in a partial block may be used as padding.
+        subvol = np.pad(subvol, padding, mode="edge")
+    (gx, gy, gz), (bx, by, bz) = grid, block_size
+    return (
+        subvol.reshape(gx, bx, gy, by, gz, bz)
+        .transpose(4, 2, 0, 5, 3, 1)
+        .reshape(gx * gy * gz, bx * by * bz)
+    )
+
+
+def _pack_values(indices, encoded_bits):
+    """Packs the table indices of some blocks into little-endian uint32 words."""
+    per_word = 32 // encoded_bits
+    num_blocks, block_voxels = indices.shape
+    num_words = -(-block_voxels // per_word)
+    padded = np.zeros((num_blocks, num_words * per_word), dtype=np.uint32)
+    padded[:, :block_voxels] = indices
+    shifts = np.arange(per_word, dtype=np.uint32) * np.uint32(encoded_bits)
+    words = padded.reshape(num_blocks, num_words, per_word) << shifts
+    return np.bitwise_or.reduce(words, axis=2)
+
+
+def encode_compressed_segmentation(subvol, block_size):
+    """Encodes a 3-d uint32 or uint64 array in the compressed_segmentation format.
+
+    The result uses the single-channel form of the multi-channel format, as
+    expected by the frontend for volume chunks.
+
+    @param subvol: Array indexed as [x, y, z].
+    @param block_size: Compression block size [bx, by, bz].
+    """
+    if subvol.ndim != 3 or subvol.dtype not in (np.uint32, np.uint64):
+        raise ValueError(
+            "compressed_segmentation requires a 3-d uint32 or uint64 array, "
+            f"not {subvol.dtype} {subvol.shape!r}"
+        )
+    block_size = tuple(int(b) for b in block_size)
+    if len(block_size) != 3 or any(b < 1 for b in block_size):
+        raise ValueError(f"Invalid compressed_segmentation block size: {block_size!r}")
+    if subvol.size == 0:
+        return np.array([1], dtype="<u4").tobytes()
+
+    blocks = _blocks_of(subvol, block_size)
+    num_blocks, block_voxels = blocks.shape
+
+    # Per-block lookup tables of the distinct (sorted) values, and the index
+    # of each voxel's value in its block's table.
+    order = np.argsort(blocks, axis=1, kind="stable")
+    sorted_values = np.take_along_axis(blocks, order, axis=1)
+    is_new = np.ones(blocks.shape, dtype=bool)
+    np.not_equal(sorted_values[:, 1:], sorted_values[:, :-1], out=is_new[:, 1:])
+    ranks = np.cumsum(is_new, axis=1, dtype=np.uint32)
+    ranks -= 1
+    indices = np.empty(blocks.shape, dtype=np.uint32)
+    np.put_along_axis(indices, order, ranks, axis=1)
+    num_values = ranks[:, -1] + 1
+    table_values = sorted_values[is_new].astype(subvol.dtype.newbyteorder("<"))
+    table_ends = np.cumsum(num_values, dtype=np.int64)
+
+    encoded_bits = np.zeros(num_blocks, dtype=np.uint32)
+    for bits in reversed(_COMPRESSED_SEGMENTATION_BITS[1:]):
+        encoded_bits[num_values <= (1 << bits)] = bits
+    encoded_bits[num_values == 1] = 0
+
+    packed = {}
+    for bits in _COMPRESSED_SEGMENTATION_BITS[1:]:
+        selected = np.flatnonzero(encoded_bits == bits)
+        if selected.size:
+            packed[bits] = (selected, _pack_values(indices[selected], bits))
+    encoded_values = [None] * num_blocks
+    for selected, words in packed.values():
+        for block, block_words in zip(selected.tolist(), words):
+            encoded_values[block] = block_words
+
+    # Layout: block headers, then for each block its encoded values followed
+    # by its lookup table, unless an identical table was already written.
+    headers = np.empty((num_blocks, 2), dtype="<u4")
+    parts = [headers]
+    offset = 2 * num_blocks
+    tables = {}
+    table_start = 0
+    for block, (table_end, bits) in enumerate(
+        zip(table_ends.tolist(), encoded_bits.tolist())
+    ):
+        values = encoded_values[block]
+        value_offset = offset
+        if values is not None:
+            parts.append(values)
+            offset += len(values)
+        table = table_values[table_start:table_end].view("<u4")
+        table_start = table_end
+        key = table.tobytes()
+        table_offset = tables.get(key)
+        if table_offset is None:
+            table_offset = tables[key] = offset
+            parts.append(table)
+            offset += len(table)
+        headers[block] = (table_offset | (bits << 24), value_offset)
+    if max(tables.values()) >= 1 << 24:
+        raise ValueError("Chunk too large for compressed_segmentation encoding")
+    channel_header = np.array([1], dtype=np.uint32)
+    return (
+        np.concatenate([channel_header] + parts, axis=None)
+        .astype("<u4", copy=False)
+        .tobytes()
+    )
@@ -39,6 +39,12 @@ def add_server_arguments(ap):
         action="store_true",
         help="Log requests to web server used for Neuroglancer Python API",
     )
+    g.add_argument(
+        "--subvolume-processes",
+        type=int,
+        help="Encode chunks of large in-memory volumes using the specified number of worker "
+        "processes rather than threads.",
+    )
 
 
 def add_state_arguments(ap, required=False, dest="state"):
@@ -85,3 +91,5 @@ def handle_server_arguments(args):
         server.set_static_content_source(url=args.static_content_url)
     if args.debug_server:
         server.debug = True
+    if args.subvolume_processes:
+        server.set_subvolume_process_pool(max_workers=args.subvolume_processes)
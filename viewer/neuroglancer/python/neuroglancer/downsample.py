@@ -11,27 +11,217 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+"""Block-reduce downsampling kernels.
 
+All kernels reduce non-overlapping blocks of shape `factor`.  Blocks at the
+upper edge of each dimension may be partial; they are reduced over the voxels
+that are actually present (no padding values leak into the result).
+"""
+
+import itertools
 import math
 
 import numpy as np
 
 
+def _normalize_factor(array, factor):
+    factor = tuple(int(f) for f in factor)
+    if len(factor) != array.ndim:
+        raise ValueError(
+            "factor %r does not match array rank %d" % (factor, array.ndim)
+        )
+    if any(f < 1 for f in factor):
+        raise ValueError(f"factor must be >= 1: {factor!r}")
+    return factor
+
+
+def _reduce_axis(ufunc, array, axis, f, dtype=None):
+    """Reduces blocks of f elements along one axis.
+
+    The f strided slices are accumulated in place into the first one, which
+    is never shorter than the others; a partial block at the upper edge
+    simply receives fewer contributions.
+    """
+    index = [np.s_[:]] * array.ndim
+    index[axis] = np.s_[0::f]
+    result = np.array(array[tuple(index)], dtype=dtype, copy=True)
+    for offset in range(1, min(f, array.shape[axis])):
+        index[axis] = np.s_[offset::f]
+        part = array[tuple(index)]
+        target = result
+        if part.shape[axis] != result.shape[axis]:
+            trim = [np.s_[:]] * array.ndim
+            trim[axis] = np.s_[: part.shape[axis]]
+            target = result[tuple(trim)]
+        ufunc(target, part, out=target, dtype=result.dtype)
+    return result
+
+
+def _block_reduce(ufunc, array, factor, dtype=None):
+    """Reduces blocks one dimension at a time.
+
+    Reductions are separable, so this costs sum(factor) rather than
+    prod(factor) passes, each over data that has already been shrunk along
+    the previously reduced dimensions.
+    """
+    result = array
+    for axis, f in enumerate(factor):
+        if f == 1:
+            continue
+        result = _reduce_axis(ufunc, result, axis, f, dtype)
+    if result is array:
+        result = np.array(array, dtype=dtype, copy=True)
+    return result
+
+
+def _block_counts(shape, factor):
+    """Number of input voxels in each output block (broadcastable array)."""
+    counts = np.full((1,) * len(shape), math.prod(factor), dtype=np.int64)
+    for axis, (s, f) in enumerate(zip(shape, factor)):
+        if f == 1 or s % f == 0:
+            continue
+        counts //= f
+        n = int(math.ceil(s / f))
+        axis_counts = np.full(n, f, dtype=np.int64)
+        axis_counts[-1] = s - (n - 1) * f
+        counts = counts * axis_counts.reshape(
+            (1,) * axis + (n,) + (1,) * (len(shape) - axis - 1)
+        )
+    return counts
+
+
+def _sum_dtype(dtype, block_size):
+    """Smallest integer type for exactly rounding the mean of block_size values.
+
+    The type must hold 2 * sum + block_size (see `downsample_with_averaging`).
+    Returns None if even a 64-bit accumulator could overflow.
+    """
+    info = np.iinfo(dtype)
+    low = 2 * info.min * block_size
+    high = 2 * info.max * block_size + block_size
+    for candidate in (np.uint16, np.int16, np.uint32, np.int32, np.int64):
+        candidate_info = np.iinfo(candidate)
+        if candidate_info.min <= low and high <= candidate_info.max:
+            return np.dtype(candidate)
+    return None
+
+
 def downsample_with_averaging(array, factor):
     """Downsample x by factor using averaging.
 
+    Integer inputs are summed exactly and rounded to the nearest integer (ties
+    round up); floating point inputs are averaged in at least float32.
+
+    @return: The downsampled array, of the same type as x.
+    """
+    array = np.asarray(array)
+    factor = _normalize_factor(array, factor)
+    dtype = array.dtype
+    counts = _block_counts(array.shape, factor)
+
+    if dtype.kind == "b":
+        array = array.view(np.uint8)
+    if dtype.kind in "biu":
+        sum_dtype = _sum_dtype(array.dtype, math.prod(factor))
+        if sum_dtype is not None:
+            sums = _block_reduce(np.add, array, factor, dtype=sum_dtype)
+            counts = counts.astype(sum_dtype) if counts.size > 1 else int(counts.item())
+            # floor(sums / counts + 1/2) in exact integer arithmetic
+            sums *= 2
+            sums += counts
+            sums //= 2 * counts
+            return sums.astype(dtype, copy=False)
+        sums = _block_reduce(np.add, array, factor, dtype=np.float64)
+        return np.floor(sums / counts + 0.5).astype(dtype)
+
+    acc_dtype = np.float64 if dtype == np.float64 else np.float32
+    sums = _block_reduce(np.add, array, factor, dtype=acc_dtype)
+    return np.asarray(sums / counts, dtype=dtype)
+
+
+def downsample_with_min(array, factor):
+    """Downsample x by factor, taking the minimum of each block.
+
     @return: The downsampled array, of the same type as x.
     """
-    factor = tuple(factor)
+    array = np.asarray(array)
+    return _block_reduce(np.minimum, array, _normalize_factor(array, factor))
+
+
+def downsample_with_max(array, factor):
+    """Downsample x by factor, taking the maximum of each block.
+
+    @return: The downsampled array, of the same type as x.
+    """
+    array = np.asarray(array)
+    return _block_reduce(np.maximum, array, _normalize_factor(array, factor))
+
+
+def _mode_of_full_blocks(array, factor):
+    """Mode of each block; every dimension of array is a multiple of factor."""
+    rank = array.ndim
+    output_shape = tuple(s // f for s, f in zip(array.shape, factor))
+    # (n0, f0, n1, f1, ...) -> (n0, n1, ..., f0, f1, ...) -> (blocks, block_size)
+    split_shape = tuple(x for n, f in zip(output_shape, factor) for x in (n, f))
+    block_axes = tuple(range(0, 2 * rank, 2)) + tuple(range(1, 2 * rank, 2))
+    values = np.array(
+        array.reshape(split_shape)
+        .transpose(block_axes)
+        .reshape(math.prod(output_shape), -1)
+    )
+    values.sort(axis=1)
+    num_blocks, block_size = values.shape
+
+    # Length of each run of equal values, stored at the position where the run
+    # starts; argmax then picks the longest run, and the first (smallest) value
+    # on ties.
+    starts = np.ones(values.shape, dtype=bool)
+    np.not_equal(values[:, 1:], values[:, :-1], out=starts[:, 1:])
+    run_starts = np.flatnonzero(starts)
+    run_lengths = np.zeros(values.size, dtype=np.int32)
+    run_lengths[run_starts] = np.diff(run_starts, append=values.size)
+    best = run_lengths.reshape(values.shape).argmax(axis=1)
+    return values[np.arange(num_blocks), best].reshape(output_shape)
+
+
+def downsample_with_mode(array, factor):
+    """Downsample x by factor, taking the most frequent value of each block.
+
+    Intended for segmentation volumes, where averaging or striding produces
+    labels that are not representative of the block.  Ties are broken in favor
+    of the smallest value.
+
+    @return: The downsampled array, of the same type as x.
+    """
+    array = np.asarray(array)
+    factor = _normalize_factor(array, factor)
+    if all(f == 1 for f in factor):
+        return array.copy()
+
     output_shape = tuple(int(math.ceil(s / f)) for s, f in zip(array.shape, factor))
-    temp = np.zeros(output_shape, dtype=np.float32)
-    counts = np.zeros(output_shape, int)
-    for offset in np.ndindex(factor):
-        part = array[tuple(np.s_[o::f] for o, f in zip(offset, factor))]
-        indexing_expr = tuple(np.s_[:s] for s in part.shape)
-        temp[indexing_expr] += part
-        counts[indexing_expr] += 1
-    return np.asarray(temp / counts, dtype=array.dtype)
+    result = np.empty(output_shape, dtype=array.dtype)
+
+    # Split each dimension into the part covered by full blocks and the
+    # partial block at the edge.  The edge region is itself made of full
+    # blocks for a smaller factor (its remaining size), so every region can
+    # use the reshape-based kernel.
+    axis_parts = []
+    for s, f in zip(array.shape, factor):
+        full = s // f
+        parts = []
+        if full:
+            parts.append((np.s_[: full * f], np.s_[:full], f))
+        if s % f:
+            parts.append((np.s_[full * f :], np.s_[full:], s % f))
+        axis_parts.append(parts)
+
+    for region in itertools.product(*axis_parts):
+        source = tuple(p[0] for p in region)
+        target = tuple(p[1] for p in region)
+        result[target] = _mode_of_full_blocks(
+            array[source], tuple(p[2] for p in region)
+        )
+    return result
 
 
 def downsample_with_striding(array, factor):
@@ -40,3 +230,27 @@ def downsample_with_striding(array, factor):
     @return: The downsampled array, of the same type as x.
     """
     return array[tuple(np.s_[::f] for f in factor)]
+
+
+DOWNSAMPLING_METHODS = {
+    "mean": downsample_with_averaging,
+    "mode": downsample_with_mode,
+    "min": downsample_with_min,
+    "max": downsample_with_max,
+    "stride": downsample_with_striding,
+}
+
+
+def downsample(array, factor, method="mean"):
+    """Downsample x by factor using one of `DOWNSAMPLING_METHODS`.
+
+    @return: The downsampled array, of the same type as x.
+    """
+    try:
+        fn = DOWNSAMPLING_METHODS[method]
+    except KeyError:
+        raise ValueError(
+            f"Invalid downsampling method {method!r}, expected one of "
+            f"{sorted(DOWNSAMPLING_METHODS)!r}"
+        ) from None
+    return fn(array, factor)
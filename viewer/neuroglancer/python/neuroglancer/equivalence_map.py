@@ -17,6 +17,8 @@ import collections
 import copy
 from collections.abc import ItemsView, Iterator, KeysView
 
+import numpy as np
+
 
 class EquivalenceMap:
     """Union-find data structure.
@@ -103,6 +105,11 @@ class EquivalenceMap:
             result = self._union_pair(a, b)
         return result
 
+    def union_edges(self, edges):
+        """Unions the equivalence classes of each pair in an (n, 2) array."""
+        for a, b in edges:
+            self.union(int(a), int(b))
+
     def _union_pair(self, a: int, b: int) -> int:
         a = self._get_representative(a)
         b = self._get_representative(b)
@@ -191,3 +198,360 @@ class EquivalenceMap:
         members = list(self.members(element))
         self.delete_set(element)
         self.union(*(v for v in members if v != element))
+
+
+# Elements added by scalar operations are kept out of the sorted index of
+# `ArrayEquivalenceMap` until there are more than this many, or more than
+# 1/16 of the elements.
+_MIN_UNINDEXED_ELEMENTS = 1024
+
+
+class ArrayEquivalenceMap:
+    """Union-find data structure backed by NumPy arrays.
+
+    Supports the same interface as `EquivalenceMap`, but stores about 48 bytes
+    per element rather than several hundred, which makes it suitable for
+    agglomeration graphs with tens of millions of segments.  Additionally,
+    `union_edges` and indexing with an array of ids are vectorized.
+
+    Elements are numbered in insertion order; ids are mapped to element
+    numbers by a sorted index, and a small dict of elements added since the
+    index was last rebuilt.  Each element stores its parent and, at roots,
+    the minimum id of its set; the members of each set form a circular linked
+    list.
+
+    Group:
+      viewer-state-segments
+    """
+
+    supports_readonly = True
+
+    _size: int
+    _ids: np.typing.NDArray[np.uint64]
+    _parents: np.typing.NDArray[np.int64]
+    _min_values: np.typing.NDArray[np.uint64]
+    _next: np.typing.NDArray[np.int64]
+    _sorted_ids: np.typing.NDArray[np.uint64]
+    _sorted_indices: np.typing.NDArray[np.int64]
+    _unindexed: dict[int, int]
+
+    def __init__(self, existing=None, _readonly=False):
+        """Create a new empty union-find structure."""
+        self._readonly = False
+        self.clear()
+        if isinstance(existing, ArrayEquivalenceMap):
+            self._copy_from(existing)
+        elif existing is not None:
+            if isinstance(existing, EquivalenceMap):
+                existing = existing.to_json()
+            elif isinstance(existing, dict):
+                existing = existing.items()
+            groups = [np.asarray(group, dtype=np.uint64).ravel() for group in existing]
+            groups = [group for group in groups if len(group) > 1]
+            if groups:
+                self.union_edges(
+                    np.concatenate(
+                        [np.stack([group[:-1], group[1:]], axis=1) for group in groups]
+                    )
+                )
+        self._readonly = _readonly
+
+    def _copy_from(self, other: "ArrayEquivalenceMap"):
+        n = other._size
+        self._size = n
+        self._ids = other._ids[:n].copy()
+        self._parents = other._parents[:n].copy()
+        self._min_values = other._min_values[:n].copy()
+        self._next = other._next[:n].copy()
+        self._sorted_ids = other._sorted_ids
+        self._sorted_indices = other._sorted_indices
+        self._unindexed = dict(other._unindexed)
+
+    def clear(self):
+        self._size = 0
+        self._ids = np.zeros(0, dtype=np.uint64)
+        self._parents = np.zeros(0, dtype=np.int64)
+        self._min_values = np.zeros(0, dtype=np.uint64)
+        self._next = np.zeros(0, dtype=np.int64)
+        self._sorted_ids = np.zeros(0, dtype=np.uint64)
+        self._sorted_indices = np.zeros(0, dtype=np.int64)
+        self._unindexed = {}
+
+    def _append(self, ids) -> np.typing.NDArray[np.int64]:
+        """Adds new elements, each in its own set; returns their indices."""
+        ids = np.asarray(ids, dtype=np.uint64)
+        begin = self._size
+        end = begin + len(ids)
+        if end > len(self._ids):
+            capacity = max(end, 2 * len(self._ids), 16)
+            for name in ("_ids", "_parents", "_min_values", "_next"):
+                old = getattr(self, name)
+                new = np.empty(capacity, dtype=old.dtype)
+                new[:begin] = old[:begin]
+                setattr(self, name, new)
+        indices = np.arange(begin, end, dtype=np.int64)
+        self._ids[begin:end] = ids
+        self._parents[begin:end] = indices
+        self._min_values[begin:end] = ids
+        self._next[begin:end] = indices
+        self._size = end
+        if len(self._unindexed) + len(ids) > max(_MIN_UNINDEXED_ELEMENTS, end >> 4):
+            self._rebuild_index()
+        else:
+            self._unindexed.update(zip(ids.tolist(), indices.tolist()))
+        return indices
+
+    def _rebuild_index(self):
+        ids = self._ids[: self._size]
+        self._sorted_indices = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._sorted_indices]
+        self._unindexed = {}
+
+    def _get_index(self, obj: int) -> int | None:
+        index = self._unindexed.get(obj)
+        if index is not None:
+            return index
+        sorted_ids = self._sorted_ids
+        pos = int(np.searchsorted(sorted_ids, np.uint64(obj)))
+        if pos < len(sorted_ids) and sorted_ids[pos] == obj:
+            return int(self._sorted_indices[pos])
+        return None
+
+    def _get_indices(self, ids) -> np.typing.NDArray[np.int64]:
+        """Returns the indices of an array of ids, or -1 for unknown ids."""
+        if self._unindexed:
+            self._rebuild_index()
+        sorted_ids = self._sorted_ids
+        if not len(sorted_ids):
+            return np.full(ids.shape, -1, dtype=np.int64)
+        # Searching in order of id is several times faster for large arrays,
+        # since successive searches access nearby memory.
+        order = np.argsort(ids)
+        pos = np.empty(len(ids), dtype=np.int64)
+        pos[order] = np.searchsorted(sorted_ids, ids[order])
+        pos = np.minimum(pos, len(sorted_ids) - 1)
+        return np.where(sorted_ids[pos] == ids, self._sorted_indices[pos], -1)
+
+    def _get_representative(self, index: int) -> int:
+        """Finds the root of the set containing the specified element index."""
+        parents = self._parents
+        path = []
+        root = index
+        while True:
+            parent = int(parents[root])
+            if parent == root:
+                break
+            path.append(root)
+            root = parent
+        # compress the path and return
+        for ancestor in path:
+            parents[ancestor] = root
+        return root
+
+    def _get_representatives(self, indices) -> np.typing.NDArray[np.int64]:
+        """Vectorized `_get_representative`."""
+        parents = self._parents
+        roots = parents[indices]
+        while True:
+            grandparents = parents[roots]
+            if np.array_equal(grandparents, roots):
+                break
+            roots = grandparents
+        parents[indices] = roots
+        return roots
+
+    def __getitem__(self, obj):
+        """Returns the minimum element in the set containing the specified element.
+
+        If `obj` is an array, returns an array of the same shape.
+        """
+        if isinstance(obj, np.ndarray):
+            ids = obj.astype(np.uint64).ravel()
+            indices = self._get_indices(ids)
+            known = indices >= 0
+            ids[known] = self._min_values[self._get_representatives(indices[known])]
+            return ids.reshape(obj.shape)
+        index = self._get_index(obj)
+        if index is None:
+            return obj
+        return int(self._min_values[self._get_representative(index)])
+
+    def __iter__(self) -> Iterator[int]:
+        """Iterates over all elements known to this equivalence map."""
+        return iter(self.keys())
+
+    def items(self) -> list[tuple[int, int]]:
+        ids = self._ids[: self._size]
+        return list(zip(ids.tolist(), ids[self._parents[: self._size]].tolist()))
+
+    def keys(self) -> list[int]:
+        return self._ids[: self._size].tolist()
+
+    def union(self, *elements: int) -> int | None:
+        """Unions the equivalence classes containing the specified elements."""
+        if self._readonly:
+            raise AttributeError
+
+        if len(elements) == 0:
+            return None
+        if len(elements) == 1:
+            return self[elements[0]]
+        for a, b in zip(elements[:-1], elements[1:]):
+            result = self._union_pair(a, b)
+        return result
+
+    def _get_or_add_index(self, obj: int) -> int:
+        index = self._get_index(obj)
+        if index is None:
+            index = int(self._append([obj])[0])
+        return index
+
+    def _union_pair(self, a: int, b: int) -> int:
+        a = self._get_representative(self._get_or_add_index(a))
+        b = self._get_representative(self._get_or_add_index(b))
+        min_values = self._min_values
+        if a != b:
+            if a < b:
+                a, b = b, a
+            # Root indices decrease along each path, so there are no cycles.
+            self._parents[a] = b
+            min_values[b] = min(min_values[a], min_values[b])
+            # Swapping the successors of two elements of distinct circular
+            # lists joins them.
+            next_ = self._next
+            next_[a], next_[b] = next_[b], next_[a]
+        return int(min_values[b])
+
+    def union_edges(self, edges):
+        """Unions the equivalence classes of each pair in an (n, 2) array."""
+        if self._readonly:
+            raise AttributeError
+        edges = np.asarray(edges, dtype=np.uint64).reshape(-1, 2)
+        ids = edges.ravel()
+        indices = self._get_indices(ids)
+        unknown = indices < 0
+        if unknown.any():
+            new_ids, inverse = np.unique(ids[unknown], return_inverse=True)
+            indices[unknown] = self._append(new_ids)[inverse]
+        roots = self._get_representatives(indices)
+
+        # Solve the connected components of the graph of the roots, numbered
+        # consecutively, by alternately hooking roots to the smallest adjacent
+        # root and compressing paths by pointer jumping.
+        if len(roots) * 8 > self._size:
+            # Relabeling with a dense mask avoids sorting large edge arrays.
+            is_root = np.zeros(self._size, dtype=bool)
+            is_root[roots] = True
+            old_roots = np.flatnonzero(is_root)
+            edge_roots = (np.cumsum(is_root) - 1)[roots]
+        else:
+            old_roots, edge_roots = np.unique(roots, return_inverse=True)
+        edge_roots = edge_roots.reshape(-1, 2)
+        parents = np.arange(len(old_roots))
+        a, b = edge_roots[:, 0], edge_roots[:, 1]
+        while True:
+            root_a = parents[a]
+            root_b = parents[b]
+            remaining = root_a != root_b
+            if not remaining.any():
+                break
+            a, b = a[remaining], b[remaining]
+            root_a, root_b = root_a[remaining], root_b[remaining]
+            np.minimum.at(
+                parents, np.maximum(root_a, root_b), np.minimum(root_a, root_b)
+            )
+            while True:
+                grandparents = parents[parents]
+                if np.array_equal(grandparents, parents):
+                    break
+                parents = grandparents
+
+        merged = np.flatnonzero(parents != np.arange(len(old_roots)))
+        if not len(merged):
+            return
+        new_roots = old_roots[parents]
+        np.minimum.at(
+            self._min_values, new_roots[merged], self._min_values[old_roots[merged]]
+        )
+        self._parents[old_roots[merged]] = new_roots[merged]
+
+        # Join the circular lists of each component by linking each old root
+        # to the successor of the next old root of the component.
+        order = np.argsort(parents, kind="stable")
+        group_roots = old_roots[order]
+        group_parents = parents[order]
+        successors = np.arange(1, len(order) + 1)
+        group_ends = np.flatnonzero(
+            np.append(group_parents[1:] != group_parents[:-1], True)
+        )
+        group_starts = np.append(0, group_ends[:-1] + 1)
+        successors[group_ends] = group_starts
+        self._next[group_roots] = self._next[group_roots[successors]]
+
+    def members(self, element: int) -> Iterator[int]:
+        """Yields the members of the equivalence class containing the specified element."""
+        index = self._get_index(element)
+        if index is None:
+            yield element
+            return
+        ids = self._ids
+        next_ = self._next
+        cur = index
+        while True:
+            yield int(ids[cur])
+            cur = int(next_[cur])
+            if cur == index:
+                break
+
+    def _get_sets(self) -> list[np.typing.NDArray[np.uint64]]:
+        """Returns the sorted members of each set, sorted by minimum element."""
+        ids = self._ids[: self._size]
+        min_values = self[ids]
+        order = np.lexsort((ids, min_values))
+        min_values = min_values[order]
+        boundaries = np.flatnonzero(min_values[1:] != min_values[:-1]) + 1
+        return np.split(ids[order], boundaries) if len(ids) else []
+
+    def sets(self) -> frozenset[frozenset[int]]:
+        """Returns the equivalence classes as a set of sets."""
+        return frozenset(frozenset(s.tolist()) for s in self._get_sets())
+
+    def to_json(self) -> list[list[int]]:
+        """Returns the equivalence classes a sorted list of sorted lists."""
+        return [s.tolist() for s in self._get_sets()]
+
+    def __copy__(self) -> "ArrayEquivalenceMap":
+        """Does not preserve _readonly attribute."""
+        return ArrayEquivalenceMap(self)
+
+    def __deepcopy__(self, memo) -> "ArrayEquivalenceMap":
+        """Does not preserve _readonly attribute."""
+        return ArrayEquivalenceMap(self)
+
+    def copy(self) -> "ArrayEquivalenceMap":
+        """Returns a copy of the equivalence map."""
+        return ArrayEquivalenceMap(self)
+
+    def delete_set(self, element: int):
+        """Removes the equivalence class containing the specified element."""
+        if self._get_index(element) is None:
+            return
+        members = np.array(list(self.members(element)), dtype=np.uint64)
+        n = self._size
+        keep = np.ones(n, dtype=bool)
+        keep[self._get_indices(members)] = False
+        # Parents and successors of the remaining elements are in their own
+        # sets, so they remain as well.
+        new_indices = np.cumsum(keep) - 1
+        self._ids = self._ids[:n][keep]
+        self._parents = new_indices[self._parents[:n][keep]]
+        self._min_values = self._min_values[:n][keep]
+        self._next = new_indices[self._next[:n][keep]]
+        self._size = len(self._ids)
+        self._rebuild_index()
+
+    def isolate_element(self, element: int):
+        """Isolates the specified element from its equivalence class."""
+        members = list(self.members(element))
+        self.delete_set(element)
+        self.union(*(v for v in members if v != element))
@@ -0,0 +1,217 @@
+# @license
+# Copyright 2025 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""JSON Patch (RFC 6902) support for incremental viewer state updates.
+
+Only ``add``, ``remove`` and ``replace`` operations are generated, but all
+operations are accepted by `apply_patch`.  Must be kept in sync with
+src/util/json_patch.ts.
+"""
+
+import copy
+import typing
+
+JsonPatch = list[dict[str, typing.Any]]
+
+
+class JsonPatchError(ValueError):
+    """Indicates a patch that cannot be applied to a document."""
+
+
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _parse_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [
+        token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")
+    ]
+
+
+def _same(a, b) -> bool:
+    # Unlike `==`, distinguishes e.g. ``1``, ``1.0`` and ``True`` at any depth,
+    # since they are encoded differently.
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    if isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same(v, b[k]) for k, v in a.items())
+    if isinstance(a, list):
+        return len(a) == len(b) and all(map(_same, a, b))
+    return a == b
+
+
+def make_patch(old, new) -> JsonPatch:
+    """Returns a patch that transforms the JSON value `old` into `new`."""
+    patch: JsonPatch = []
+    _diff(old, new, "", patch)
+    return patch
+
+
+def _diff(old, new, path: str, patch: JsonPatch):
+    if _same(old, new):
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{_escape(key)}"})
+        for key, value in new.items():
+            child_path = f"{path}/{_escape(key)}"
+            if key in old:
+                _diff(old[key], value, child_path, patch)
+            else:
+                patch.append({"op": "add", "path": child_path, "value": value})
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        _diff_lists(old, new, path, patch)
+        return
+    patch.append({"op": "replace", "path": path, "value": new})
+
+
+def _diff_lists(old: list, new: list, path: str, patch: JsonPatch):
+    # Only the elements between the common prefix and suffix are diffed, which
+    # handles the common cases of appending, inserting or deleting a run of
+    # elements (e.g. segment ids) in a long list.
+    common = min(len(old), len(new))
+    prefix = 0
+    while prefix < common and _same(old[prefix], new[prefix]):
+        prefix += 1
+    suffix = 0
+    while suffix < common - prefix and _same(old[-1 - suffix], new[-1 - suffix]):
+        suffix += 1
+    num_removed = len(old) - prefix - suffix
+    num_added = len(new) - prefix - suffix
+    if num_removed == num_added:
+        for i in range(prefix, prefix + num_added):
+            _diff(old[i], new[i], f"{path}/{i}", patch)
+        return
+    if num_removed + num_added > len(new):
+        patch.append({"op": "replace", "path": path, "value": new})
+        return
+    for _ in range(num_removed):
+        patch.append({"op": "remove", "path": f"{path}/{prefix}"})
+    for i in range(prefix, prefix + num_added):
+        patch.append({"op": "add", "path": f"{path}/{i}", "value": new[i]})
+
+
+def apply_patch(doc, patch: JsonPatch):
+    """Returns the result of applying `patch` to the JSON value `doc`.
+
+    `doc` is not modified; containers along modified paths are copied, and all
+    other values are shared with the result.
+
+    Raises:
+      JsonPatchError: If an operation is invalid or does not apply to `doc`.
+    """
+    # Containers copied by this call, which may be modified in place, by id.
+    # They are kept alive so that their ids are not reused.
+    owned: dict[int, typing.Any] = {}
+    for operation in patch:
+        value = None
+        try:
+            op = operation["op"]
+            path = _parse_pointer(operation["path"])
+            if op in ("add", "replace", "test"):
+                value = operation["value"]
+            elif op in ("move", "copy"):
+                from_path = _parse_pointer(operation["from"])
+                value = _get(doc, from_path)
+                if op == "copy":
+                    value = copy.deepcopy(value)
+                else:
+                    if path[: len(from_path)] == from_path and path != from_path:
+                        raise JsonPatchError("Cannot move a value into itself")
+                    doc = _apply(doc, from_path, "remove", None, owned)
+                op = "add"
+            elif op != "remove":
+                raise JsonPatchError(f"Unsupported operation: {op!r}")
+        except (KeyError, TypeError) as e:
+            raise JsonPatchError(f"Invalid operation: {operation!r}") from e
+        if op == "test":
+            if not _same(_get(doc, path), value):
+                raise JsonPatchError(f"Test failed: {operation!r}")
+            continue
+        doc = _apply(doc, path, op, value, owned)
+    return doc
+
+
+def _get_index(token: str, size: int) -> int:
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index >= size:
+        raise JsonPatchError(f"Array index out of range: {token!r}")
+    return index
+
+
+def _get(doc, path: list[str]):
+    for token in path:
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Missing member: {token!r}")
+            doc = doc[token]
+        elif isinstance(doc, list):
+            doc = doc[_get_index(token, len(doc))]
+        else:
+            raise JsonPatchError(f"Cannot index non-container with {token!r}")
+    return doc
+
+
+def _apply(doc, path: list[str], op: str, value, owned: dict[int, typing.Any]):
+    if not path:
+        if op == "remove":
+            raise JsonPatchError("Cannot remove the root value")
+        return value
+    if isinstance(doc, dict):
+        if id(doc) not in owned:
+            doc = dict(doc)
+            owned[id(doc)] = doc
+    elif isinstance(doc, list):
+        if id(doc) not in owned:
+            doc = list(doc)
+            owned[id(doc)] = doc
+    else:
+        raise JsonPatchError(f"Cannot index non-container with {path[0]!r}")
+    token = path[0]
+    if len(path) > 1:
+        key: str | int
+        if isinstance(doc, dict):
+            if token not in doc:
+                raise JsonPatchError(f"Missing member: {token!r}")
+            key = token
+        else:
+            key = _get_index(token, len(doc))
+        doc[key] = _apply(doc[key], path[1:], op, value, owned)
+        return doc
+    if isinstance(doc, dict):
+        if op != "add" and token not in doc:
+            raise JsonPatchError(f"Missing member: {token!r}")
+        if op == "remove":
+            del doc[token]
+        else:
+            doc[token] = value
+    elif op == "add":
+        index = len(doc) if token == "-" else _get_index(token, len(doc) + 1)
+        doc.insert(index, value)
+    else:
+        index = _get_index(token, len(doc))
+        if op == "remove":
+            del doc[index]
+        else:
+            doc[index] = value
+    return doc
@@ -24,10 +24,83 @@ except ImportError:
     ts = None
 
 from . import downsample, downsample_scales, trackable_state
-from .chunks import encode_jpeg, encode_npz, encode_raw
+from .chunk_cache import ChunkCache
+from .chunks import (
+    DEFAULT_COMPRESSION_LEVEL,
+    GZIP_FORMATS,
+    encode_compressed_segmentation,
+    encode_gzip,
+    encode_jpeg,
+    encode_npz,
+    encode_raw,
+)
 from .coordinate_space import CoordinateSpace
 from .random_token import make_random_token
 
+DEFAULT_ENCODED_CACHE_BYTES = 32 << 20
+DEFAULT_SUBVOLUME_CACHE_BYTES = 128 << 20
+
+# Methods for which downsampling by 2 twice equals downsampling by 4, so that
+# coarse chunks may be built from cached finer chunks.
+CASCADE_DOWNSAMPLING_METHODS = ("min", "max", "stride")
+
+DATA_FORMATS = ("jpeg", "npz", "raw", "compressed_segmentation")
+
+
+def read_subvolume(data, downsample_factor, start, end, downsampling_method):
+    """Reads the region [start, end) of data at a given scale.
+
+    @param data: Full-resolution source array.
+    @param downsample_factor: Per-dimension downsampling factor; start and end
+        are in downsampled coordinates.
+    """
+    orig_data_shape = data.shape
+    indexing_expr = tuple(
+        np.s_[
+            start[i] * downsample_factor[i] : min(
+                orig_data_shape[i], end[i] * downsample_factor[i]
+            )
+        ]
+        for i in range(len(orig_data_shape))
+    )
+    subvol = np.array(data[indexing_expr], copy=False)
+    if subvol.dtype == "float64":
+        subvol = np.asarray(subvol, dtype=np.float32)
+
+    if any(f != 1 for f in downsample_factor):
+        subvol = downsample.downsample(subvol, downsample_factor, downsampling_method)
+    return subvol
+
+
+def encode_subvolume(
+    data_format,
+    subvol,
+    compression_level=DEFAULT_COMPRESSION_LEVEL,
+    block_size=None,
+    gzip=False,
+):
+    """Encodes a subvolume in one of the chunk formats served by LocalVolume.
+
+    @param block_size: Block size for the 'compressed_segmentation' format.
+    @param gzip: Additionally compress the result for gzip Content-Encoding.
+
+    @return: Tuple (data, content_type).  For the 'raw' format data may be a
+        memoryview of subvol.
+    """
+    content_type = "application/octet-stream"
+    if data_format == "jpeg":
+        data = encode_jpeg(subvol)
+        content_type = "image/jpeg"
+    elif data_format == "npz":
+        data = encode_npz(subvol, compression_level)
+    elif data_format == "compressed_segmentation":
+        data = encode_compressed_segmentation(subvol, block_size)
+    else:
+        data = encode_raw(subvol)
+    if gzip:
+        data = encode_gzip(data, compression_level)
+    return data, content_type
+
 
 class MeshImplementationNotAvailable(Exception):
     pass
@@ -62,15 +135,53 @@ class LocalVolume(trackable_state.ChangeNotifier):
         max_downsampling=downsample_scales.DEFAULT_MAX_DOWNSAMPLING,
         max_downsampled_size=downsample_scales.DEFAULT_MAX_DOWNSAMPLED_SIZE,
         max_downsampling_scales=downsample_scales.DEFAULT_MAX_DOWNSAMPLING_SCALES,
+        downsampling_method=None,
+        encoded_cache_bytes=DEFAULT_ENCODED_CACHE_BYTES,
+        subvolume_cache_bytes=DEFAULT_SUBVOLUME_CACHE_BYTES,
+        cascade_downsampling=True,
+        compression_level=DEFAULT_COMPRESSION_LEVEL,
+        content_encoding=None,
     ):
         """Initializes a LocalVolume.
 
         @param data: Source data.
 
+        @param encoding: Chunk format, one of 'npz', 'raw', 'jpeg' or
+            'compressed_segmentation'.  'compressed_segmentation' requires a
+            3-d uint32 or uint64 'segmentation' volume, and saves the frontend
+            from re-encoding each chunk itself.
+
+        @param compression_level: zlib compression level (0-9) for the 'npz'
+            encoding and for gzip Content-Encoding.
+
+        @param content_encoding: 'gzip' to compress 'raw' and
+            'compressed_segmentation' chunks with gzip Content-Encoding, which
+            the browser decodes natively, for clients that accept it.  None to
+            send them uncompressed.
+
         @param downsampling: '3d' to use isotropic downsampling, '2d' to
             downsample separately in XY, XZ, and YZ, None to use no
             downsampling.
 
+        @param downsampling_method: Block reduction used for on-the-fly
+            downsampling, one of 'mean', 'mode', 'min', 'max' or 'stride'.
+            Defaults to 'mean' for 'image' volumes and 'mode' (most frequent
+            label) for 'segmentation' volumes.
+
+        @param encoded_cache_bytes: Size limit of the cache of encoded chunks
+            returned by `get_encoded_subvolume`.  0 disables the cache.
+
+        @param subvolume_cache_bytes: Size limit of the cache of (downsampled)
+            subvolumes prior to encoding, shared by all data formats.  0
+            disables the cache.
+
+        @param cascade_downsampling: If true, a downsampled chunk whose
+            finer-scale chunks are all cached is computed from them rather
+            than from the full-resolution data.  Only applies to the 'min',
+            'max' and 'stride' methods, for which this is exact; the mode of
+            modes and the mean of rounded means differ from direct
+            downsampling.
+
         @param max_downsampling: Maximum amount by which on-the-fly downsampling
             may reduce the volume of a chunk.  For example, 4x4x4 downsampling
             reduces the volume by 64.
@@ -130,7 +241,21 @@ class LocalVolume(trackable_state.ChangeNotifier):
         self.data_type = np.dtype(self.data.dtype).name
         if self.data_type == "float64":
             self.data_type = "float32"
+        if encoding not in DATA_FORMATS:
+            raise ValueError(
+                f"Invalid encoding {encoding!r}, expected one of {DATA_FORMATS!r}"
+            )
+        if encoding == "compressed_segmentation" and not (
+            self.rank == 3 and self.data_type in ("uint32", "uint64")
+        ):
+            raise ValueError(
+                "compressed_segmentation encoding requires a 3-d uint32 or uint64 volume"
+            )
+        if content_encoding not in (None, "gzip"):
+            raise ValueError(f"Invalid content_encoding {content_encoding!r}")
         self.encoding = encoding
+        self.compression_level = compression_level
+        self.content_encoding = content_encoding
         if volume_type is None:
             if self.rank == 3 and (
                 self.data_type == "uint16"
@@ -140,7 +265,30 @@ class LocalVolume(trackable_state.ChangeNotifier):
                 volume_type = "segmentation"
             else:
                 volume_type = "image"
+        if encoding == "compressed_segmentation" and volume_type != "segmentation":
+            raise ValueError(
+                "compressed_segmentation encoding requires a segmentation volume"
+            )
         self.volume_type = volume_type
+        if downsampling_method is None:
+            downsampling_method = "mean" if volume_type == "image" else "mode"
+        if downsampling_method not in downsample.DOWNSAMPLING_METHODS:
+            raise ValueError(
+                f"Invalid downsampling_method {downsampling_method!r}, expected "
+                f"one of {sorted(downsample.DOWNSAMPLING_METHODS)!r}"
+            )
+        self.downsampling_method = downsampling_method
+        self.cascade_downsampling = cascade_downsampling
+        self._encoded_cache = (
+            ChunkCache(encoded_cache_bytes, lambda x: len(x[0]))
+            if encoded_cache_bytes
+            else None
+        )
+        self._subvolume_cache = (
+            ChunkCache(subvolume_cache_bytes, lambda x: x.nbytes)
+            if subvolume_cache_bytes
+            else None
+        )
 
         self._mesh_generator = None
         self._mesh_generator_pending = None
@@ -191,7 +339,36 @@ class LocalVolume(trackable_state.ChangeNotifier):
 
         return info
 
-    def get_encoded_subvolume(self, data_format, start, end, scale_key):
+    def uses_gzip(self, data_format):
+        """Whether chunks in data_format are sent with gzip Content-Encoding.
+
+        Only applies to clients that accept gzip.
+        """
+        return self.content_encoding == "gzip" and data_format in GZIP_FORMATS
+
+    def get_encoded_subvolume(
+        self,
+        data_format,
+        start,
+        end,
+        scale_key,
+        process_pool=None,
+        block_size=None,
+        gzip=False,
+    ):
+        """Returns the encoded chunk [start, end) at the scale given by scale_key.
+
+        @param block_size: Comma-separated block size, required for the
+            'compressed_segmentation' format.
+
+        @param gzip: Compress the encoded chunk for gzip Content-Encoding.
+
+        @param process_pool: Optional `SubvolumeProcessPool`.  If it accepts
+            this volume, the chunk is read, downsampled and encoded in a worker
+            process.  Encoded chunks are still cached in this process.
+
+        @return: Tuple (data, content_type).
+        """
         rank = self.rank
         if len(start) != rank or len(end) != rank:
             raise ValueError("Invalid request")
@@ -208,36 +385,127 @@ class LocalVolume(trackable_state.ChangeNotifier):
         )
         if np.any(end < start) or np.any(start < 0) or np.any(end > downsampled_shape):
             raise ValueError("Out of bounds data request.")
+        if data_format not in DATA_FORMATS:
+            raise ValueError("Invalid data format requested.")
+        if data_format == "compressed_segmentation":
+            if self.rank != 3 or self.data_type not in ("uint32", "uint64"):
+                raise ValueError("Invalid data format requested.")
+            try:
+                block_size = tuple(int(x) for x in block_size.split(","))
+            except (AttributeError, ValueError):
+                raise ValueError(
+                    "Invalid compressed_segmentation block size."
+                ) from None
+            if len(block_size) != 3 or any(b < 1 for b in block_size):
+                raise ValueError("Invalid compressed_segmentation block size.")
+        else:
+            block_size = None
+
+        downsample_factor = tuple(int(f) for f in downsample_factor)
+        start = tuple(int(x) for x in start)
+        end = tuple(int(x) for x in end)
+        encode_options = dict(
+            compression_level=self.compression_level,
+            block_size=block_size,
+            gzip=bool(gzip),
+        )
 
-        orig_data_shape = self.data.shape
-        indexing_expr = tuple(
-            np.s_[
-                start[i] * downsample_factor[i] : min(
-                    orig_data_shape[i], end[i] * downsample_factor[i]
+        def encode():
+            if process_pool is not None and process_pool.accepts(self):
+                return process_pool.encode_subvolume(
+                    self, data_format, downsample_factor, start, end, encode_options
                 )
-            ]
-            for i in range(rank)
+            return encode_subvolume(
+                data_format,
+                self._get_subvolume(downsample_factor, start, end),
+                **encode_options,
+            )
+
+        if self._encoded_cache is None:
+            return encode()
+        key = (
+            self.change_count,
+            downsample_factor,
+            start,
+            end,
+            data_format,
+            block_size,
+            bool(gzip),
+        )
+        return self._encoded_cache.get_or_compute(key, encode)
+
+    def _get_subvolume(self, downsample_factor, start, end):
+        """Returns the (downsampled) data for [start, end) at a given scale."""
+        cache = self._subvolume_cache
+        if cache is None:
+            return self._read_subvolume(downsample_factor, start, end)
+        key = (self.change_count, downsample_factor, start, end)
+        subvol = cache.get(key)
+        if subvol is not None:
+            return subvol
+        subvol = self._cascade_subvolume(downsample_factor, start, end)
+        if subvol is None:
+            subvol = self._read_subvolume(downsample_factor, start, end)
+        # Slices of in-memory arrays are views and cost nothing to recompute.
+        if subvol.flags.owndata:
+            subvol.setflags(write=False)
+            cache.put(key, subvol)
+        return subvol
+
+    def _read_subvolume(self, downsample_factor, start, end):
+        return read_subvolume(
+            self.data, downsample_factor, start, end, self.downsampling_method
         )
-        subvol = np.array(self.data[indexing_expr], copy=False)
-        if subvol.dtype == "float64":
-            subvol = np.asarray(subvol, dtype=np.float32)
 
-        if np.any(downsample_factor != 1):
-            if self.volume_type == "image":
-                subvol = downsample.downsample_with_averaging(subvol, downsample_factor)
-            else:
-                subvol = downsample.downsample_with_striding(subvol, downsample_factor)
-        content_type = "application/octet-stream"
-        if data_format == "jpeg":
-            data = encode_jpeg(subvol)
-            content_type = "image/jpeg"
-        elif data_format == "npz":
-            data = encode_npz(subvol)
-        elif data_format == "raw":
-            data = encode_raw(subvol)
-        else:
-            raise ValueError("Invalid data format requested.")
-        return data, content_type
+    def _cascade_subvolume(self, downsample_factor, start, end):
+        """Builds a downsampled chunk from cached chunks of the next finer scale.
+
+        The finer scale halves every even factor.  Its chunks are looked up
+        on the grid implied by this request (chunk shape `end - start`,
+        aligned at `start * 2`), which matches the requests made by the
+        frontend when it uses the same chunk shape at every scale.  Returns
+        None unless every covering finer chunk is cached.
+        """
+        if (
+            not self.cascade_downsampling
+            or self.downsampling_method not in CASCADE_DOWNSAMPLING_METHODS
+            or any(e <= s for s, e in zip(start, end))
+        ):
+            return None
+        ratio = tuple(2 if f % 2 == 0 else 1 for f in downsample_factor)
+        if all(r == 1 for r in ratio):
+            return None
+        finer_factor = tuple(f // r for f, r in zip(downsample_factor, ratio))
+        finer_shape = tuple(-(-s // f) for s, f in zip(self.shape, finer_factor))
+        generation = self.change_count
+        cache = self._subvolume_cache
+
+        axis_tiles = []
+        for s, e, r, limit in zip(start, end, ratio, finer_shape):
+            size = e - s
+            tile_start = s * r
+            tile_end = min(e * r, limit)
+            tiles = []
+            while tile_start < tile_end:
+                tiles.append((tile_start, min(tile_start + size, limit)))
+                tile_start += size
+            axis_tiles.append(tiles)
+
+        def assemble(axis, tile_start, tile_end):
+            if axis == self.rank:
+                return cache.get((generation, finer_factor, tile_start, tile_end))
+            parts = []
+            for s, e in axis_tiles[axis]:
+                part = assemble(axis + 1, tile_start + (s,), tile_end + (e,))
+                if part is None:
+                    return None
+                parts.append(part)
+            return parts
+
+        parts = assemble(0, (), ())
+        if parts is None:
+            return None
+        return downsample.downsample(np.block(parts), ratio, self.downsampling_method)
 
     def get_object_mesh(self, object_id):
         mesh_generator = self._get_mesh_generator()
@@ -301,6 +569,10 @@ class LocalVolume(trackable_state.ChangeNotifier):
         with self._mesh_generator_lock:
             self._mesh_generator_pending = None
             self._mesh_generator = None
+        if self._encoded_cache is not None:
+            self._encoded_cache.clear()
+        if self._subvolume_cache is not None:
+            self._subvolume_cache.clear()
         self._dispatch_changed_callbacks()
 
 
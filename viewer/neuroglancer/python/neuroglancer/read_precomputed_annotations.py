@@ -14,7 +14,6 @@
 
 """Reads annotations in the Precomputed annotation format."""
 
-import collections
 import json
 import struct
 import time
@@ -24,10 +23,18 @@ import numpy as np
 import tensorstore as ts
 
 from . import coordinate_space, viewer_state, write_annotations
+from .chunk_cache import ChunkCache
 
 K = typing.TypeVar("K")
 V = typing.TypeVar("V")
 
+# Default size limit of the cache of decoded spatial index chunks.
+DEFAULT_CHUNK_CACHE_BYTES = 64 << 20
+
+# Approximate size of a cached chunk in addition to its arrays, which bounds
+# the number of cached empty chunks.
+_CHUNK_OVERHEAD_BYTES = 256
+
 
 def _get_uint64_key_encoder(metadata):
     if metadata is not None and "sharding" in metadata:
@@ -105,15 +112,26 @@ class AnnotationMap(typing.Generic[K, V]):
                 read_result = future.result()
                 if read_result.state != "value":
                     promise.set_result(None)
+                    return
                 promise.set_result(self._value_decoder(key, read_result.value))
             except Exception as e:
                 promise.set_exception(e)
 
-        self._kvstore.read(
-            self._key_encoder(key), staleness_bound=self.staleness_bound
-        ).add_done_callback(done_callback)
+        self.read(key, batch=batch).add_done_callback(done_callback)
         return future
 
+    def read(self, key: K, batch: ts.Batch | None = None) -> ts.Future:
+        """Reads the encoded value of a given key, returning a Future.
+
+        The result is a `ts.KvStore.ReadResult`, with a state of ``"missing"``
+        if the key is not present.
+        """
+        if self._kvstore is None:
+            raise KeyError("required index kind not available")
+        return self._kvstore.read(
+            self._key_encoder(key), staleness_bound=self.staleness_bound, batch=batch
+        )
+
     async def get_async(self, key: K, batch: ts.Batch | None = None) -> V:
         """Asynchronously reads a given key."""
         if self._kvstore is None:
@@ -171,53 +189,24 @@ _ANNOTATION_TYPE_CONSTRUCTORS = {
 }
 
 
-def _point_check_bounds(annotation, lower_bound, upper_bound):
-    point = annotation.point
-    return np.all(point >= lower_bound) and np.all(point <= upper_bound)
-
-
-def _bbox_check_bounds(min_pt, max_pt, lower_bound, upper_bound):
-    return np.all(min_pt <= upper_bound) and np.all(max_pt <= lower_bound)
-
-
-def _line_check_bounds(annotation, lower_bound, upper_bound):
-    # For now, just perform a bounding box check for simplicity.
-    # TODO(jbms): perform a more precise check
-    point_a = annotation.point_a
-    point_b = annotation.point_b
-    min_pt = np.minimum(point_a, point_b)
-    max_pt = np.maximum(point_a, point_b)
-    return _bbox_check_bounds(min_pt, max_pt, lower_bound, upper_bound)
-
-
-def _axis_aligned_bounding_box_check_bounds(annotation, lower_bound, upper_bound):
-    point_a = annotation.point_a
-    point_b = annotation.point_b
-    min_pt = np.minimum(point_a, point_b)
-    max_pt = np.maximum(point_a, point_b)
-    return _bbox_check_bounds(min_pt, max_pt, lower_bound, upper_bound)
-
-
-def _ellipsoid_check_bounds(annotation, lower_bound, upper_bound):
-    center = annotation.point_a
-    radii = annotation.radii
-    return _bbox_check_bounds(center - radii, center + radii, lower_bound, upper_bound)
-
+# Names of the geometry fields of the records returned by
+# `AnnotationReader.get_records_within_spatial_bounds`.
+_GEOMETRY_FIELDS: dict[str, tuple[str, ...]] = {
+    "point": ("point",),
+    "line": ("point_a", "point_b"),
+    "axis_aligned_bounding_box": ("point_a", "point_b"),
+    "ellipsoid": ("center", "radii"),
+    "polyline": ("points",),
+}
 
-def _polyline_check_bounds(annotation, lower_bound, upper_bound):
-    points = annotation.points
-    min_pt = np.min(points, axis=0)
-    max_pt = np.max(points, axis=0)
-    return _bbox_check_bounds(min_pt, max_pt, lower_bound, upper_bound)
 
+class _SpatialChunk(typing.NamedTuple):
+    """Decoded annotations of a spatial index cell."""
 
-_ANNOTATION_TYPE_CHECK_BOUNDS = {
-    "point": _point_check_bounds,
-    "line": _line_check_bounds,
-    "axis_aligned_bounding_box": _axis_aligned_bounding_box_check_bounds,
-    "ellipsoid": _ellipsoid_check_bounds,
-    "polyline": _polyline_check_bounds,
-}
+    records: np.ndarray
+    lower: np.typing.NDArray[np.float32]
+    upper: np.typing.NDArray[np.float32]
+    nbytes: int
 
 
 class AnnotationReader:
@@ -290,11 +279,25 @@ class AnnotationReader:
       Accessors
     """
 
+    record_dtype: np.dtype
+    """Structured dtype of the records returned by
+    `.get_records_within_spatial_bounds`.
+
+    The fields are ``id``, the geometry fields (``point``; ``point_a`` and
+    ``point_b``; ``center`` and ``radii``; or, for polylines, ``points``, an
+    object field holding a ``(num_points, rank)`` array), followed by one field
+    per property, named by its id.
+
+    Group:
+      Accessors
+    """
+
     def __init__(
         self,
         base_spec: typing.Any | ts.KvStore.Spec,
         context: ts.Context | None = None,
         staleness_bound: float | typing.Literal["open"] = "open",
+        chunk_cache_bytes: int = DEFAULT_CHUNK_CACHE_BYTES,
     ):
         """Constructs an annotation reader.
 
@@ -306,6 +309,9 @@ class AnnotationReader:
           staleness_bound: Staleness bound for caching sharding metadata.  If not
               specified, defaults to the time at which the `AnnotationReader` is
               constructed.
+          chunk_cache_bytes: Size limit of the cache of decoded spatial index
+              chunks shared by spatial queries, or 0 to disable it.  Cached
+              chunks are reused regardless of `staleness_bound`.
 
         Group:
           Constructors
@@ -346,24 +352,56 @@ class AnnotationReader:
             viewer_state.AnnotationPropertySpec(prop)
             for prop in self.metadata.get("properties", [])
         ]
+        # Properties are encoded in order of decreasing alignment.
+        sorted_indices = sorted(
+            range(len(self.properties)),
+            key=lambda i: -write_annotations._PROPERTY_DTYPES[self.properties[i].type][
+                1
+            ],
+        )
         self._property_dtype = write_annotations._get_dtype_for_properties(
-            self.properties
+            [self.properties[i] for i in sorted_indices]
         )
+        self._property_fields = [
+            f"property{sorted_indices.index(i)}" for i in range(len(self.properties))
+        ]
+        rank = self.coordinate_space.rank
         self._dtype = (
-            write_annotations._get_dtype_for_geometry(
-                self.annotation_type, self.coordinate_space.rank
-            )
+            write_annotations._get_dtype_for_geometry(self.annotation_type, rank)
             + self._property_dtype
         )
+        geometry_dtype: list[tuple]
+        if self.annotation_type == "polyline":
+            geometry_dtype = [("points", object)]
+        else:
+            geometry_dtype = [
+                (name, "<f4", (rank,))
+                for name in _GEOMETRY_FIELDS[self.annotation_type]
+            ]
+        self.record_dtype = np.dtype(
+            [("id", "<u8")]
+            + geometry_dtype
+            + [
+                (p.id, *write_annotations._PROPERTY_DTYPES[p.type][0])
+                for p in self.properties
+            ]
+        )
+        self._chunk_cache = (
+            ChunkCache(chunk_cache_bytes, lambda chunk: chunk.nbytes)
+            if chunk_cache_bytes
+            else None
+        )
         self.spatial = [
             self._get_child_spatial_map(spatial_metadata)
             for spatial_metadata in self.metadata.get("spatial", [])
         ]
 
-    def _get_dtype(self, encoded: bytes) -> np.dtype:
+    def _get_dtype(self, encoded: bytes, offset: int = 0) -> np.dtype:
         """Returns the dtype for the encoded annotation."""
         if self.annotation_type == "polyline":
-            num_points_value = np.frombuffer(encoded, dtype="<u4", count=1)[0]
+            num_points_value = np.frombuffer(
+                encoded, dtype="<u4", count=1, offset=offset
+            )[0]
             num_points = ("num_points", "<u4")
             geometry = (
                 "geometry",
@@ -373,14 +411,82 @@ class AnnotationReader:
             return np.dtype([num_points, geometry] + self._property_dtype)
         return self._dtype
 
+    def _decode_records(
+        self, encoded: bytes, count: int, offset: int
+    ) -> tuple[np.ndarray, int]:
+        """Decodes consecutive encoded annotations, excluding their ids.
+
+        Returns:
+          The records, with the `.record_dtype`, and the offset following the
+          last annotation.
+        """
+        records = np.zeros(count, dtype=self.record_dtype)
+        rank = self.coordinate_space.rank
+        if self.annotation_type == "polyline":
+            decoded_parts = []
+            for i in range(count):
+                dtype = self._get_dtype(encoded, offset)
+                decoded_polyline = np.frombuffer(
+                    encoded, dtype=dtype, count=1, offset=offset
+                )[0]
+                points = decoded_polyline["geometry"].reshape(-1, rank)
+                points.setflags(write=False)
+                records["points"][i] = points
+                decoded_parts.append(decoded_polyline)
+                offset += decoded_polyline.nbytes
+            for prop, field in zip(self.properties, self._property_fields):
+                records[prop.id] = [decoded[field] for decoded in decoded_parts]
+            return records, offset
+        decoded = np.frombuffer(encoded, dtype=self._dtype, count=count, offset=offset)
+        geometry = decoded["geometry"].reshape(count, -1, rank)
+        for i, name in enumerate(_GEOMETRY_FIELDS[self.annotation_type]):
+            records[name] = geometry[:, i]
+        for prop, field in zip(self.properties, self._property_fields):
+            records[prop.id] = decoded[field]
+        return records, offset + decoded.nbytes
+
+    def _decode_multiple_records(self, encoded: bytes) -> np.ndarray:
+        count = int(np.frombuffer(encoded, dtype="<u8", count=1)[0])
+        records, offset = self._decode_records(encoded, count, 8)
+        ids = np.frombuffer(encoded, dtype="<u8", count=count, offset=offset)
+        offset += ids.nbytes
+        if offset != len(encoded):
+            raise ValueError(
+                f"Expected encoded size to be {offset} bytes but actual size is {len(encoded)}"
+            )
+        records["id"] = ids
+        return records
+
+    def _get_annotations(
+        self, records: np.ndarray, segments=None
+    ) -> list[viewer_state.Annotation]:
+        """Converts records to annotation objects."""
+        constructor = _ANNOTATION_TYPE_CONSTRUCTORS[self.annotation_type]
+        rank = self.coordinate_space.rank
+        if self.annotation_type == "polyline":
+            geometry = records["points"]
+        else:
+            geometry = np.concatenate(
+                [records[name] for name in _GEOMETRY_FIELDS[self.annotation_type]],
+                axis=1,
+            )
+        props = [records[prop.id] for prop in self.properties]
+        return [
+            constructor(
+                geometry[i],
+                rank,
+                [values[i] for values in props],
+                None if segments is None else segments[i],
+                str(annotation_id),
+            )
+            for i, annotation_id in enumerate(records["id"].tolist())
+        ]
+
     def _decode_single_annotation(
         self, annotation_id: int, encoded: bytes
     ) -> viewer_state.Annotation:
-        dtype = self._get_dtype(encoded)
-        decoded = np.frombuffer(encoded, dtype=dtype, count=1)[0]
-        geom = decoded["geometry"]
-        props = [decoded[f"property{i}"] for i in range(len(self.properties))]
-        offset = decoded.nbytes
+        records, offset = self._decode_records(encoded, 1, 0)
+        records["id"] = annotation_id
         segments = []
         for i in range(len(self.relationships)):
             count = np.frombuffer(encoded, dtype="<u4", count=1, offset=offset)[0]
@@ -389,50 +495,41 @@ class AnnotationReader:
                 np.frombuffer(encoded, dtype="<u8", count=count, offset=offset)
             )
             offset += 8 * count
-        return _ANNOTATION_TYPE_CONSTRUCTORS[self.annotation_type](
-            geom, self.coordinate_space.rank, props, segments, str(annotation_id)
-        )
+        return self._get_annotations(records, [segments])[0]
 
     def _decode_multiple_annotations(
         self, unused_key, encoded: bytes
     ) -> list[viewer_state.Annotation]:
-        count = np.frombuffer(encoded, dtype="<u8", count=1)[0]
-        offset = 8
+        return self._get_annotations(self._decode_multiple_records(encoded))
+
+    def _decode_spatial_chunk(self, encoded: bytes | None) -> _SpatialChunk:
+        rank = self.coordinate_space.rank
+        if encoded is None:
+            records = np.zeros(0, dtype=self.record_dtype)
+        else:
+            records = self._decode_multiple_records(encoded)
+        nbytes = records.nbytes + _CHUNK_OVERHEAD_BYTES
         if self.annotation_type == "polyline":
-            decoded_parts = []
-            for _ in range(count):
-                encoded_subset = encoded[offset:]
-                dtype = self._get_dtype(encoded_subset)
-                decoded_polyline = np.frombuffer(encoded_subset, dtype=dtype, count=1)[
-                    0
-                ]
-                decoded_parts.append(decoded_polyline)
-                offset += decoded_polyline.nbytes
-            decoded = np.array(decoded_parts, dtype=object)
+            lower = np.zeros((len(records), rank), dtype=np.float32)
+            upper = np.zeros((len(records), rank), dtype=np.float32)
+            for i, points in enumerate(records["points"]):
+                lower[i] = points.min(axis=0)
+                upper[i] = points.max(axis=0)
+                nbytes += points.nbytes
         else:
-            decoded = np.frombuffer(
-                encoded, dtype=self._dtype, count=count, offset=offset
-            )
-            offset += decoded.nbytes
-        ids = np.frombuffer(encoded, dtype="<u8", count=count, offset=offset)
-        offset += ids.nbytes
-        if offset != len(encoded):
-            raise ValueError(
-                f"Expected encoded size to be {offset} bytes but actual size is {len(encoded)}"
-            )
-        constructor = _ANNOTATION_TYPE_CONSTRUCTORS[self.annotation_type]
-        rank = self.coordinate_space.rank
-        num_properties = len(self.properties)
-        return [
-            constructor(
-                decoded[annotation_i]["geometry"],
+            lower, upper = write_annotations._get_geometry_bounds(
+                self.annotation_type,
                 rank,
-                [decoded[annotation_i][f"property{i}"] for i in range(num_properties)],
-                None,
-                str(ids[annotation_i]),
+                np.concatenate(
+                    [records[name] for name in _GEOMETRY_FIELDS[self.annotation_type]],
+                    axis=1,
+                ).reshape(-1, len(_GEOMETRY_FIELDS[self.annotation_type]) * rank),
             )
-            for annotation_i in range(count)
-        ]
+        nbytes += lower.nbytes + upper.nbytes
+        # Cached chunks are shared by all queries.
+        for array in (records, lower, upper):
+            array.setflags(write=False)
+        return _SpatialChunk(records, lower, upper, nbytes)
 
     def _get_child_kvstore(self, metadata: typing.Any) -> ts.KvStore | None:
         if metadata is None:
@@ -470,6 +567,107 @@ class AnnotationReader:
             staleness_bound=self.staleness_bound,
         )
 
+    def _get_spatial_chunks(self, level: int, cells: np.ndarray) -> list[_SpatialChunk]:
+        """Returns the decoded chunks of cells of a spatial index level.
+
+        Chunks not in the cache are read in a single `ts.Batch`, which allows
+        reads from the same shard to be coalesced.  Missing cells are returned
+        as empty chunks.
+        """
+        spatial_index = self.spatial[level]
+        cache = self._chunk_cache
+        keys = [(level, tuple(cell)) for cell in cells.tolist()]
+        chunks = [None if cache is None else cache.get(key) for key in keys]
+        missing = [i for i, chunk in enumerate(chunks) if chunk is None]
+        if missing:
+            with ts.Batch() as batch:
+                futures = [spatial_index.read(keys[i][1], batch=batch) for i in missing]
+            for i, future in zip(missing, futures):
+                read_result = future.result()
+                chunk = self._decode_spatial_chunk(
+                    read_result.value if read_result.state == "value" else None
+                )
+                if cache is not None:
+                    cache.put(keys[i], chunk)
+                chunks[i] = chunk
+        return typing.cast(list[_SpatialChunk], chunks)
+
+    def _iter_records_within_spatial_bounds(
+        self,
+        lower_bound: typing.Sequence[float] | None,
+        upper_bound: typing.Sequence[float] | None,
+        min_spatial_index_level: int,
+        limit: int | None,
+        max_parallelism: int,
+    ) -> typing.Iterator[np.ndarray]:
+        """Yields records of the annotations within bounds, chunk by chunk.
+
+        Annotations that intersect several cells, at one or more levels, are
+        yielded only from the first of them.
+        """
+        origin = np.array(self.lower_bound, dtype=np.float64)
+        dataset_upper_bound = np.array(self.upper_bound, dtype=np.float64)
+        lower = origin if lower_bound is None else np.maximum(origin, lower_bound)
+        upper = (
+            dataset_upper_bound
+            if upper_bound is None
+            else np.minimum(dataset_upper_bound, upper_bound)
+        )
+        if np.any(upper < lower):
+            return
+
+        count = 0
+        seen: set[int] = set()
+        for level in range(len(self.spatial) - 1, min_spatial_index_level - 1, -1):
+            metadata = self.spatial[level].metadata
+            chunk_size = np.array(metadata["chunk_size"], dtype=np.float64)
+            min_chunk = np.maximum(
+                0, np.asarray((lower - origin) // chunk_size, dtype=np.int64)
+            )
+            max_chunk = np.minimum(
+                metadata["grid_shape"],
+                np.asarray((upper - origin) // chunk_size, dtype=np.int64) + 1,
+            )
+            shape = tuple(np.maximum(max_chunk - min_chunk, 0).tolist())
+            num_cells = int(np.prod(shape))
+            for begin in range(0, num_cells, max_parallelism):
+                # Cells are visited in the same order as `np.ndindex`.
+                cells = min_chunk + np.stack(
+                    np.unravel_index(
+                        np.arange(begin, min(begin + max_parallelism, num_cells)),
+                        shape,
+                    ),
+                    axis=-1,
+                )
+                cell_lower_bound = cells * chunk_size + origin
+                cell_upper_bound = np.minimum(
+                    dataset_upper_bound, cell_lower_bound + chunk_size
+                )
+                contained = np.all(cell_lower_bound >= lower, axis=1) & np.all(
+                    cell_upper_bound <= upper, axis=1
+                )
+                chunks = self._get_spatial_chunks(level, cells)
+                for chunk, chunk_contained in zip(chunks, contained.tolist()):
+                    if limit is not None and count >= limit:
+                        return
+                    records = chunk.records
+                    if not chunk_contained:
+                        records = records[
+                            np.all(chunk.lower <= upper, axis=1)
+                            & np.all(chunk.upper >= lower, axis=1)
+                        ]
+                    ids = records["id"].tolist()
+                    is_new = np.fromiter(
+                        (i not in seen for i in ids), dtype=bool, count=len(ids)
+                    )
+                    seen.update(ids)
+                    records = records[is_new]
+                    if limit is not None:
+                        records = records[: limit - count]
+                    if len(records):
+                        count += len(records)
+                        yield records
+
     def get_within_spatial_bounds(
         self,
         *,
@@ -488,95 +686,55 @@ class AnnotationReader:
               If not specified, defaults to `.upper_bound`.
           min_spatial_index_level: Minimum spatial index level to use.
           limit: Maximum number of iterations to return.
+          max_parallelism: Maximum number of spatial index cells read in a
+              single batch.
 
         Group:
           I/O
         """
-        if lower_bound is None:
-            lower_bound = self.lower_bound
-        else:
-            lower_bound = np.maximum(self.lower_bound, lower_bound)  # type: ignore[assignment]
-
-        if upper_bound is None:
-            upper_bound = self.upper_bound
-        else:
-            upper_bound = np.minimum(self.upper_bound, upper_bound)  # type: ignore[assignment]
+        for records in self._iter_records_within_spatial_bounds(
+            lower_bound, upper_bound, min_spatial_index_level, limit, max_parallelism
+        ):
+            yield from self._get_annotations(records)
 
-        if np.any(upper_bound < lower_bound):  # type: ignore[operator]
-            return
+    def get_records_within_spatial_bounds(
+        self,
+        *,
+        lower_bound: typing.Sequence[float] | None = None,
+        upper_bound: typing.Sequence[float] | None = None,
+        min_spatial_index_level=0,
+        limit: int | None = None,
+        max_parallelism: int = 128,
+    ) -> np.ndarray:
+        """Returns the annotations within the specified bounds as an array.
 
-        check_bounds = _ANNOTATION_TYPE_CHECK_BOUNDS[self.annotation_type]
+        Equivalent to `.get_within_spatial_bounds`, but returns a structured
+        array with the `.record_dtype` rather than annotation objects.  Each
+        annotation appears once, even if it intersects several spatial index
+        cells.
 
-        count = 0
-        outstanding_requests: collections.deque[
-            tuple[
-                ts.Future, np.typing.NDArray[np.float64], np.typing.NDArray[np.float64]
-            ]
-        ] = collections.deque()
-
-        def handle_outstanding_request():
-            nonlocal count
-
-            future, req_lower_bound, req_upper_bound = outstanding_requests.pop()
-            annotations = future.result()
-            if annotations is None:
-                return
-            if np.all(req_lower_bound >= lower_bound) and np.all(
-                req_upper_bound <= upper_bound
-            ):
-                annotation_iter = iter(annotations)
-            else:
-                annotation_iter = (
-                    annotation
-                    for annotation in annotations
-                    if check_bounds(annotation, lower_bound, upper_bound)
-                )
-            for annotation in annotation_iter:
-                if limit is not None and count >= limit:
-                    break
-                yield annotation
-                count += 1
-
-        def add_request(spatial_index, coords, req_lower_bound, req_upper_bound):
-            while len(outstanding_requests) >= max_parallelism:
-                yield from handle_outstanding_request()
-
-            if limit is not None and count >= limit:
-                return
-            outstanding_requests.appendleft(
-                (spatial_index.get(coords), req_lower_bound, req_upper_bound)
-            )
+        Args:
+          lower_bound: Lower bound within `.coordinate_space`.
+              If not specified, defaults to `.lower_bound`.
+          upper_bound: Upper bound within `.coordinate_space`.
+              If not specified, defaults to `.upper_bound`.
+          min_spatial_index_level: Minimum spatial index level to use.
+          limit: Maximum number of annotations to return.
+          max_parallelism: Maximum number of spatial index cells read in a
+              single batch.
 
-        for level in range(len(self.spatial) - 1, min_spatial_index_level - 1, -1):
-            if limit is not None and count >= limit:
-                return
-            spatial_index = self.spatial[level]
-            metadata = spatial_index.metadata
-            chunk_size = metadata["chunk_size"]
-            grid_shape = metadata["grid_shape"]
-            min_chunk = np.asarray(
-                (np.array(lower_bound) - self.lower_bound) // chunk_size, dtype=np.int64
-            )
-            max_chunk = (
-                np.asarray(
-                    (np.array(upper_bound) - self.lower_bound) // chunk_size,
-                    dtype=np.int64,
+        Group:
+          I/O
+        """
+        return np.concatenate(
+            [np.zeros(0, dtype=self.record_dtype)]
+            + list(
+                self._iter_records_within_spatial_bounds(
+                    lower_bound,
+                    upper_bound,
+                    min_spatial_index_level,
+                    limit,
+                    max_parallelism,
                 )
-                + 1
             )
-            min_chunk = np.maximum(0, min_chunk)
-            max_chunk = np.minimum(grid_shape, max_chunk)
-            for coords in np.ndindex(*(max_chunk - min_chunk)):
-                if limit is not None and count >= limit:
-                    return
-                coords = coords + min_chunk  # type: ignore[assignment]
-                req_lower_bound = coords * chunk_size + self.lower_bound
-                req_upper_bound = np.minimum(
-                    self.upper_bound, req_lower_bound + chunk_size
-                )
-                yield from add_request(
-                    spatial_index, coords, req_lower_bound, req_upper_bound
-                )
-
-        while outstanding_requests:
-            yield from handle_outstanding_request()
+        )
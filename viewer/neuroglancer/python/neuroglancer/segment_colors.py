@@ -12,8 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
 import math
 
+import numpy as np
+
 
 def hash_function(state, value):
     """Python implementation of hashCombine() function
@@ -89,3 +92,85 @@ def hex_string_from_segment_id(color_seed, segment_id):
         hex_string = "0" * (6 - len(hex_string)) + hex_string
     hex_string = "#" + hex_string
     return hex_string
+
+
+def hash_function_array(state, value):
+    """Vectorized `hash_function` over arrays of uint32 states and values."""
+    state = np.asarray(state, dtype=np.uint32)
+    value = np.asarray(value, dtype=np.uint32) * np.uint32(0xCC9E2D51)
+    value = (value << np.uint32(15)) | (value >> np.uint32(17))
+    value = value * np.uint32(0x1B873593)
+    state = state ^ value
+    state = (state << np.uint32(13)) | (state >> np.uint32(19))
+    return state * np.uint32(5) + np.uint32(0xE6546B64)
+
+
+def _hsv_to_rgb_array(h, s, v):
+    """Vectorized `hsv_to_rgb`; returns an array of shape (..., 3)."""
+    h = h * 6
+    hue_index = np.floor(h)
+    remainder = h - hue_index
+    val1 = v * (1 - s)
+    val2 = v * (1 - (s * remainder))
+    val3 = v * (1 - (s * (1 - remainder)))
+    v = np.broadcast_to(v, np.shape(h))
+    channels = np.stack([v, val1, val2, val3])
+    # Indices into `channels` of the (r, g, b) values for each hue sector.
+    sectors = np.array(
+        [[0, 3, 1], [2, 0, 1], [1, 0, 3], [1, 2, 0], [3, 1, 0], [0, 1, 2]]
+    )
+    selected = sectors[hue_index.astype(np.int64) % 6]
+    return np.take_along_axis(channels[..., np.newaxis], selected[np.newaxis], axis=0)[
+        0
+    ]
+
+
+@functools.cache
+def _get_packed_color_table():
+    """Returns the packed color for each value of the low 16 bits of the hash.
+
+    Colors depend on the color seed only through the hash, so the table is
+    shared by all seeds.
+    """
+    hashes = np.arange(1 << 16, dtype=np.uint32)
+    c0 = (hashes & 0xFF) / 255.0
+    c1 = ((hashes >> 8) & 0xFF) / 255.0
+    rgb = _hsv_to_rgb_array(c0, 0.5 + 0.5 * c1, 1.0)
+    # np.rint rounds halfway cases to even, as `round` in `pack_color` does.
+    rgb = np.clip(np.rint(rgb * 255), 0, 255).astype(np.uint32)
+    table = (rgb[:, 0] << 16) | (rgb[:, 1] << 8) | rgb[:, 2]
+    table.setflags(write=False)
+    return table
+
+
+@functools.cache
+def _get_hex_string_table():
+    return ["#%06x" % color for color in _get_packed_color_table().tolist()]
+
+
+def _get_color_hashes(color_seed, segment_ids):
+    segment_ids = np.asarray(segment_ids, dtype=np.uint64)
+    result = hash_function_array(
+        color_seed & 0xFFFFFFFF, (segment_ids & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+    )
+    result = hash_function_array(
+        result, (segment_ids >> np.uint64(32)).astype(np.uint32)
+    )
+    return result & np.uint32(0xFFFF)
+
+
+def packed_colors_from_segment_ids(color_seed, segment_ids):
+    """Returns the colors of an array of segment ids given a color seed.
+
+    The result is a uint32 array of the same shape, with each color packed as
+    0xRRGGBB, as in `hex_string_from_segment_id`.
+    """
+    return _get_packed_color_table()[_get_color_hashes(color_seed, segment_ids)]
+
+
+def hex_strings_from_segment_ids(color_seed, segment_ids):
+    """Returns a list of the hex color strings of an array of segment ids."""
+    table = _get_hex_string_table()
+    return [
+        table[h] for h in _get_color_hashes(color_seed, segment_ids).ravel().tolist()
+    ]
@@ -30,7 +30,14 @@ import tornado.netutil
 import tornado.platform.asyncio
 import tornado.web
 
-from . import async_util, local_volume, skeleton, static
+from . import (
+    async_util,
+    json_patch,
+    local_volume,
+    skeleton,
+    static,
+    subvolume_process_pool,
+)
 from .json_utils import encode_json, json_encoder_default
 from .random_token import make_random_token
 from .trackable_state import ConcurrentModificationError
@@ -94,7 +101,13 @@ def _get_colab_server_url(port: int) -> str:
 
 
 class Server(async_util.BackgroundTornadoServer):
-    def __init__(self, bind_address="127.0.0.1", bind_port=0, token=None):
+    def __init__(
+        self,
+        bind_address="127.0.0.1",
+        bind_port=0,
+        token=None,
+        process_pool_options=None,
+    ):
         super().__init__(daemon=True)
         self.viewers = weakref.WeakValueDictionary()
         self._bind_address = bind_address
@@ -105,6 +118,11 @@ class Server(async_util.BackgroundTornadoServer):
         self.executor = concurrent.futures.ThreadPoolExecutor(
             max_workers=multiprocessing.cpu_count()
         )
+        self.process_pool = None
+        if process_pool_options is not None:
+            self.process_pool = subvolume_process_pool.SubvolumeProcessPool(
+                **process_pool_options
+            )
 
     def _attempt_to_start_server(self):
         def log_function(handler):
@@ -170,6 +188,11 @@ class Server(async_util.BackgroundTornadoServer):
     def __exit__(self, exc_type, exc_value, traceback):
         self.stop()
 
+    def stop(self):
+        super().stop()
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+
     def get_volume(self, key):
         dot_index = key.find(".")
         if dot_index == -1:
@@ -248,12 +271,24 @@ class VolumeChunkResponseHandler(BaseRequestHandler):
 
 
 class EventStreamStateWatcher:
-    def __init__(self, key: str, client_id: str, state, last_generation: str, wake_up):
+    def __init__(
+        self,
+        key: str,
+        client_id: str,
+        state,
+        last_generation: str,
+        wake_up,
+        send_patches: bool = False,
+    ):
         self.key = key
         self.state = state
         self.last_generation = last_generation
         self._wake_up = wake_up
         self._client_id = client_id
+        self._send_patches = send_patches
+        # Raw state with generation `last_generation`, if known to be held by
+        # the client.  Subsequent updates are sent as patches against it.
+        self._last_state = None
         state.add_changed_callback(wake_up)
 
     def unregister(self):
@@ -264,9 +299,26 @@ class EventStreamStateWatcher:
         if generation == self.last_generation:
             return False
         if generation.startswith(self._client_id + "/"):
+            # The client sent this state itself, and uses it as the base of
+            # the next patch once the request completes.
+            if self._send_patches:
+                self.last_generation = generation
+                self._last_state = raw_state
             return False
+        if self._last_state is None:
+            msg = {"k": self.key, "s": raw_state, "g": generation}
+        else:
+            # The client falls back to requesting the full state if it no
+            # longer has the state with generation `pg`.
+            msg = {
+                "k": self.key,
+                "p": json_patch.make_patch(self._last_state, raw_state),
+                "pg": self.last_generation,
+                "g": generation,
+            }
         self.last_generation = generation
-        msg = {"k": self.key, "s": raw_state, "g": generation}
+        if self._send_patches:
+            self._last_state = raw_state
         handler.write(f"data: {encode_json(msg)}\n\n")
         if debug:
             print(f"data: {encode_json(msg)}\n\n")
@@ -287,6 +339,7 @@ class EventStreamHandler(BaseRequestHandler):
         client_id = self.get_query_argument("c")
         if client_id is None:
             raise tornado.web.HTTPError(400, "missing client_id")
+        send_patches = self.get_query_argument("p", None) == "1"
         self._closed = False
 
         watchers = []
@@ -302,6 +355,7 @@ class EventStreamHandler(BaseRequestHandler):
                     client_id=client_id,
                     wake_up=self._wake_up,
                     last_generation=last_generation,
+                    send_patches=send_patches,
                 )
             )
 
@@ -352,9 +406,17 @@ class SetStateHandler(BaseRequestHandler):
         msg = json.loads(self.request.body)
         prev_generation = msg["pg"]
         generation = msg["g"]
-        state = msg["s"]
         client_id = msg["c"]
         try:
+            if "p" in msg:
+                # Patch against the state with generation `prev_generation`.
+                shared_state = viewer.shared_state
+                state, existing_generation = shared_state.raw_state_and_generation
+                if existing_generation != prev_generation:
+                    raise ConcurrentModificationError
+                state = json_patch.apply_patch(state, msg["p"])
+            else:
+                state = msg["s"]
             new_generation = viewer.set_state(
                 state, f"{client_id}/{generation}", existing_generation=prev_generation
             )
@@ -363,6 +425,8 @@ class SetStateHandler(BaseRequestHandler):
         except ConcurrentModificationError:
             self.set_status(412)
             self.finish("")
+        except json_patch.JsonPatchError as e:
+            raise tornado.web.HTTPError(400, str(e)) from e
 
 
 class CredentialsHandler(BaseRequestHandler):
@@ -424,6 +488,8 @@ class SubvolumeHandler(BaseRequestHandler):
             self.send_error(404)
             return
 
+        uses_gzip = vol.uses_gzip(data_format)
+        gzip = uses_gzip and "gzip" in self.request.headers.get("Accept-Encoding", "")
         try:
             data, content_type = await asyncio.wrap_future(
                 self.server.executor.submit(
@@ -432,13 +498,29 @@ class SubvolumeHandler(BaseRequestHandler):
                     start=start_pos,
                     end=end_pos,
                     scale_key=scale_key,
+                    process_pool=self.server.process_pool,
+                    block_size=self.get_query_argument("blockSize", None),
+                    gzip=gzip,
                 )
             )
         except ValueError as e:
             self.send_error(400, message=e.args[0])
             return
         self.set_header("Content-type", content_type)
-        self.finish(data)
+        if uses_gzip:
+            # The body depends on Accept-Encoding, so caches must key on it.
+            self.set_header("Vary", "Accept-Encoding")
+        if gzip:
+            self.set_header("Content-Encoding", "gzip")
+        if isinstance(data, memoryview):
+            # `write` only accepts bytes; send the buffer directly rather than
+            # copying it.
+            self.set_header("Content-Length", str(data.nbytes))
+            self.flush()
+            self.request.connection.write(data)
+        else:
+            self.write(data)
+        self.finish()
 
 
 class MeshHandler(BaseRequestHandler):
@@ -589,6 +671,33 @@ def set_server_bind_address(bind_address=None, bind_port=0):
         global_server_args.update(bind_address=bind_address, bind_port=bind_port)
 
 
+def set_subvolume_process_pool(
+    enabled=True,
+    max_workers=None,
+    min_bytes=subvolume_process_pool.DEFAULT_MIN_BYTES,
+):
+    """Serves chunks of large in-memory volumes from a pool of worker processes.
+
+    By default chunks of `LocalVolume` data are read, downsampled and encoded
+    in a thread pool, which is limited by the GIL to roughly one core.  With
+    the process pool enabled, volumes backed by a NumPy array of at least
+    `min_bytes` are copied once into shared memory and their chunks are
+    encoded by worker processes; smaller volumes still use the thread pool.
+
+    If the server is already running, this does not have any effect until the
+    server is restarted.
+
+    Group:
+      Server
+
+    """
+    options = None
+    if enabled:
+        options = dict(max_workers=max_workers, min_bytes=min_bytes)
+    with _global_server_lock:
+        global_server_args.update(process_pool_options=options)
+
+
 def is_server_running() -> bool:
     """Returns ``True`` if the Python integration webserver is running.
 
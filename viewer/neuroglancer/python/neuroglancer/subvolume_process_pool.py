@@ -0,0 +1,222 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Process pool for reading, downsampling and encoding LocalVolume chunks.
+
+Compression and downsampling of chunks served from Python are partly bound
+by the GIL, so with the default thread pool a single volume is served by
+roughly one core.  `SubvolumeProcessPool` instead runs that work in worker
+processes.
+
+The source array of each volume is copied once per generation into a
+`multiprocessing.shared_memory` segment, which workers map directly; a request
+only sends the segment name and chunk bounds, and only the encoded chunk is
+sent back.
+"""
+
+import collections
+import concurrent.futures
+import multiprocessing
+import threading
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import local_volume
+
+# Volumes smaller than this are served by the thread pool, where the cost of
+# copying the data to shared memory and of the process round trip is not
+# worthwhile.
+DEFAULT_MIN_BYTES = 64 << 20
+
+# Number of shared memory segments each worker keeps mapped.
+MAX_ATTACHED_SEGMENTS = 8
+
+
+class _SharedArray:
+    """Copy of a volume's source array in shared memory."""
+
+    def __init__(self, array, generation):
+        self.generation = generation
+        self.shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        view = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf)
+        view[...] = array
+        del view
+        self.spec = (self.shm.name, array.shape, array.dtype.str)
+        self._refs = 0
+        self._retired = False
+
+    def acquire(self):
+        self._refs += 1
+
+    def release(self):
+        """Drops a reference; returns True if the segment should be unlinked."""
+        self._refs -= 1
+        return self._retired and self._refs == 0
+
+    def retire(self):
+        """Marks the segment as superseded; returns True if it is unused."""
+        self._retired = True
+        return self._refs == 0
+
+    def unlink(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class SubvolumeProcessPool:
+    """Encodes chunks of large in-memory LocalVolumes in worker processes.
+
+    Only volumes backed by a NumPy array of at least `min_bytes` are
+    accepted; TensorStore-backed and small volumes keep using the thread pool.
+    The shared copy is refreshed when the volume is invalidated, so in-place
+    modifications of the source array are only seen after
+    `LocalVolume.invalidate` is called.
+    """
+
+    def __init__(self, max_workers=None, min_bytes=DEFAULT_MIN_BYTES, mp_context=None):
+        """Initializes the pool.
+
+        @param max_workers: Number of worker processes.  Defaults to the number
+            of CPUs.
+        @param min_bytes: Minimum size of the source array of an accepted
+            volume.
+        @param mp_context: multiprocessing context used to start workers.
+            Defaults to 'forkserver' where available, since forking the
+            multi-threaded server process is unsafe, and 'spawn' otherwise.
+        """
+        if mp_context is None:
+            method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            mp_context = multiprocessing.get_context(method)
+        self.min_bytes = min_bytes
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=mp_context
+        )
+        self._lock = threading.Lock()
+        self._shared: dict[str, _SharedArray] = {}
+
+    def accepts(self, vol):
+        data = vol.data
+        if type(data) is not local_volume.DataWrapper:
+            return False
+        array = data._data
+        return (
+            type(array) is np.ndarray
+            and not array.dtype.hasobject
+            and array.nbytes >= self.min_bytes
+        )
+
+    def encode_subvolume(
+        self, vol, data_format, downsample_factor, start, end, encode_options
+    ):
+        """Reads, downsamples and encodes a chunk of vol in a worker process.
+
+        Blocks until the result is available.
+
+        @param encode_options: Keyword arguments for
+            `local_volume.encode_subvolume`.
+
+        @return: Tuple (data, content_type), as for
+            `LocalVolume.get_encoded_subvolume`.
+        """
+        shared = self._acquire(vol)
+        try:
+            return self._executor.submit(
+                _encode_subvolume,
+                shared.spec,
+                data_format,
+                downsample_factor,
+                start,
+                end,
+                vol.downsampling_method,
+                encode_options,
+            ).result()
+        finally:
+            with self._lock:
+                unlink = shared.release()
+            if unlink:
+                shared.unlink()
+
+    def _acquire(self, vol):
+        generation = vol.change_count
+        with self._lock:
+            shared = self._shared.get(vol.token)
+            if shared is None or shared.generation != generation:
+                if shared is None:
+                    weakref.finalize(vol, self._remove, vol.token)
+                elif shared.retire():
+                    shared.unlink()
+                shared = self._shared[vol.token] = _SharedArray(
+                    vol.data._data, generation
+                )
+            shared.acquire()
+            return shared
+
+    def _remove(self, token):
+        with self._lock:
+            shared = self._shared.pop(token, None)
+            unlink = shared is not None and shared.retire()
+        if unlink:
+            shared.unlink()
+
+    def shutdown(self):
+        """Stops the workers and frees all shared memory segments."""
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for token in list(self._shared):
+            self._remove(token)
+
+
+# Per-worker mapped segments: name -> (SharedMemory, array).
+_attached: collections.OrderedDict = collections.OrderedDict()
+
+
+def _open_shared_memory(name):
+    try:
+        # The segment is owned by the server process; since Python 3.13 this
+        # keeps the worker's resource tracker from unlinking it on exit.
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _attach(name, shape, dtype):
+    entry = _attached.get(name)
+    if entry is not None:
+        _attached.move_to_end(name)
+        return entry[1]
+    shm = _open_shared_memory(name)
+    array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    array.setflags(write=False)
+    _attached[name] = (shm, array)
+    while len(_attached) > MAX_ATTACHED_SEGMENTS:
+        _, (old_shm, old_array) = _attached.popitem(last=False)
+        del old_array
+        old_shm.close()
+    return array
+
+
+def _encode_subvolume(
+    spec, data_format, downsample_factor, start, end, method, encode_options
+):
+    data = _attach(*spec)
+    subvol = local_volume.read_subvolume(data, downsample_factor, start, end, method)
+    data, content_type = local_volume.encode_subvolume(
+        data_format, subvol, **encode_options
+    )
+    # memoryviews returned by the raw encoder cannot be pickled.
+    return bytes(data), content_type
@@ -0,0 +1,267 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Writes the neuroglancer_uint64_sharded_v1 format.
+
+See src/datasource/precomputed/sharded.md for the format specification.
+"""
+
+import gzip
+import os
+import pathlib
+from collections.abc import Sequence
+from typing import Literal, NamedTuple
+
+import numpy as np
+
+ShardingHash = Literal["identity", "murmurhash3_x86_128"]
+ShardingEncoding = Literal["raw", "gzip"]
+
+# Targets used by `choose_sharding_spec`.
+DEFAULT_TARGET_KEYS_PER_MINISHARD = 256
+DEFAULT_TARGET_SHARD_BYTES = 256 << 20
+
+# zlib's default level; level 9 is several times slower for minishard indices
+# while producing output of about the same size.
+GZIP_COMPRESSION_LEVEL = 6
+
+
+class ShardingSpec(NamedTuple):
+    """Sharding specification (the ``"sharding"`` JSON member)."""
+
+    hash: ShardingHash = "murmurhash3_x86_128"
+    preshift_bits: int = 0
+    minishard_bits: int = 0
+    shard_bits: int = 0
+    minishard_index_encoding: ShardingEncoding = "gzip"
+    data_encoding: ShardingEncoding = "raw"
+
+    def to_json(self):
+        return {
+            "@type": "neuroglancer_uint64_sharded_v1",
+            "hash": self.hash,
+            "preshift_bits": self.preshift_bits,
+            "minishard_bits": self.minishard_bits,
+            "shard_bits": self.shard_bits,
+            "minishard_index_encoding": self.minishard_index_encoding,
+            "data_encoding": self.data_encoding,
+        }
+
+    def get_shard_and_minishard(self, keys):
+        """Returns the shard and minishard numbers of an array of uint64 keys."""
+        hashed = np.asarray(keys, dtype=np.uint64) >> np.uint64(self.preshift_bits)
+        if self.hash == "murmurhash3_x86_128":
+            hashed = murmurhash3_x86_128_uint64(hashed)
+        elif self.hash != "identity":
+            raise ValueError(f"Unsupported sharding hash: {self.hash!r}")
+        minishard = hashed & np.uint64((1 << self.minishard_bits) - 1)
+        shard = (hashed >> np.uint64(self.minishard_bits)) & np.uint64(
+            (1 << self.shard_bits) - 1
+        )
+        return shard, minishard
+
+    def get_shard_filename(self, shard: int) -> str:
+        return "%0*x.shard" % ((self.shard_bits + 3) // 4, shard)
+
+
+def choose_sharding_spec(
+    num_keys: int,
+    total_bytes: int,
+    hash: ShardingHash = "murmurhash3_x86_128",
+    target_keys_per_minishard: int = DEFAULT_TARGET_KEYS_PER_MINISHARD,
+    target_shard_bytes: int = DEFAULT_TARGET_SHARD_BYTES,
+    data_encoding: ShardingEncoding = "raw",
+) -> ShardingSpec:
+    """Chooses shard and minishard counts for an index of a given size.
+
+    Shards are sized to hold about `target_shard_bytes`, and minishards to
+    hold about `target_keys_per_minishard` keys, which keeps each minishard
+    index that the client must fetch small.
+    """
+    total_bits = max(
+        0, int(np.ceil(np.log2(max(num_keys, 1) / target_keys_per_minishard)))
+    )
+    shard_bits = max(0, int(np.ceil(np.log2(max(total_bytes, 1) / target_shard_bytes))))
+    shard_bits = min(shard_bits, total_bits)
+    return ShardingSpec(
+        hash=hash,
+        minishard_bits=total_bits - shard_bits,
+        shard_bits=shard_bits,
+        data_encoding=data_encoding,
+    )
+
+
+_M32 = np.uint64(0xFFFFFFFF)
+
+
+def _rotl32(x, r):
+    return ((x << np.uint64(r)) | (x >> np.uint64(32 - r))) & _M32
+
+
+def _fmix32(h):
+    h ^= h >> np.uint64(16)
+    h = (h * np.uint64(0x85EBCA6B)) & _M32
+    h ^= h >> np.uint64(13)
+    h = (h * np.uint64(0xC2B2AE35)) & _M32
+    h ^= h >> np.uint64(16)
+    return h
+
+
+def murmurhash3_x86_128_uint64(keys):
+    """Low 64 bits of MurmurHash3_x86_128 (seed 0) of little-endian uint64 keys.
+
+    32-bit arithmetic is emulated in uint64 lanes, masking after each
+    multiplication.
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    c1 = np.uint64(0x239B961B)
+    c2 = np.uint64(0xAB0E9789)
+    c3 = np.uint64(0x38B34AE5)
+
+    # 8-byte input: only the tail steps for k2 (bytes 4-7) and k1 (bytes 0-3).
+    k2 = keys >> np.uint64(32)
+    k2 = (k2 * c2) & _M32
+    k2 = _rotl32(k2, 16)
+    k2 = (k2 * c3) & _M32
+    h2 = k2
+
+    k1 = keys & _M32
+    k1 = (k1 * c1) & _M32
+    k1 = _rotl32(k1, 15)
+    k1 = (k1 * c2) & _M32
+    h1 = k1
+
+    length = np.uint64(8)
+    h1 ^= length
+    h2 ^= length
+    h3 = np.full_like(keys, 8)
+    h4 = np.full_like(keys, 8)
+
+    h1 = (h1 + h2 + h3 + h4) & _M32
+    h2 = (h2 + h1) & _M32
+    h3 = (h3 + h1) & _M32
+    h4 = (h4 + h1) & _M32
+
+    h1 = _fmix32(h1)
+    h2 = _fmix32(h2)
+    h3 = _fmix32(h3)
+    h4 = _fmix32(h4)
+
+    h1 = (h1 + h2 + h3 + h4) & _M32
+    h2 = (h2 + h1) & _M32
+    return h1 | (h2 << np.uint64(32))
+
+
+def compressed_morton_code(cells, grid_shape: Sequence[int]):
+    """Compressed Morton codes of an (n, rank) array of grid cell positions.
+
+    Each dimension contributes only as many bits as needed for its grid size,
+    interleaved starting from the least significant bit.
+    """
+    cells = np.asarray(cells, dtype=np.uint64)
+    code = np.zeros(cells.shape[0], dtype=np.uint64)
+    bits_per_dim = [int(size - 1).bit_length() for size in grid_shape]
+    output_bit = 0
+    for bit in range(max(bits_per_dim, default=0)):
+        for dim, num_bits in enumerate(bits_per_dim):
+            if bit < num_bits:
+                code |= ((cells[:, dim] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(
+                    output_bit
+                )
+                output_bit += 1
+    if output_bit > 64:
+        raise ValueError(f"Grid shape {list(grid_shape)} requires more than 64 bits")
+    return code
+
+
+def _encode(data: bytes, encoding: ShardingEncoding) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_COMPRESSION_LEVEL, mtime=0)
+    return data
+
+
+def write_shard(f, spec: ShardingSpec, keys, minishards, values: Sequence[bytes]):
+    """Writes a single shard file.
+
+    @param keys: uint64 keys of the chunks in the shard.
+    @param minishards: Minishard number of each key.
+    @param values: Encoded chunk data for each key (before `data_encoding`).
+    """
+    keys = np.asarray(keys, dtype=np.uint64)
+    order = np.lexsort((keys, minishards))
+    keys = keys[order]
+    minishards = np.asarray(minishards, dtype=np.int64)[order]
+    num_minishards = 1 << spec.minishard_bits
+
+    if spec.data_encoding == "raw":
+        data = [values[i] for i in order.tolist()]
+    else:
+        data = [_encode(values[i], spec.data_encoding) for i in order.tolist()]
+    sizes = np.fromiter(map(len, data), dtype=np.uint64, count=len(data))
+    starts = np.cumsum(sizes) - sizes
+    f.write(b"\0" * (16 * num_minishards))
+    f.write(b"".join(data))
+    offset = int(sizes.sum())
+    del data
+
+    shard_index = np.zeros((num_minishards, 2), dtype="<u8")
+    bounds = np.searchsorted(minishards, np.arange(num_minishards + 1))
+    for minishard in np.flatnonzero(np.diff(bounds)).tolist():
+        begin, end = bounds[minishard], bounds[minishard + 1]
+        index = np.empty((3, end - begin), dtype="<u8")
+        index[0] = np.diff(keys[begin:end], prepend=np.uint64(0))
+        # Chunks of a minishard are contiguous, so only the first one has a
+        # non-zero offset relative to the end of its predecessor.
+        index[1] = 0
+        index[1, 0] = starts[begin]
+        index[2] = sizes[begin:end]
+        encoded_index = _encode(index.tobytes(), spec.minishard_index_encoding)
+        shard_index[minishard] = (offset, offset + len(encoded_index))
+        f.write(encoded_index)
+        offset += len(encoded_index)
+
+    f.seek(0)
+    f.write(shard_index.tobytes())
+
+
+def write_sharded(
+    directory: str | pathlib.Path,
+    spec: ShardingSpec,
+    keys,
+    values: Sequence[bytes],
+):
+    """Writes a sharded index mapping uint64 keys to values.
+
+    @return: The paths of the shard files written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    keys = np.asarray(keys, dtype=np.uint64)
+    shards, minishards = spec.get_shard_and_minishard(keys)
+    order = np.argsort(shards, kind="stable")
+    shard_numbers, shard_starts = np.unique(shards[order], return_index=True)
+    shard_ends = np.append(shard_starts[1:], len(order))
+    paths = []
+    for shard, begin, end in zip(shard_numbers.tolist(), shard_starts, shard_ends):
+        members = order[begin:end]
+        path = os.path.join(directory, spec.get_shard_filename(shard))
+        with open(path, "wb") as f:
+            write_shard(
+                f,
+                spec,
+                keys[members],
+                minishards[members],
+                [values[i] for i in members.tolist()],
+            )
+        paths.append(path)
+    return paths
@@ -26,7 +26,7 @@ import numpy as np
 
 from . import local_volume, segment_colors, skeleton
 from .coordinate_space import CoordinateArray, CoordinateSpace, DimensionScale
-from .equivalence_map import EquivalenceMap
+from .equivalence_map import ArrayEquivalenceMap, EquivalenceMap
 from .json_utils import encode_json_for_repr
 from .json_wrappers import (
     JsonObjectWrapper,
@@ -624,7 +624,7 @@ class ImageLayer(Layer, _AnnotationLayerOptions):
 
 
 def uint64_equivalence_map(obj, _readonly=False):
-    if isinstance(obj, EquivalenceMap):
+    if isinstance(obj, EquivalenceMap | ArrayEquivalenceMap):
         return obj
     if obj is not None:
         obj = [[int(v) for v in group] for group in obj]
@@ -987,13 +987,11 @@ class SegmentationLayer(Layer, _AnnotationLayerOptions):
         strings representing the colors of those segments given the current
         color seed
         """
-        d = {}
-        for segment in self.segments:
-            hex_string = segment_colors.hex_string_from_segment_id(
-                color_seed=self.color_seed, segment_id=segment
-            )
-            d[segment] = hex_string
-        return d
+        segments = list(self.segments)
+        hex_strings = segment_colors.hex_strings_from_segment_ids(
+            self.color_seed, np.array(segments, dtype=np.uint64)
+        )
+        return dict(zip(segments, hex_strings))
 
     linked_segmentation_group = linkedSegmentationGroup = wrapped_property(
         "linkedSegmentationGroup", optional(str)
@@ -14,31 +14,47 @@
 
 """Writes annotations in the Precomputed annotation format.
 
-This provides a simple way to write annotations in the precomputed format, but
-has a number of limitations that makes it suitable only for a relatively small
-amount of annotation data:
+Annotations are added either individually or in bulk from NumPy arrays, and
+are buffered in memory, in columnar form, until they are written.  In
+streaming mode (`max_buffer_bytes`), buffered annotations are spilled to
+temporary files instead, and each index is written one partition at a time.
 
-- All annotations are buffered in memory.
-
-- Only a trivial spatial index consisting of a single grid cell at a single
-  level is generated.  Consequently, Neuroglancer will be forced to download all
-  annotations at once.
-
-- All indices are written in the unsharded format.  Consequently, there is at
-  least one file written per annotation.
+The spatial index is built as described in the format specification: each
+level halves the cell size along the largest dimensions, and annotations are
+randomly subsampled so that each cell holds about `spatial_index_limit`
+annotations, with the remainder deferred to finer levels.  Indices are written
+in the unsharded format (at least one file per annotation) unless `sharded` is
+specified when writing.
 """
 
+import contextlib
+import itertools
 import json
+import math
 import numbers
 import os
 import pathlib
+import shutil
 import struct
-from collections.abc import Sequence
+import tempfile
+import weakref
+from collections.abc import Callable, Sequence
 from typing import Literal, NamedTuple, cast
 
 import numpy as np
 
-from . import coordinate_space, viewer_state
+from . import coordinate_space, uint64_sharded, viewer_state
+
+# Default maximum number of annotations in each cell of the spatial index.
+DEFAULT_SPATIAL_INDEX_LIMIT = 10000
+
+# Individually added annotations are converted to a batch in groups of this
+# size.
+_MAX_PENDING_ANNOTATIONS = 65536
+
+# Cells are addressed by compressed Morton codes in the sharded format, which
+# bounds the total number of subdivisions of the spatial index grid.
+_MAX_SPATIAL_GRID_BITS = 62
 
 
 class Annotation(NamedTuple):
@@ -116,9 +132,468 @@ def _convert_rgba_to_uint8(rgba: str) -> tuple[int, int, int, int]:
     return (*color, alpha)
 
 
+def _get_geometry_bounds(annotation_type: AnnotationType, rank: int, geometry):
+    """Returns the bounds of fixed-size annotations from their geometry."""
+    if annotation_type == "point":
+        return geometry, geometry
+    first = geometry[:, :rank]
+    second = geometry[:, rank:]
+    if annotation_type == "ellipsoid":
+        radii = np.abs(second)
+        return first - radii, first + radii
+    return np.minimum(first, second), np.maximum(first, second)
+
+
+def _get_spatial_sampling_keys(indices, level: int):
+    """Pseudo-random uint64 keys used to subsample annotations at a level.
+
+    The keys depend only on the insertion index of each annotation, so that
+    every pass over the annotations makes the same choices without storing
+    any random state.  The same key is used for all cells intersecting an
+    annotation, so that it is emitted in either all or none of them.
+    """
+    keys = (np.asarray(indices, dtype=np.uint64) << np.uint64(6)) | np.uint64(level)
+    return uint64_sharded.murmurhash3_x86_128_uint64(keys)
+
+
+def _get_intersecting_cells(lower, upper, origin, chunk_size, grid_shape):
+    """Returns the grid cells intersecting each annotation.
+
+    Returns:
+        Tuple ``(annotation_indices, cells)`` with an entry for each
+        (annotation, cell) pair, where ``cells`` has shape ``(num_pairs, rank)``.
+    """
+    num_annotations, rank = lower.shape
+    first = np.clip(np.floor((lower - origin) / chunk_size), 0, grid_shape - 1)
+    last = np.clip(np.floor((upper - origin) / chunk_size), first, grid_shape - 1)
+    first = first.astype(np.int64)
+    extent = last.astype(np.int64) - first + 1
+    counts = extent.prod(axis=1)
+    annotation_indices = np.repeat(np.arange(num_annotations, dtype=np.int64), counts)
+    position = np.arange(len(annotation_indices), dtype=np.int64) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+    cells = np.empty((len(annotation_indices), rank), dtype=np.int64)
+    for dim in range(rank):
+        dim_extent = extent[annotation_indices, dim]
+        cells[:, dim] = first[annotation_indices, dim] + position % dim_extent
+        position //= dim_extent
+    return annotation_indices, cells
+
+
+class _RaggedBytes(NamedTuple):
+    """Sequence of byte strings stored in a single buffer."""
+
+    data: np.typing.NDArray[np.uint8]
+    # Start of each string, followed by the total size.
+    offsets: np.typing.NDArray[np.int64]
+
+    @staticmethod
+    def from_encoded(encoded: np.ndarray | list[bytes], indices):
+        """Returns the subset `indices` of encoded annotations."""
+        if isinstance(encoded, list):
+            return _RaggedBytes.from_list([encoded[i] for i in indices.tolist()])
+        records = np.ascontiguousarray(encoded[indices])
+        return _RaggedBytes(
+            records.view(np.uint8).reshape(-1),
+            np.arange(len(records) + 1, dtype=np.int64) * records.dtype.itemsize,
+        )
+
+    @staticmethod
+    def from_list(values: Sequence[bytes]):
+        offsets = np.zeros(len(values) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        return _RaggedBytes(np.frombuffer(b"".join(values), dtype=np.uint8), offsets)
+
+    @staticmethod
+    def concatenate(parts: Sequence["_RaggedBytes"]):
+        if len(parts) == 1:
+            return parts[0]
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for part in parts:
+            offsets.append(part.offsets[1:] + base)
+            base += int(part.offsets[-1])
+        return _RaggedBytes(
+            np.concatenate([part.data for part in parts]), np.concatenate(offsets)
+        )
+
+    def take(self, indices):
+        sizes = np.diff(self.offsets)
+        if len(sizes) and (sizes == sizes[0]).all():
+            size = int(sizes[0])
+            return _RaggedBytes(
+                self.data.reshape(-1, size)[indices].reshape(-1),
+                np.arange(len(indices) + 1, dtype=np.int64) * size,
+            )
+        data = self.data.tobytes()
+        offsets = self.offsets.tolist()
+        return _RaggedBytes.from_list(
+            [data[offsets[i] : offsets[i + 1]] for i in indices.tolist()]
+        )
+
+
+class _IndexWriter:
+    """Writes a single index of the dataset, either as files or shards.
+
+    Entries are divided into partitions, by shard for sharded indices and by a
+    hash of the key otherwise, which are kept in memory or, if
+    `temp_directory` is specified, appended to a file per partition.  Each
+    partition is then sorted and written in turn by `finish`, so that only one
+    partition needs to be held in memory at a time.
+
+    For grouped indices, the entries with the same key are combined, ordered
+    by their `orders` value, into the multiple annotation encoding.  Otherwise
+    each key must occur once and its value is written as is.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        sharding: uint64_sharded.ShardingSpec | None,
+        grouped: bool,
+        get_name: Callable[[int], str] = str,
+        num_partitions: int = 1,
+        temp_directory: str | None = None,
+    ):
+        self.directory = directory
+        self.sharding = sharding
+        self.grouped = grouped
+        self.get_name = get_name
+        if sharding is not None:
+            num_partitions = 1 << sharding.shard_bits
+        self.num_partitions = num_partitions
+        self.temp_directory = temp_directory
+        self._partitions: list[list[tuple[np.ndarray, ...]]] = [
+            [] for _ in range(num_partitions)
+        ]
+        # Maximum number of entries combined under one key.
+        self.max_group_size = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, keys, values: _RaggedBytes, orders=None, ids=None):
+        """Adds entries.
+
+        Args:
+            keys: uint64 key of each entry.
+            values: Encoded annotation (grouped) or complete value of each entry.
+            orders: uint64 sort key of each entry within its group.
+            ids: Annotation id of each entry, for grouped indices.
+        """
+        keys = np.asarray(keys, dtype=np.uint64)
+        if not len(keys):
+            return
+        if not self.grouped:
+            if self.sharding is None:
+                self._write_files(keys, values, np.arange(len(keys)))
+                return
+            orders = ids = np.zeros(len(keys), dtype=np.uint64)
+        if self.sharding is not None:
+            partitions = self.sharding.get_shard_and_minishard(keys)[0]
+        else:
+            partitions = uint64_sharded.murmurhash3_x86_128_uint64(keys) % np.uint64(
+                self.num_partitions
+            )
+        partitions = partitions.astype(np.int64)
+        for partition in np.unique(partitions).tolist():
+            members = np.flatnonzero(partitions == partition)
+            part = values.take(members)
+            chunk = (
+                keys[members],
+                np.asarray(orders, dtype=np.uint64)[members],
+                np.asarray(ids, dtype=np.uint64)[members],
+                part.data,
+                part.offsets,
+            )
+            if self.temp_directory is None:
+                self._partitions[partition].append(chunk)
+            else:
+                with open(self._get_partition_path(partition), "ab") as f:
+                    for array in chunk:
+                        np.save(f, array)
+                self._partitions[partition].append(())
+
+    def _get_partition_path(self, partition: int) -> str:
+        assert self.temp_directory is not None
+        return os.path.join(self.temp_directory, f"partition{partition}.npy")
+
+    def _load_partition(self, partition: int):
+        chunks = self._partitions[partition]
+        self._partitions[partition] = []
+        if self.temp_directory is not None and chunks:
+            path = self._get_partition_path(partition)
+            with open(path, "rb") as f:
+                chunks = [
+                    tuple(np.load(f) for _ in range(5)) for _ in range(len(chunks))
+                ]
+            os.remove(path)
+        return chunks
+
+    def _write_files(self, keys, values: _RaggedBytes, indices):
+        data = values.data
+        offsets = values.offsets.tolist()
+        for key, i in zip(keys.tolist(), indices.tolist()):
+            with open(os.path.join(self.directory, self.get_name(key)), "wb") as f:
+                f.write(data[offsets[i] : offsets[i + 1]].tobytes())
+
+    def finish(self) -> dict | None:
+        """Writes all partitions; returns the sharding spec JSON, if any."""
+        for partition in range(self.num_partitions):
+            chunks = self._load_partition(partition)
+            if not chunks:
+                continue
+            keys = np.concatenate([chunk[0] for chunk in chunks])
+            values = _RaggedBytes.concatenate(
+                [_RaggedBytes(chunk[3], chunk[4]) for chunk in chunks]
+            )
+            if self.grouped:
+                orders = np.concatenate([chunk[1] for chunk in chunks])
+                ids = np.concatenate([chunk[2] for chunk in chunks])
+                order = np.lexsort((orders, keys))
+                keys, values = self._group(keys[order], values.take(order), ids[order])
+            del chunks
+            if self.sharding is None:
+                self._write_files(keys, values, np.arange(len(keys)))
+                continue
+            path = os.path.join(
+                self.directory, self.sharding.get_shard_filename(partition)
+            )
+            data = values.data.tobytes()
+            offsets = values.offsets.tolist()
+            with open(path, "wb") as f:
+                uint64_sharded.write_shard(
+                    f,
+                    self.sharding,
+                    keys,
+                    self.sharding.get_shard_and_minishard(keys)[1],
+                    [data[offsets[i] : offsets[i + 1]] for i in range(len(keys))],
+                )
+        if self.sharding is None:
+            return None
+        return self.sharding.to_json()
+
+    def _group(self, keys, values: _RaggedBytes, ids):
+        """Combines sorted entries with equal keys."""
+        starts = np.flatnonzero(np.diff(keys, prepend=keys[:1] + np.uint64(1)))
+        ends = np.append(starts[1:], len(keys))
+        self.max_group_size = max(self.max_group_size, int((ends - starts).max()))
+        data = values.data.tobytes()
+        offsets = values.offsets.tolist()
+        ids_data = ids.astype("<u8").tobytes()
+        grouped = [
+            struct.pack("<Q", end - start)
+            + data[offsets[start] : offsets[end]]
+            + ids_data[8 * start : 8 * end]
+            for start, end in zip(starts.tolist(), ends.tolist())
+        ]
+        return keys[starts], _RaggedBytes.from_list(grouped)
+
+
+class _AnnotationBatch(NamedTuple):
+    ids: np.typing.NDArray[np.uint64]
+    # Structured array of encoded annotations, or for polylines, which have a
+    # variable size, the encoding of each annotation.
+    encoded: np.ndarray | list[bytes]
+    # Bounds of each annotation, as (num_annotations, rank) arrays.
+    lower: np.typing.NDArray[np.float32]
+    upper: np.typing.NDArray[np.float32]
+    # (annotation index, segment id) pairs for each relationship.
+    relationships: list[
+        tuple[np.typing.NDArray[np.int64], np.typing.NDArray[np.uint64]]
+    ]
+
+
+def _get_relationship_pairs(value, num_annotations: int):
+    """Converts the related segment ids of a batch of annotations to pairs.
+
+    Args:
+        value: A single segment id related to all annotations, an array of shape
+            ``(num_annotations,)`` or ``(num_annotations, k)``, or a sequence
+            with an id or sequence of ids for each annotation.
+        num_annotations: Number of annotations in the batch.
+    """
+    annotation_indices = np.arange(num_annotations, dtype=np.int64)
+    if value is None:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint64)
+    if isinstance(value, numbers.Integral):
+        return annotation_indices, np.full(num_annotations, value, dtype=np.uint64)
+    if isinstance(value, np.ndarray):
+        if value.ndim not in (1, 2) or value.shape[0] != num_annotations:
+            raise ValueError(
+                f"Expected related segment ids of shape ({num_annotations},) or "
+                f"({num_annotations}, k), but received: {value.shape}"
+            )
+        segment_ids = value.astype(np.uint64).reshape(-1)
+        per_annotation = 1 if value.ndim == 1 else value.shape[1]
+        return np.repeat(annotation_indices, per_annotation), segment_ids
+    if len(value) != num_annotations:
+        raise ValueError(
+            f"Expected related segment ids for {num_annotations} annotations, but received: {len(value)}"
+        )
+    value = [[ids] if isinstance(ids, numbers.Integral) else ids for ids in value]
+    return (
+        np.repeat(annotation_indices, [len(ids) for ids in value]),
+        np.fromiter(itertools.chain.from_iterable(value), dtype=np.uint64),
+    )
+
+
+def _concatenate_batches(
+    batches: Sequence[_AnnotationBatch], num_relationships: int
+) -> _AnnotationBatch:
+    if len(batches) == 1:
+        return batches[0]
+    offsets = np.cumsum([0] + [len(batch.ids) for batch in batches])
+    if isinstance(batches[0].encoded, list):
+        encoded: np.ndarray | list[bytes] = [
+            x for batch in batches for x in cast(list[bytes], batch.encoded)
+        ]
+    else:
+        encoded = np.concatenate([batch.encoded for batch in batches])
+    relationships = []
+    for i in range(num_relationships):
+        relationships.append(
+            (
+                np.concatenate(
+                    [
+                        batch.relationships[i][0] + offset
+                        for batch, offset in zip(batches, offsets)
+                    ]
+                ),
+                np.concatenate([batch.relationships[i][1] for batch in batches]),
+            )
+        )
+    return _AnnotationBatch(
+        ids=np.concatenate([batch.ids for batch in batches]),
+        encoded=encoded,
+        lower=np.concatenate([batch.lower for batch in batches]),
+        upper=np.concatenate([batch.upper for batch in batches]),
+        relationships=relationships,
+    )
+
+
+def _get_batch_nbytes(batch: _AnnotationBatch) -> int:
+    if isinstance(batch.encoded, list):
+        encoded_bytes = sum(len(x) for x in batch.encoded)
+    else:
+        encoded_bytes = batch.encoded.nbytes
+    return (
+        batch.ids.nbytes
+        + encoded_bytes
+        + batch.lower.nbytes
+        + batch.upper.nbytes
+        + sum(a.nbytes + s.nbytes for a, s in batch.relationships)
+    )
+
+
+def _save_batch(directory: str, batch: _AnnotationBatch):
+    os.makedirs(directory)
+
+    def save(name, array):
+        np.save(os.path.join(directory, name), array)
+
+    save("ids.npy", batch.ids)
+    if isinstance(batch.encoded, list):
+        save("encoded_sizes.npy", np.array([len(x) for x in batch.encoded]))
+        with open(os.path.join(directory, "encoded"), "wb") as f:
+            f.write(b"".join(batch.encoded))
+    else:
+        save("encoded.npy", batch.encoded)
+    save("lower.npy", batch.lower)
+    save("upper.npy", batch.upper)
+    for i, (annotation_indices, segment_ids) in enumerate(batch.relationships):
+        save(f"rel{i}_annotations.npy", annotation_indices)
+        save(f"rel{i}_segments.npy", segment_ids)
+
+
+def _load_batch(directory: str, num_relationships: int) -> _AnnotationBatch:
+    def load(name):
+        return np.load(os.path.join(directory, name), mmap_mode="r")
+
+    encoded: np.ndarray | list[bytes]
+    if os.path.exists(os.path.join(directory, "encoded.npy")):
+        encoded = load("encoded.npy")
+    else:
+        offsets = [0, *np.cumsum(load("encoded_sizes.npy")).tolist()]
+        with open(os.path.join(directory, "encoded"), "rb") as f:
+            data = f.read()
+        encoded = [data[offsets[i] : offsets[i + 1]] for i in range(len(offsets) - 1)]
+    return _AnnotationBatch(
+        ids=load("ids.npy"),
+        encoded=encoded,
+        lower=load("lower.npy"),
+        upper=load("upper.npy"),
+        relationships=[
+            (load(f"rel{i}_annotations.npy"), load(f"rel{i}_segments.npy"))
+            for i in range(num_relationships)
+        ],
+    )
+
+
+class _AnnotationBlock:
+    """Annotations held in memory or in a directory they were spilled to.
+
+    Also tracks which annotations have been emitted at a coarser level of the
+    spatial index while it is written.
+    """
+
+    def __init__(
+        self,
+        first_index: int,
+        num_annotations: int,
+        num_relationships: int,
+        batch: _AnnotationBatch | None = None,
+        directory: str | None = None,
+    ):
+        self.first_index = first_index
+        self.num_annotations = num_annotations
+        self._num_relationships = num_relationships
+        self._batch = batch
+        self._directory = directory
+        self._emitted: np.ndarray | None = None
+
+    def load(self) -> _AnnotationBatch:
+        if self._batch is not None:
+            return self._batch
+        assert self._directory is not None
+        return _load_batch(self._directory, self._num_relationships)
+
+    def get_emitted(self) -> np.typing.NDArray[np.bool_]:
+        if self._directory is None:
+            if self._emitted is None:
+                self._emitted = np.zeros(self.num_annotations, dtype=bool)
+            return self._emitted
+        path = os.path.join(self._directory, "emitted.npy")
+        if not os.path.exists(path):
+            return np.zeros(self.num_annotations, dtype=bool)
+        return np.load(path)
+
+    def set_emitted(self, emitted: np.typing.NDArray[np.bool_] | None):
+        """Sets which annotations have been emitted; None resets the state."""
+        if self._directory is None:
+            self._emitted = emitted
+            return
+        path = os.path.join(self._directory, "emitted.npy")
+        if emitted is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            np.save(path, emitted)
+
+
 class AnnotationWriter:
-    annotations: list[Annotation]
-    related_annotations: list[dict[int, list[Annotation]]]
+    """Writes annotations in the Precomputed annotation format.
+
+    Annotations are added either individually, with `add_point` and the other
+    ``add_<type>`` methods, or in bulk from arrays with `add_points` and the
+    other ``add_<type>s`` methods.
+
+    By default all annotations are buffered in memory until `write` is called.
+    If `max_buffer_bytes` is specified, buffered annotations are instead
+    spilled to temporary files whenever they exceed that size, and `write`
+    processes them one spilled run or index partition at a time, so that
+    datasets larger than memory can be written.
+    """
+
     lower_bound: np.typing.NDArray[np.float64]
     upper_bound: np.typing.NDArray[np.float64]
 
@@ -128,7 +603,23 @@ class AnnotationWriter:
         annotation_type: AnnotationType,
         relationships: Sequence[str] = (),
         properties: Sequence[viewer_state.AnnotationPropertySpec] = (),
+        max_buffer_bytes: int | None = None,
+        temp_directory: str | pathlib.Path | None = None,
     ):
+        """Initializes the writer.
+
+        Args:
+            coordinate_space: Coordinate space of the annotations.
+            annotation_type: Type of the annotations.
+            relationships: Names of the related segment relationships.
+            properties: Per-annotation properties.
+            max_buffer_bytes: Enables streaming mode, in which at most about
+                this many bytes of annotations are buffered in memory.  Index
+                partitions written by `write` are limited to the same size,
+                except that shards of sharded indices are assembled in memory.
+            temp_directory: Parent directory of the temporary files used in
+                streaming mode.  Defaults to the system temporary directory.
+        """
         self.coordinate_space = coordinate_space
         self.relationships = list(relationships)
         self.annotation_type = annotation_type
@@ -136,18 +627,85 @@ class AnnotationWriter:
         self.properties_sorted = sorted(
             self.properties, key=lambda p: -_PROPERTY_DTYPES[p.type][1]
         )
-        self.annotations = []
         self.rank = coordinate_space.rank
         self._dtype = _get_dtype_for_geometry(
             annotation_type, coordinate_space.rank
         ) + _get_dtype_for_properties(self.properties_sorted)
+        self._property_dtype = np.dtype(
+            _get_dtype_for_properties(self.properties_sorted)
+        )
         self.lower_bound = np.full(
             shape=(self.rank,), fill_value=float("inf"), dtype=np.float32
         )
         self.upper_bound = np.full(
             shape=(self.rank,), fill_value=float("-inf"), dtype=np.float32
         )
-        self.related_annotations = [{} for _ in self.relationships]
+        self.max_buffer_bytes = max_buffer_bytes
+        self.temp_directory = temp_directory
+        self._batches: list[_AnnotationBatch] = []
+        self._buffered_bytes = 0
+        # Annotations added individually since the last batch.
+        self._pending: list[Annotation] = []
+        self._num_annotations = 0
+        # Directories and sizes of the runs of spilled batches.
+        self._runs: list[tuple[str, int]] = []
+        self._spill_directory: str | None = None
+        # Totals over all batches, used to size the indices.
+        self._index_lower_bound = np.full(self.rank, np.inf, dtype=np.float32)
+        self._index_upper_bound = np.full(self.rank, -np.inf, dtype=np.float32)
+        self._encoded_bytes = 0
+        self._num_related = [0] * len(self.relationships)
+
+    @property
+    def annotations(self) -> list[Annotation]:
+        """All annotations added, in insertion order.
+
+        This is constructed on each access, and is intended only for inspection.
+        """
+        self._flush_pending()
+        annotations = []
+        for block in self._get_blocks():
+            batch = block.load()
+            num_annotations = len(batch.ids)
+            related = []
+            for annotation_indices, segment_ids in batch.relationships:
+                order = np.argsort(annotation_indices, kind="stable")
+                bounds = np.searchsorted(
+                    annotation_indices[order], np.arange(num_annotations + 1)
+                ).tolist()
+                related.append((segment_ids[order].tolist(), bounds))
+            for i, annotation_id in enumerate(batch.ids.tolist()):
+                encoded = batch.encoded[i]
+                if not isinstance(encoded, bytes):
+                    encoded = encoded.tobytes()
+                annotations.append(
+                    Annotation(
+                        id=annotation_id,
+                        encoded=encoded,
+                        relationships=[
+                            segment_ids[bounds[i] : bounds[i + 1]]
+                            for segment_ids, bounds in related
+                        ],
+                    )
+                )
+        return annotations
+
+    @property
+    def related_annotations(self) -> list[dict[int, list[Annotation]]]:
+        """Annotations related to each segment, for each relationship.
+
+        This is constructed on each access, and is intended only for inspection.
+        """
+        related_annotations: list[dict[int, list[Annotation]]] = [
+            {} for _ in self.relationships
+        ]
+        for annotation in self.annotations:
+            for rel_index, segment_ids in zip(
+                related_annotations, annotation.relationships
+            ):
+                for segment_id in segment_ids:
+                    rel_index.setdefault(segment_id, []).append(annotation)
+        return related_annotations
 
     def get_dtype(self, annotation_size=None) -> np.dtype:
         """
@@ -239,6 +797,295 @@ class AnnotationWriter:
         geometry = np.concatenate(points)
         self._add_obj(cast(Sequence[float], geometry), id, **kwargs)
 
+    def add_points(self, points, ids=None, **kwargs):
+        """Adds point annotations in bulk.
+
+        Args:
+            points: Array of shape ``(n, rank)``.
+            ids: Annotation ids, of shape ``(n,)``.  Defaults to consecutive ids
+                following the number of annotations already added.
+            **kwargs: Property values and related segment ids.  Each property
+                value is either a single value for all annotations or an array
+                with a leading dimension of ``n``.  The related segment ids for
+                each relationship are either a single id for all annotations,
+                an array of shape ``(n,)`` or ``(n, k)``, or a sequence with the
+                ids of each annotation.
+        """
+        self._check_annotation_type("point")
+        self._add_batch(self._as_coordinates(points, "points"), ids, kwargs)
+
+    def add_axis_aligned_bounding_boxes(self, points_a, points_b, ids=None, **kwargs):
+        """Adds axis-aligned bounding box annotations in bulk.
+
+        Args:
+            points_a: Array of shape ``(n, rank)`` of first corners.
+            points_b: Array of shape ``(n, rank)`` of opposite corners.
+            ids: Annotation ids, as for `add_points`.
+            **kwargs: Property values and related segment ids, as for
+                `add_points`.
+        """
+        self._check_annotation_type("axis_aligned_bounding_box")
+        self._add_two_point_batch(points_a, points_b, ids, kwargs)
+
+    def add_lines(self, points_a, points_b, ids=None, **kwargs):
+        """Adds line annotations in bulk.
+
+        Args:
+            points_a: Array of shape ``(n, rank)`` of start points.
+            points_b: Array of shape ``(n, rank)`` of end points.
+            ids: Annotation ids, as for `add_points`.
+            **kwargs: Property values and related segment ids, as for
+                `add_points`.
+        """
+        self._check_annotation_type("line")
+        self._add_two_point_batch(points_a, points_b, ids, kwargs)
+
+    def add_ellipsoids(self, centers, radii, ids=None, **kwargs):
+        """Adds ellipsoid annotations in bulk.
+
+        Args:
+            centers: Array of shape ``(n, rank)``.
+            radii: Array of shape ``(n, rank)``.
+            ids: Annotation ids, as for `add_points`.
+            **kwargs: Property values and related segment ids, as for
+                `add_points`.
+        """
+        self._check_annotation_type("ellipsoid")
+        self._add_two_point_batch(centers, radii, ids, kwargs)
+
+    def add_polylines(self, polylines, ids=None, **kwargs):
+        """Adds polyline annotations in bulk.
+
+        Args:
+            polylines: Sequence of ``n`` arrays of shape ``(num_points, rank)``.
+            ids: Annotation ids, as for `add_points`.
+            **kwargs: Property values and related segment ids, as for
+                `add_points`.
+        """
+        self._check_annotation_type("polyline")
+        polylines = [
+            self._as_coordinates(points, "polyline points", dtype="<f4")
+            for points in polylines
+        ]
+        if any(len(points) < 2 for points in polylines):
+            raise ValueError("Expected at least two points for a polyline")
+        num_annotations = len(polylines)
+        properties = np.zeros(num_annotations, dtype=self._property_dtype)
+        self._set_properties(properties, kwargs)
+        relationships = self._get_batch_relationships(num_annotations, kwargs)
+        ids = self._get_batch_ids(num_annotations, ids)
+        property_bytes = properties.tobytes()
+        property_size = self._property_dtype.itemsize
+        encoded = [
+            struct.pack("<I", len(points))
+            + points.tobytes()
+            + property_bytes[i * property_size : (i + 1) * property_size]
+            for i, points in enumerate(polylines)
+        ]
+        if num_annotations:
+            all_points = np.concatenate(polylines)
+            starts = np.cumsum([0] + [len(points) for points in polylines[:-1]])
+            lower = np.minimum.reduceat(all_points, starts, axis=0)
+            upper = np.maximum.reduceat(all_points, starts, axis=0)
+        else:
+            lower = upper = np.zeros((0, self.rank), dtype=np.float32)
+        self._append_batch(
+            _AnnotationBatch(ids, encoded, lower, upper, relationships),
+            update_bounds=True,
+        )
+
+    def _check_annotation_type(self, annotation_type: AnnotationType):
+        if self.annotation_type != annotation_type:
+            raise ValueError(
+                f"Expected annotation type {annotation_type}, but received: {self.annotation_type}"
+            )
+
+    def _as_coordinates(self, points, name: str, dtype=np.float64):
+        points = np.asarray(points, dtype=dtype)
+        if points.ndim != 2 or points.shape[1] != self.rank:
+            raise ValueError(
+                f"Expected {name} to have shape (n, {self.rank}), but received: {points.shape}"
+            )
+        return points
+
+    def _add_two_point_batch(self, points_a, points_b, ids, kwargs):
+        points_a = self._as_coordinates(points_a, "coordinates")
+        points_b = self._as_coordinates(points_b, "coordinates")
+        if len(points_a) != len(points_b):
+            raise ValueError(
+                f"Expected the same number of coordinates, but received: {len(points_a)} and {len(points_b)}"
+            )
+        self._add_batch(np.concatenate((points_a, points_b), axis=1), ids, kwargs)
+
+    def _add_batch(self, geometry, ids, kwargs):
+        num_annotations = len(geometry)
+        encoded = np.zeros(num_annotations, dtype=self._dtype)
+        encoded["geometry"] = geometry
+        self._set_properties(encoded, kwargs)
+        relationships = self._get_batch_relationships(num_annotations, kwargs)
+        ids = self._get_batch_ids(num_annotations, ids)
+        lower, upper = self._get_geometry_bounds(encoded["geometry"])
+        self._append_batch(
+            _AnnotationBatch(ids, encoded, lower, upper, relationships),
+            update_bounds=True,
+        )
+
+    def _set_properties(self, encoded: np.ndarray, kwargs):
+        """Sets the properties of encoded annotations, consuming their kwargs."""
+        for i, p in enumerate(self.properties_sorted):
+            value = kwargs.pop(p.id, p.default)
+            if p.type in ("rgb", "rgba"):
+                convert = (
+                    _convert_rgb_to_uint8 if p.type == "rgb" else _convert_rgba_to_uint8
+                )
+                if isinstance(value, str):
+                    value = convert(value)
+                elif (
+                    isinstance(value, Sequence)
+                    and len(value)
+                    and isinstance(value[0], str)
+                ):
+                    value = [convert(x) for x in value]
+            if value is not None:
+                encoded[f"property{i}"] = value
+
+    def _get_batch_relationships(self, num_annotations: int, kwargs):
+        """Returns the relationship pairs, consuming the remaining kwargs."""
+        relationships = [
+            _get_relationship_pairs(kwargs.pop(relationship, None), num_annotations)
+            for relationship in self.relationships
+        ]
+        if kwargs:
+            raise ValueError(f"Unexpected keyword arguments {kwargs}")
+        return relationships
+
+    def _get_batch_ids(self, num_annotations: int, ids):
+        if ids is None:
+            ids = np.arange(
+                self._num_annotations,
+                self._num_annotations + num_annotations,
+                dtype=np.uint64,
+            )
+        else:
+            ids = np.asarray(ids, dtype=np.uint64)
+            if ids.shape != (num_annotations,):
+                raise ValueError(
+                    f"Expected ids to have shape ({num_annotations},), but received: {ids.shape}"
+                )
+        return ids
+
+    def _get_geometry_bounds(self, geometry):
+        return _get_geometry_bounds(self.annotation_type, self.rank, geometry)
+
+    def _append_batch(self, batch: _AnnotationBatch, update_bounds: bool = False):
+        self._flush_pending()
+        if update_bounds:
+            self._num_annotations += len(batch.ids)
+            if len(batch.ids):
+                self.lower_bound = np.minimum(self.lower_bound, batch.lower.min(axis=0))
+                self.upper_bound = np.maximum(self.upper_bound, batch.upper.max(axis=0))
+        self._buffer_batch(batch)
+
+    def _buffer_batch(self, batch: _AnnotationBatch):
+        if len(batch.ids):
+            self._index_lower_bound = np.minimum(
+                self._index_lower_bound, batch.lower.min(axis=0)
+            )
+            self._index_upper_bound = np.maximum(
+                self._index_upper_bound, batch.upper.max(axis=0)
+            )
+        if isinstance(batch.encoded, list):
+            self._encoded_bytes += sum(len(x) for x in batch.encoded)
+        else:
+            self._encoded_bytes += batch.encoded.nbytes
+        for i, (annotation_indices, _) in enumerate(batch.relationships):
+            self._num_related[i] += len(annotation_indices)
+        self._batches.append(batch)
+        self._buffered_bytes += _get_batch_nbytes(batch)
+        if (
+            self.max_buffer_bytes is not None
+            and self._buffered_bytes > self.max_buffer_bytes
+        ):
+            self._spill()
+
+    def _spill(self):
+        """Moves the buffered batches to a run on disk."""
+        if self._spill_directory is None:
+            self._spill_directory = tempfile.mkdtemp(
+                prefix="neuroglancer-annotations-", dir=self.temp_directory
+            )
+            weakref.finalize(
+                self, shutil.rmtree, self._spill_directory, ignore_errors=True
+            )
+        batch = _concatenate_batches(self._batches, len(self.relationships))
+        directory = os.path.join(self._spill_directory, f"run{len(self._runs)}")
+        _save_batch(directory, batch)
+        self._runs.append((directory, len(batch.ids)))
+        self._batches = []
+        self._buffered_bytes = 0
+
+    def _get_blocks(self) -> list[_AnnotationBlock]:
+        """Returns the spilled runs and buffered batches, in insertion order."""
+        num_relationships = len(self.relationships)
+        blocks = []
+        first_index = 0
+        for directory, num_annotations in self._runs:
+            blocks.append(
+                _AnnotationBlock(
+                    first_index, num_annotations, num_relationships, directory=directory
+                )
+            )
+            first_index += num_annotations
+        if self._batches:
+            batch = _concatenate_batches(self._batches, num_relationships)
+            self._batches = [batch]
+            blocks.append(
+                _AnnotationBlock(
+                    first_index, len(batch.ids), num_relationships, batch=batch
+                )
+            )
+        return blocks
+
+    def _flush_pending(self):
+        """Converts individually-added annotations to a batch."""
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+        if self.annotation_type == "polyline":
+            encoded: np.ndarray | list[bytes] = [a.encoded for a in pending]
+            lower = np.empty((len(pending), self.rank), dtype=np.float32)
+            upper = np.empty((len(pending), self.rank), dtype=np.float32)
+            for i, annotation in enumerate(pending):
+                (num_points,) = struct.unpack_from("<I", annotation.encoded)
+                points = np.frombuffer(
+                    annotation.encoded,
+                    dtype="<f4",
+                    count=num_points * self.rank,
+                    offset=4,
+                ).reshape(num_points, self.rank)
+                lower[i] = points.min(axis=0)
+                upper[i] = points.max(axis=0)
+        else:
+            encoded = np.frombuffer(
+                b"".join(a.encoded for a in pending), dtype=self._dtype
+            )
+            lower, upper = self._get_geometry_bounds(encoded["geometry"])
+        self._buffer_batch(
+            _AnnotationBatch(
+                ids=np.array([a.id for a in pending], dtype=np.uint64),
+                encoded=encoded,
+                lower=lower,
+                upper=upper,
+                relationships=[
+                    _get_relationship_pairs(
+                        [a.relationships[i] for a in pending], len(pending)
+                    )
+                    for i in range(len(self.relationships))
+                ],
+            )
+        )
+
     def _add_two_point_obj(
         self,
         point_a: Sequence[float],
@@ -268,17 +1115,7 @@ class AnnotationWriter:
             encoded[()]["num_points"] = len(coords) // self.rank  # type: ignore[call-overload]
         encoded[()]["geometry"] = coords  # type: ignore[call-overload]
 
-        for i, p in enumerate(self.properties_sorted):
-            default_value = p.default
-            if p.id in kwargs:
-                default_value = kwargs.pop(p.id)
-            if isinstance(default_value, str) and p.type in ("rgb", "rgba"):
-                if p.type == "rgb":
-                    default_value = _convert_rgb_to_uint8(default_value)
-                else:
-                    default_value = _convert_rgba_to_uint8(default_value)
-            if default_value is not None:
-                encoded[()][f"property{i}"] = default_value  # type: ignore[call-overload]
+        self._set_properties(encoded, kwargs)
 
         related_ids = []
         for relationship in self.relationships:
@@ -293,84 +1130,326 @@ class AnnotationWriter:
             raise ValueError(f"Unexpected keyword arguments {kwargs}")
 
         if id is None:
-            id = len(self.annotations)
+            id = self._num_annotations
+        self._num_annotations += 1
 
-        annotation = Annotation(
-            id=id, encoded=encoded.tobytes(), relationships=related_ids
+        self._pending.append(
+            Annotation(id=id, encoded=encoded.tobytes(), relationships=related_ids)
         )
+        if len(self._pending) >= _MAX_PENDING_ANNOTATIONS:
+            self._flush_pending()
+
+    def _encode_annotations_by_id(self, batch: _AnnotationBatch):
+        """Yields the id and single annotation encoding of each annotation."""
+        num_annotations = len(batch.ids)
+        related = []
+        for annotation_indices, segment_ids in batch.relationships:
+            order = np.argsort(annotation_indices, kind="stable")
+            bounds = np.searchsorted(
+                annotation_indices[order], np.arange(num_annotations + 1)
+            )
+            counts = np.diff(bounds)
+            related.append(
+                (
+                    segment_ids[order].astype("<u8").tobytes(),
+                    (8 * bounds).tolist(),
+                    [struct.pack("<I", count) for count in counts.tolist()],
+                )
+            )
+        encoded: list[bytes]
+        if isinstance(batch.encoded, list):
+            encoded = batch.encoded
+        else:
+            buffer = batch.encoded.tobytes()
+            size = batch.encoded.dtype.itemsize
+            encoded = [
+                buffer[i * size : (i + 1) * size] for i in range(num_annotations)
+            ]
+        for i, annotation_id in enumerate(batch.ids.tolist()):
+            parts = [encoded[i]]
+            for segment_bytes, offsets, encoded_counts in related:
+                parts.append(encoded_counts[i])
+                parts.append(segment_bytes[offsets[i] : offsets[i + 1]])
+            yield annotation_id, b"".join(parts)
+
+    def write(
+        self,
+        path: str | pathlib.Path,
+        spatial_index_limit: int = DEFAULT_SPATIAL_INDEX_LIMIT,
+        sharded: bool = False,
+    ):
+        """Writes the annotations to a directory.
+
+        Args:
+            path: Output directory.
+            spatial_index_limit: Maximum number of annotations in each cell of
+                the spatial index.  If all annotations fit, a single cell is
+                written, with the annotations in insertion order.
+            sharded: Write all indices in the sharded format, with the shard
+                and minishard counts chosen based on the size of each index.
+        """
+        if spatial_index_limit < 1:
+            raise ValueError(
+                f"spatial_index_limit must be positive, but received: {spatial_index_limit}"
+            )
+        self._flush_pending()
+        blocks = self._get_blocks()
+        num_annotations = self._num_annotations
+        if num_annotations:
+            lower_bound = self._index_lower_bound.astype(np.float64)
+            upper_bound = self._index_upper_bound.astype(np.float64)
+        else:
+            lower_bound = upper_bound = np.zeros(self.rank)
+        # Size of each annotation in a multiple annotation encoding.
+        entry_size = self._encoded_bytes / max(num_annotations, 1) + 8
+
+        os.makedirs(path, exist_ok=True)
+        streaming = self.max_buffer_bytes is not None
+        with contextlib.ExitStack() as stack:
+            partition_directory: str | None = None
+            if streaming:
+                partition_directory = stack.enter_context(
+                    tempfile.TemporaryDirectory(
+                        prefix="neuroglancer-annotations-", dir=self.temp_directory
+                    )
+                )
+
+            def make_index_writer(
+                key: str,
+                num_keys: int,
+                total_bytes: float,
+                grouped: bool,
+                sharding_hash: uint64_sharded.ShardingHash = "murmurhash3_x86_128",
+                get_name: Callable[[int], str] = str,
+            ):
+                sharding = None
+                if sharded:
+                    sharding = uint64_sharded.choose_sharding_spec(
+                        num_keys, int(total_bytes), hash=sharding_hash
+                    )
+                num_partitions = 1
+                temp_directory = None
+                if partition_directory is not None:
+                    assert self.max_buffer_bytes is not None
+                    num_partitions = max(
+                        1, math.ceil(total_bytes / max(self.max_buffer_bytes, 1))
+                    )
+                    temp_directory = os.path.join(partition_directory, key)
+                    os.makedirs(temp_directory)
+                return _IndexWriter(
+                    os.path.join(path, key),
+                    sharding,
+                    grouped,
+                    get_name=get_name,
+                    num_partitions=num_partitions,
+                    temp_directory=temp_directory,
+                )
+
+            spatial_metadata = self._write_spatial_index(
+                blocks,
+                lower_bound,
+                upper_bound,
+                spatial_index_limit,
+                sharded,
+                entry_size,
+                make_index_writer,
+            )
+
+            writer = make_index_writer(
+                "by_id",
+                num_annotations,
+                self._encoded_bytes
+                + 4 * len(self.relationships) * num_annotations
+                + 8 * sum(self._num_related),
+                grouped=False,
+            )
+            for block in blocks:
+                batch = block.load()
+                writer.add(
+                    batch.ids,
+                    _RaggedBytes.from_list(
+                        [value for _, value in self._encode_annotations_by_id(batch)]
+                    ),
+                )
+            by_id_metadata = {"key": "by_id"}
+            sharding = writer.finish()
+            if sharding is not None:
+                by_id_metadata["sharding"] = sharding
+
+            relationships_metadata = []
+            for i, relationship in enumerate(self.relationships):
+                key = f"rel_{relationship}"
+                writer = make_index_writer(
+                    key,
+                    self._num_related[i],
+                    self._num_related[i] * entry_size,
+                    grouped=True,
+                )
+                for block in blocks:
+                    batch = block.load()
+                    annotation_indices, segment_ids = batch.relationships[i]
+                    annotation_indices = np.asarray(annotation_indices)
+                    writer.add(
+                        segment_ids,
+                        _RaggedBytes.from_encoded(batch.encoded, annotation_indices),
+                        orders=block.first_index + annotation_indices,
+                        ids=batch.ids[annotation_indices],
+                    )
+                relationship_metadata = {"id": relationship, "key": key}
+                sharding = writer.finish()
+                if sharding is not None:
+                    relationship_metadata["sharding"] = sharding
+                relationships_metadata.append(relationship_metadata)
 
-        self.annotations.append(annotation)
-
-        for i, segment_ids in enumerate(related_ids):
-            for segment_id in segment_ids:
-                rel_index = self.related_annotations[i]
-                rel_index_list = rel_index.setdefault(segment_id, [])
-                rel_index_list.append(annotation)
-
-    def _serialize_annotations(self, f, annotations: list[Annotation]):
-        f.write(struct.pack("<Q", len(annotations)))
-        for annotation in annotations:
-            f.write(annotation.encoded)
-        for annotation in annotations:
-            f.write(struct.pack("<Q", annotation.id))
-
-    def _serialize_annotation(self, f, annotation: Annotation):
-        f.write(annotation.encoded)
-        for related_ids in annotation.relationships:
-            f.write(struct.pack("<I", len(related_ids)))
-            for related_id in related_ids:
-                f.write(struct.pack("<Q", related_id))
-
-    def write(self, path: str | pathlib.Path):
         metadata = {
             "@type": "neuroglancer_annotations_v1",
             "dimensions": self.coordinate_space.to_json(),
-            "lower_bound": [float(x) for x in self.lower_bound],
-            "upper_bound": [float(x) for x in self.upper_bound],
+            "lower_bound": lower_bound.tolist(),
+            "upper_bound": upper_bound.tolist(),
             "annotation_type": self.annotation_type,
             "properties": [p.to_json() for p in self.properties],
-            "relationships": [
-                {"id": relationship, "key": f"rel_{relationship}"}
-                for relationship in self.relationships
-            ],
-            "by_id": {
-                "key": "by_id",
-            },
-            "spatial": [
-                {
-                    "key": "spatial0",
-                    "grid_shape": [1] * self.rank,
-                    "chunk_size": [
-                        max(1, float(x)) for x in self.upper_bound - self.lower_bound
-                    ],
-                    "limit": len(self.annotations),
-                },
-            ],
+            "relationships": relationships_metadata,
+            "by_id": by_id_metadata,
+            "spatial": spatial_metadata,
         }
-
-        os.makedirs(path, exist_ok=True)
-        for relationship in self.relationships:
-            os.makedirs(os.path.join(path, f"rel_{relationship}"), exist_ok=True)
-        os.makedirs(os.path.join(path, "by_id"), exist_ok=True)
-        os.makedirs(os.path.join(path, "spatial0"), exist_ok=True)
-
+        # The info file is written last, so that a partially-written dataset
+        # is not mistaken for a complete one.
         with open(os.path.join(path, "info"), "w") as f:
             f.write(json.dumps(metadata))
 
-        with open(
-            os.path.join(path, "spatial0", "_".join("0" for _ in range(self.rank))),
-            "wb",
-        ) as f:
-            self._serialize_annotations(f, self.annotations)
+    def _write_spatial_index(
+        self,
+        blocks: list[_AnnotationBlock],
+        origin,
+        upper_bound,
+        limit: int,
+        sharded: bool,
+        entry_size: float,
+        make_index_writer,
+    ) -> list[dict]:
+        """Writes the levels of the spatial index; returns their metadata.
+
+        Each level halves the cell size of the previous one along the
+        dimensions within a factor of 2 of the largest, to keep cells roughly
+        isotropic.  At each level, the remaining annotations are counted per
+        cell and, if the maximum count exceeds `limit`, each is emitted with
+        probability ``limit / max_count``; the rest are deferred to the next
+        level.
+        """
+        chunk_size = np.maximum(upper_bound - origin, 1).astype(np.float64)
+        grid_shape = np.ones(self.rank, dtype=np.int64)
+        grid_bits = 0
+        for block in blocks:
+            block.set_emitted(None)
+        metadata: list[dict] = []
+        level = 0
+        while True:
+            cell_keys = np.zeros(0, dtype=np.int64)
+            cell_counts = np.zeros(0, dtype=np.int64)
+            num_pairs = 0
+            num_remaining = 0
+            for block in blocks:
+                batch = block.load()
+                remaining = np.flatnonzero(~block.get_emitted())
+                num_remaining += len(remaining)
+                _, cells = _get_intersecting_cells(
+                    batch.lower[remaining],
+                    batch.upper[remaining],
+                    origin,
+                    chunk_size,
+                    grid_shape,
+                )
+                num_pairs += len(cells)
+                inverse: np.typing.NDArray[np.intp]
+                cell_keys, inverse = np.unique(
+                    np.concatenate(
+                        (cell_keys, np.ravel_multi_index(cells.T, grid_shape))
+                    ),
+                    return_inverse=True,
+                )
+                cell_counts = np.bincount(
+                    inverse,
+                    weights=np.concatenate(
+                        (cell_counts, np.ones(len(cells), dtype=np.int64))
+                    ),
+                    minlength=len(cell_keys),
+                ).astype(np.int64)
+            if level and not num_remaining:
+                return metadata
 
-        for annotation in self.annotations:
-            with open(os.path.join(path, "by_id", str(annotation.id)), "wb") as f:
-                self._serialize_annotation(f, annotation)
-
-        for i, relationship in enumerate(self.relationships):
-            rel_index = self.related_annotations[i]
-            for segment_id, annotations in rel_index.items():
-                with open(
-                    os.path.join(path, f"rel_{relationship}", str(segment_id)), "wb"
-                ) as f:
-                    self._serialize_annotations(f, annotations)
+            max_count = int(cell_counts.max(initial=0))
+            subdivide = chunk_size >= chunk_size.max() / 2
+            full = (
+                max_count <= limit
+                or grid_bits + int(subdivide.sum()) > _MAX_SPATIAL_GRID_BITS
+            )
+            probability = 1.0 if full else limit / max_count
+            threshold = np.uint64(min(int(probability * 2.0**64), 2**64 - 1))
+            key = f"spatial{level}"
+            writer = make_index_writer(
+                key,
+                len(cell_keys),
+                num_pairs * probability * entry_size,
+                grouped=True,
+                sharding_hash="identity",
+                get_name=lambda cell_key, shape=tuple(grid_shape.tolist()): "_".join(
+                    str(x) for x in np.unravel_index(cell_key, shape)
+                ),
+            )
+            for block in blocks:
+                batch = block.load()
+                emitted = block.get_emitted()
+                remaining = np.flatnonzero(~emitted)
+                pair_annotations, cells = _get_intersecting_cells(
+                    batch.lower[remaining],
+                    batch.upper[remaining],
+                    origin,
+                    chunk_size,
+                    grid_shape,
+                )
+                pair_annotations = remaining[pair_annotations]
+                global_indices = block.first_index + pair_annotations
+                if full:
+                    # Preserve insertion order within each cell.
+                    orders = global_indices.astype(np.uint64)
+                    emitted[:] = True
+                else:
+                    # Ordering by the sampling key shuffles each cell.
+                    orders = _get_spatial_sampling_keys(global_indices, level)
+                    emit = orders < threshold
+                    pair_annotations = pair_annotations[emit]
+                    cells = cells[emit]
+                    orders = orders[emit]
+                    emitted[pair_annotations] = True
+                if sharded:
+                    keys = uint64_sharded.compressed_morton_code(
+                        cells, grid_shape.tolist()
+                    )
+                else:
+                    keys = np.ravel_multi_index(cells.T, grid_shape)
+                writer.add(
+                    keys,
+                    _RaggedBytes.from_encoded(batch.encoded, pair_annotations),
+                    orders=orders,
+                    ids=batch.ids[pair_annotations],
+                )
+                block.set_emitted(emitted)
+            level_metadata = {
+                "key": key,
+                "grid_shape": grid_shape.tolist(),
+                "chunk_size": chunk_size.tolist(),
+            }
+            sharding = writer.finish()
+            # Subsampling only bounds the expected number of annotations per
+            # cell, so the limit recorded is the actual maximum.
+            level_metadata["limit"] = max(writer.max_group_size, 1)
+            if sharding is not None:
+                level_metadata["sharding"] = sharding
+            metadata.append(level_metadata)
+            if full:
+                return metadata
+
+            chunk_size = np.where(subdivide, chunk_size / 2, chunk_size)
+            grid_shape = np.where(subdivide, grid_shape * 2, grid_shape)
+            grid_bits += int(subdivide.sum())
+            level += 1
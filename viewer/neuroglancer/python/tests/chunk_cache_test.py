@@ -0,0 +1,54 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for chunk_cache.py"""
+
+import threading
+import time
+
+from neuroglancer.chunk_cache import ChunkCache
+
+
+def test_chunk_cache_coalesces_concurrent_requests():
+    cache = ChunkCache(1 << 20, len)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return b"x" * 10
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("k", compute))
+        )
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [b"x" * 10] * 4
+
+
+def test_chunk_cache_evicts_least_recently_used():
+    cache = ChunkCache(25, len)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"x" * 10)
+    cache.get("a")
+    cache.put("c", b"x" * 10)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.total_bytes == 20
@@ -0,0 +1,156 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for chunks.py"""
+
+import gzip
+import io
+import zlib
+
+import neuroglancer
+import numpy as np
+import pytest
+from neuroglancer import chunks
+
+
+def _decode_compressed_segmentation(encoded, shape, block_size, dtype):
+    """Straightforward decoder following the format specification."""
+    words = np.frombuffer(encoded, dtype="<u4")
+    assert words[0] == 1
+    words = words[1:]
+    words_per_value = np.dtype(dtype).itemsize // 4
+    grid = [-(-s // b) for s, b in zip(shape, block_size)]
+    result = np.zeros(shape, dtype=dtype)
+    for x, y, z in np.ndindex(*shape):
+        bx, by, bz = x // block_size[0], y // block_size[1], z // block_size[2]
+        block = bx + grid[0] * (by + grid[1] * bz)
+        table_offset = int(words[2 * block]) & 0xFFFFFF
+        encoded_bits = int(words[2 * block]) >> 24
+        values_offset = int(words[2 * block + 1])
+        ix, iy, iz = (
+            x % block_size[0],
+            y % block_size[1],
+            z % block_size[2],
+        )
+        bit_offset = encoded_bits * (ix + block_size[0] * (iy + block_size[1] * iz))
+        index = 0
+        if encoded_bits:
+            word = int(words[values_offset + bit_offset // 32])
+            index = (word >> (bit_offset % 32)) & ((1 << encoded_bits) - 1)
+        entry = words[
+            table_offset + index * words_per_value : table_offset
+            + (index + 1) * words_per_value
+        ]
+        result[x, y, z] = entry.view("<u8")[0] if words_per_value == 2 else entry[0]
+    return result
+
+
+@pytest.mark.parametrize("dtype", [np.uint32, np.uint64])
+@pytest.mark.parametrize(
+    "shape,block_size,num_labels",
+    [
+        ((8, 8, 8), (8, 8, 8), 1),
+        ((10, 7, 5), (4, 4, 4), 3),
+        ((16, 9, 3), (8, 4, 2), 20),
+        ((6, 6, 6), (2, 3, 1), 6),
+        ((9, 9, 9), (8, 8, 8), 300),
+    ],
+)
+def test_compressed_segmentation_round_trip(dtype, shape, block_size, num_labels):
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 2**32, num_labels, dtype=np.uint64).astype(dtype)
+    if dtype == np.uint64:
+        labels += np.uint64(1 << 40)
+    subvol = labels[rng.integers(0, num_labels, shape)]
+    encoded = chunks.encode_compressed_segmentation(subvol, block_size)
+    np.testing.assert_array_equal(
+        _decode_compressed_segmentation(encoded, shape, block_size, dtype), subvol
+    )
+
+
+def test_compressed_segmentation_shares_tables():
+    subvol = np.zeros((16, 16, 16), dtype=np.uint32)
+    subvol[:, :, 8:] = 7
+    encoded = chunks.encode_compressed_segmentation(subvol, (8, 8, 8))
+    # Channel header, 8 block headers and the two distinct one-value tables.
+    assert len(encoded) == 4 * (1 + 2 * 8 + 2)
+
+
+def test_compressed_segmentation_invalid():
+    with pytest.raises(ValueError):
+        chunks.encode_compressed_segmentation(np.zeros((2, 2, 2), np.uint8), (2, 2, 2))
+    with pytest.raises(ValueError):
+        chunks.encode_compressed_segmentation(np.zeros((2, 2, 2), np.uint32), (2, 0, 2))
+
+
+def test_raw_is_fortran_order():
+    subvol = np.arange(24, dtype=">u2").reshape(2, 3, 4)
+    encoded = chunks.encode_raw(subvol)
+    np.testing.assert_array_equal(
+        np.frombuffer(encoded, dtype="<u2"), subvol.ravel(order="F")
+    )
+
+
+def test_raw_zero_copy():
+    subvol = np.asfortranarray(np.arange(24, dtype=np.uint32).reshape(2, 3, 4))
+    encoded = chunks.encode_raw(subvol)
+    assert isinstance(encoded, memoryview)
+    assert np.shares_memory(np.frombuffer(encoded, dtype=np.uint8), subvol)
+    np.testing.assert_array_equal(
+        np.frombuffer(encoded, dtype=np.uint32), subvol.ravel(order="F")
+    )
+
+
+@pytest.mark.parametrize("level", [0, 1, 9])
+def test_npz_compression_level(level):
+    subvol = np.arange(1000, dtype=np.uint16).reshape(10, 10, 10)
+    decoded = np.load(io.BytesIO(zlib.decompress(chunks.encode_npz(subvol, level))))
+    np.testing.assert_array_equal(decoded, subvol)
+
+
+def test_local_volume_compressed_segmentation_gzip():
+    data = np.random.default_rng(1).integers(0, 5, (12, 10, 9)).astype(np.uint64)
+    vol = neuroglancer.LocalVolume(
+        data, encoding="compressed_segmentation", content_encoding="gzip"
+    )
+    assert vol.info()["encoding"] == "compressed_segmentation"
+    assert vol.uses_gzip("compressed_segmentation")
+    assert not vol.uses_gzip("npz")
+    encoded, _ = vol.get_encoded_subvolume(
+        "compressed_segmentation",
+        np.array([0, 0, 0]),
+        np.array([12, 10, 9]),
+        "1,1,1",
+        block_size="8,8,8",
+        gzip=True,
+    )
+    np.testing.assert_array_equal(
+        _decode_compressed_segmentation(
+            gzip.decompress(encoded), data.shape, (8, 8, 8), np.uint64
+        ),
+        data,
+    )
+    with pytest.raises(ValueError):
+        vol.get_encoded_subvolume(
+            "compressed_segmentation",
+            np.array([0, 0, 0]),
+            np.array([1, 1, 1]),
+            "1,1,1",
+        )
+
+
+def test_local_volume_compressed_segmentation_requires_labels():
+    with pytest.raises(ValueError):
+        neuroglancer.LocalVolume(
+            np.zeros((4, 4, 4), dtype=np.uint8), encoding="compressed_segmentation"
+        )
@@ -0,0 +1,119 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for downsample.py"""
+
+import collections
+import io
+import math
+import zlib
+
+import neuroglancer
+import numpy as np
+import pytest
+from neuroglancer import downsample
+
+
+def _reference(array, factor, reduce_block):
+    output_shape = tuple(int(math.ceil(s / f)) for s, f in zip(array.shape, factor))
+    result = np.zeros(output_shape, dtype=array.dtype)
+    for index in np.ndindex(output_shape):
+        block = array[tuple(np.s_[i * f : (i + 1) * f] for i, f in zip(index, factor))]
+        result[index] = reduce_block(block)
+    return result
+
+
+def _mode(block):
+    counts = collections.Counter(block.ravel().tolist())
+    best = max(counts.values())
+    return min(v for v, c in counts.items() if c == best)
+
+
+SHAPES_AND_FACTORS = [
+    ((8, 8, 8), (2, 2, 2)),
+    ((9, 7, 5), (2, 2, 2)),
+    ((13, 10, 6), (4, 4, 4)),
+    ((5, 17, 3), (1, 4, 2)),
+    ((6, 6), (3, 1)),
+]
+
+
+@pytest.mark.parametrize("shape,factor", SHAPES_AND_FACTORS)
+def test_averaging_integer_exact(shape, factor):
+    rng = np.random.default_rng(0)
+    array = rng.integers(0, 256, size=shape, dtype=np.uint8)
+    expected = _reference(
+        array,
+        factor,
+        lambda b: math.floor(int(b.astype(np.int64).sum()) / b.size + 0.5),
+    )
+    result = downsample.downsample_with_averaging(array, factor)
+    assert result.dtype == array.dtype
+    np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("shape,factor", SHAPES_AND_FACTORS)
+def test_averaging_float(shape, factor):
+    rng = np.random.default_rng(1)
+    array = rng.random(shape, dtype=np.float32)
+    expected = _reference(array, factor, lambda b: b.astype(np.float64).mean())
+    result = downsample.downsample_with_averaging(array, factor)
+    assert result.dtype == np.float32
+    np.testing.assert_allclose(result, expected, rtol=1e-5)
+
+
+@pytest.mark.parametrize("shape,factor", SHAPES_AND_FACTORS)
+def test_min_max(shape, factor):
+    rng = np.random.default_rng(2)
+    array = rng.integers(-1000, 1000, size=shape, dtype=np.int16)
+    np.testing.assert_array_equal(
+        downsample.downsample_with_min(array, factor),
+        _reference(array, factor, np.min),
+    )
+    np.testing.assert_array_equal(
+        downsample.downsample_with_max(array, factor),
+        _reference(array, factor, np.max),
+    )
+
+
+@pytest.mark.parametrize("shape,factor", SHAPES_AND_FACTORS)
+def test_mode(shape, factor):
+    rng = np.random.default_rng(3)
+    array = rng.integers(0, 4, size=shape).astype(np.uint64) + np.uint64(2**40)
+    result = downsample.downsample_with_mode(array, factor)
+    assert result.dtype == np.uint64
+    np.testing.assert_array_equal(result, _reference(array, factor, _mode))
+
+
+def test_mode_ignores_edge_padding():
+    # The partial edge block contains one 7 and two 3s; edge padding must not
+    # make 7 the most frequent value.
+    array = np.array([[3, 3, 7]], dtype=np.uint32)
+    np.testing.assert_array_equal(downsample.downsample_with_mode(array, (1, 4)), [[3]])
+
+
+def test_invalid_method():
+    with pytest.raises(ValueError):
+        downsample.downsample(np.zeros((2, 2)), (2, 2), "median")
+
+
+def test_local_volume_segmentation_uses_mode():
+    data = np.zeros((4, 4, 4), dtype=np.uint32)
+    data[:, :, :3] = 5
+    vol = neuroglancer.LocalVolume(data)
+    assert vol.volume_type == "segmentation"
+    assert vol.downsampling_method == "mode"
+    encoded, _ = vol.get_encoded_subvolume(
+        "npz", np.array([0, 0, 0]), np.array([1, 1, 1]), "4,4,4"
+    )
+    assert np.load(io.BytesIO(zlib.decompress(encoded))).ravel().tolist() == [5]
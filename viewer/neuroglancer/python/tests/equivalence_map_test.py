@@ -13,6 +13,11 @@
 # limitations under the License.
 """Tests for equivalence_map.py"""
 
+import copy
+
+import neuroglancer
+import numpy as np
+import pytest
 from neuroglancer import equivalence_map
 
 
@@ -76,3 +81,92 @@ def test_isolate_element():
 
     m.isolate_element(1)
     assert [[2, 3], [4, 5]] == m.to_json()
+
+
+def test_array_basic():
+    m = equivalence_map.ArrayEquivalenceMap()
+    for i in range(24):
+        assert m[i] == 0
+        assert {i + 1} == set(m.members(i + 1))
+        assert m.union(i, i + 1) == 0
+        assert set(range(i + 2)) == set(m.members(i))
+    assert m.union(30, 25) == 25
+    assert m.union(30, 7) == 0
+    assert set(range(25)) | {25, 30} == set(m.members(30))
+    assert m[100] == 100
+    assert {1, 2, 3, 4, 5} == set(
+        equivalence_map.ArrayEquivalenceMap([[1, 2, 3], [4, 5]]).keys()
+    )
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_array_matches_dict(seed):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(1 << 62, 300, replace=False).astype(np.uint64)
+    dict_map = equivalence_map.EquivalenceMap()
+    array_map = equivalence_map.ArrayEquivalenceMap()
+    for step in range(20):
+        edges = ids[rng.integers(0, len(ids), (rng.integers(1, 15), 2))]
+        if step % 2:
+            dict_map.union_edges(edges)
+            array_map.union_edges(edges)
+        else:
+            for a, b in edges.tolist():
+                assert dict_map.union(a, b) == array_map.union(a, b)
+        if step % 7 == 6:
+            element = int(edges[0, 0])
+            dict_map.isolate_element(element)
+            array_map.isolate_element(element)
+            dict_map.delete_set(int(edges[-1, 1]))
+            array_map.delete_set(int(edges[-1, 1]))
+        assert array_map.to_json() == dict_map.to_json()
+        assert array_map.sets() == dict_map.sets()
+        assert sorted(array_map) == sorted(dict_map)
+    np.testing.assert_array_equal(
+        array_map[ids.reshape(10, 30)],
+        np.array([dict_map[x] for x in ids.tolist()], dtype=np.uint64).reshape(10, 30),
+    )
+    for x in ids[:50].tolist():
+        assert array_map[x] == dict_map[x]
+        assert sorted(array_map.members(x)) == sorted(dict_map.members(x))
+
+
+def test_array_union_edges_large():
+    # A long chain, in random order, and many small sets.
+    n = 100000
+    rng = np.random.default_rng(3)
+    chain = np.stack([np.arange(n - 1), np.arange(1, n)], axis=1) + 10
+    pairs = np.stack([np.arange(0, n, 2), np.arange(1, n, 2)], axis=1) + 10 * n
+    edges = np.concatenate([chain, pairs])[rng.permutation(len(chain) + len(pairs))]
+    m = equivalence_map.ArrayEquivalenceMap()
+    m.union_edges(edges[: len(edges) // 2])
+    m.union_edges(edges[len(edges) // 2 :])
+    assert (m[np.arange(10, n + 10)] == 10).all()
+    np.testing.assert_array_equal(
+        m[np.arange(10 * n, 11 * n)], np.repeat(np.arange(10 * n, 11 * n, 2), 2)
+    )
+    assert len(list(m.members(n // 2))) == n
+    assert len(m.to_json()) == 1 + n // 2
+
+
+def test_array_copy_and_readonly():
+    m = equivalence_map.ArrayEquivalenceMap([[1, 2, 3], [4, 5]])
+    for other in (m.copy(), copy.copy(m), copy.deepcopy(m)):
+        other.union(3, 4)
+        assert other.to_json() == [[1, 2, 3, 4, 5]]
+    assert m.to_json() == [[1, 2, 3], [4, 5]]
+    assert (
+        equivalence_map.ArrayEquivalenceMap(
+            equivalence_map.EquivalenceMap(m.to_json())
+        ).to_json()
+        == m.to_json()
+    )
+    readonly = equivalence_map.ArrayEquivalenceMap(m, _readonly=True)
+    with pytest.raises(AttributeError):
+        readonly.union(1, 4)
+    with pytest.raises(AttributeError):
+        readonly.union_edges([[1, 4]])
+
+    layer = neuroglancer.SegmentationLayer(equivalences=m)
+    assert layer.equivalences is m
+    assert layer.to_json()["equivalences"] == [[1, 2, 3], [4, 5]]
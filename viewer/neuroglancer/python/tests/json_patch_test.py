@@ -0,0 +1,145 @@
+# @license
+# Copyright 2025 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for json_patch.py"""
+
+import copy
+import json
+
+import neuroglancer
+import pytest
+from neuroglancer import json_patch, server, trackable_state
+
+
+@pytest.mark.parametrize(
+    "old,new",
+    [
+        ({"a": 1}, {"a": 1}),
+        ({"a": 1, "b": [1, 2]}, {"a": 2, "c": "x"}),
+        ({"a/b": {"c~d": 1}}, {"a/b": {"c~d": 2}}),
+        ({"ids": ["1", "2", "3"]}, {"ids": ["1", "2", "5", "3"]}),
+        ({"ids": ["1", "2", "3", "4"]}, {"ids": ["1", "4"]}),
+        ([1, 2, 3], [4, 5]),
+        ({"a": 1}, [1]),
+        ({"a": 1}, {"a": 1.0}),
+        ({"a": True}, {"a": 1}),
+        ({"a": [1]}, {"a": [1.0]}),
+        ([1], [True]),
+        ({"a": {"b": [0, 1]}}, {"a": {"b": [0, False]}}),
+    ],
+)
+def test_round_trip(old, new):
+    old_copy = copy.deepcopy(old)
+    patch = json_patch.make_patch(old, new)
+    result = json_patch.apply_patch(old, patch)
+    assert json.dumps(result) == json.dumps(new)
+    assert json.dumps(old) == json.dumps(old_copy)
+
+
+def test_list_edit_patch_is_small():
+    ids = [str(i) for i in range(1000)]
+    assert json_patch.make_patch({"ids": ids}, {"ids": ids + ["1000"]}) == [
+        {"op": "add", "path": "/ids/1000", "value": "1000"}
+    ]
+    assert json_patch.make_patch({"ids": ids}, {"ids": ids[:10] + ids[11:]}) == [
+        {"op": "remove", "path": "/ids/10"}
+    ]
+
+
+def test_apply_all_operations():
+    doc = {"a": {"b": 1}, "c": [1, 2]}
+    result = json_patch.apply_patch(
+        doc,
+        [
+            {"op": "test", "path": "/c", "value": [1, 2]},
+            {"op": "copy", "from": "/a", "path": "/d"},
+            {"op": "move", "from": "/a/b", "path": "/c/-"},
+            {"op": "add", "path": "/d/e", "value": 2},
+        ],
+    )
+    assert result == {"a": {}, "c": [1, 2, 1], "d": {"b": 1, "e": 2}}
+    assert doc == {"a": {"b": 1}, "c": [1, 2]}
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [{"op": "remove", "path": "/b"}],
+        [{"op": "replace", "path": "/c/2", "value": 0}],
+        [{"op": "add", "path": "/c/01", "value": 0}],
+        [{"op": "add", "path": "a", "value": 0}],
+        [{"op": "test", "path": "/a", "value": 2}],
+        [{"op": "move", "from": "/c", "path": "/c/0"}],
+        [{"op": "frobnicate", "path": "/a"}],
+        [{"path": "/a"}],
+    ],
+)
+def test_apply_invalid(patch):
+    with pytest.raises(json_patch.JsonPatchError):
+        json_patch.apply_patch({"a": 1, "c": [1, 2]}, patch)
+
+
+class _FakeHandler:
+    def __init__(self):
+        self.messages = []
+
+    def write(self, data):
+        assert data.startswith("data: ") and data.endswith("\n\n")
+        self.messages.append(json.loads(data[len("data: ") : -2]))
+
+
+def test_event_stream_sends_patches():
+    state = trackable_state.TrackableState(neuroglancer.ViewerState)
+    initial_generation = state.set_state({"layers": []})
+    handler = _FakeHandler()
+    watcher = server.EventStreamStateWatcher(
+        key="s",
+        client_id="client",
+        state=state,
+        last_generation="",
+        wake_up=lambda: None,
+        send_patches=True,
+    )
+    try:
+        # The client's state is unknown, so the first update is a full state.
+        assert watcher.maybe_send_update(handler)
+        assert handler.messages.pop() == {
+            "k": "s",
+            "s": {"layers": []},
+            "g": initial_generation,
+        }
+        assert not watcher.maybe_send_update(handler)
+
+        layer = {"type": "segmentation", "name": "a", "segments": ["1"]}
+        generation = state.set_state({"layers": [layer]})
+        assert watcher.maybe_send_update(handler)
+        assert handler.messages.pop() == {
+            "k": "s",
+            "p": [{"op": "add", "path": "/layers/0", "value": layer}],
+            "pg": initial_generation,
+            "g": generation,
+        }
+
+        # States sent by the client itself become the base of later patches.
+        client_state = {"layers": [dict(layer, segments=["1", "2"])]}
+        client_generation = state.set_state(client_state, "client/5")
+        assert not watcher.maybe_send_update(handler)
+        new_state = {"layers": [dict(layer, segments=["1", "2", "3"])]}
+        generation = state.set_state(new_state)
+        assert watcher.maybe_send_update(handler)
+        msg = handler.messages.pop()
+        assert msg["pg"] == client_generation
+        assert msg["g"] == generation
+        assert json_patch.apply_patch(client_state, msg["p"]) == new_state
+    finally:
+        watcher.unregister()
@@ -79,3 +79,77 @@ def test_tensorstore_features():
         names=["x", "y", "d2"], units=units, scales=scales
     )
     assert local_volume.dimensions.to_json() == dimensions.to_json()
+
+
+def _get_chunk(local_volume, start, end, scale_key, data_format="npz"):
+    data, _ = local_volume.get_encoded_subvolume(
+        data_format, np.array(start), np.array(end), scale_key
+    )
+    return data
+
+
+def test_encoded_chunk_cache():
+    data = np.arange(16 * 16 * 16, dtype=np.uint16).reshape((16, 16, 16))
+    local_volume = neuroglancer.LocalVolume(data, volume_type="image")
+    first = _get_chunk(local_volume, (0, 0, 0), (4, 4, 4), "2,2,2")
+    assert _get_chunk(local_volume, (0, 0, 0), (4, 4, 4), "2,2,2") is first
+    assert local_volume._encoded_cache.hits == 1
+
+    data[:] = 0
+    local_volume.invalidate()
+    assert _get_chunk(local_volume, (0, 0, 0), (4, 4, 4), "2,2,2") != first
+
+
+@pytest.mark.parametrize("downsampling_method", ["max", "min"])
+def test_cascade_downsampling_from_cached_chunks(downsampling_method):
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 255, size=(32, 32, 24), dtype=np.uint8)
+    local_volume = neuroglancer.LocalVolume(
+        data, volume_type="image", downsampling_method=downsampling_method
+    )
+    uncached = neuroglancer.LocalVolume(
+        data,
+        volume_type="image",
+        downsampling_method=downsampling_method,
+        encoded_cache_bytes=0,
+        subvolume_cache_bytes=0,
+    )
+    for x in (0, 8):
+        for y in (0, 8):
+            for z in (0, 8):
+                start = (x, y, z)
+                end = (x + 8, y + 8, min(z + 8, 12))
+                _get_chunk(local_volume, start, end, "2,2,2")
+    cached_before = len(local_volume._subvolume_cache)
+    assert _get_chunk(local_volume, (0, 0, 0), (8, 8, 6), "4,4,4") == _get_chunk(
+        uncached, (0, 0, 0), (8, 8, 6), "4,4,4"
+    )
+    # The coarse chunk was built from the 8 cached finer chunks.
+    assert local_volume._subvolume_cache.hits == 0
+    assert len(local_volume._subvolume_cache) == cached_before + 1
+
+
+@pytest.mark.parametrize("downsampling_method", ["mean", "mode"])
+def test_cascade_downsampling_skips_inexact_methods(downsampling_method):
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 4, size=(16, 16, 16), dtype=np.uint32)
+    local_volume = neuroglancer.LocalVolume(
+        data, volume_type="image", downsampling_method=downsampling_method
+    )
+    uncached = neuroglancer.LocalVolume(
+        data,
+        volume_type="image",
+        downsampling_method=downsampling_method,
+        encoded_cache_bytes=0,
+        subvolume_cache_bytes=0,
+    )
+    for x in (0, 4):
+        for y in (0, 4):
+            for z in (0, 4):
+                start = (x, y, z)
+                _get_chunk(local_volume, start, (x + 4, y + 4, z + 4), "2,2,2")
+    # Mode of modes and mean of rounded means are not exact, so the coarse
+    # chunk must not depend on which finer chunks happen to be cached.
+    assert _get_chunk(local_volume, (0, 0, 0), (4, 4, 4), "4,4,4") == _get_chunk(
+        uncached, (0, 0, 0), (4, 4, 4), "4,4,4"
+    )
@@ -0,0 +1,165 @@
+# @license
+# Copyright 2025 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for read_precomputed_annotations.py"""
+
+import pathlib
+import shutil
+
+import neuroglancer
+import numpy as np
+import pytest
+from neuroglancer import read_precomputed_annotations, write_annotations
+
+_COORDINATE_SPACE = neuroglancer.CoordinateSpace(names=["x", "y", "z"], units="nm")
+
+# Not sorted by alignment, unlike their encoding.
+_PROPERTIES = [
+    neuroglancer.AnnotationPropertySpec(id="label", type="uint8"),
+    neuroglancer.AnnotationPropertySpec(id="score", type="float32"),
+]
+
+
+def _write_boxes(path: pathlib.Path, num_annotations: int, **kwargs):
+    rng = np.random.default_rng(0)
+    lower = (rng.random((num_annotations, 3)) * 100).astype(np.float32)
+    upper = lower + (rng.random((num_annotations, 3)) * 5).astype(np.float32)
+    labels = rng.integers(0, 256, num_annotations)
+    scores = rng.random(num_annotations).astype(np.float32)
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=_COORDINATE_SPACE,
+        annotation_type="axis_aligned_bounding_box",
+        properties=_PROPERTIES,
+    )
+    writer.add_axis_aligned_bounding_boxes(
+        lower, upper, ids=np.arange(num_annotations) + 1, label=labels, score=scores
+    )
+    writer.write(path, spatial_index_limit=50, **kwargs)
+    return lower, upper, labels, scores
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_records_within_spatial_bounds(tmp_path: pathlib.Path, sharded):
+    lower, upper, labels, scores = _write_boxes(tmp_path, 1000, sharded=sharded)
+    reader = read_precomputed_annotations.AnnotationReader(tmp_path.as_uri())
+    assert reader.record_dtype.names == ("id", "point_a", "point_b", "label", "score")
+
+    query_lower = [20.0, 30.0, 10.0]
+    query_upper = [60.0, 50.0, 90.0]
+    records = reader.get_records_within_spatial_bounds(
+        lower_bound=query_lower, upper_bound=query_upper, max_parallelism=3
+    )
+    expected = (
+        np.flatnonzero(
+            np.all(lower <= query_upper, axis=1) & np.all(upper >= query_lower, axis=1)
+        )
+        + 1
+    )
+    ids = np.sort(records["id"])
+    np.testing.assert_array_equal(ids, expected)
+    records = records[np.argsort(records["id"])]
+    np.testing.assert_array_equal(records["point_a"], lower[ids - 1])
+    np.testing.assert_array_equal(records["point_b"], upper[ids - 1])
+    np.testing.assert_array_equal(records["label"], labels[ids - 1])
+    np.testing.assert_array_equal(records["score"], scores[ids - 1])
+
+    annotations = list(
+        reader.get_within_spatial_bounds(
+            lower_bound=query_lower, upper_bound=query_upper
+        )
+    )
+    assert sorted({int(a.id) for a in annotations}) == expected.tolist()
+    annotation = reader.by_id[int(ids[0])]
+    assert int(annotation.props[0]) == labels[ids[0] - 1]
+    assert annotation.props[1] == scores[ids[0] - 1]
+
+    assert len(reader.get_records_within_spatial_bounds(limit=7)) == 7
+    assert len(reader.get_records_within_spatial_bounds(limit=0)) == 0
+    empty = reader.get_records_within_spatial_bounds(
+        lower_bound=[50, 50, 50], upper_bound=[40, 40, 40]
+    )
+    assert empty.dtype == reader.record_dtype and len(empty) == 0
+
+
+@pytest.mark.parametrize("chunk_cache_bytes", [0, 1 << 20])
+def test_spatial_queries_use_cache(tmp_path: pathlib.Path, chunk_cache_bytes):
+    _write_boxes(tmp_path, 1000)
+    reader = read_precomputed_annotations.AnnotationReader(
+        tmp_path.as_uri(), chunk_cache_bytes=chunk_cache_bytes
+    )
+    query_lower = [0.0, 0.0, 0.0]
+    query_upper = [30.0, 30.0, 30.0]
+    records = reader.get_records_within_spatial_bounds(
+        lower_bound=query_lower, upper_bound=query_upper
+    )
+    assert len(records)
+    for level in reader.metadata["spatial"]:
+        shutil.rmtree(tmp_path / level["key"])
+    repeated = reader.get_records_within_spatial_bounds(
+        lower_bound=query_lower, upper_bound=query_upper
+    )
+    if chunk_cache_bytes:
+        np.testing.assert_array_equal(repeated, records)
+    else:
+        assert len(repeated) == 0
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_records_are_not_repeated_across_cells(tmp_path: pathlib.Path, sharded):
+    # Long lines intersect many cells of each spatial index level.
+    rng = np.random.default_rng(2)
+    num_annotations = 500
+    point_a = (rng.random((num_annotations, 3)) * 100).astype(np.float32)
+    point_b = point_a + (rng.random((num_annotations, 3)) * 30).astype(np.float32)
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=_COORDINATE_SPACE, annotation_type="line"
+    )
+    writer.add_lines(point_a, point_b)
+    writer.write(tmp_path, spatial_index_limit=50, sharded=sharded)
+    reader = read_precomputed_annotations.AnnotationReader(tmp_path.as_uri())
+    assert len(reader.spatial) > 1
+
+    records = reader.get_records_within_spatial_bounds()
+    assert sorted(records["id"].tolist()) == list(range(num_annotations))
+
+    query_lower = [20.0, 30.0, 10.0]
+    query_upper = [40.0, 50.0, 30.0]
+    records = reader.get_records_within_spatial_bounds(
+        lower_bound=query_lower, upper_bound=query_upper, max_parallelism=3
+    )
+    lower = np.minimum(point_a, point_b)
+    upper = np.maximum(point_a, point_b)
+    expected = np.flatnonzero(
+        np.all(lower <= query_upper, axis=1) & np.all(upper >= query_lower, axis=1)
+    )
+    assert sorted(records["id"].tolist()) == expected.tolist()
+    assert len(reader.get_records_within_spatial_bounds(limit=300)) == 300
+
+
+def test_polyline_records(tmp_path: pathlib.Path):
+    rng = np.random.default_rng(1)
+    polylines = [rng.random((2 + i % 4, 3)) * 10 for i in range(20)]
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=_COORDINATE_SPACE,
+        annotation_type="polyline",
+        properties=_PROPERTIES,
+    )
+    writer.add_polylines(polylines, label=np.arange(20), score=np.arange(20) / 2)
+    writer.write(tmp_path, sharded=True)
+    reader = read_precomputed_annotations.AnnotationReader(tmp_path.as_uri())
+    records = reader.get_records_within_spatial_bounds()
+    assert records["id"].tolist() == list(range(20))
+    for points, expected in zip(records["points"], polylines):
+        np.testing.assert_allclose(points, expected.astype(np.float32))
+    np.testing.assert_array_equal(records["label"], np.arange(20))
+    np.testing.assert_array_equal(records["score"], np.arange(20) / 2)
@@ -15,6 +15,8 @@
 
 import neuroglancer
 import numpy as np
+import pytest
+from neuroglancer import segment_colors
 from neuroglancer.segment_colors import hash_function, hex_string_from_segment_id
 
 
@@ -70,6 +72,38 @@ def test_hex_string_from_segment_id():
     assert result.upper() == "#FF4ACE"
 
 
+@pytest.mark.parametrize("color_seed", [0, 1965848648, 2183424408, 0xFFFFFFFF])
+def test_vectorized_matches_scalar(color_seed):
+    rng = np.random.default_rng(color_seed)
+    segment_ids = np.concatenate(
+        [
+            np.array([0, 39, 40, 58, 143, 2**64 - 1], dtype=np.uint64),
+            rng.integers(0, 2**64 - 1, 2000, dtype=np.uint64, endpoint=True),
+        ]
+    )
+    expected = [hex_string_from_segment_id(color_seed, x) for x in segment_ids]
+    assert segment_colors.hex_strings_from_segment_ids(color_seed, segment_ids) == (
+        expected
+    )
+    packed = segment_colors.packed_colors_from_segment_ids(
+        color_seed, segment_ids.reshape(2, -1)
+    )
+    assert packed.shape == (2, len(segment_ids) // 2)
+    assert ["#%06x" % x for x in packed.ravel().tolist()] == expected
+    np.testing.assert_array_equal(
+        segment_colors.hash_function_array(color_seed, segment_ids[:10] & 0xFFFFFFFF),
+        [hash_function(color_seed, int(x)) for x in segment_ids[:10]],
+    )
+
+
+def test_segment_html_color_dict():
+    layer = neuroglancer.SegmentationLayer(segments=[39, 40], color_seed=0)
+    assert layer.segment_html_color_dict == {
+        39: "#992cff",
+        40: hex_string_from_segment_id(0, 40),
+    }
+
+
 def test_segment_colors(webdriver):
     a = np.array([[[42]]], dtype=np.uint8)
     with webdriver.viewer.txn() as s:
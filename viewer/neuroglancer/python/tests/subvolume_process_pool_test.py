@@ -0,0 +1,76 @@
+# @license
+# Copyright 2024 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for subvolume_process_pool.py"""
+
+import io
+import zlib
+
+import neuroglancer
+import numpy as np
+import pytest
+from neuroglancer.subvolume_process_pool import SubvolumeProcessPool
+
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SubvolumeProcessPool(max_workers=2, min_bytes=0)
+    yield pool
+    pool.shutdown()
+
+
+def _decode_npz(encoded):
+    return np.load(io.BytesIO(zlib.decompress(encoded)))
+
+
+@pytest.mark.parametrize("scale_key", ["1,1,1", "2,2,2", "4,4,1"])
+def test_matches_thread_pool(pool, scale_key):
+    data = np.random.default_rng(0).integers(0, 256, (20, 17, 9), dtype=np.uint8)
+    vol = neuroglancer.LocalVolume(data, encoded_cache_bytes=0)
+    assert pool.accepts(vol)
+    start = np.array([1, 0, 0])
+    end = np.array([4, 4, 2])
+    expected = vol.get_encoded_subvolume("npz", start, end, scale_key)
+    actual = vol.get_encoded_subvolume("npz", start, end, scale_key, process_pool=pool)
+    assert actual == expected
+
+
+def test_invalidate_republishes(pool):
+    data = np.zeros((8, 8, 8), dtype=np.uint16)
+    vol = neuroglancer.LocalVolume(data, encoded_cache_bytes=0)
+    start, end = np.array([0, 0, 0]), np.array([2, 2, 2])
+    encoded, _ = vol.get_encoded_subvolume(
+        "npz", start, end, "1,1,1", process_pool=pool
+    )
+    assert not _decode_npz(encoded).any()
+
+    data[...] = 3
+    vol.invalidate()
+    encoded, _ = vol.get_encoded_subvolume(
+        "npz", start, end, "1,1,1", process_pool=pool
+    )
+    assert (_decode_npz(encoded) == 3).all()
+    assert pool._shared[vol.token].generation == vol.change_count
+
+
+def test_small_volumes_use_threads():
+    pool = SubvolumeProcessPool(max_workers=1, min_bytes=1 << 20)
+    try:
+        vol = neuroglancer.LocalVolume(np.zeros((4, 4, 4), dtype=np.uint8))
+        assert not pool.accepts(vol)
+        vol.get_encoded_subvolume(
+            "npz", np.array([0, 0, 0]), np.array([4, 4, 4]), "1,1,1", process_pool=pool
+        )
+        assert not pool._shared
+    finally:
+        pool.shutdown()
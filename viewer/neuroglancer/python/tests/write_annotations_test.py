@@ -13,11 +13,14 @@
 # limitations under the License.
 
 
+import json
 import os
 import pathlib
+import struct
 
 import neuroglancer
 import numpy as np
+import pytest
 from neuroglancer import write_annotations
 
 
@@ -149,3 +152,326 @@ def test_annotation_writer_polyline(tmp_path: pathlib.Path):
     # The first 8 bytes are the total count of the number of elements
     num_points = np.frombuffer(contents[0:8], dtype=np.uint64)
     assert num_points[0] == len(polylines)
+
+
+def _write_points(tmp_path, num_points, **kwargs):
+    coordinate_space = neuroglancer.CoordinateSpace(
+        names=["x", "y", "z"], units="nm", scales=[1, 1, 1]
+    )
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=coordinate_space,
+        annotation_type="point",
+        relationships=["segment"],
+        properties=[neuroglancer.AnnotationPropertySpec(id="size", type="uint16")],
+    )
+    rng = np.random.default_rng(0)
+    points = rng.random((num_points, 3)) * [1000, 500, 20]
+    for i, point in enumerate(points):
+        writer.add_point(point, id=i * 7 + 1, size=i % 1000, segment=[i % 13])
+    writer.write(tmp_path, **kwargs)
+    return points
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+def test_annotation_writer_multi_level_round_trip(tmp_path: pathlib.Path, sharded):
+    read_precomputed_annotations = pytest.importorskip(
+        "neuroglancer.read_precomputed_annotations"
+    )
+    num_points = 3000
+    limit = 100
+    points = _write_points(
+        tmp_path, num_points, spatial_index_limit=limit, sharded=sharded
+    )
+    reader = read_precomputed_annotations.AnnotationReader(tmp_path.as_uri())
+
+    spatial = reader.metadata["spatial"]
+    assert len(spatial) > 1
+    assert ("sharding" in spatial[0]) == sharded
+    assert ("sharding" in reader.metadata["by_id"]) == sharded
+    for level in spatial:
+        assert level["limit"] <= 2 * limit
+    # Each level halves the cell size along the largest dimensions.
+    assert spatial[1]["grid_shape"] == [2, 1, 1]
+    assert spatial[1]["chunk_size"][0] == spatial[0]["chunk_size"][0] / 2
+
+    annotations = list(reader.get_within_spatial_bounds())
+    ids = sorted(int(annotation.id) for annotation in annotations)
+    assert ids == [i * 7 + 1 for i in range(num_points)]
+    by_id = {int(annotation.id): annotation for annotation in annotations}
+    for i in (0, 17, num_points - 1):
+        np.testing.assert_allclose(by_id[i * 7 + 1].point, points[i], rtol=1e-6)
+
+    annotation = reader.by_id[17 * 7 + 1]
+    np.testing.assert_allclose(annotation.point, points[17], rtol=1e-6)
+    assert int(annotation.props[0]) == 17
+    assert list(annotation.segments[0]) == [17 % 13]
+
+    related = reader.relationships["segment"][5]
+    assert sorted(int(a.id) for a in related) == [
+        i * 7 + 1 for i in range(num_points) if i % 13 == 5
+    ]
+
+
+def test_annotation_writer_spatial_index_covers_boxes(tmp_path: pathlib.Path):
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y"], units="m")
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=coordinate_space, annotation_type="axis_aligned_bounding_box"
+    )
+    rng = np.random.default_rng(1)
+    lower = (rng.random((500, 2)) * 100).astype(np.float32)
+    upper = lower + (rng.random((500, 2)) * 30).astype(np.float32)
+    for point_a, point_b in zip(lower, upper):
+        writer.add_axis_aligned_bounding_box(point_a, point_b)
+    writer.write(tmp_path, spatial_index_limit=20)
+
+    info = json.loads((tmp_path / "info").read_text())
+    origin = np.array(info["lower_bound"])
+    found: dict[int, int] = {}
+    for level in info["spatial"]:
+        chunk_size = np.array(level["chunk_size"])
+        for cell_path in (tmp_path / level["key"]).iterdir():
+            cell = np.array([int(x) for x in cell_path.name.split("_")])
+            contents = cell_path.read_bytes()
+            count = int(np.frombuffer(contents, "<u8", count=1)[0])
+            assert count <= level["limit"]
+            ids = np.frombuffer(
+                contents, "<u8", count=count, offset=len(contents) - 8 * count
+            )
+            for annotation_id in ids.tolist():
+                # Every cell an annotation is emitted in intersects it.
+                cell_lower = origin + cell * chunk_size
+                assert np.all(lower[annotation_id] <= cell_lower + chunk_size + 1e-6)
+                assert np.all(upper[annotation_id] >= cell_lower - 1e-6)
+                level_index = found.setdefault(annotation_id, int(level["key"][7:]))
+                assert level_index == int(level["key"][7:])
+    assert sorted(found) == list(range(500))
+
+
+def _read_tree(path: pathlib.Path):
+    return {
+        str(p.relative_to(path)): p.read_bytes() for p in path.rglob("*") if p.is_file()
+    }
+
+
+_BULK_PROPERTIES = [
+    neuroglancer.AnnotationPropertySpec(id="size", type="float32"),
+    neuroglancer.AnnotationPropertySpec(id="cell_type", type="uint16", default=3),
+    neuroglancer.AnnotationPropertySpec(id="color", type="rgb"),
+]
+
+
+@pytest.mark.parametrize(
+    "annotation_type,single,bulk",
+    [
+        ("point", "add_point", "add_points"),
+        ("line", "add_line", "add_lines"),
+        (
+            "axis_aligned_bounding_box",
+            "add_axis_aligned_bounding_box",
+            "add_axis_aligned_bounding_boxes",
+        ),
+        ("ellipsoid", "add_ellipsoid", "add_ellipsoids"),
+        ("polyline", "add_polyline", "add_polylines"),
+    ],
+)
+def test_annotation_writer_bulk_matches_single(
+    tmp_path: pathlib.Path, annotation_type, single, bulk
+):
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y", "z"], units="nm")
+    rng = np.random.default_rng(2)
+    num_annotations = 50
+    geometry: list
+    if annotation_type == "point":
+        geometry = [rng.random((num_annotations, 3)) * 100]
+    elif annotation_type == "polyline":
+        geometry = [[rng.random((2 + i % 4, 3)) * 100 for i in range(num_annotations)]]
+    else:
+        geometry = [rng.random((num_annotations, 3)) * 100 for _ in range(2)]
+    ids = rng.permutation(1000)[:num_annotations] + 5
+    sizes = rng.random(num_annotations).astype(np.float32)
+    colors = ["#%06x" % c for c in rng.integers(0, 1 << 24, num_annotations)]
+    pre = [[int(x) for x in rng.integers(0, 10, i % 3)] for i in range(num_annotations)]
+    post = rng.integers(0, 10, num_annotations)
+
+    def make_writer():
+        return write_annotations.AnnotationWriter(
+            coordinate_space=coordinate_space,
+            annotation_type=annotation_type,
+            relationships=["pre", "post"],
+            properties=_BULK_PROPERTIES,
+        )
+
+    writer = make_writer()
+    for i in range(num_annotations):
+        getattr(writer, single)(
+            *[g[i] for g in geometry],
+            id=int(ids[i]),
+            size=sizes[i],
+            color=colors[i],
+            pre=pre[i],
+            post=int(post[i]),
+        )
+    writer.write(tmp_path / "single", spatial_index_limit=10)
+
+    writer = make_writer()
+    split = num_annotations // 3
+    getattr(writer, bulk)(
+        *[g[:split] for g in geometry],
+        ids=ids[:split],
+        size=sizes[:split],
+        color=colors[:split],
+        pre=pre[:split],
+        post=post[:split],
+    )
+    getattr(writer, bulk)(
+        *[g[split:] for g in geometry],
+        ids=ids[split:],
+        size=sizes[split:],
+        color=colors[split:],
+        pre=pre[split:],
+        post=post[split:],
+    )
+    writer.write(tmp_path / "bulk", spatial_index_limit=10)
+
+    assert _read_tree(tmp_path / "bulk") == _read_tree(tmp_path / "single")
+
+
+def test_annotation_writer_bulk_mixed_with_single(tmp_path: pathlib.Path):
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y"], units="m")
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=coordinate_space,
+        annotation_type="point",
+        relationships=["segment"],
+        properties=_BULK_PROPERTIES[:2],
+    )
+    writer.add_point([0, 0], segment=7)
+    writer.add_points(
+        [[1, 1], [2, 2]], size=[1.5, 2.5], segment=np.array([[7, 8], [9, 9]])
+    )
+    writer.add_point([3, 3], cell_type=4)
+    writer.add_points(np.zeros((0, 2)))
+
+    annotations = writer.annotations
+    assert [a.id for a in annotations] == [0, 1, 2, 3]
+    assert [list(a.relationships[0]) for a in annotations] == [[7], [7, 8], [9, 9], []]
+    assert [a.id for a in writer.related_annotations[0][7]] == [0, 1]
+    np.testing.assert_array_equal(writer.lower_bound, [0, 0])
+    np.testing.assert_array_equal(writer.upper_bound, [3, 3])
+
+    writer.write(tmp_path)
+    contents = (tmp_path / "spatial0" / "0_0").read_bytes()
+    count = int(np.frombuffer(contents, "<u8", count=1)[0])
+    records = np.frombuffer(contents, dtype=writer._dtype, count=count, offset=8)
+    np.testing.assert_array_equal(records["property0"], [0, 1.5, 2.5, 0])
+    np.testing.assert_array_equal(records["property1"], [3, 3, 3, 4])
+    assert (tmp_path / "rel_segment" / "9").read_bytes() == (
+        struct.pack("<Q", 2) + records[2:3].tobytes() * 2 + struct.pack("<QQ", 2, 2)
+    )
+
+
+def test_annotation_writer_bulk_invalid():
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y"], units="m")
+    writer = write_annotations.AnnotationWriter(
+        coordinate_space=coordinate_space,
+        annotation_type="line",
+        relationships=["segment"],
+    )
+    with pytest.raises(ValueError):
+        writer.add_points([[0, 0]])
+    with pytest.raises(ValueError):
+        writer.add_lines([[0, 0, 0]], [[1, 1, 1]])
+    with pytest.raises(ValueError):
+        writer.add_lines([[0, 0]], [[1, 1], [2, 2]])
+    with pytest.raises(ValueError):
+        writer.add_lines([[0, 0]], [[1, 1]], ids=[1, 2])
+    with pytest.raises(ValueError):
+        writer.add_lines([[0, 0]], [[1, 1]], segment=np.array([1, 2]))
+    with pytest.raises(ValueError):
+        writer.add_lines([[0, 0]], [[1, 1]], unknown=1)
+
+
+@pytest.mark.parametrize("sharded", [False, True])
+@pytest.mark.parametrize(
+    "annotation_type,add",
+    [
+        ("axis_aligned_bounding_box", "add_axis_aligned_bounding_boxes"),
+        ("polyline", "add_polylines"),
+    ],
+)
+def test_annotation_writer_streaming_matches_in_memory(
+    tmp_path: pathlib.Path, annotation_type, add, sharded
+):
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y", "z"], units="nm")
+    rng = np.random.default_rng(3)
+    num_annotations = 2000
+    geometry: list
+    if annotation_type == "polyline":
+        geometry = [
+            [
+                rng.random(3) * 100 + rng.random((2 + i % 3, 3)) * 10
+                for i in range(num_annotations)
+            ]
+        ]
+    else:
+        lower = rng.random((num_annotations, 3)) * 100
+        geometry = [lower, lower + rng.random((num_annotations, 3)) * 10]
+    sizes = rng.random(num_annotations).astype(np.float32)
+    segments = rng.integers(0, 50, num_annotations)
+    ids = rng.permutation(10 * num_annotations)[:num_annotations]
+
+    def write(path, **kwargs):
+        writer = write_annotations.AnnotationWriter(
+            coordinate_space=coordinate_space,
+            annotation_type=annotation_type,
+            relationships=["segment"],
+            properties=_BULK_PROPERTIES[:1],
+            **kwargs,
+        )
+        for begin in range(0, num_annotations, 150):
+            end = begin + 150
+            getattr(writer, add)(
+                *[g[begin:end] for g in geometry],
+                ids=ids[begin:end],
+                size=sizes[begin:end],
+                segment=segments[begin:end],
+            )
+        writer.write(path, spatial_index_limit=50, sharded=sharded)
+        return writer
+
+    write(tmp_path / "in_memory")
+    (tmp_path / "temp").mkdir()
+    writer = write(
+        tmp_path / "streaming",
+        max_buffer_bytes=20000,
+        temp_directory=tmp_path / "temp",
+    )
+    assert len(writer._runs) > 1
+    assert _read_tree(tmp_path / "streaming") == _read_tree(tmp_path / "in_memory")
+    # Partition files are removed after writing.
+    assert [p.name for p in (tmp_path / "temp").iterdir()] == [
+        os.path.basename(writer._spill_directory)
+    ]
+    annotations = writer.annotations
+    assert [a.id for a in annotations] == ids.tolist()
+
+
+def test_annotation_writer_streaming_single(tmp_path: pathlib.Path):
+    coordinate_space = neuroglancer.CoordinateSpace(names=["x", "y"], units="m")
+    expected = None
+    for max_buffer_bytes in (None, 100):
+        writer = write_annotations.AnnotationWriter(
+            coordinate_space=coordinate_space,
+            annotation_type="point",
+            relationships=["segment"],
+            max_buffer_bytes=max_buffer_bytes,
+        )
+        for i in range(300):
+            writer.add_point([i % 17, i % 5], segment=i % 7)
+            if i % 50 == 0:
+                writer.add_points([[i, i]], segment=[1])
+        path = tmp_path / str(max_buffer_bytes)
+        writer.write(path, spatial_index_limit=20)
+        if expected is None:
+            expected = _read_tree(path)
+        else:
+            assert _read_tree(path) == expected
@@ -30,6 +30,7 @@ import {
 } from "#src/mesh/backend.js";
 import { SkeletonChunk, SkeletonSource } from "#src/skeleton/backend.js";
 import { decodeSkeletonChunk } from "#src/skeleton/decode_precomputed_skeleton.js";
+import { decodeCompressedSegmentationChunk } from "#src/sliceview/backend_chunk_decoders/compressed_segmentation.js";
 import { ChunkDecoder } from "#src/sliceview/backend_chunk_decoders/index.js";
 import { decodeJpegChunk } from "#src/sliceview/backend_chunk_decoders/jpeg.js";
 import { decodeNdstoreNpzChunk } from "#src/sliceview/backend_chunk_decoders/ndstoreNpz.js";
@@ -46,14 +47,26 @@ const chunkDecoders = new Map<VolumeChunkEncoding, ChunkDecoder>();
 chunkDecoders.set(VolumeChunkEncoding.NPZ, decodeNdstoreNpzChunk);
 chunkDecoders.set(VolumeChunkEncoding.JPEG, decodeJpegChunk);
 chunkDecoders.set(VolumeChunkEncoding.RAW, decodeRawChunk);
+chunkDecoders.set(
+  VolumeChunkEncoding.COMPRESSED_SEGMENTATION,
+  decodeCompressedSegmentationChunk,
+);
 
 @registerSharedObject()
 export class PythonVolumeChunkSource extends WithParameters(
   VolumeChunkSource,
   VolumeChunkSourceParameters,
 ) {
-  chunkDecoder = chunkDecoders.get(this.parameters["encoding"])!;
-  encoding = VolumeChunkEncoding[this.parameters.encoding].toLowerCase();
+  // The server encodes compressed_segmentation chunks with the block size chosen for the chunk
+  // specification.  If the specification does not use compressed segmentation, raw chunks are
+  // requested instead.
+  effectiveEncoding =
+    this.spec.compressedSegmentationBlockSize === undefined &&
+    this.parameters.encoding === VolumeChunkEncoding.COMPRESSED_SEGMENTATION
+      ? VolumeChunkEncoding.RAW
+      : this.parameters.encoding;
+  chunkDecoder = chunkDecoders.get(this.effectiveEncoding)!;
+  encoding = VolumeChunkEncoding[this.effectiveEncoding].toLowerCase();
 
   async download(chunk: VolumeChunk, signal: AbortSignal) {
     const { parameters } = this;
@@ -70,6 +83,12 @@ export class PythonVolumeChunkSource extends WithParameters(
         path += (chunkPosition[i] + chunkDataSize[i]).toString();
       }
     }
+    const { compressedSegmentationBlockSize } = this.spec;
+    if (
+      this.effectiveEncoding === VolumeChunkEncoding.COMPRESSED_SEGMENTATION
+    ) {
+      path += `?blockSize=${compressedSegmentationBlockSize!.join()}`;
+    }
     const response = await fetchOk(new URL(path, parameters.baseUrl).href, {
       signal: signal,
     });
@@ -20,6 +20,7 @@ export enum VolumeChunkEncoding {
   JPEG = 0,
   NPZ = 1,
   RAW = 2,
+  COMPRESSED_SEGMENTATION = 3,
 }
 
 export class PythonSourceParameters {
@@ -19,6 +19,12 @@ import { StatusMessage } from "#src/status.js";
 import { RefCounted } from "#src/util/disposable.js";
 import { HttpError } from "#src/util/http_request.js";
 import { bigintToStringJsonReplacer } from "#src/util/json.js";
+import type { JsonPatch } from "#src/util/json_patch.js";
+import {
+  applyJsonPatch,
+  createJsonPatch,
+  jsonValuesEqual,
+} from "#src/util/json_patch.js";
 import { getRandomHexString } from "#src/util/random.js";
 import type { Trackable } from "#src/util/trackable.js";
 import { getCachedJson } from "#src/util/trackable.js";
@@ -44,7 +50,9 @@ function getServerUrls() {
 
 export class ClientStateSynchronizer extends RefCounted {
   clientGeneration = -1;
-  lastServerState = "";
+  // JSON state with generation `lastServerGeneration`, which state updates in both directions are
+  // sent as patches against.
+  lastServerState: unknown = undefined;
   lastServerGeneration = "";
   private needUpdate = false;
   private updateInProgress = false;
@@ -85,12 +93,13 @@ export class ClientStateSynchronizer extends RefCounted {
         if (clientGeneration === this.clientGeneration) {
           return;
         }
-        const newStateJson = getCachedJson(this.state).value;
-        const newStateEncoded = JSON.stringify(
-          newStateJson,
-          bigintToStringJsonReplacer,
+        const newStateJson = JSON.parse(
+          JSON.stringify(
+            getCachedJson(this.state).value,
+            bigintToStringJsonReplacer,
+          ),
         );
-        if (newStateEncoded === this.lastServerState) {
+        if (jsonValuesEqual(newStateJson, this.lastServerState)) {
           // Avoid sending back the exact same state just received from or sent to the server.  This
           // is also important for making things work in the presence of multiple simultaneous
           // clients.
@@ -99,7 +108,7 @@ export class ClientStateSynchronizer extends RefCounted {
         }
         if (DEBUG) {
           console.log("Sending update due to mismatch: ", {
-            newStateEncoded,
+            newStateJson,
             lastServerState: this.lastServerState,
             lastServerGeneration: this.lastServerGeneration,
           });
@@ -108,7 +117,9 @@ export class ClientStateSynchronizer extends RefCounted {
           const response = await fetch(this.client.urls.state, {
             method: "POST",
             body: JSON.stringify({
-              s: newStateJson,
+              ...(this.lastServerState === undefined
+                ? { s: newStateJson }
+                : { p: createJsonPatch(this.lastServerState, newStateJson) }),
               g: clientGeneration,
               pg: this.lastServerGeneration,
               c: this.client.clientId,
@@ -116,7 +127,7 @@ export class ClientStateSynchronizer extends RefCounted {
           });
           if (response.status === 200) {
             const responseJson = await response.json();
-            this.lastServerState = newStateEncoded;
+            this.lastServerState = newStateJson;
             this.lastServerGeneration = responseJson.g;
             this.clientGeneration = clientGeneration;
           } else if (response.status === 412) {
@@ -138,10 +149,34 @@ export class ClientStateSynchronizer extends RefCounted {
     const trackable = this.state;
     trackable.reset();
     trackable.restoreState(state);
-    this.lastServerState = JSON.stringify(state);
+    this.lastServerState = state;
     this.clientGeneration = trackable.changed.count;
     this.lastServerGeneration = generation;
   }
+
+  /**
+   * Applies a patch against the state with generation `baseGeneration`.
+   *
+   * Returns `false`, without changing the state, if that is not the last server
+   * state.
+   */
+  applyServerPatch(
+    patch: JsonPatch,
+    baseGeneration: string,
+    generation: string,
+  ): boolean {
+    if (
+      this.lastServerState === undefined ||
+      baseGeneration !== this.lastServerGeneration
+    ) {
+      return false;
+    }
+    this.setServerState(
+      applyJsonPatch(this.lastServerState, patch),
+      generation,
+    );
+    return true;
+  }
 }
 
 export class ClientStateReceiver extends RefCounted {
@@ -166,13 +201,23 @@ export class ClientStateReceiver extends RefCounted {
     }
   }
 
-  connect() {
+  /**
+   * Connects to the server event stream.
+   *
+   * @param fullStateKeys Keys of states that the server must send in full, rather than as patches.
+   */
+  connect(fullStateKeys = new Set<string>()) {
     this.status.setText("Connecting to Python server");
     this.status.setVisible(true);
     const url = new URL(this.client.urls.events);
     url.searchParams.set("c", this.client.clientId);
+    // Request state updates as patches.
+    url.searchParams.set("p", "1");
     for (const [key, synchronizer] of this.states) {
-      url.searchParams.set(`g${key}`, synchronizer.lastServerGeneration);
+      url.searchParams.set(
+        `g${key}`,
+        fullStateKeys.has(key) ? "" : synchronizer.lastServerGeneration,
+      );
     }
     const eventSource = (this.eventSource = new EventSource(url.toString()));
     eventSource.onmessage = (ev: MessageEvent<string>) => {
@@ -182,13 +227,21 @@ export class ClientStateReceiver extends RefCounted {
       }
       const generation = msg.g;
       const key = msg.k;
-      const state = msg.s;
       const synchronizer = this.states.get(key);
       if (synchronizer === undefined) {
         console.log("unexpected state update for key: ", key);
         return;
       }
-      synchronizer.setServerState(state, generation);
+      if (msg.p === undefined) {
+        synchronizer.setServerState(msg.s, generation);
+      } else if (!synchronizer.applyServerPatch(msg.p, msg.pg, generation)) {
+        // The patch is against a state this client no longer has, e.g. because a state update
+        // sent by this client completed in the meantime.  Reconnect to receive the full state.
+        console.log("python state patch generation mismatch for key: ", key);
+        eventSource.close();
+        this.eventSource = undefined;
+        this.connect(new Set([key]));
+      }
     };
     eventSource.onerror = () => {
       console.log("python state event source disconnected");
@@ -0,0 +1,68 @@
+/**
+ * @license
+ * Copyright 2025 Google Inc.
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+import { describe, it, expect } from "vitest";
+import {
+  applyJsonPatch,
+  createJsonPatch,
+  jsonValuesEqual,
+} from "#src/util/json_patch.js";
+
+describe("json patch", () => {
+  it("round trips", () => {
+    const cases: [unknown, unknown][] = [
+      [{ a: 1 }, { a: 1 }],
+      [{ a: 1, b: [1, 2] }, { a: 2, c: "x" }],
+      [{ "a/b": { "c~d": 1 } }, { "a/b": { "c~d": 2 } }],
+      [{ ids: ["1", "2", "3"] }, { ids: ["1", "2", "5", "3"] }],
+      [{ ids: ["1", "2", "3", "4"] }, { ids: ["1", "4"] }],
+      [[1, 2, 3], [4, 5]],
+      [{ a: 1 }, [1]],
+    ];
+    for (const [oldValue, newValue] of cases) {
+      const oldCopy = structuredClone(oldValue);
+      const patch = createJsonPatch(oldValue, newValue);
+      expect(applyJsonPatch(oldValue, patch)).toEqual(newValue);
+      expect(oldValue).toEqual(oldCopy);
+    }
+  });
+
+  it("generates small patches for list edits", () => {
+    const ids = Array.from({ length: 1000 }, (_, i) => `${i}`);
+    const patch = createJsonPatch({ ids }, { ids: [...ids, "1000"] });
+    expect(patch).toEqual([{ op: "add", path: "/ids/1000", value: "1000" }]);
+  });
+
+  it("applies all operations", () => {
+    expect(
+      applyJsonPatch({ a: { b: 1 }, c: [1, 2] }, [
+        { op: "test", path: "/c", value: [1, 2] },
+        { op: "copy", from: "/a", path: "/d" },
+        { op: "move", from: "/a/b", path: "/c/-" },
+        { op: "add", path: "/d/e", value: 2 },
+      ]),
+    ).toEqual({ a: {}, c: [1, 2, 1], d: { b: 1, e: 2 } });
+    expect(() =>
+      applyJsonPatch({ a: 1 }, [{ op: "remove", path: "/b" }]),
+    ).toThrow();
+  });
+
+  it("compares values ignoring member order", () => {
+    expect(jsonValuesEqual({ a: 1, b: 2 }, { b: 2, a: 1 })).toBe(true);
+    expect(jsonValuesEqual({ a: 1 }, { a: 1, b: undefined })).toBe(false);
+    expect(jsonValuesEqual([1, 2], [2, 1])).toBe(false);
+  });
+});
@@ -0,0 +1,312 @@
+/**
+ * @license
+ * Copyright 2025 Google Inc.
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *      http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+/**
+ * @file JSON Patch (RFC 6902) support for incremental state updates between the client and the
+ * Python server.
+ *
+ * Only `add`, `remove` and `replace` operations are generated, but all operations are accepted by
+ * `applyJsonPatch`.  Must be kept in sync with python/neuroglancer/json_patch.py.
+ */
+
+export interface JsonPatchOperation {
+  op: "add" | "remove" | "replace" | "move" | "copy" | "test";
+  path: string;
+  from?: string;
+  value?: any;
+}
+
+export type JsonPatch = JsonPatchOperation[];
+
+function escapePointerToken(token: string) {
+  return token.replace(/~/g, "~0").replace(/\//g, "~1");
+}
+
+function parsePointer(pointer: string): string[] {
+  if (pointer === "") return [];
+  if (!pointer.startsWith("/")) {
+    throw new Error(`Invalid JSON pointer: ${JSON.stringify(pointer)}`);
+  }
+  return pointer
+    .substring(1)
+    .split("/")
+    .map((token) => token.replace(/~1/g, "/").replace(/~0/g, "~"));
+}
+
+function isObject(x: unknown): x is Record<string, unknown> {
+  return typeof x === "object" && x !== null && !Array.isArray(x);
+}
+
+/**
+ * Compares two JSON values, ignoring the order of object members.
+ */
+export function jsonValuesEqual(a: unknown, b: unknown): boolean {
+  if (a === b) return true;
+  if (Array.isArray(a)) {
+    if (!Array.isArray(b) || a.length !== b.length) return false;
+    for (let i = 0, length = a.length; i < length; ++i) {
+      if (!jsonValuesEqual(a[i], b[i])) return false;
+    }
+    return true;
+  }
+  if (isObject(a)) {
+    if (!isObject(b)) return false;
+    const keys = Object.keys(a);
+    if (keys.length !== Object.keys(b).length) return false;
+    for (const key of keys) {
+      if (!Object.prototype.hasOwnProperty.call(b, key)) return false;
+      if (!jsonValuesEqual(a[key], b[key])) return false;
+    }
+    return true;
+  }
+  return false;
+}
+
+/**
+ * Returns a patch that transforms the JSON value `oldValue` into `newValue`.
+ */
+export function createJsonPatch(
+  oldValue: unknown,
+  newValue: unknown,
+): JsonPatch {
+  const patch: JsonPatch = [];
+  diffValues(oldValue, newValue, "", patch);
+  return patch;
+}
+
+function diffValues(
+  oldValue: unknown,
+  newValue: unknown,
+  path: string,
+  patch: JsonPatch,
+) {
+  if (jsonValuesEqual(oldValue, newValue)) return;
+  if (isObject(oldValue) && isObject(newValue)) {
+    for (const key of Object.keys(oldValue)) {
+      if (!Object.prototype.hasOwnProperty.call(newValue, key)) {
+        patch.push({
+          op: "remove",
+          path: `${path}/${escapePointerToken(key)}`,
+        });
+      }
+    }
+    for (const [key, value] of Object.entries(newValue)) {
+      const childPath = `${path}/${escapePointerToken(key)}`;
+      if (Object.prototype.hasOwnProperty.call(oldValue, key)) {
+        diffValues(oldValue[key], value, childPath, patch);
+      } else {
+        patch.push({ op: "add", path: childPath, value });
+      }
+    }
+    return;
+  }
+  if (Array.isArray(oldValue) && Array.isArray(newValue)) {
+    diffArrays(oldValue, newValue, path, patch);
+    return;
+  }
+  patch.push({ op: "replace", path, value: newValue });
+}
+
+function diffArrays(
+  oldValue: unknown[],
+  newValue: unknown[],
+  path: string,
+  patch: JsonPatch,
+) {
+  // Only the elements between the common prefix and suffix are diffed, which handles the common
+  // cases of appending, inserting or deleting a run of elements in a long list.
+  const oldLength = oldValue.length;
+  const newLength = newValue.length;
+  const common = Math.min(oldLength, newLength);
+  let prefix = 0;
+  while (
+    prefix < common &&
+    jsonValuesEqual(oldValue[prefix], newValue[prefix])
+  ) {
+    ++prefix;
+  }
+  let suffix = 0;
+  while (
+    suffix < common - prefix &&
+    jsonValuesEqual(
+      oldValue[oldLength - 1 - suffix],
+      newValue[newLength - 1 - suffix],
+    )
+  ) {
+    ++suffix;
+  }
+  const numRemoved = oldLength - prefix - suffix;
+  const numAdded = newLength - prefix - suffix;
+  if (numRemoved === numAdded) {
+    for (let i = prefix; i < prefix + numAdded; ++i) {
+      diffValues(oldValue[i], newValue[i], `${path}/${i}`, patch);
+    }
+    return;
+  }
+  if (numRemoved + numAdded > newLength) {
+    patch.push({ op: "replace", path, value: newValue });
+    return;
+  }
+  for (let i = 0; i < numRemoved; ++i) {
+    patch.push({ op: "remove", path: `${path}/${prefix}` });
+  }
+  for (let i = prefix; i < prefix + numAdded; ++i) {
+    patch.push({ op: "add", path: `${path}/${i}`, value: newValue[i] });
+  }
+}
+
+function getArrayIndex(token: string, size: number) {
+  if (!/^(0|[1-9][0-9]*)$/.test(token)) {
+    throw new Error(`Invalid array index: ${JSON.stringify(token)}`);
+  }
+  const index = Number(token);
+  if (index >= size) {
+    throw new Error(`Array index out of range: ${JSON.stringify(token)}`);
+  }
+  return index;
+}
+
+function getMember(container: any, token: string) {
+  if (Array.isArray(container)) {
+    return container[getArrayIndex(token, container.length)];
+  }
+  if (isObject(container)) {
+    if (!Object.prototype.hasOwnProperty.call(container, token)) {
+      throw new Error(`Missing member: ${JSON.stringify(token)}`);
+    }
+    return container[token];
+  }
+  throw new Error(`Cannot index non-container with ${JSON.stringify(token)}`);
+}
+
+function getValue(doc: any, path: string[]) {
+  for (const token of path) {
+    doc = getMember(doc, token);
+  }
+  return doc;
+}
+
+function applyOperation(
+  doc: any,
+  path: string[],
+  pathIndex: number,
+  op: "add" | "remove" | "replace",
+  value: any,
+  owned: Set<any>,
+): any {
+  if (pathIndex === path.length) {
+    if (op === "remove") {
+      throw new Error("Cannot remove the root value");
+    }
+    return value;
+  }
+  const token = path[pathIndex];
+  if (Array.isArray(doc)) {
+    if (!owned.has(doc)) {
+      doc = Array.from(doc);
+      owned.add(doc);
+    }
+  } else if (isObject(doc)) {
+    if (!owned.has(doc)) {
+      doc = { ...doc };
+      owned.add(doc);
+    }
+  } else {
+    throw new Error(`Cannot index non-container with ${JSON.stringify(token)}`);
+  }
+  if (pathIndex + 1 < path.length) {
+    const key = Array.isArray(doc) ? getArrayIndex(token, doc.length) : token;
+    doc[key] = applyOperation(
+      getMember(doc, token),
+      path,
+      pathIndex + 1,
+      op,
+      value,
+      owned,
+    );
+    return doc;
+  }
+  if (Array.isArray(doc)) {
+    if (op === "add") {
+      const index =
+        token === "-" ? doc.length : getArrayIndex(token, doc.length + 1);
+      doc.splice(index, 0, value);
+    } else {
+      const index = getArrayIndex(token, doc.length);
+      if (op === "remove") {
+        doc.splice(index, 1);
+      } else {
+        doc[index] = value;
+      }
+    }
+  } else {
+    if (op !== "add") getMember(doc, token);
+    if (op === "remove") {
+      delete doc[token];
+    } else {
+      doc[token] = value;
+    }
+  }
+  return doc;
+}
+
+/**
+ * Returns the result of applying `patch` to the JSON value `doc`.
+ *
+ * `doc` is not modified; containers along modified paths are copied, and all other values are
+ * shared with the result.
+ */
+export function applyJsonPatch(doc: unknown, patch: JsonPatch): unknown {
+  // Containers copied by this call, which may be modified in place.
+  const owned = new Set<any>();
+  for (const operation of patch) {
+    const path = parsePointer(operation.path);
+    let value = operation.value;
+    switch (operation.op) {
+      case "test":
+        if (!jsonValuesEqual(getValue(doc, path), value)) {
+          throw new Error(`Test failed: ${JSON.stringify(operation)}`);
+        }
+        continue;
+      case "move":
+      case "copy": {
+        const fromPath = parsePointer(operation.from!);
+        value = getValue(doc, fromPath);
+        if (operation.op === "copy") {
+          value = structuredClone(value);
+        } else {
+          if (
+            path.length > fromPath.length &&
+            fromPath.every((token, i) => path[i] === token)
+          ) {
+            throw new Error("Cannot move a value into itself");
+          }
+          doc = applyOperation(doc, fromPath, 0, "remove", undefined, owned);
+        }
+        doc = applyOperation(doc, path, 0, "add", value, owned);
+        continue;
+      }
+      case "add":
+      case "remove":
+      case "replace":
+        doc = applyOperation(doc, path, 0, operation.op, value, owned);
+        continue;
+      default:
+        throw new Error(`Unsupported operation: ${JSON.stringify(operation)}`);
+    }
+  }
+  return doc;
+}